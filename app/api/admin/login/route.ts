@@ -1,10 +1,10 @@
 import { NextRequest, NextResponse } from 'next/server';
-import bcrypt from 'bcryptjs';
 import { pool } from '@/lib/db';
 import { generateToken } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { rateLimitMiddleware, getRateLimitIdentifier, rateLimiters } from '@/lib/rate-limit';
 import { z } from 'zod';
+import { comparePassword, PasswordHasherBusyError, passwordHasherBusyResponse } from '@/lib/password-hasher';
 
 const loginSchema = z.object({
   email: z.string().email('Correo electrónico inválido'),
@@ -60,7 +60,7 @@ export async function POST(request: NextRequest) {
 
     const user = result.rows[0];
 
-    const passwordMatch = await bcrypt.compare(password, user.password);
+    const passwordMatch = await comparePassword(password, user.password);
     if (!passwordMatch) {
       const duration = Date.now() - startTime;
       logApiRequest('POST', '/api/admin/login', 401, duration);
@@ -105,6 +105,10 @@ export async function POST(request: NextRequest) {
     });
   } catch (error: unknown) {
     const duration = Date.now() - startTime;
+    if (error instanceof PasswordHasherBusyError) {
+      logApiRequest('POST', '/api/admin/login', 503, duration);
+      return passwordHasherBusyResponse();
+    }
     apiLogger.error(
       {
         error: error instanceof Error ? error.message : String(error),
@@ -1,10 +1,10 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { pool } from '@/lib/db';
 import { isSuperAdmin } from '@/lib/auth';
-import bcrypt from 'bcryptjs';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { rateLimitMiddleware, getRateLimitIdentifier, rateLimiters } from '@/lib/rate-limit';
 import { z } from 'zod';
+import { hashPassword, PasswordHasherBusyError, passwordHasherBusyResponse } from '@/lib/password-hasher';
 
 const masterResetPasswordSchema = z.object({
   email: z.string().email('Email inválido'),
@@ -184,7 +184,7 @@ export async function POST(request: NextRequest) {
     userId = user.id;
 
     // Hashear nueva contraseña
-    const hashedPassword = await bcrypt.hash(new_password, 10);
+    const hashedPassword = await hashPassword(new_password);
 
     // Actualizar contraseña según el tipo de usuario
     if (userType === 'provider') {
@@ -227,6 +227,10 @@ export async function POST(request: NextRequest) {
     });
   } catch (error: any) {
     const duration = Date.now() - startTime;
+    if (error instanceof PasswordHasherBusyError) {
+      logApiRequest('POST', '/api/admin/master-reset-password', 503, duration);
+      return passwordHasherBusyResponse();
+    }
     apiLogger.error({ 
       error: error instanceof Error ? error.message : String(error),
       stack: error instanceof Error ? error.stack : undefined,
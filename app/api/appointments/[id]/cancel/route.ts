@@ -1,10 +1,12 @@
-import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
+import { NextRequest, NextResponse, after } from 'next/server';
+import { pool, markProviderWrite } from '@/lib/db';
 import { withTransaction } from '@/lib/db-transactions';
 import { verifyCancellationToken, canCancelAppointment, getAppointmentInfoFromToken } from '@/lib/cancellation-token';
-import { sendProviderCancellationNotification } from '@/lib/whatsapp';
+import { sendProviderCancellationNotification, buildProviderCancellationMessage } from '@/lib/whatsapp';
+import { isWhatsAppOutboxEnabled, enqueueWhatsAppMessage, drainWhatsAppOutboxSafely } from '@/lib/whatsapp-outbox';
 import { getUsernameByUserAccountId } from '@/lib/user-routes';
 import { invalidateAppointmentCache } from '@/lib/cache';
+import { markSlotReleased } from '@/lib/availability';
 import { requireAuth } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { z } from 'zod';
@@ -157,6 +159,19 @@ export async function POST(
       }
     }
 
+    // Si es cancelación por proveedor, avisar al paciente por WhatsApp: con outbox
+    // se encola en la misma transacción y se envía después de responder
+    const notifyPatient = cancelled_by === 'provider';
+    const useOutbox = notifyPatient && await isWhatsAppOutboxEnabled();
+    const cancellationDetails = notifyPatient
+      ? {
+          patientName: `${appointment.first_name} ${appointment.last_name}`,
+          date: appointment.appointment_date.toISOString().split('T')[0],
+          time: appointment.appointment_time.substring(0, 5),
+          rescheduleUrl: `${getAppUrl()}/${await getUsernameByUserAccountId(appointment.user_account_id)}/agendar-visita`,
+        }
+      : null;
+
     // Actualizar estado de la cita usando transacción
     await withTransaction(async (client) => {
       await client.query(
@@ -165,23 +180,26 @@ export async function POST(
          WHERE id = $1`,
         [appointmentId]
       );
+
+      if (useOutbox && cancellationDetails) {
+        await enqueueWhatsAppMessage(client, {
+          idempotencyKey: `provider_cancellation:${appointmentId}`,
+          appointmentId,
+          kind: 'provider_cancellation',
+          phoneNumber: appointment.phone_number,
+          message: buildProviderCancellationMessage(cancellationDetails),
+        });
+      }
     });
 
-    // Si es cancelación por proveedor, enviar WhatsApp al paciente
-    if (cancelled_by === 'provider') {
+    if (useOutbox) {
+      after(drainWhatsAppOutboxSafely);
+    } else if (cancellationDetails) {
+      // Sin tabla whatsapp_outbox: enviar en línea
       try {
-        const providerUsername = await getUsernameByUserAccountId(appointment.user_account_id);
-        const baseUrl = getAppUrl();
-        const rescheduleUrl = `${baseUrl}/${providerUsername}/agendar-visita`;
-
         const whatsappResult = await sendProviderCancellationNotification(
           appointment.phone_number,
-          {
-            patientName: `${appointment.first_name} ${appointment.last_name}`,
-            date: appointment.appointment_date.toISOString().split('T')[0],
-            time: appointment.appointment_time.substring(0, 5),
-            rescheduleUrl,
-          }
+          cancellationDetails
         );
 
         // Actualizar estado de WhatsApp si se envió exitosamente
@@ -201,8 +219,11 @@ export async function POST(
       }
     }
 
-    // Invalidar caché de disponibilidad
-    await invalidateAppointmentCache(appointment.user_account_id, appointment.appointment_date.toISOString().split('T')[0]);
+    // Actualizar índice y caché de disponibilidad
+    const appointmentDate = appointment.appointment_date.toISOString().split('T')[0];
+    markProviderWrite(appointment.user_account_id);
+    await markSlotReleased(appointment.user_account_id, appointmentDate, appointment.appointment_time);
+    await invalidateAppointmentCache(appointment.user_account_id, appointmentDate);
 
     const duration = Date.now() - startTime;
     logApiRequest('POST', `/api/appointments/${appointmentId}/cancel`, 200, duration);
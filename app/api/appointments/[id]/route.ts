@@ -1,9 +1,33 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
+import { query, defineStatement } from '@/lib/db';
 import { verifyCancellationToken, canCancelAppointment } from '@/lib/cancellation-token';
 import { getUsernameByUserAccountId } from '@/lib/user-routes';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 
+const APPOINTMENT_DETAIL = defineStatement(
+  'appointment_detail',
+  `SELECT 
+    a.id,
+    a.appointment_date,
+    a.appointment_time,
+    a.health_insurance,
+    a.status,
+    a.cancellation_token,
+    c.first_name,
+    c.last_name,
+    c.phone_number,
+    a.user_account_id,
+    vt.name as visit_type_name,
+    ct.name as consult_type_name,
+    pt.name as practice_type_name
+  FROM appointments a
+  JOIN clients c ON a.client_id = c.id
+  JOIN visit_types vt ON a.visit_type_id = vt.id
+  LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
+  LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
+  WHERE a.id = $1`
+);
+
 export async function GET(
   request: NextRequest,
   { params }: { params: Promise<{ id: string }> }
@@ -25,29 +49,7 @@ export async function GET(
 
   try {
     // Obtener información de la cita
-    const appointmentResult = await pool.query(
-      `SELECT 
-        a.id,
-        a.appointment_date,
-        a.appointment_time,
-        a.health_insurance,
-        a.status,
-        a.cancellation_token,
-        c.first_name,
-        c.last_name,
-        c.phone_number,
-        a.user_account_id,
-        vt.name as visit_type_name,
-        ct.name as consult_type_name,
-        pt.name as practice_type_name
-      FROM appointments a
-      JOIN clients c ON a.client_id = c.id
-      JOIN visit_types vt ON a.visit_type_id = vt.id
-      LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
-      LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
-      WHERE a.id = $1`,
-      [appointmentId]
-    );
+    const appointmentResult = await query(APPOINTMENT_DETAIL, [appointmentId]);
 
     if (appointmentResult.rows.length === 0) {
       const duration = Date.now() - startTime;
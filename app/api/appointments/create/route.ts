@@ -1,10 +1,13 @@
-import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { withTransaction, upsertClientInTransaction, createAppointmentInTransaction, updateWhatsAppStatusInTransaction } from '@/lib/db-transactions';
+import { NextRequest, NextResponse, after } from 'next/server';
+import { pool, markProviderWrite } from '@/lib/db';
+import { createBooking, AppointmentSlotTakenError } from '@/lib/db-transactions';
 import { generateCancellationToken } from '@/lib/cancellation-token';
-import { sendAppointmentConfirmation } from '@/lib/whatsapp';
-import { getUserAccountIdByUsername, getUsernameByUserAccountId } from '@/lib/user-routes';
+import { sendAppointmentConfirmation, buildAppointmentConfirmationMessage } from '@/lib/whatsapp';
+import { isWhatsAppOutboxEnabled, drainWhatsAppOutboxSafely } from '@/lib/whatsapp-outbox';
+import { getUserAccountIdByUsername, getProviderById } from '@/lib/user-routes';
 import { invalidateAppointmentCache } from '@/lib/cache';
+import { markSlotBooked } from '@/lib/availability';
+import { getReferenceData, resolveVisitTypeId, resolveConsultTypeId, resolvePracticeTypeId } from '@/lib/reference-data';
 import { rateLimitMiddleware, getRateLimitIdentifier } from '@/lib/rate-limit';
 import { rateLimiters } from '@/lib/rate-limit';
 import { apiLogger, logApiRequest } from '@/lib/logger';
@@ -154,103 +157,18 @@ export async function POST(request: NextRequest) {
 
     const data = validationResult.data;
 
-    // Validar que visit_type_id existe en la base de datos
-    const visitTypeCheck = await pool.query(
-      'SELECT id FROM visit_types WHERE id = $1',
-      [data.visit_type_id]
-    );
-    
-    if (visitTypeCheck.rows.length === 0) {
-      // Si no existe el ID solicitado, intentar mapear por nombre según el ID esperado
-      const requestedId = data.visit_type_id;
-      let targetName = '';
-      let foundById = false;
-      
-      // Mapear ID esperado a nombre (buscar variaciones)
-      if (requestedId === 1) {
-        targetName = 'Consulta';
-      } else if (requestedId === 2) {
-        targetName = 'Practica';
-      }
-      
-      // Intentar buscar por nombre primero (con variaciones)
-      if (targetName) {
-        // Buscar por nombre exacto o variaciones comunes
-        const nameVariations = requestedId === 2 
-          ? ['Practica', 'Práctica', 'practice', 'practica']
-          : ['Consulta', 'consulta', 'Consulta General', 'consulta general'];
-        
-        for (const nameVar of nameVariations) {
-          const byNameResult = await pool.query(
-            `SELECT id FROM visit_types WHERE LOWER(TRIM(name)) = LOWER(TRIM($1)) LIMIT 1`,
-            [nameVar]
-          );
-          
-          if (byNameResult.rows.length > 0) {
-            data.visit_type_id = byNameResult.rows[0].id;
-            foundById = true;
-            apiLogger.warn({ 
-              requestedId, 
-              usingId: data.visit_type_id,
-              matchedByName: nameVar
-            }, 'visit_type_id no encontrado, usando por nombre');
-            break;
-          }
-        }
-      }
-      
-      // Si aún no se encontró, crear el tipo de visita solicitado (NO usar el primero disponible)
-      if (!foundById) {
-        try {
-          // Crear según el ID solicitado
-          const defaultName = requestedId === 1 ? 'Consulta' : requestedId === 2 ? 'Practica' : 'Consulta';
-          const defaultDesc = requestedId === 1 ? 'Consulta médica general' : 'Procedimiento o práctica médica';
-          
-          const insertResult = await pool.query(
-            `INSERT INTO visit_types (name, description) 
-             VALUES ($1, $2) 
-             ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-             RETURNING id`,
-            [defaultName, defaultDesc]
-          );
-          
-          if (insertResult.rows.length > 0) {
-            data.visit_type_id = insertResult.rows[0].id;
-            apiLogger.info({ createdId: data.visit_type_id, name: defaultName }, 'Creado visit_type solicitado');
-          } else {
-            // Si el INSERT no retornó filas (por el ON CONFLICT), buscar el existente
-            const existingResult = await pool.query(
-              `SELECT id FROM visit_types WHERE LOWER(TRIM(name)) = LOWER(TRIM($1)) LIMIT 1`,
-              [defaultName]
-            );
-            if (existingResult.rows.length > 0) {
-              data.visit_type_id = existingResult.rows[0].id;
-              apiLogger.info({ usingId: data.visit_type_id, name: defaultName }, 'Usando visit_type existente después de conflicto');
-            } else {
-              throw new Error('No se pudo crear o encontrar el visit_type');
-            }
-          }
-        } catch (insertError: any) {
-          // Si falla la inserción, intentar obtenerlo por nombre una vez más
-          const defaultName = requestedId === 1 ? 'Consulta' : requestedId === 2 ? 'Practica' : 'Consulta';
-          const existingResult = await pool.query(
-            `SELECT id FROM visit_types WHERE LOWER(TRIM(name)) = LOWER(TRIM($1)) LIMIT 1`,
-            [defaultName]
-          );
-          if (existingResult.rows.length > 0) {
-            data.visit_type_id = existingResult.rows[0].id;
-            apiLogger.warn({ usingId: data.visit_type_id, name: defaultName }, 'Usando visit_type existente después de error');
-          } else {
-            const duration = Date.now() - startTime;
-            logApiRequest('POST', '/api/appointments/create', 400, duration);
-            return NextResponse.json(
-              { error: `No se pudo crear o encontrar el tipo de visita solicitado (ID: ${requestedId})` },
-              { status: 400 }
-            );
-          }
-        }
-      }
+    // Resolver tipos de referencia en memoria (sin consultas a la BD en el caso normal)
+    const requestedVisitTypeId = data.visit_type_id;
+    const resolvedVisitTypeId = await resolveVisitTypeId(requestedVisitTypeId);
+    if (resolvedVisitTypeId === null) {
+      const duration = Date.now() - startTime;
+      logApiRequest('POST', '/api/appointments/create', 400, duration);
+      return NextResponse.json(
+        { error: `No se pudo crear o encontrar el tipo de visita solicitado (ID: ${requestedVisitTypeId})` },
+        { status: 400 }
+      );
     }
+    data.visit_type_id = resolvedVisitTypeId;
 
     // Validar lógica condicional
     if (data.visit_type_id === 1) {
@@ -273,148 +191,31 @@ export async function POST(request: NextRequest) {
       }
     }
 
-    // Validar que consult_type_id existe en la base de datos (si está presente)
     if (data.consult_type_id !== null && data.consult_type_id !== undefined) {
-      const consultTypeCheck = await pool.query(
-        'SELECT id FROM consult_types WHERE id = $1',
-        [data.consult_type_id]
-      );
-      
-      if (consultTypeCheck.rows.length === 0) {
-        // Si no existe, intentar obtener el primer consult_type disponible o crear uno por defecto
-        const requestedId = data.consult_type_id;
-        const firstConsultType = await pool.query(
-          'SELECT id FROM consult_types ORDER BY id LIMIT 1'
+      const resolvedConsultTypeId = await resolveConsultTypeId(data.consult_type_id);
+      if (resolvedConsultTypeId === null) {
+        const duration = Date.now() - startTime;
+        logApiRequest('POST', '/api/appointments/create', 400, duration);
+        return NextResponse.json(
+          { error: 'No se pudo crear o encontrar un tipo de consulta válido' },
+          { status: 400 }
         );
-        
-        if (firstConsultType.rows.length > 0) {
-          // Usar el primer consult_type disponible
-          data.consult_type_id = firstConsultType.rows[0].id;
-          apiLogger.warn({ 
-            requestedId, 
-            usingId: data.consult_type_id 
-          }, 'consult_type_id no encontrado, usando primer disponible');
-        } else {
-          // Crear un consult_type por defecto si no existe ninguno
-          try {
-            const insertResult = await pool.query(
-              `INSERT INTO consult_types (name, description) 
-               VALUES ('Primera vez', 'Consulta inicial del paciente') 
-               RETURNING id`
-            );
-            data.consult_type_id = insertResult.rows[0].id;
-            apiLogger.info({ createdId: data.consult_type_id }, 'Creado consult_type por defecto');
-          } catch (insertError: any) {
-            // Si falla la inserción (puede ser por constraint UNIQUE), intentar obtenerlo
-            const existingResult = await pool.query(
-              `SELECT id FROM consult_types WHERE name = 'Primera vez' LIMIT 1`
-            );
-            if (existingResult.rows.length > 0) {
-              data.consult_type_id = existingResult.rows[0].id;
-            } else {
-              const duration = Date.now() - startTime;
-              logApiRequest('POST', '/api/appointments/create', 400, duration);
-              return NextResponse.json(
-                { error: 'No se pudo crear o encontrar un tipo de consulta válido' },
-                { status: 400 }
-              );
-            }
-          }
-        }
       }
+      data.consult_type_id = resolvedConsultTypeId;
     }
 
-    // Validar que practice_type_id existe en la base de datos (si está presente)
     if (data.practice_type_id !== null && data.practice_type_id !== undefined) {
-      const practiceTypeCheck = await pool.query(
-        'SELECT id FROM practice_types WHERE id = $1',
-        [data.practice_type_id]
-      );
-      
-      if (practiceTypeCheck.rows.length === 0) {
-        // Si no existe el ID solicitado, intentar buscar por nombre según el ID esperado
-        const requestedId = data.practice_type_id;
-        let targetName = '';
-        let foundById = false;
-        
-        // Mapear ID esperado a nombre (según los valores del formulario)
-        const practiceTypeMap: Record<number, string> = {
-          1: 'Criocirugía',
-          2: 'Electrocoagulación',
-          3: 'Biopsia'
-        };
-        
-        targetName = practiceTypeMap[requestedId] || '';
-        
-        // Intentar buscar por nombre primero
-        if (targetName) {
-          const byNameResult = await pool.query(
-            `SELECT id FROM practice_types WHERE LOWER(TRIM(name)) = LOWER(TRIM($1)) LIMIT 1`,
-            [targetName]
-          );
-          
-          if (byNameResult.rows.length > 0) {
-            data.practice_type_id = byNameResult.rows[0].id;
-            foundById = true;
-            apiLogger.warn({ 
-              requestedId, 
-              usingId: data.practice_type_id,
-              matchedByName: targetName
-            }, 'practice_type_id no encontrado, usando por nombre');
-          }
-        }
-        
-        // Si aún no se encontró, crear el tipo de práctica solicitado (NO usar el primero disponible)
-        if (!foundById) {
-          try {
-            const defaultName = targetName || 'Criocirugía';
-            const defaultDesc = `Procedimiento de ${defaultName.toLowerCase()}`;
-            
-            const insertResult = await pool.query(
-              `INSERT INTO practice_types (name, description) 
-               VALUES ($1, $2) 
-               ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-               RETURNING id`,
-              [defaultName, defaultDesc]
-            );
-            
-            if (insertResult.rows.length > 0) {
-              data.practice_type_id = insertResult.rows[0].id;
-              apiLogger.info({ createdId: data.practice_type_id, name: defaultName }, 'Creado practice_type solicitado');
-            } else {
-              // Si el INSERT no retornó filas (por el ON CONFLICT), buscar el existente
-              const existingResult = await pool.query(
-                `SELECT id FROM practice_types WHERE LOWER(TRIM(name)) = LOWER(TRIM($1)) LIMIT 1`,
-                [defaultName]
-              );
-              if (existingResult.rows.length > 0) {
-                data.practice_type_id = existingResult.rows[0].id;
-                apiLogger.info({ usingId: data.practice_type_id, name: defaultName }, 'Usando practice_type existente después de conflicto');
-              } else {
-                throw new Error('No se pudo crear o encontrar el practice_type');
-              }
-            }
-          } catch (insertError: any) {
-            // Si falla la inserción, intentar obtenerlo por nombre una vez más
-            const defaultName = targetName || 'Criocirugía';
-            const existingResult = await pool.query(
-              `SELECT id FROM practice_types WHERE LOWER(TRIM(name)) = LOWER(TRIM($1)) LIMIT 1`,
-              [defaultName]
-            );
-            if (existingResult.rows.length > 0) {
-              data.practice_type_id = existingResult.rows[0].id;
-              apiLogger.warn({ usingId: data.practice_type_id, name: defaultName }, 'Usando practice_type existente después de error');
-            } else {
-              const duration = Date.now() - startTime;
-              logApiRequest('POST', '/api/appointments/create', 400, duration);
-              return NextResponse.json(
-                { error: `No se pudo crear o encontrar el tipo de práctica solicitado (ID: ${requestedId}, Nombre esperado: ${targetName || 'N/A'})` },
-                { status: 400 }
-              );
-            }
-          }
-        }
+      const requestedPracticeTypeId = data.practice_type_id;
+      const resolvedPracticeTypeId = await resolvePracticeTypeId(requestedPracticeTypeId);
+      if (resolvedPracticeTypeId === null) {
+        const duration = Date.now() - startTime;
+        logApiRequest('POST', '/api/appointments/create', 400, duration);
+        return NextResponse.json(
+          { error: `No se pudo crear o encontrar el tipo de práctica solicitado (ID: ${requestedPracticeTypeId})` },
+          { status: 400 }
+        );
       }
+      data.practice_type_id = resolvedPracticeTypeId;
     }
 
     // Validar que la fecha no sea en el pasado
@@ -432,12 +233,9 @@ export async function POST(request: NextRequest) {
     }
 
     // Verificar que el proveedor existe y obtener su información
-    const providerCheck = await pool.query(
-      'SELECT id, username, first_name, last_name FROM user_accounts WHERE id = $1',
-      [data.user_account_id]
-    );
+    const provider = await getProviderById(data.user_account_id);
 
-    if (providerCheck.rows.length === 0) {
+    if (!provider) {
       const duration = Date.now() - startTime;
       logApiRequest('POST', '/api/appointments/create', 404, duration);
       return NextResponse.json(
@@ -446,164 +244,145 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    const providerUsername = providerCheck.rows[0].username;
-    const providerName = providerCheck.rows[0].first_name && providerCheck.rows[0].last_name
-      ? `${providerCheck.rows[0].first_name} ${providerCheck.rows[0].last_name}`
-      : providerCheck.rows[0].first_name || providerCheck.rows[0].last_name || providerUsername;
+    const providerUsername = provider.username;
+    const providerName = provider.first_name && provider.last_name
+      ? `${provider.first_name} ${provider.last_name}`
+      : provider.first_name || provider.last_name || providerUsername;
 
-    // Verificar si ya existe una cita duplicada activa
+    // Las reservas duplicadas las rechaza el índice único parcial al insertar
+    // (AppointmentSlotTakenError), sin consultas previas
     const phoneCleaned = cleanPhoneNumber(data.phone_number);
-    const existingClientCheck = await pool.query(
-      'SELECT id FROM clients WHERE phone_number = $1',
-      [phoneCleaned]
-    );
-
-    if (existingClientCheck.rows.length > 0) {
-      const clientId = existingClientCheck.rows[0].id;
-      const duplicateCheck = await pool.query(
-        `SELECT id FROM appointments
-         WHERE client_id = $1
-           AND user_account_id = $2
-           AND appointment_date = $3
-           AND appointment_time = $4
-           AND status = 'scheduled'`,
-        [clientId, data.user_account_id, data.appointment_date, `${data.appointment_time}:00`]
-      );
-
-      if (duplicateCheck.rows.length > 0) {
-        const duration = Date.now() - startTime;
-        logApiRequest('POST', '/api/appointments/create', 409, duration);
-        return NextResponse.json(
-          { error: 'Ya existe una cita duplicada', message: 'Ya existe una cita para este cliente, fecha y hora' },
-          { status: 409 }
-        );
-      }
-    }
-
-    // Crear cita usando transacción
-    const result = await withTransaction(async (client) => {
-      // Crear o actualizar cliente
-      const clientId = await upsertClientInTransaction(
-        client,
-        phoneCleaned,
-        data.first_name,
-        data.last_name,
-        data.user_account_id
-      );
+    const appointmentTime = `${data.appointment_time}:00`;
+    const consultTypeId = data.visit_type_id === 1 ? data.consult_type_id! : null;
+    const practiceTypeId = data.visit_type_id === 2 ? data.practice_type_id! : null;
+
+    // Con outbox, la confirmación de WhatsApp se escribe junto con la cita
+    // y se envía después de responder
+    const useOutbox = await isWhatsAppOutboxEnabled();
+    const referenceData = await getReferenceData();
+    const baseUrl = getAppUrl();
 
-      // Crear cita
-      const appointmentId = await createAppointmentInTransaction(client, {
-        clientId,
+    // Los nombres de los tipos salen de los datos de referencia en memoria
+    const appointment = {
+      patient_name: `${data.first_name} ${data.last_name}`,
+      phone_number: phoneCleaned,
+      appointment_date: data.appointment_date,
+      appointment_time: data.appointment_time,
+      visit_type_name: referenceData.visitTypes.byId.get(data.visit_type_id)?.name || '',
+      consult_type_name: consultTypeId ? referenceData.consultTypes.byId.get(consultTypeId)?.name ?? null : null,
+      practice_type_name: practiceTypeId ? referenceData.practiceTypes.byId.get(practiceTypeId)?.name ?? null : null,
+    };
+    const buildDetailsUrl = (appointmentId: number, cancellationToken: string) =>
+      `${baseUrl}/${providerUsername}/cita/${appointmentId}?token=${cancellationToken}`;
+
+    // Cliente, cita, token y outbox: reserva de IDs + una sentencia (ver createBooking)
+    const result = await createBooking(
+      {
+        phoneNumber: phoneCleaned,
+        firstName: data.first_name,
+        lastName: data.last_name,
         userAccountId: data.user_account_id,
         appointmentDate: data.appointment_date,
-        appointmentTime: `${data.appointment_time}:00`,
+        appointmentTime,
         visitTypeId: data.visit_type_id,
-        consultTypeId: data.visit_type_id === 1 ? data.consult_type_id! : null,
-        practiceTypeId: data.visit_type_id === 2 ? data.practice_type_id! : null,
+        consultTypeId,
+        practiceTypeId,
         healthInsurance: data.health_insurance,
-        cancellationToken: '', // Se actualizará después con el ID
         notes: data.notes,
-      });
-
-      // Generar token de cancelación con el ID de la cita
-      const cancellationToken = generateCancellationToken({
-        appointmentId,
-        patientId: clientId,
-        patientPhone: phoneCleaned,
-        appointmentDate: data.appointment_date,
-        appointmentTime: data.appointment_time,
-      });
-
-      // Actualizar token en la cita
-      await client.query(
-        'UPDATE appointments SET cancellation_token = $1 WHERE id = $2',
-        [cancellationToken, appointmentId]
-      );
-
-      return {
-        appointmentId,
-        clientId,
-        cancellationToken,
-      };
-    });
-
-    // Obtener información completa de la cita para respuesta
-    const appointmentResult = await pool.query(
-      `SELECT 
-        a.id,
-        a.appointment_date,
-        a.appointment_time,
-        a.health_insurance,
-        c.first_name,
-        c.last_name,
-        c.phone_number,
-        vt.name as visit_type_name,
-        ct.name as consult_type_name,
-        pt.name as practice_type_name
-      FROM appointments a
-      JOIN clients c ON a.client_id = c.id
-      JOIN visit_types vt ON a.visit_type_id = vt.id
-      LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
-      LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
-      WHERE a.id = $1`,
-      [result.appointmentId]
+      },
+      ({ appointmentId, clientId }) => {
+        // El token se firma con el ID reservado, antes de insertar la cita
+        const cancellationToken = generateCancellationToken({
+          appointmentId,
+          patientId: clientId,
+          patientPhone: phoneCleaned,
+          appointmentDate: data.appointment_date,
+          appointmentTime: data.appointment_time,
+        });
+
+        return {
+          cancellationToken,
+          ...(useOutbox && {
+            outbox: {
+              idempotencyKey: `confirmation:${appointmentId}`,
+              kind: 'appointment_confirmation',
+              message: buildAppointmentConfirmationMessage({
+                patientName: appointment.patient_name,
+                providerName,
+                date: appointment.appointment_date,
+                time: appointment.appointment_time,
+                visitType: appointment.visit_type_name,
+                consultType: appointment.consult_type_name,
+                practiceType: appointment.practice_type_name,
+                healthInsurance: data.health_insurance,
+                detailsUrl: buildDetailsUrl(appointmentId, cancellationToken),
+              }),
+            },
+          }),
+        };
+      }
     );
 
-    const appointment = appointmentResult.rows[0];
     // Construir URL usando NEXT_PUBLIC_APP_URL directamente
-    const baseUrl = getAppUrl();
-    const appointmentDetailsUrl = `${baseUrl}/${providerUsername}/cita/${result.appointmentId}?token=${result.cancellationToken}`;
+    const appointmentDetailsUrl = buildDetailsUrl(result.appointmentId, result.cancellationToken);
     
     // Log para debugging
     apiLogger.info({ baseUrl, appointmentDetailsUrl, envUrl: process.env.NEXT_PUBLIC_APP_URL }, 'Constructing appointment details URL');
 
-    // Enviar WhatsApp de confirmación (no bloquea si falla)
-    try {
-      const whatsappResult = await sendAppointmentConfirmation(
-        appointment.phone_number,
-        {
-          patientName: `${appointment.first_name} ${appointment.last_name}`,
-          providerName: providerName,
-          date: appointment.appointment_date.toISOString().split('T')[0],
-          time: appointment.appointment_time.substring(0, 5),
-          visitType: appointment.visit_type_name,
-          consultType: appointment.consult_type_name,
-          practiceType: appointment.practice_type_name,
-          healthInsurance: appointment.health_insurance,
-          detailsUrl: appointmentDetailsUrl,
-        }
-      );
-
-      // Actualizar estado de WhatsApp si se envió exitosamente
-      if (whatsappResult.success && whatsappResult.messageId) {
-        await pool.query(
-          `UPDATE appointments 
-           SET whatsapp_sent = true, 
-               whatsapp_sent_at = CURRENT_TIMESTAMP,
-               whatsapp_message_id = $1
-           WHERE id = $2`,
-          [whatsappResult.messageId, result.appointmentId]
+    if (useOutbox) {
+      // Enviar el outbox después de responder (los reintentos los hace el cron)
+      after(drainWhatsAppOutboxSafely);
+    } else {
+      try {
+        // Sin tabla whatsapp_outbox: enviar WhatsApp de confirmación en línea (no bloquea si falla)
+        const whatsappResult = await sendAppointmentConfirmation(
+          appointment.phone_number,
+          {
+            patientName: appointment.patient_name,
+            providerName: providerName,
+            date: appointment.appointment_date,
+            time: appointment.appointment_time,
+            visitType: appointment.visit_type_name,
+            consultType: appointment.consult_type_name,
+            practiceType: appointment.practice_type_name,
+            healthInsurance: data.health_insurance,
+            detailsUrl: appointmentDetailsUrl,
+          }
         );
+
+        // Actualizar estado de WhatsApp si se envió exitosamente
+        if (whatsappResult.success && whatsappResult.messageId) {
+          await pool.query(
+            `UPDATE appointments 
+             SET whatsapp_sent = true, 
+                 whatsapp_sent_at = CURRENT_TIMESTAMP,
+                 whatsapp_message_id = $1
+             WHERE id = $2`,
+            [whatsappResult.messageId, result.appointmentId]
+          );
+        }
+      } catch (whatsappError) {
+        apiLogger.error({ error: whatsappError, appointmentId: result.appointmentId }, 'Error sending WhatsApp confirmation');
+        // No fallar la creación de la cita si WhatsApp falla
       }
-    } catch (whatsappError) {
-      apiLogger.error({ error: whatsappError, appointmentId: result.appointmentId }, 'Error sending WhatsApp confirmation');
-      // No fallar la creación de la cita si WhatsApp falla
     }
 
-    // Invalidar caché de disponibilidad
+    // Lecturas del proveedor al primario (read-your-writes), índice y caché de disponibilidad
+    markProviderWrite(data.user_account_id);
+    await markSlotBooked(data.user_account_id, data.appointment_date, data.appointment_time);
     await invalidateAppointmentCache(data.user_account_id, data.appointment_date);
 
     const duration = Date.now() - startTime;
     logApiRequest('POST', '/api/appointments/create', 200, duration);
 
     return NextResponse.json({
-      is_existing_patient: existingClientCheck.rows.length > 0,
+      is_existing_patient: !result.isNewClient,
       appointment_info: {
         id: result.appointmentId,
-        patient_name: `${appointment.first_name} ${appointment.last_name}`,
+        patient_name: appointment.patient_name,
         phone_number: appointment.phone_number,
-        appointment_date: appointment.appointment_date.toISOString().split('T')[0],
-        appointment_time: appointment.appointment_time.substring(0, 5),
+        appointment_date: appointment.appointment_date,
+        appointment_time: appointment.appointment_time,
         visit_type_name: appointment.visit_type_name,
         consult_type_name: appointment.consult_type_name,
         practice_type_name: appointment.practice_type_name,
@@ -613,17 +392,19 @@ export async function POST(request: NextRequest) {
     });
   } catch (error: any) {
     const duration = Date.now() - startTime;
-    apiLogger.error({ error, duration }, 'Error in create appointment endpoint');
-    logApiRequest('POST', '/api/appointments/create', 500, duration);
 
-    // Manejar errores de constraint de BD (citas duplicadas)
-    if (error.code === '23505' && error.constraint === 'unique_appointment_scheduled') {
+    // El horario ya fue reservado (índice único parcial de citas activas)
+    if (error instanceof AppointmentSlotTakenError) {
+      logApiRequest('POST', '/api/appointments/create', 409, duration);
       return NextResponse.json(
-        { error: 'Ya existe una cita duplicada', message: 'Ya existe una cita para este cliente, fecha y hora' },
+        { error: 'Horario no disponible', message: 'Ya existe una cita para esta fecha y hora' },
         { status: 409 }
       );
     }
 
+    apiLogger.error({ error, duration }, 'Error in create appointment endpoint');
+    logApiRequest('POST', '/api/appointments/create', 500, duration);
+
     // Manejar errores de foreign key constraint (referencias inválidas)
     if (error.code === '23503') {
       let errorMessage = 'Referencia inválida en los datos de la cita';
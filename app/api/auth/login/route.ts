@@ -1,11 +1,11 @@
 import { NextRequest, NextResponse } from 'next/server';
-import bcrypt from 'bcryptjs';
 import { pool } from '@/lib/db';
 import { generateToken } from '@/lib/auth';
 import { rateLimitMiddleware, getRateLimitIdentifier } from '@/lib/rate-limit';
 import { rateLimiters } from '@/lib/rate-limit';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { z } from 'zod';
+import { comparePassword, PasswordHasherBusyError, passwordHasherBusyResponse } from '@/lib/password-hasher';
 
 const loginSchema = z.object({
   email: z.string().email('Email inválido'),
@@ -70,7 +70,7 @@ export async function POST(request: NextRequest) {
     const user = result.rows[0];
 
     // Verificar contraseña
-    const passwordMatch = await bcrypt.compare(password, user.password);
+    const passwordMatch = await comparePassword(password, user.password);
     if (!passwordMatch) {
       const duration = Date.now() - startTime;
       logApiRequest('POST', '/api/auth/login', 401, duration);
@@ -128,6 +128,10 @@ export async function POST(request: NextRequest) {
     });
   } catch (error: any) {
     const duration = Date.now() - startTime;
+    if (error instanceof PasswordHasherBusyError) {
+      logApiRequest('POST', '/api/auth/login', 503, duration);
+      return passwordHasherBusyResponse();
+    }
     apiLogger.error({ 
       error: error instanceof Error ? error.message : String(error),
       stack: error instanceof Error ? error.stack : undefined,
@@ -1,13 +1,14 @@
-import { NextRequest, NextResponse } from 'next/server';
-import bcrypt from 'bcryptjs';
-import { pool } from '@/lib/db';
+import { NextRequest, NextResponse, after } from 'next/server';
+import { pool, getSchemaCapabilities } from '@/lib/db';
 import { withTransaction } from '@/lib/db-transactions';
-import { sendVerificationEmail } from '@/lib/email';
+import { queueVerificationEmail, whenEmailQueueIdle } from '@/lib/email';
+import { invalidateProviderDirectory } from '@/lib/user-routes';
 import { rateLimitMiddleware, getRateLimitIdentifier } from '@/lib/rate-limit';
 import { rateLimiters } from '@/lib/rate-limit';
 import { apiLogger, logApiRequest, authLogger } from '@/lib/logger';
 import { z } from 'zod';
 import crypto from 'crypto';
+import { hashPassword, PasswordHasherBusyError, passwordHasherBusyResponse } from '@/lib/password-hasher';
 
 const registerSchema = z.object({
   email: z.string().email('Email inválido'),
@@ -105,7 +106,7 @@ export async function POST(request: NextRequest) {
     }
 
     // Hashear contraseña
-    const hashedPassword = await bcrypt.hash(password, 10);
+    const hashedPassword = await hashPassword(password);
 
     // Generar token de verificación
     const verificationToken = crypto.randomBytes(32).toString('hex');
@@ -113,19 +114,12 @@ export async function POST(request: NextRequest) {
     verificationTokenExpires.setHours(verificationTokenExpires.getHours() + 24); // Expira en 24 horas
 
     // Verificar qué columnas existen en la tabla user_accounts
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'user_accounts'
-      ORDER BY ordinal_position
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasFirstName = existingColumns.includes('first_name');
-    const hasLastName = existingColumns.includes('last_name');
-    const hasWhatsAppPhone = existingColumns.includes('whatsapp_phone_number');
-    const hasVerificationToken = existingColumns.includes('verification_token');
-    const hasVerificationTokenExpires = existingColumns.includes('verification_token_expires');
+    const schema = await getSchemaCapabilities();
+    const hasFirstName = schema.hasColumn('user_accounts', 'first_name');
+    const hasLastName = schema.hasColumn('user_accounts', 'last_name');
+    const hasWhatsAppPhone = schema.hasColumn('user_accounts', 'whatsapp_phone_number');
+    const hasVerificationToken = schema.hasColumn('user_accounts', 'verification_token');
+    const hasVerificationTokenExpires = schema.hasColumn('user_accounts', 'verification_token_expires');
 
     // Usar first_name y last_name del body si vienen, sino dividir full_name
     let finalFirstName: string | undefined;
@@ -193,13 +187,17 @@ export async function POST(request: NextRequest) {
 
     const userId = result.userId;
 
-    // Enviar email de verificación (fuera de transacción)
+    // Descartar un posible "no encontrado" cacheado para este username
+    await invalidateProviderDirectory(userId, username);
+
+    // Encolar email de verificación (fuera de transacción); se envía después de responder
     let emailSent = false;
     let emailError: any = null;
     try {
-      await sendVerificationEmail(email, username, verificationToken);
+      queueVerificationEmail(email, username, verificationToken);
+      after(whenEmailQueueIdle);
       emailSent = true;
-      authLogger.info({ userId, email }, 'Verification email sent');
+      authLogger.info({ userId, email }, 'Verification email queued');
     } catch (err) {
       emailError = err;
       authLogger.error({ 
@@ -231,6 +229,10 @@ export async function POST(request: NextRequest) {
     }, { status: 201 });
   } catch (error: any) {
     const duration = Date.now() - startTime;
+    if (error instanceof PasswordHasherBusyError) {
+      logApiRequest('POST', '/api/auth/register', 503, duration);
+      return passwordHasherBusyResponse();
+    }
     apiLogger.error({ 
       error: error instanceof Error ? error.message : String(error),
       stack: error instanceof Error ? error.stack : undefined,
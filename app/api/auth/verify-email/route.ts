@@ -1,9 +1,10 @@
-import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
+import { NextRequest, NextResponse, after } from 'next/server';
+import { pool, getSchemaCapabilities } from '@/lib/db';
 import { withTransaction } from '@/lib/db-transactions';
 import { rateLimitMiddleware, getRateLimitIdentifier, rateLimiters } from '@/lib/rate-limit';
 import { apiLogger, logApiRequest, authLogger } from '@/lib/logger';
-import { sendVerificationEmail } from '@/lib/email';
+import { queueVerificationEmail, whenEmailQueueIdle } from '@/lib/email';
+import { invalidateProviderDirectory } from '@/lib/user-routes';
 import crypto from 'crypto';
 
 export async function GET(request: NextRequest) {
@@ -41,16 +42,9 @@ export async function GET(request: NextRequest) {
 
   try {
     // Verificar qué columnas existen en la tabla user_accounts
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'user_accounts'
-      ORDER BY ordinal_position
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasVerificationToken = existingColumns.includes('verification_token');
-    const hasVerificationTokenExpires = existingColumns.includes('verification_token_expires');
+    const schema = await getSchemaCapabilities();
+    const hasVerificationToken = schema.hasColumn('user_accounts', 'verification_token');
+    const hasVerificationTokenExpires = schema.hasColumn('user_accounts', 'verification_token_expires');
 
     // Construir SELECT dinámicamente basado en columnas disponibles
     let selectColumns = 'id, email, username, email_verified';
@@ -136,6 +130,9 @@ export async function GET(request: NextRequest) {
       );
     });
 
+    // email_verified cambió: quitar la entrada vieja del directorio
+    await invalidateProviderDirectory(user.id);
+
     const duration = Date.now() - startTime;
     authLogger.info({ userId: user.id, email: user.email, duration }, 'Email verified successfully');
     logApiRequest('GET', '/api/auth/verify-email', 200, duration);
@@ -199,16 +196,9 @@ export async function POST(request: NextRequest) {
     }
 
     // Verificar qué columnas existen en la tabla user_accounts
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'user_accounts'
-      ORDER BY ordinal_position
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasVerificationToken = existingColumns.includes('verification_token');
-    const hasVerificationTokenExpires = existingColumns.includes('verification_token_expires');
+    const schema = await getSchemaCapabilities();
+    const hasVerificationToken = schema.hasColumn('user_accounts', 'verification_token');
+    const hasVerificationTokenExpires = schema.hasColumn('user_accounts', 'verification_token_expires');
 
     // Construir SELECT dinámicamente
     let selectColumns = 'id, email, username, email_verified';
@@ -293,12 +283,13 @@ export async function POST(request: NextRequest) {
       });
     }
 
-    // Enviar email de verificación
+    // Encolar email de verificación; se envía después de responder
     try {
-      await sendVerificationEmail(user.email, user.username, verificationToken);
+      queueVerificationEmail(user.email, user.username, verificationToken);
+      after(whenEmailQueueIdle);
       
       const duration = Date.now() - startTime;
-      authLogger.info({ userId: user.id, email: user.email, duration }, 'Verification email resent');
+      authLogger.info({ userId: user.id, email: user.email, duration }, 'Verification email queued for resend');
       logApiRequest('POST', '/api/auth/verify-email', 200, duration);
 
       return NextResponse.json({
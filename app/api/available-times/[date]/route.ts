@@ -1,166 +1,9 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { getOrSetCache, cacheKeys, invalidateAppointmentCache } from '@/lib/cache';
+import { getOrSetCache, cacheKeys, invalidateAppointmentCache, AVAILABLE_TIMES_CACHE_OPTIONS } from '@/lib/cache';
 import { rateLimitMiddleware, getRateLimitIdentifier, rateLimiters } from '@/lib/rate-limit';
 import { apiLogger, logApiRequest } from '@/lib/logger';
-import { dayNameToNumber, getDayNameEnglish } from '@/lib/utils';
-import { getUserAccountIdByUsername } from '@/lib/user-routes';
-
-/**
- * Genera intervalos de tiempo de 20 minutos entre startTime y endTime
- */
-function generateTimeSlots(startTime: string, endTime: string): string[] {
-  const slots: string[] = [];
-  
-  // Parsear tiempos
-  const [startHour, startMin] = startTime.split(':').map(Number);
-  const [endHour, endMin] = endTime.split(':').map(Number);
-  
-  const startMinutes = startHour * 60 + startMin;
-  const endMinutes = endHour * 60 + endMin;
-  
-  // Generar slots de 20 minutos
-  for (let minutes = startMinutes; minutes < endMinutes; minutes += 20) {
-    const hours = Math.floor(minutes / 60);
-    const mins = minutes % 60;
-    const timeString = `${String(hours).padStart(2, '0')}:${String(mins).padStart(2, '0')}`;
-    slots.push(timeString);
-  }
-  
-  return slots;
-}
-
-/**
- * Calcula horarios disponibles para una fecha y proveedor
- */
-async function calculateAvailableTimes(userAccountId: number, date: string): Promise<string[]> {
-  // Validar formato de fecha
-  if (!/^\d{4}-\d{2}-\d{2}$/.test(date)) {
-    throw new Error('Formato de fecha inválido. Debe ser YYYY-MM-DD');
-  }
-
-  // Validar que la fecha no sea en el pasado
-  const selectedDate = new Date(date);
-  const today = new Date();
-  today.setHours(0, 0, 0, 0);
-  
-  if (selectedDate < today) {
-    return []; // Fecha pasada, no hay horarios disponibles
-  }
-
-  // Obtener día de la semana
-  const dayOfWeek = selectedDate.getDay();
-  const dayName = getDayNameEnglish(dayOfWeek);
-
-  // Verificar si el día está marcado como no disponible
-  const unavailableDayCheck = await pool.query(
-    `SELECT id FROM unavailable_days 
-     WHERE user_account_id = $1 AND unavailable_date = $2`,
-    [userAccountId, date]
-  );
-
-  if (unavailableDayCheck.rows.length > 0) {
-    return []; // Día completo no disponible
-  }
-
-  // Obtener horario de trabajo para el día
-  const workScheduleResult = await pool.query(
-    `SELECT ws.id, ws.is_working_day
-     FROM work_schedule ws
-     WHERE ws.user_account_id = $1 AND ws.day_of_week = $2`,
-    [userAccountId, dayName]
-  );
-
-  if (workScheduleResult.rows.length === 0 || !workScheduleResult.rows[0].is_working_day) {
-    return []; // Día no laborable
-  }
-
-  const workScheduleId = workScheduleResult.rows[0].id;
-
-  // Obtener franjas horarias disponibles para el día
-  const slotsResult = await pool.query(
-    `SELECT start_time, end_time
-     FROM available_slots
-     WHERE work_schedule_id = $1 AND is_available = true
-     ORDER BY start_time`,
-    [workScheduleId]
-  );
-
-  if (slotsResult.rows.length === 0) {
-    return []; // No hay horarios configurados
-  }
-
-  // Generar todos los slots posibles de 20 minutos
-  let allSlots: string[] = [];
-  for (const slot of slotsResult.rows) {
-    const startTime = slot.start_time.substring(0, 5); // HH:MM
-    const endTime = slot.end_time.substring(0, 5); // HH:MM
-    const slots = generateTimeSlots(startTime, endTime);
-    allSlots.push(...slots);
-  }
-
-  // Eliminar duplicados y ordenar
-  allSlots = [...new Set(allSlots)].sort();
-
-  // Obtener citas reservadas para la fecha
-  const appointmentsResult = await pool.query(
-    `SELECT appointment_time
-     FROM appointments
-     WHERE user_account_id = $1 
-       AND appointment_date = $2 
-       AND status = 'scheduled'`,
-    [userAccountId, date]
-  );
-
-  const bookedTimes = new Set(
-    appointmentsResult.rows.map((row: any) => row.appointment_time.substring(0, 5))
-  );
-
-  // Verificar si la tabla unavailable_time_frames existe
-  const tableCheckResult = await pool.query(`
-    SELECT EXISTS (
-      SELECT FROM information_schema.tables 
-      WHERE table_schema = 'public' 
-      AND table_name = 'unavailable_time_frames'
-    )
-  `);
-  
-  const hasUnavailableTimeFramesTable = tableCheckResult.rows[0]?.exists || false;
-
-  // Obtener marcos de tiempo bloqueados (solo si la tabla existe)
-  let blockedFramesResult = { rows: [] };
-  if (hasUnavailableTimeFramesTable) {
-    try {
-      blockedFramesResult = await pool.query(
-        `SELECT start_time, end_time
-         FROM unavailable_time_frames
-         WHERE user_account_id = $1 AND workday_date = $2`,
-        [userAccountId, date]
-      );
-    } catch (error: any) {
-      // Si hay un error al consultar la tabla, registrar pero continuar sin bloquear slots
-      apiLogger.warn({ error, userAccountId, date }, 'Error querying unavailable_time_frames, skipping blocked slots');
-      blockedFramesResult = { rows: [] };
-    }
-  }
-
-  const blockedSlots = new Set<string>();
-  for (const frame of blockedFramesResult.rows) {
-    const startTime = (frame as any).start_time?.substring(0, 5) || '';
-    const endTime = (frame as any).end_time?.substring(0, 5) || '';
-    if (startTime && endTime) {
-      const blocked = generateTimeSlots(startTime, endTime);
-      blocked.forEach(slot => blockedSlots.add(slot));
-    }
-  }
-
-  // Filtrar slots disponibles
-  const availableSlots = allSlots.filter(
-    slot => !bookedTimes.has(slot) && !blockedSlots.has(slot)
-  );
-
-  return availableSlots;
-}
+import { calculateAvailableTimes } from '@/lib/availability';
+import { getUserAccountIdByUsername, getProviderById } from '@/lib/user-routes';
 
 export async function GET(
   request: NextRequest,
@@ -211,13 +54,10 @@ export async function GET(
       );
     }
 
-    // Verificar que el proveedor existe
-    const providerCheck = await pool.query(
-      'SELECT id FROM user_accounts WHERE id = $1',
-      [userAccountId]
-    );
+    // Verificar que el proveedor existe (directorio en memoria)
+    const provider = await getProviderById(userAccountId);
 
-    if (providerCheck.rows.length === 0) {
+    if (!provider) {
       const duration = Date.now() - startTime;
       logApiRequest('GET', `/api/available-times/${date}`, 404, duration);
       return NextResponse.json(
@@ -232,7 +72,8 @@ export async function GET(
       async () => {
         return await calculateAvailableTimes(userAccountId, date);
       },
-      300 // 5 minutos TTL
+      // Fresco 5 minutos; hasta 15 minutos se sirve viejo mientras un solo proceso recalcula
+      AVAILABLE_TIMES_CACHE_OPTIONS
     );
 
     const duration = Date.now() - startTime;
@@ -0,0 +1,150 @@
+import { NextRequest, NextResponse } from 'next/server';
+import {
+  getManyCache,
+  getCacheGeneration,
+  setComputedCache,
+  cacheNamespace,
+  cacheKeys,
+  AVAILABLE_TIMES_CACHE_OPTIONS,
+} from '@/lib/cache';
+import { rateLimitMiddleware, getRateLimitIdentifier, rateLimiters } from '@/lib/rate-limit';
+import { apiLogger, logApiRequest } from '@/lib/logger';
+import { calculateAvailableTimesForDates, listDatesInRange } from '@/lib/availability';
+import { getUserAccountIdByUsername, getProviderById } from '@/lib/user-routes';
+
+/**
+ * Horarios disponibles para un rango de fechas
+ *
+ * GET /api/available-times?provider=X&from=YYYY-MM-DD&to=YYYY-MM-DD
+ *
+ * Reutiliza las mismas claves de caché por fecha que /api/available-times/[date]:
+ * las fechas ya cacheadas no se recalculan y las calculadas se guardan por fecha,
+ * con el mismo formato y TTLs y la generación leída antes de calcular (si una
+ * reserva invalida el namespace mientras tanto, el resultado no se sirve).
+ */
+export async function GET(request: NextRequest) {
+  const startTime = Date.now();
+  const searchParams = request.nextUrl.searchParams;
+
+  // Aceptar user_account_id, username, provider o providerUsername (alias)
+  let userAccountId = parseInt(searchParams.get('user_account_id') || '0');
+  const username = searchParams.get('username') || searchParams.get('provider') || searchParams.get('providerUsername');
+  const from = searchParams.get('from') || '';
+  const to = searchParams.get('to') || from;
+
+  // Rate limiting: una sola request cubre todo el rango
+  const rateLimitResponse = await rateLimitMiddleware(
+    getRateLimitIdentifier(request),
+    rateLimiters.publicRead
+  );
+  if (rateLimitResponse) {
+    return rateLimitResponse;
+  }
+
+  let dates: string[];
+  try {
+    dates = listDatesInRange(from, to);
+  } catch (error: any) {
+    const duration = Date.now() - startTime;
+    logApiRequest('GET', '/api/available-times', 400, duration);
+    return NextResponse.json(
+      { error: error.message },
+      { status: 400 }
+    );
+  }
+
+  try {
+    // Si se proporciona username/provider, resolver a user_account_id
+    if ((!userAccountId || userAccountId <= 0) && username) {
+      const resolvedId = await getUserAccountIdByUsername(username);
+
+      if (!resolvedId) {
+        const duration = Date.now() - startTime;
+        logApiRequest('GET', '/api/available-times', 404, duration);
+        return NextResponse.json(
+          { error: 'Proveedor no encontrado' },
+          { status: 404 }
+        );
+      }
+
+      userAccountId = resolvedId;
+    }
+
+    if (!userAccountId || userAccountId <= 0) {
+      const duration = Date.now() - startTime;
+      logApiRequest('GET', '/api/available-times', 400, duration);
+      return NextResponse.json(
+        { error: 'user_account_id, username o provider requerido' },
+        { status: 400 }
+      );
+    }
+
+    // Verificar que el proveedor existe (directorio en memoria)
+    const provider = await getProviderById(userAccountId);
+
+    if (!provider) {
+      const duration = Date.now() - startTime;
+      logApiRequest('GET', '/api/available-times', 404, duration);
+      return NextResponse.json(
+        { error: 'Proveedor no encontrado' },
+        { status: 404 }
+      );
+    }
+
+    // Leer del caché todas las fechas del rango en una sola operación
+    const cached = await getManyCache<string[]>(
+      dates.map((date) => cacheKeys.availableTimes(userAccountId, date))
+    );
+
+    const availableTimes: Record<string, string[]> = {};
+    const missingDates: string[] = [];
+    dates.forEach((date, i) => {
+      const value = cached[i];
+      if (value !== null && value !== undefined) {
+        availableTimes[date] = value;
+      } else {
+        missingDates.push(date);
+      }
+    });
+
+    // Calcular solo las fechas faltantes y guardarlas con su clave por fecha
+    if (missingDates.length > 0) {
+      const generation = await getCacheGeneration(
+        cacheNamespace(cacheKeys.availableTimes(userAccountId, missingDates[0]))
+      );
+      const computed = await calculateAvailableTimesForDates(userAccountId, missingDates);
+      Object.assign(availableTimes, computed);
+
+      setImmediate(async () => {
+        await Promise.all(
+          Object.entries(computed).map(([date, times]) =>
+            setComputedCache(
+              cacheKeys.availableTimes(userAccountId, date),
+              times,
+              AVAILABLE_TIMES_CACHE_OPTIONS,
+              generation
+            )
+          )
+        );
+      });
+    }
+
+    const duration = Date.now() - startTime;
+    logApiRequest('GET', '/api/available-times', 200, duration);
+
+    return NextResponse.json({
+      from: dates[0],
+      to: dates[dates.length - 1],
+      available_times: Object.fromEntries(dates.map((date) => [date, availableTimes[date] || []])),
+    });
+  } catch (error: any) {
+    const duration = Date.now() - startTime;
+    apiLogger.error({ error, from, to, userAccountId, duration }, 'Error in available-times range endpoint');
+    logApiRequest('GET', '/api/available-times', 500, duration);
+
+    return NextResponse.json(
+      { error: 'Error al obtener horarios disponibles' },
+      { status: 500 }
+    );
+  }
+}
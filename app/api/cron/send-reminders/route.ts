@@ -1,35 +1,29 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
+import { pool, readQuery } from '@/lib/db';
 import { sendAppointmentReminder, isWhatsAppConfigured } from '@/lib/whatsapp';
 import { apiLogger, logApiRequest } from '@/lib/logger';
+import { dispatchWithConcurrency } from '@/lib/dispatch';
+import { isCronRequestAuthorized } from '@/lib/auth';
 
 const ARGENTINA_TZ = 'America/Argentina/Buenos_Aires';
 const REMINDER_HOURS_MIN = 29;
 const REMINDER_HOURS_MAX = 31;
 
+// Envíos en paralelo y separación mínima entre mensajes al mismo teléfono
+const REMINDER_CONCURRENCY = parseInt(process.env.REMINDER_CONCURRENCY || '5');
+const REMINDER_PER_PHONE_INTERVAL_MS = parseInt(process.env.REMINDER_PER_PHONE_INTERVAL_MS || '1000');
+// No iniciar envíos nuevos pasado este tiempo (los pendientes quedan para la próxima corrida)
+const REMINDER_TIME_BUDGET_MS = parseInt(process.env.REMINDER_TIME_BUDGET_MS || '45000');
+
 function getAppUrl(): string {
   const url = process.env.NEXT_PUBLIC_APP_URL;
   if (!url) return 'http://localhost:3000';
   return url.endsWith('/') ? url.slice(0, -1) : url;
 }
 
-function isAuthorized(request: NextRequest): boolean {
-  const secret = process.env.CRON_SECRET;
-  if (!secret) {
-    apiLogger.warn('CRON_SECRET not set, cron send-reminders is disabled');
-    return false;
-  }
-  const authHeader = request.headers.get('authorization');
-  if (authHeader?.startsWith('Bearer ')) {
-    return authHeader.slice(7) === secret;
-  }
-  const cronSecret = request.headers.get('x-cron-secret');
-  return cronSecret === secret;
-}
-
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
-  if (!isAuthorized(request)) {
+  if (!isCronRequestAuthorized(request.headers, 'send-reminders')) {
     logApiRequest('GET', '/api/cron/send-reminders', 401, Date.now() - startTime);
     return NextResponse.json({ error: 'No autorizado' }, { status: 401 });
   }
@@ -44,7 +38,8 @@ export async function GET(request: NextRequest) {
   }
 
   try {
-    const result = await pool.query(
+    // La búsqueda va a la réplica (si hay); la marca de enviados, al primario
+    const result = await readQuery(
       `SELECT 
         a.id,
         a.appointment_date,
@@ -83,45 +78,72 @@ export async function GET(request: NextRequest) {
     }>;
 
     const baseUrl = getAppUrl();
-    let sent = 0;
-    const errors: Array<{ appointmentId: number; error: string }> = [];
 
-    for (const row of rows) {
-      const detailsUrl = `${baseUrl}/${row.provider_username}/cita/${row.id}${row.cancellation_token ? `?token=${row.cancellation_token}` : ''}`;
-      const providerName = [row.provider_first_name, row.provider_last_name].filter(Boolean).join(' ').trim() || row.provider_username;
-      const dateStr = row.appointment_date instanceof Date
-        ? row.appointment_date.toISOString().split('T')[0]
-        : String(row.appointment_date).split('T')[0];
-      const timeStr = typeof row.appointment_time === 'string'
-        ? row.appointment_time.substring(0, 5)
-        : String(row.appointment_time).substring(0, 5);
+    const summary = await dispatchWithConcurrency(
+      rows,
+      (row) => {
+        const detailsUrl = `${baseUrl}/${row.provider_username}/cita/${row.id}${row.cancellation_token ? `?token=${row.cancellation_token}` : ''}`;
+        const providerName = [row.provider_first_name, row.provider_last_name].filter(Boolean).join(' ').trim() || row.provider_username;
+        const dateStr = row.appointment_date instanceof Date
+          ? row.appointment_date.toISOString().split('T')[0]
+          : String(row.appointment_date).split('T')[0];
+        const timeStr = typeof row.appointment_time === 'string'
+          ? row.appointment_time.substring(0, 5)
+          : String(row.appointment_time).substring(0, 5);
 
-      const reminderResult = await sendAppointmentReminder(row.phone_number, {
-        patientName: `${row.first_name} ${row.last_name}`,
-        providerName,
-        date: dateStr,
-        time: timeStr,
-        detailsUrl,
-      });
+        return sendAppointmentReminder(row.phone_number, {
+          patientName: `${row.first_name} ${row.last_name}`,
+          providerName,
+          date: dateStr,
+          time: timeStr,
+          detailsUrl,
+        });
+      },
+      {
+        concurrency: REMINDER_CONCURRENCY,
+        destinationOf: (row) => row.phone_number,
+        minIntervalPerDestinationMs: REMINDER_PER_PHONE_INTERVAL_MS,
+        deadline: startTime + REMINDER_TIME_BUDGET_MS,
+      }
+    );
 
-      if (reminderResult.success) {
-        await pool.query(
-          'UPDATE appointments SET reminder_sent_at = CURRENT_TIMESTAMP WHERE id = $1',
-          [row.id]
-        );
-        sent++;
+    const sentIds: number[] = [];
+    const errors: Array<{ appointmentId: number; error: string }> = [];
+    for (const outcome of summary.outcomes) {
+      if (outcome.result?.success) {
+        sentIds.push(outcome.item.id);
       } else {
-        errors.push({ appointmentId: row.id, error: reminderResult.error || 'Unknown error' });
-        apiLogger.warn({ appointmentId: row.id, error: reminderResult.error }, 'Failed to send reminder WhatsApp');
+        const error = outcome.result?.error
+          || (outcome.error instanceof Error ? outcome.error.message : outcome.error ? String(outcome.error) : 'Unknown error');
+        errors.push({ appointmentId: outcome.item.id, error });
+        apiLogger.warn({ appointmentId: outcome.item.id, error }, 'Failed to send reminder WhatsApp');
       }
     }
 
+    // Marcar todos los enviados en una sola sentencia
+    if (sentIds.length > 0) {
+      await pool.query(
+        'UPDATE appointments SET reminder_sent_at = CURRENT_TIMESTAMP WHERE id = ANY($1::int[])',
+        [sentIds]
+      );
+    }
+
+    const stats = {
+      duration_ms: summary.durationMs,
+      throughput_per_second: summary.throughputPerSecond,
+      latency_ms: summary.latencyMs,
+      concurrency: REMINDER_CONCURRENCY,
+      deferred: summary.skipped.length,
+    };
+    apiLogger.info({ sent: sentIds.length, failed: errors.length, total: rows.length, ...stats }, 'Reminder dispatch finished');
+
     const duration = Date.now() - startTime;
     logApiRequest('GET', '/api/cron/send-reminders', 200, duration);
     return NextResponse.json({
       ok: true,
-      sent,
+      sent: sentIds.length,
       total: rows.length,
+      stats,
       errors: errors.length > 0 ? errors : undefined,
     });
   } catch (error: unknown) {
@@ -0,0 +1,38 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { drainWhatsAppOutbox } from '@/lib/whatsapp-outbox';
+import { isCronRequestAuthorized } from '@/lib/auth';
+import { apiLogger, logApiRequest } from '@/lib/logger';
+
+/**
+ * GET/POST /api/cron/whatsapp-outbox
+ * 
+ * Envía los mensajes pendientes del outbox de WhatsApp, incluidos los
+ * reintentos programados. Pensado para un cron externo cada minuto.
+ */
+export async function GET(request: NextRequest) {
+  const startTime = Date.now();
+  if (!isCronRequestAuthorized(request.headers, 'whatsapp-outbox')) {
+    logApiRequest('GET', '/api/cron/whatsapp-outbox', 401, Date.now() - startTime);
+    return NextResponse.json({ error: 'No autorizado' }, { status: 401 });
+  }
+
+  try {
+    const { sent, failed, deferred } = await drainWhatsAppOutbox();
+
+    const duration = Date.now() - startTime;
+    logApiRequest('GET', '/api/cron/whatsapp-outbox', 200, duration);
+    return NextResponse.json({ ok: true, sent, failed, deferred, duration_ms: duration });
+  } catch (error: unknown) {
+    const duration = Date.now() - startTime;
+    apiLogger.error({ error }, 'Cron whatsapp-outbox failed');
+    logApiRequest('GET', '/api/cron/whatsapp-outbox', 500, duration);
+    return NextResponse.json(
+      { error: error instanceof Error ? error.message : 'Error al enviar mensajes pendientes' },
+      { status: 500 }
+    );
+  }
+}
+
+export async function POST(request: NextRequest) {
+  return GET(request);
+}
@@ -1,9 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { getOrSetCache, cacheKeys } from '@/lib/cache';
 import { rateLimitMiddleware, getRateLimitIdentifier } from '@/lib/rate-limit';
 import { apiLogger, logApiRequest } from '@/lib/logger';
-import { pool } from '@/lib/db';
-import { HealthInsurance } from '@/lib/types';
+import { getReferenceData } from '@/lib/reference-data';
 
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
@@ -16,22 +14,9 @@ export async function GET(request: NextRequest) {
   }
 
   try {
-    const normalizedData = await getOrSetCache<HealthInsurance[]>(
-      cacheKeys.healthInsurance(),
-      async () => {
-        const result = await pool.query(
-          'SELECT id, name, price, notes FROM health_insurance ORDER BY id'
-        );
-        return result.rows.map((row, index) => ({
-          id: row.id ?? index + 1,
-          name: row.name,
-          price: row.price ?? null,
-          price_numeric: null,
-          notes: row.notes ?? null,
-        }));
-      },
-      3600
-    );
+    // Servido desde los datos de referencia en memoria
+    const { healthInsurance } = await getReferenceData();
+    const normalizedData = healthInsurance.list;
 
     const duration = Date.now() - startTime;
     logApiRequest('GET', '/api/health-insurance', 200, duration);
@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
+import { getEmailQueueStats, EmailQueueStats } from '@/lib/email';
+import { getHealthProbes, HealthProbes } from '@/lib/health';
 
 type HealthChecks = {
   server: boolean;
@@ -20,52 +21,63 @@ type HealthChecks = {
  * - Conexión a base de datos
  * - Variables de entorno críticas
  * - Redis (solo si UPSTASH_REDIS_REST_URL está definido)
+ *
+ * Incluye además el estado de la cola de emails (profundidad y latencia).
+ *
+ * Con ?deep=1 agrega latencias, saturación del pool y lag del event loop
+ * (ver lib/health.ts). 'degraded' responde 200, salvo que la causa sea propia
+ * de la instancia (lag del event loop, requests esperando en su pool): ahí
+ * responde 503 para que el load balancer la saque. Una base o un Redis lentos
+ * afectan a todas las instancias y no deben sacarlas a todas juntas.
+ * Las sondas se reutilizan durante unos segundos en ambos modos.
  */
 export async function GET(request: NextRequest) {
+  const deep = ['1', 'true'].includes(request.nextUrl.searchParams.get('deep') ?? '');
+  const probes = await getHealthProbes();
+
   const health: {
-    status: 'healthy' | 'unhealthy';
+    status: 'healthy' | 'degraded' | 'unhealthy';
     timestamp: string;
     checks: HealthChecks;
+    queues: { email: EmailQueueStats };
+    deep?: Omit<HealthProbes, 'status' | 'reasons' | 'localDegraded'>;
     errors?: string[];
   } = {
     status: 'healthy',
     timestamp: new Date().toISOString(),
     checks: {
       server: true,
-      database: false,
+      database: probes.database.ok,
       env: {
         jwt_secret: !!process.env.JWT_SECRET && process.env.JWT_SECRET.length >= 32,
         postgresql_host: !!process.env.POSTGRESQL_HOST,
         postgresql_database: !!process.env.POSTGRESQL_DATABASE,
       },
+      ...(probes.redis && { redis: probes.redis.ok }),
+    },
+    queues: {
+      email: getEmailQueueStats(),
     },
     errors: [],
   };
 
-  // Verificar conexión a base de datos
-  try {
-    await pool.query('SELECT 1');
-    health.checks.database = true;
-  } catch (error: unknown) {
+  // Base de datos y Redis (sondas cacheadas)
+  if (probes.status === 'unhealthy') {
     health.status = 'unhealthy';
-    health.errors?.push(`Database connection failed: ${error instanceof Error ? error.message : String(error)}`);
   }
-
-  // Verificar Redis (opcional; solo si está configurado)
-  if (process.env.UPSTASH_REDIS_REST_URL && process.env.UPSTASH_REDIS_REST_TOKEN) {
-    try {
-      const { Redis } = await import('@upstash/redis');
-      const redis = Redis.fromEnv();
-      const pong = await redis.ping();
-      health.checks.redis = pong === 'PONG';
-      if (!health.checks.redis) {
-        health.status = 'unhealthy';
-        health.errors?.push('Redis ping did not return PONG');
-      }
-    } catch (error: unknown) {
-      health.checks.redis = false;
-      health.status = 'unhealthy';
-      health.errors?.push(`Redis connection failed: ${error instanceof Error ? error.message : String(error)}`);
+  if (deep) {
+    const { status, reasons, localDegraded, ...details } = probes;
+    health.deep = details;
+    health.errors?.push(...reasons);
+    if (status === 'degraded' && health.status === 'healthy') {
+      health.status = 'degraded';
+    }
+  } else {
+    if (!probes.database.ok) {
+      health.errors?.push(`Database connection failed: ${probes.database.error}`);
+    }
+    if (probes.redis && !probes.redis.ok) {
+      health.errors?.push(`Redis connection failed: ${probes.redis.error}`);
     }
   }
 
@@ -85,7 +97,8 @@ export async function GET(request: NextRequest) {
     health.errors?.push('POSTGRESQL_DATABASE is missing');
   }
 
+  const outOfRotation = health.status === 'unhealthy' || (deep && probes.localDegraded);
   return NextResponse.json(health, {
-    status: health.status === 'healthy' ? 200 : 503,
+    status: outOfRotation ? 503 : 200,
   });
 }
@@ -0,0 +1,77 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { isMetricsRequestAuthorized } from '@/lib/auth';
+import { getEmailQueueStats } from '@/lib/email';
+import { logApiRequest } from '@/lib/logger';
+import { registerCollectedCounter, registerGauge, renderPrometheusMetrics } from '@/lib/metrics';
+import { getPasswordHasherStats } from '@/lib/password-hasher';
+import { getRateLimitStats } from '@/lib/rate-limit';
+import { getWhatsAppClientStats } from '@/lib/whatsapp';
+
+// Estado de colas y clientes que ya llevan sus propios contadores: lo que
+// sube y baja se exporta como gauge y lo que solo crece como contador
+registerGauge('email_queue_jobs', 'Emails en la cola en memoria', () => {
+  const stats = getEmailQueueStats();
+  return [
+    { labels: { state: 'queued' }, value: stats.depth },
+    { labels: { state: 'retrying' }, value: stats.retrying },
+    { labels: { state: 'in_flight' }, value: stats.inFlight },
+  ];
+});
+
+registerGauge('password_hasher_jobs', 'Trabajos en curso y en espera del pool de bcrypt', () => {
+  const stats = getPasswordHasherStats();
+  return [
+    { labels: { state: 'busy' }, value: stats.busy },
+    { labels: { state: 'queued' }, value: stats.queued },
+  ];
+});
+
+registerCollectedCounter('password_hasher_rejected_total', 'Hashes rechazados por la cola llena del pool de bcrypt', () => [
+  { value: getPasswordHasherStats().rejected },
+]);
+
+registerCollectedCounter('rate_limit_local_decisions_total', 'Decisiones del L1 del rate limiting y llamadas a Redis', () => {
+  const stats = getRateLimitStats();
+  return [
+    { labels: { decision: 'local_allowed' }, value: stats.localAllowed },
+    { labels: { decision: 'local_denied' }, value: stats.localDenied },
+    { labels: { decision: 'redis_call' }, value: stats.redisCalls },
+  ];
+});
+
+registerCollectedCounter('whatsapp_client_requests_total', 'Requests a UltraMsg por resultado', () => {
+  const stats = getWhatsAppClientStats();
+  if (!stats) return [];
+  return [
+    { labels: { result: 'sent' }, value: stats.sent },
+    { labels: { result: 'rejected' }, value: stats.rejected },
+    { labels: { result: 'error' }, value: stats.errors },
+    { labels: { result: 'timeout' }, value: stats.timeouts },
+    { labels: { result: 'short_circuited' }, value: stats.shortCircuited },
+  ];
+});
+
+/**
+ * GET /api/metrics
+ * 
+ * Métricas de la instancia en formato de texto de Prometheus: latencia por
+ * ruta y por query, conexiones del pool, hit ratio del caché, rechazos del
+ * rate limiting y estado de las colas.
+ * 
+ * Requiere 'Authorization: Bearer <METRICS_TOKEN>'.
+ */
+export async function GET(request: NextRequest) {
+  const startTime = Date.now();
+  if (!isMetricsRequestAuthorized(request.headers)) {
+    logApiRequest('GET', '/api/metrics', 401, Date.now() - startTime);
+    return NextResponse.json({ error: 'No autorizado' }, { status: 401 });
+  }
+
+  return new NextResponse(renderPrometheusMetrics(), {
+    status: 200,
+    headers: {
+      'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+      'Cache-Control': 'no-store',
+    },
+  });
+}
@@ -1,14 +1,59 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { readQuery, defineStatement, getSchemaCapabilities } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
+import { getOrSetCache } from '@/lib/cache';
+
+const MAX_LIMIT = 100;
+const TOTAL_CACHE_TTL_SECONDS = 60;
+
+/**
+ * Cursor de paginación: posición (fecha, hora, id) de la última cita devuelta,
+ * codificada en base64url para que el cliente la trate como opaca.
+ */
+interface AppointmentsCursor {
+  date: string;
+  time: string;
+  id: number;
+}
+
+function encodeCursor(cursor: AppointmentsCursor): string {
+  return Buffer.from(JSON.stringify([cursor.date, cursor.time, cursor.id])).toString('base64url');
+}
+
+function decodeCursor(value: string): AppointmentsCursor | null {
+  try {
+    const [date, time, id] = JSON.parse(Buffer.from(value, 'base64url').toString('utf8'));
+    if (
+      typeof date !== 'string' || !/^\d{4}-\d{2}-\d{2}$/.test(date) ||
+      typeof time !== 'string' || !/^\d{2}:\d{2}(:\d{2})?$/.test(time) ||
+      !Number.isInteger(id)
+    ) {
+      return null;
+    }
+    return { date, time, id };
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * GET /api/proveedor/appointments
+ * 
+ * Paginación por cursor (keyset) sobre (appointment_date, appointment_time, id):
+ * pasar el next_cursor de la respuesta como ?cursor= para la página siguiente.
+ * Cada página cuesta lo mismo sin importar su profundidad. ?page= (OFFSET) se
+ * mantiene por compatibilidad.
+ * 
+ * El total se cachea por filtro durante TOTAL_CACHE_TTL_SECONDS (se invalida al
+ * crear o cancelar citas); include_total=false lo omite.
+ */
 
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
   
   // Verificar autenticación
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -29,21 +74,29 @@ export async function GET(request: NextRequest) {
     endDate = dateParam;
   }
   const formatArray = searchParams.get('format') === 'array';
-  const page = parseInt(searchParams.get('page') || '1');
-  const limit = parseInt(searchParams.get('limit') || '20');
+  const cursorParam = searchParams.get('cursor');
+  const includeTotal = searchParams.get('include_total') !== 'false';
+  const page = Math.max(parseInt(searchParams.get('page') || '1') || 1, 1);
+  const limit = Math.min(Math.max(parseInt(searchParams.get('limit') || '20') || 20, 1), MAX_LIMIT);
   const offset = (page - 1) * limit;
 
+  const cursor = cursorParam ? decodeCursor(cursorParam) : null;
+  if (cursorParam && !cursor) {
+    const duration = Date.now() - startTime;
+    logApiRequest('GET', '/api/proveedor/appointments', 400, duration);
+    return NextResponse.json(
+      { error: 'Cursor inválido' },
+      { status: 400 }
+    );
+  }
+  // Sin cursor ni page explícito, la primera página también se pide por keyset
+  const useKeyset = cursor !== null || !searchParams.get('page');
+
   try {
     // Verificar qué columnas existen en appointments
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'appointments' AND table_schema = 'public'
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasWhatsAppSent = existingColumns.includes('whatsapp_sent');
-    const hasWhatsAppSentAt = existingColumns.includes('whatsapp_sent_at');
+    const schema = await getSchemaCapabilities();
+    const hasWhatsAppSent = schema.hasColumn('appointments', 'whatsapp_sent');
+    const hasWhatsAppSentAt = schema.hasColumn('appointments', 'whatsapp_sent_at');
     
     // Construir SELECT dinámicamente
     const selectFields = [
@@ -55,6 +108,7 @@ export async function GET(request: NextRequest) {
       ...(hasWhatsAppSent ? ['a.whatsapp_sent'] : []),
       ...(hasWhatsAppSentAt ? ['a.whatsapp_sent_at'] : []),
       'a.created_at',
+      "to_char(a.appointment_date, 'YYYY-MM-DD') as cursor_date",
       'c.first_name',
       'c.last_name',
       'c.phone_number',
@@ -63,49 +117,88 @@ export async function GET(request: NextRequest) {
       'pt.name as practice_type_name'
     ];
     
-    let query = `
-      SELECT ${selectFields.join(', ')}
-      FROM appointments a
-      JOIN clients c ON a.client_id = c.id
-      JOIN visit_types vt ON a.visit_type_id = vt.id
-      LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
-      LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
-      WHERE a.user_account_id = $1
-    `;
-
-    const queryParams: any[] = [user.id];
+    // Filtros comunes a la lista y al conteo
+    let where = 'a.user_account_id = $1';
+    const filterParams: any[] = [user.id];
     let paramIndex = 2;
 
     if (status) {
-      query += ` AND a.status = $${paramIndex}`;
-      queryParams.push(status);
+      where += ` AND a.status = $${paramIndex}`;
+      filterParams.push(status);
       paramIndex++;
     }
 
     if (startDate) {
-      query += ` AND a.appointment_date >= $${paramIndex}`;
-      queryParams.push(startDate);
+      where += ` AND a.appointment_date >= $${paramIndex}`;
+      filterParams.push(startDate);
       paramIndex++;
     }
 
     if (endDate) {
-      query += ` AND a.appointment_date <= $${paramIndex}`;
-      queryParams.push(endDate);
+      where += ` AND a.appointment_date <= $${paramIndex}`;
+      filterParams.push(endDate);
       paramIndex++;
     }
 
-    // Contar total
-    const countQuery = query.replace(/SELECT[\s\S]*?FROM/, 'SELECT COUNT(*) as total FROM');
-    const countResult = await pool.query(countQuery, queryParams);
-    const total = parseInt(countResult.rows[0].total);
+    // Contar total (cacheado por filtro; el namespace appointments:<id> se invalida con cada cita)
+    const totalPromise = includeTotal
+      ? getOrSetCache<number>(
+          `appointments:${user.id}:count:${status || 'all'}:${startDate || ''}:${endDate || ''}`,
+          async () => {
+            const countResult = await readQuery(
+              defineStatement('provider_appointments_count', `SELECT COUNT(*) as total FROM appointments a WHERE ${where}`),
+              filterParams,
+              { userAccountId: user.id }
+            );
+            return parseInt(countResult.rows[0].total);
+          },
+          TOTAL_CACHE_TTL_SECONDS
+        )
+      : Promise.resolve(null);
+
+    let listSql = `
+      SELECT ${selectFields.join(', ')}
+      FROM appointments a
+      JOIN clients c ON a.client_id = c.id
+      JOIN visit_types vt ON a.visit_type_id = vt.id
+      LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
+      LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
+      WHERE ${where}
+    `;
+    const queryParams: any[] = [...filterParams];
+
+    // Obtener resultados paginados (una fila extra para saber si hay más)
+    if (useKeyset) {
+      if (cursor) {
+        listSql += ` AND (a.appointment_date, a.appointment_time, a.id) < ($${paramIndex}::date, $${paramIndex + 1}::time, $${paramIndex + 2})`;
+        queryParams.push(cursor.date, cursor.time, cursor.id);
+        paramIndex += 3;
+      }
+      listSql += ` ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC LIMIT $${paramIndex}`;
+      queryParams.push(limit + 1);
+    } else {
+      listSql += ` ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC LIMIT $${paramIndex} OFFSET $${paramIndex + 1}`;
+      queryParams.push(limit + 1, offset);
+    }
 
-    // Obtener resultados paginados
-    query += ` ORDER BY a.appointment_date DESC, a.appointment_time DESC LIMIT $${paramIndex} OFFSET $${paramIndex + 1}`;
-    queryParams.push(limit, offset);
+    // Cada combinación de filtros y columnas opcionales es un prepared statement propio
+    const [result, total] = await Promise.all([
+      readQuery(defineStatement('provider_appointments_page', listSql), queryParams, { userAccountId: user.id }),
+      totalPromise,
+    ]);
 
-    const result = await pool.query(query, queryParams);
+    const hasMore = result.rows.length > limit;
+    const rows = hasMore ? result.rows.slice(0, limit) : result.rows;
+    const lastRow = rows[rows.length - 1];
+    const nextCursor = hasMore && lastRow
+      ? encodeCursor({
+          date: lastRow.cursor_date,
+          time: lastRow.appointment_time,
+          id: lastRow.id,
+        })
+      : null;
 
-    const appointments = result.rows.map((row: any) => ({
+    const appointments = rows.map((row: any) => ({
       id: row.id,
       patient_name: `${row.first_name} ${row.last_name}`,
       patient_phone: row.phone_number,
@@ -131,9 +224,11 @@ export async function GET(request: NextRequest) {
     return NextResponse.json({
       appointments,
       total,
-      page,
+      page: cursor ? null : page,
       limit,
-      total_pages: Math.ceil(total / limit),
+      total_pages: total !== null ? Math.ceil(total / limit) : null,
+      has_more: hasMore,
+      next_cursor: nextCursor,
     });
   } catch (error: any) {
     const duration = Date.now() - startTime;
@@ -1,14 +1,149 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { query, defineStatement, getSchemaCapabilities } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
-import { getDayNameEnglish } from '@/lib/utils';
+import { getOrSetCache, cacheKeys } from '@/lib/cache';
+import { computeRangeAvailabilitySql, freeSlotsFromAvailability } from '@/lib/availability';
+import { CalendarDay, CalendarResponse } from '@/lib/types';
+
+interface CalendarAppointment {
+  id: number;
+  time: string;
+  patient_name: string;
+  visit_type: string;
+  consult_type: string | null;
+  practice_type: string | null;
+  whatsapp_sent: boolean;
+  status: string;
+}
+
+type MonthCalendarDay = Omit<CalendarDay, 'appointments'> & { appointments: CalendarAppointment[] };
+type MonthCalendar = Omit<CalendarResponse, 'days'> & { days: MonthCalendarDay[] };
+
+// Función helper para formatear fecha como YYYY-MM-DD sin problemas de zona horaria
+function formatDateAsISO(y: number, m: number, d: number): string {
+  const monthStr = m.toString().padStart(2, '0');
+  const dayStr = d.toString().padStart(2, '0');
+  return `${y}-${monthStr}-${dayStr}`;
+}
+
+/**
+ * Calcula el calendario de un mes
+ * 
+ * Los slots salen de available_slots y unavailable_time_frames (una sola
+ * sentencia agregada para todo el mes, ver computeRangeAvailabilitySql);
+ * las citas del mes se leen con una segunda consulta.
+ * 
+ * Lee del primario: el resultado va al caché compartido y las reservas de
+ * pacientes llegan por otras instancias, así que el read-your-writes de
+ * readQuery no las cubre y una réplica atrasada dejaría cacheado un mes viejo.
+ */
+async function buildMonthCalendar(userAccountId: number, year: number, month: number): Promise<MonthCalendar> {
+  const daysInMonth = new Date(year, month, 0).getDate();
+  const dates = Array.from({ length: daysInMonth }, (_, i) => formatDateAsISO(year, month, i + 1));
+
+  // Verificar qué columnas existen en appointments
+  const schema = await getSchemaCapabilities();
+  const hasWhatsAppSent = schema.hasColumn('appointments', 'whatsapp_sent');
+  
+  // Construir SELECT dinámicamente
+  const selectFields = [
+    'a.id',
+    "to_char(a.appointment_date, 'YYYY-MM-DD') as date",
+    'a.appointment_time',
+    'a.status',
+    ...(hasWhatsAppSent ? ['a.whatsapp_sent'] : []),
+    'c.first_name',
+    'c.last_name',
+    'vt.name as visit_type_name',
+    'ct.name as consult_type_name',
+    'pt.name as practice_type_name'
+  ];
+  
+  const [availabilityByDate, appointmentsResult] = await Promise.all([
+    computeRangeAvailabilitySql(userAccountId, dates, 'primary'),
+    // Obtener todas las citas del mes
+    query(
+      defineStatement(
+        'calendar_month_appointments',
+        `SELECT ${selectFields.join(', ')}
+          FROM appointments a
+          JOIN clients c ON a.client_id = c.id
+          JOIN visit_types vt ON a.visit_type_id = vt.id
+          LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
+          LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
+          WHERE a.user_account_id = $1 
+            AND a.appointment_date >= $2 
+            AND a.appointment_date <= $3
+          ORDER BY a.appointment_date, a.appointment_time`
+      ),
+      [userAccountId, dates[0], dates[dates.length - 1]]
+    ),
+  ]);
+
+  // Agrupar citas por fecha y contar estados en una sola pasada
+  const appointmentsByDate: { [key: string]: CalendarAppointment[] } = {};
+  const statusCounts: { [key: string]: { scheduled: number; cancelled: number; completed: number } } = {};
+  appointmentsResult.rows.forEach((row: any) => {
+    if (!appointmentsByDate[row.date]) {
+      appointmentsByDate[row.date] = [];
+      statusCounts[row.date] = { scheduled: 0, cancelled: 0, completed: 0 };
+    }
+    appointmentsByDate[row.date].push({
+      id: row.id,
+      time: row.appointment_time.substring(0, 5),
+      patient_name: `${row.first_name} ${row.last_name}`,
+      visit_type: row.visit_type_name,
+      consult_type: row.consult_type_name,
+      practice_type: row.practice_type_name,
+      whatsapp_sent: hasWhatsAppSent ? row.whatsapp_sent : false,
+      status: row.status,
+    });
+    if (row.status in statusCounts[row.date]) {
+      statusCounts[row.date][row.status as 'scheduled' | 'cancelled' | 'completed']++;
+    }
+  });
+
+  const days: MonthCalendarDay[] = dates.map((dateString) => {
+    const dayAppointments = appointmentsByDate[dateString] || [];
+    const { scheduled, cancelled, completed } = statusCounts[dateString] || { scheduled: 0, cancelled: 0, completed: 0 };
+
+    // Slots reales del día (horario de trabajo menos días y franjas no disponibles)
+    const availability = availabilityByDate.get(dateString);
+    const totalSlots = availability ? new Set(availability.openMinutes).size : 0;
+    const availableSlots = availability ? freeSlotsFromAvailability(availability).length : 0;
+
+    return {
+      date: dateString,
+      total_appointments: dayAppointments.length,
+      scheduled,
+      cancelled,
+      completed,
+      is_full: totalSlots > 0 && availableSlots === 0,
+      is_working_day: totalSlots > 0,
+      appointments: dayAppointments,
+      available_slots: availableSlots,
+      total_slots: totalSlots,
+    };
+  });
+
+  return {
+    year,
+    month,
+    days,
+    summary: {
+      total_days: daysInMonth,
+      working_days: days.filter((d) => d.is_working_day).length,
+      full_days: days.filter((d) => d.is_full).length,
+      total_appointments: appointmentsResult.rows.length,
+    },
+  };
+}
 
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -33,193 +168,18 @@ export async function GET(request: NextRequest) {
   }
 
   try {
-    const startDate = new Date(year, month - 1, 1);
-    const endDate = new Date(year, month, 0);
-    const startDateString = startDate.toISOString().split('T')[0];
-    const endDateString = endDate.toISOString().split('T')[0];
-
-    // Verificar qué columnas existen en appointments
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'appointments' AND table_schema = 'public'
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasWhatsAppSent = existingColumns.includes('whatsapp_sent');
-    
-    // Construir SELECT dinámicamente
-    const selectFields = [
-      'a.id',
-      'a.appointment_date',
-      'a.appointment_time',
-      'a.status',
-      ...(hasWhatsAppSent ? ['a.whatsapp_sent'] : []),
-      'c.first_name',
-      'c.last_name',
-      'vt.name as visit_type_name',
-      'ct.name as consult_type_name',
-      'pt.name as practice_type_name'
-    ];
-    
-    // Obtener todas las citas del mes
-    const appointmentsResult = await pool.query(
-      `SELECT ${selectFields.join(', ')}
-      FROM appointments a
-      JOIN clients c ON a.client_id = c.id
-      JOIN visit_types vt ON a.visit_type_id = vt.id
-      LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
-      LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
-      WHERE a.user_account_id = $1 
-        AND a.appointment_date >= $2 
-        AND a.appointment_date <= $3
-      ORDER BY a.appointment_date, a.appointment_time`,
-      [user.id, startDateString, endDateString]
-    );
-
-    // Obtener días no laborables del mes
-    const unavailableDaysResult = await pool.query(
-      `SELECT unavailable_date
-       FROM unavailable_days
-       WHERE user_account_id = $1 
-         AND unavailable_date >= $2 
-         AND unavailable_date <= $3`,
-      [user.id, startDateString, endDateString]
-    );
-
-    const unavailableDates = new Set(
-      unavailableDaysResult.rows.map((row: any) => row.unavailable_date.toISOString().split('T')[0])
+    const calendar = await getOrSetCache<MonthCalendar>(
+      cacheKeys.calendar(user.id, year, month),
+      () => buildMonthCalendar(user.id, year, month),
+      // Se invalida al crear/cancelar citas y al cambiar horarios; el TTL cubre
+      // cambios de estado de WhatsApp que no pasan por esas rutas
+      { softTtlSeconds: 60, hardTtlSeconds: 300 }
     );
 
-    // Obtener horarios de trabajo
-    const workScheduleResult = await pool.query(
-      `SELECT day_of_week, is_working_day
-       FROM work_schedule
-       WHERE user_account_id = $1`,
-      [user.id]
-    );
-
-    // Mapeo de días de la semana (asegurar consistencia)
-    const dayMap: { [key: string]: number } = {
-      'Sunday': 0,
-      'Monday': 1,
-      'Tuesday': 2,
-      'Wednesday': 3,
-      'Thursday': 4,
-      'Friday': 5,
-      'Saturday': 6,
-    };
-
-    const workingDaysArray = workScheduleResult.rows
-      .filter((row: any) => row.is_working_day)
-      .map((row: any) => {
-        const dayNumber = dayMap[row.day_of_week];
-        if (dayNumber === undefined) {
-          apiLogger.warn({ day_of_week: row.day_of_week }, 'Invalid day_of_week in work_schedule');
-          return null;
-        }
-        return dayNumber;
-      })
-      .filter((day: number | null) => day !== null) as number[];
-
-    const workingDays = new Set(workingDaysArray);
-
-    // Log para debugging (solo en desarrollo)
-    if (process.env.NODE_ENV === 'development') {
-      apiLogger.debug({ 
-        userId: user.id, 
-        workingDays: Array.from(workingDays),
-        workScheduleRows: workScheduleResult.rows.map((r: any) => ({ 
-          day: r.day_of_week, 
-          is_working: r.is_working_day 
-        }))
-      }, 'Working days configuration');
-    }
-
-    // Agrupar citas por fecha
-    const appointmentsByDate: { [key: string]: any[] } = {};
-    appointmentsResult.rows.forEach((row: any) => {
-      const date = row.appointment_date.toISOString().split('T')[0];
-      if (!appointmentsByDate[date]) {
-        appointmentsByDate[date] = [];
-      }
-      appointmentsByDate[date].push({
-        id: row.id,
-        time: row.appointment_time.substring(0, 5),
-        patient_name: `${row.first_name} ${row.last_name}`,
-        visit_type: row.visit_type_name,
-        consult_type: row.consult_type_name,
-        practice_type: row.practice_type_name,
-        whatsapp_sent: hasWhatsAppSent ? row.whatsapp_sent : false,
-        status: row.status,
-      });
-    });
-
-    // Generar días del mes
-    const days: any[] = [];
-    const daysInMonth = endDate.getDate();
-
-    // Función helper para calcular el día de la semana sin problemas de zona horaria
-    // Usa el algoritmo de Zeller o cálculo directo
-    function getDayOfWeek(y: number, m: number, d: number): number {
-      // m es 1-12, necesitamos 0-11 para Date
-      const date = new Date(y, m - 1, d, 12, 0, 0); // Usar mediodía para evitar problemas de zona horaria
-      return date.getDay();
-    }
-
-    // Función helper para formatear fecha como YYYY-MM-DD sin problemas de zona horaria
-    function formatDateAsISO(y: number, m: number, d: number): string {
-      const monthStr = m.toString().padStart(2, '0');
-      const dayStr = d.toString().padStart(2, '0');
-      return `${y}-${monthStr}-${dayStr}`;
-    }
-
-    for (let day = 1; day <= daysInMonth; day++) {
-      const dateString = formatDateAsISO(year, month, day);
-      const dayOfWeek = getDayOfWeek(year, month, day);
-      const isWorkingDay = workingDays.has(dayOfWeek);
-      const isUnavailable = unavailableDates.has(dateString);
-      const dayAppointments = appointmentsByDate[dateString] || [];
-
-      const scheduled = dayAppointments.filter((a: any) => a.status === 'scheduled').length;
-      const cancelled = dayAppointments.filter((a: any) => a.status === 'cancelled').length;
-      const completed = dayAppointments.filter((a: any) => a.status === 'completed').length;
-
-      // Calcular slots disponibles (simplificado - asumiendo 20 minutos por slot)
-      // En producción, esto debería calcularse basándose en el horario de trabajo real
-      const totalSlots = isWorkingDay && !isUnavailable ? 27 : 0; // 9 horas * 3 slots por hora
-      const availableSlots = Math.max(0, totalSlots - scheduled);
-
-      days.push({
-        date: dateString,
-        total_appointments: dayAppointments.length,
-        scheduled,
-        cancelled,
-        completed,
-        is_full: availableSlots === 0 && scheduled > 0,
-        is_working_day: isWorkingDay && !isUnavailable,
-        appointments: dayAppointments,
-        available_slots: availableSlots,
-        total_slots: totalSlots,
-      });
-    }
-
-    const summary = {
-      total_days: daysInMonth,
-      working_days: days.filter((d: any) => d.is_working_day).length,
-      full_days: days.filter((d: any) => d.is_full).length,
-      total_appointments: appointmentsResult.rows.length,
-    };
-
     const duration = Date.now() - startTime;
     logApiRequest('GET', '/api/proveedor/calendar', 200, duration);
 
-    return NextResponse.json({
-      year,
-      month,
-      days,
-      summary,
-    });
+    return NextResponse.json(calendar);
   } catch (error: any) {
     const duration = Date.now() - startTime;
     apiLogger.error({ error, userId: user.id, year, month, duration }, 'Error in calendar endpoint');
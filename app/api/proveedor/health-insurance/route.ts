@@ -1,7 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { requireAuth } from '@/lib/auth';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
-import { getOrSetCache, cacheKeys, deleteCache } from '@/lib/cache';
+import { getReferenceData, refreshReferenceData } from '@/lib/reference-data';
 import { pool } from '@/lib/db';
 import { HealthInsurance } from '@/lib/types';
 
@@ -32,7 +32,9 @@ async function writeObrasSociales(
       );
     }
     await client.query('COMMIT');
-    await deleteCache(cacheKeys.healthInsurance());
+    await refreshReferenceData().catch((refreshError) => {
+      apiLogger.error({ error: refreshError instanceof Error ? refreshError.message : String(refreshError) }, 'Reference data refresh failed');
+    });
   } catch (e) {
     await client.query('ROLLBACK');
     throw e;
@@ -43,8 +45,7 @@ async function writeObrasSociales(
 
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -53,20 +54,8 @@ export async function GET(request: NextRequest) {
   }
 
   try {
-    const data = await getOrSetCache<HealthInsurance[]>(
-      cacheKeys.healthInsurance(),
-      async () => {
-        const raw = await readObrasSociales();
-        return raw.map((item, index) => ({
-          id: item.id ?? index + 1,
-          name: item.name,
-          price: item.price ?? null,
-          price_numeric: item.price_numeric ?? null,
-          notes: item.notes ?? null,
-        }));
-      },
-      3600
-    );
+    const { healthInsurance } = await getReferenceData();
+    const data = healthInsurance.list;
     const duration = Date.now() - startTime;
     logApiRequest('GET', '/api/proveedor/health-insurance', 200, duration);
     return NextResponse.json(data);
@@ -86,8 +75,7 @@ export async function GET(request: NextRequest) {
 
 export async function POST(request: NextRequest) {
   const startTime = Date.now();
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -137,8 +125,7 @@ export async function POST(request: NextRequest) {
 
 export async function PUT(request: NextRequest) {
   const startTime = Date.now();
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -202,8 +189,7 @@ export async function PUT(request: NextRequest) {
 
 export async function DELETE(request: NextRequest) {
   const startTime = Date.now();
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
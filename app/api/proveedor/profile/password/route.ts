@@ -1,9 +1,9 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
-import bcrypt from 'bcryptjs';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { z } from 'zod';
+import { hashPassword, comparePassword, PasswordHasherBusyError, passwordHasherBusyResponse } from '@/lib/password-hasher';
 
 const changePasswordSchema = z.object({
   current_password: z.string().min(1, 'Contraseña actual requerida'),
@@ -13,8 +13,7 @@ const changePasswordSchema = z.object({
 export async function PUT(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -56,7 +55,7 @@ export async function PUT(request: NextRequest) {
     }
 
     // Verificar contraseña actual
-    const passwordMatch = await bcrypt.compare(current_password, result.rows[0].password);
+    const passwordMatch = await comparePassword(current_password, result.rows[0].password);
     if (!passwordMatch) {
       const duration = Date.now() - startTime;
       logApiRequest('PUT', '/api/proveedor/profile/password', 401, duration);
@@ -67,7 +66,7 @@ export async function PUT(request: NextRequest) {
     }
 
     // Verificar que la nueva contraseña sea diferente
-    const samePassword = await bcrypt.compare(new_password, result.rows[0].password);
+    const samePassword = await comparePassword(new_password, result.rows[0].password);
     if (samePassword) {
       const duration = Date.now() - startTime;
       logApiRequest('PUT', '/api/proveedor/profile/password', 400, duration);
@@ -78,7 +77,7 @@ export async function PUT(request: NextRequest) {
     }
 
     // Hashear nueva contraseña
-    const hashedPassword = await bcrypt.hash(new_password, 10);
+    const hashedPassword = await hashPassword(new_password);
 
     // Actualizar contraseña
     await pool.query(
@@ -97,6 +96,10 @@ export async function PUT(request: NextRequest) {
     });
   } catch (error: any) {
     const duration = Date.now() - startTime;
+    if (error instanceof PasswordHasherBusyError) {
+      logApiRequest('PUT', '/api/proveedor/profile/password', 503, duration);
+      return passwordHasherBusyResponse();
+    }
     apiLogger.error({ error, userId: user.id, duration }, 'Error in change password endpoint');
     logApiRequest('PUT', '/api/proveedor/profile/password', 500, duration);
 
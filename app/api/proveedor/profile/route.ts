@@ -1,9 +1,10 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { pool, getSchemaCapabilities, markProviderWrite } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { z } from 'zod';
 import { isValidPhoneNumber, cleanPhoneNumber } from '@/lib/utils';
+import { invalidateProviderDirectory } from '@/lib/user-routes';
 import crypto from 'crypto';
 
 const updateProfileSchema = z.object({
@@ -35,8 +36,7 @@ const updateProfileSchema = z.object({
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -49,16 +49,10 @@ export async function GET(request: NextRequest) {
 
   try {
     // Verificar qué columnas existen en la tabla
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'user_accounts' AND table_schema = 'public'
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasFirstName = existingColumns.includes('first_name');
-    const hasLastName = existingColumns.includes('last_name');
-    const hasWhatsAppPhone = existingColumns.includes('whatsapp_phone_number');
+    const schema = await getSchemaCapabilities();
+    const hasFirstName = schema.hasColumn('user_accounts', 'first_name');
+    const hasLastName = schema.hasColumn('user_accounts', 'last_name');
+    const hasWhatsAppPhone = schema.hasColumn('user_accounts', 'whatsapp_phone_number');
     
     // Construir SELECT dinámicamente
     const selectFields = [
@@ -123,8 +117,7 @@ export async function GET(request: NextRequest) {
 export async function PUT(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -135,6 +128,9 @@ export async function PUT(request: NextRequest) {
     );
   }
 
+  // Sus próximas lecturas van al primario (read-your-writes)
+  markProviderWrite(user.id);
+
   try {
     const body = await request.json();
     const validationResult = updateProfileSchema.safeParse(body);
@@ -149,17 +145,11 @@ export async function PUT(request: NextRequest) {
     }
 
     // Verificar qué columnas existen en la tabla
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'user_accounts' AND table_schema = 'public'
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasFirstName = existingColumns.includes('first_name');
-    const hasLastName = existingColumns.includes('last_name');
-    const hasWhatsAppPhone = existingColumns.includes('whatsapp_phone_number');
-    const hasVerificationToken = existingColumns.includes('verification_token');
+    const schema = await getSchemaCapabilities();
+    const hasFirstName = schema.hasColumn('user_accounts', 'first_name');
+    const hasLastName = schema.hasColumn('user_accounts', 'last_name');
+    const hasWhatsAppPhone = schema.hasColumn('user_accounts', 'whatsapp_phone_number');
+    const hasVerificationToken = schema.hasColumn('user_accounts', 'verification_token');
 
     const data = validationResult.data;
     const updates: string[] = [];
@@ -233,6 +223,9 @@ export async function PUT(request: NextRequest) {
       values
     );
 
+    // El directorio de proveedores tiene nombre, email y WhatsApp del perfil
+    await invalidateProviderDirectory(user.id);
+
     // Obtener perfil actualizado (usando las mismas verificaciones de columnas)
     const selectFields = [
       'id',
@@ -1,7 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { pool, markProviderWrite } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { invalidateScheduleCache } from '@/lib/cache';
+import { invalidateAvailabilityIndex } from '@/lib/availability';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { getUsernameByUserAccountId } from '@/lib/user-routes';
 
@@ -11,8 +12,7 @@ export async function DELETE(
 ) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -23,6 +23,9 @@ export async function DELETE(
     );
   }
 
+  // Sus próximas lecturas van al primario (read-your-writes)
+  markProviderWrite(user.id);
+
   const resolvedParams = await params;
   const unavailableDayId = parseInt(resolvedParams.id);
 
@@ -38,7 +41,7 @@ export async function DELETE(
   try {
     // Verificar que el día no laborable pertenece al usuario
     const checkResult = await pool.query(
-      'SELECT id FROM unavailable_days WHERE id = $1 AND user_account_id = $2',
+      'SELECT id, unavailable_date FROM unavailable_days WHERE id = $1 AND user_account_id = $2',
       [unavailableDayId, user.id]
     );
 
@@ -56,7 +59,11 @@ export async function DELETE(
       [unavailableDayId, user.id]
     );
 
-    // Invalidar caché de horarios
+    // Invalidar índice y caché de horarios
+    await invalidateAvailabilityIndex(
+      user.id,
+      checkResult.rows[0].unavailable_date.toISOString().split('T')[0]
+    );
     const username = await getUsernameByUserAccountId(user.id);
     if (username) {
       await invalidateScheduleCache(user.id, username);
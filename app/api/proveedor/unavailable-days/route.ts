@@ -1,7 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { pool, markProviderWrite } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { invalidateScheduleCache } from '@/lib/cache';
+import { markDayUnavailable } from '@/lib/availability';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { z } from 'zod';
 import { getUsernameByUserAccountId } from '@/lib/user-routes';
@@ -17,8 +18,7 @@ const createUnavailableDaySchema = z.object({
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -84,8 +84,7 @@ export async function GET(request: NextRequest) {
 export async function POST(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -96,6 +95,9 @@ export async function POST(request: NextRequest) {
     );
   }
 
+  // Sus próximas lecturas van al primario (read-your-writes)
+  markProviderWrite(user.id);
+
   try {
     const body = await request.json() as Record<string, unknown>;
     // Aceptar { date } o { dates: [...] } / { unavailable_days: [...] } (compatibilidad con tests)
@@ -161,7 +163,8 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Invalidar caché de horarios
+    // Actualizar índice e invalidar caché de horarios
+    await markDayUnavailable(user.id, date);
     const username = await getUsernameByUserAccountId(user.id);
     if (username) {
       await invalidateScheduleCache(user.id, username);
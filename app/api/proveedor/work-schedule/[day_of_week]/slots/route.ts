@@ -1,7 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { pool, markProviderWrite } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { invalidateScheduleCache } from '@/lib/cache';
+import { invalidateAvailabilityIndex } from '@/lib/availability';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { z } from 'zod';
 import { getUsernameByUserAccountId } from '@/lib/user-routes';
@@ -31,8 +32,7 @@ export async function POST(
 ) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -43,6 +43,9 @@ export async function POST(
     );
   }
 
+  // Sus próximas lecturas van al primario (read-your-writes)
+  markProviderWrite(user.id);
+
   const resolvedParams = await params;
   const { day_of_week } = resolvedParams;
 
@@ -140,7 +143,8 @@ export async function POST(
       [workScheduleId, user.id, start_time, end_time, is_available ?? true]
     );
 
-    // Invalidar caché de horarios
+    // Invalidar índice y caché de horarios
+    await invalidateAvailabilityIndex(user.id);
     const username = await getUsernameByUserAccountId(user.id);
     if (username) {
       await invalidateScheduleCache(user.id, username);
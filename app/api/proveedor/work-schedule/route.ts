@@ -1,13 +1,12 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 
 /** POST no soportado: usar PUT por día. Devuelve 405 con Allow. */
 export async function POST(request: NextRequest) {
   const startTime = Date.now();
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
   if (!user) {
     const duration = Date.now() - startTime;
     logApiRequest('POST', '/api/proveedor/work-schedule', 401, duration);
@@ -24,8 +23,7 @@ export async function POST(request: NextRequest) {
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -1,7 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { requireAuth } from '@/lib/auth';
+import { pool, markProviderWrite } from '@/lib/db';
+import { requireAuthFromRequest } from '@/lib/auth';
 import { invalidateScheduleCache } from '@/lib/cache';
+import { invalidateAvailabilityIndex } from '@/lib/availability';
 import { apiLogger, logApiRequest } from '@/lib/logger';
 import { getUsernameByUserAccountId } from '@/lib/user-routes';
 
@@ -11,8 +12,7 @@ export async function DELETE(
 ) {
   const startTime = Date.now();
   
-  const authHeader = request.headers.get('authorization');
-  const user = await requireAuth(authHeader);
+  const user = await requireAuthFromRequest(request);
 
   if (!user) {
     const duration = Date.now() - startTime;
@@ -23,6 +23,9 @@ export async function DELETE(
     );
   }
 
+  // Sus próximas lecturas van al primario (read-your-writes)
+  markProviderWrite(user.id);
+
   const resolvedParams = await params;
   const slotId = parseInt(resolvedParams.id);
 
@@ -94,7 +97,8 @@ export async function DELETE(
       [slotId, user.id]
     );
 
-    // Invalidar caché de horarios
+    // Invalidar índice y caché de horarios
+    await invalidateAvailabilityIndex(user.id);
     const username = await getUsernameByUserAccountId(user.id);
     if (username) {
       await invalidateScheduleCache(user.id, username);
@@ -95,7 +95,7 @@ export async function GET(
           unavailableDates,
         };
       },
-      300 // 5 minutos TTL
+      { softTtlSeconds: 300, hardTtlSeconds: 900 }
     );
 
     const duration = Date.now() - startTime;
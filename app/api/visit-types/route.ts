@@ -1,23 +1,25 @@
 import { NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
+import { getReferenceData } from '@/lib/reference-data';
 import { logApiRequest } from '@/lib/logger';
 
 /**
  * GET /api/visit-types
  * Devuelve los tipos de visita disponibles (para formularios y tests).
+ * Se sirven desde los datos de referencia en memoria.
  */
 export async function GET() {
   const startTime = Date.now();
 
   try {
-    const result = await pool.query(
-      `SELECT id, name, description FROM visit_types ORDER BY id`
-    );
+    const { visitTypes } = await getReferenceData();
+    if (visitTypes.list.length === 0) {
+      throw new Error('visit_types vacía o inexistente');
+    }
 
     const duration = Date.now() - startTime;
     logApiRequest('GET', '/api/visit-types', 200, duration);
 
-    return NextResponse.json(result.rows);
+    return NextResponse.json(visitTypes.list);
   } catch (err) {
     const duration = Date.now() - startTime;
     logApiRequest('GET', '/api/visit-types', 200, duration);
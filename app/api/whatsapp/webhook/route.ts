@@ -1,6 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { pool } from '@/lib/db';
-import { apiLogger, whatsappLogger } from '@/lib/logger';
+import { apiLogger, whatsappLogger, logApiRequest } from '@/lib/logger';
+import { parseWhatsAppAcks, filterStateChangingAcks, recordDeliveryAcks } from '@/lib/whatsapp-acks';
 
 /**
  * Webhook endpoint para recibir notificaciones de estado de mensajes de UltraMsg
@@ -11,114 +11,53 @@ import { apiLogger, whatsappLogger } from '@/lib/logger';
  * - Cambia el estado de entrega/lectura (webhook_message_ack)
  * 
  * Este endpoint actualiza el estado de entrega en la base de datos cuando
- * el mensaje llega al paciente (status: "device" o "read")
+ * el mensaje llega al paciente (status: "device" o "read").
+ * 
+ * Acepta un evento o un lote (array o { data: [...] }); los ACKs que no
+ * cambian el estado se descartan sin consultar la base de datos y el resto
+ * se aplica en un único UPDATE (ver lib/whatsapp-acks.ts).
  */
 export async function POST(request: NextRequest) {
+  const startTime = Date.now();
+  let body: unknown;
   try {
-    const body = await request.json();
-    
-    whatsappLogger.info({ webhookBody: body }, 'Received UltraMsg webhook');
+    body = await request.json();
+  } catch {
+    logApiRequest('POST', '/api/whatsapp/webhook', 400, Date.now() - startTime);
+    return NextResponse.json({ success: false, error: 'Invalid JSON body' }, { status: 400 });
+  }
 
-    // UltraMsg envía webhooks en diferentes formatos:
-    // Formato 1: { event_type: "message_ack", data: { id, ack, ... } }
-    // Formato 2: { id, ack, status, ... } (formato directo)
-    const eventType = body.event_type || body.event || body.type;
-    
-    // Extraer datos según el formato
-    let messageId: string | undefined;
-    let ackStatus: string | undefined;
-    
-    if (body.data && typeof body.data === 'object') {
-      // Formato con objeto data
-      messageId = body.data.id || body.data.messageId;
-      ackStatus = body.data.ack || body.data.status;
-    } else {
-      // Formato directo
-      messageId = body.id || body.messageId;
-      ackStatus = body.ack || body.status;
-    }
+  try {
+    const { acks, ignored, missingId } = parseWhatsAppAcks(body);
+    whatsappLogger.debug({ acks: acks.length, ignored, missingId }, 'Received UltraMsg webhook');
 
-    // Solo procesar webhooks de tipo message_ack o si tiene ack status
-    if (eventType && !eventType.includes('ack') && !ackStatus) {
-      whatsappLogger.debug({ eventType }, 'Ignoring non-ACK webhook event');
+    if (acks.length === 0) {
+      if (missingId > 0) {
+        whatsappLogger.warn({ body }, 'Webhook received without message ID');
+        logApiRequest('POST', '/api/whatsapp/webhook', 400, Date.now() - startTime);
+        return NextResponse.json({ success: false, error: 'Missing message ID' }, { status: 400 });
+      }
+      whatsappLogger.debug({ ignored }, 'Ignoring non-ACK webhook event');
+      logApiRequest('POST', '/api/whatsapp/webhook', 200, Date.now() - startTime);
       return NextResponse.json({ success: true, message: 'Non-ACK event ignored' });
     }
 
-    if (!messageId) {
-      whatsappLogger.warn({ body }, 'Webhook received without message ID');
-      return NextResponse.json({ success: false, error: 'Missing message ID' }, { status: 400 });
-    }
-
-    // Buscar la cita por whatsapp_message_id
-    const appointmentResult = await pool.query(
-      `SELECT id, whatsapp_message_id, whatsapp_sent 
-       FROM appointments 
-       WHERE whatsapp_message_id = $1`,
-      [String(messageId)]
-    );
-
-    if (appointmentResult.rows.length === 0) {
-      // No es un error crítico, puede ser un mensaje que no es de citas
-      whatsappLogger.debug({ messageId }, 'Message ID not found in appointments, ignoring');
-      return NextResponse.json({ success: true, message: 'Message ID not found in appointments' });
-    }
-
-    const appointment = appointmentResult.rows[0];
-
-    // Actualizar estado según el ACK recibido
-    // UltraMsg ACK values: pending, server, device, read, played
-    // "device" significa que el mensaje llegó al teléfono del paciente
-    // "read" significa que el paciente leyó el mensaje
-    if (ackStatus === 'device' || ackStatus === 'read' || ackStatus === 'played') {
-      // El mensaje llegó al paciente
-      await pool.query(
-        `UPDATE appointments 
-         SET whatsapp_sent = true,
-             whatsapp_sent_at = COALESCE(whatsapp_sent_at, CURRENT_TIMESTAMP),
-             updated_at = CURRENT_TIMESTAMP
-         WHERE id = $1`,
-        [appointment.id]
-      );
-
-      whatsappLogger.info(
-        { 
-          appointmentId: appointment.id, 
-          messageId, 
-          ackStatus,
-          eventType 
-        }, 
-        'WhatsApp message delivered to patient'
-      );
-    } else if (ackStatus === 'server') {
-      // El mensaje está en los servidores de WhatsApp pero aún no llegó al dispositivo
-      whatsappLogger.debug(
-        { 
-          appointmentId: appointment.id, 
-          messageId, 
-          ackStatus 
-        }, 
-        'WhatsApp message on server, waiting for delivery'
-      );
-    } else if (ackStatus === 'pending') {
-      // El mensaje está en la cola de la instancia
-      whatsappLogger.debug(
-        { 
-          appointmentId: appointment.id, 
-          messageId, 
-          ackStatus 
-        }, 
-        'WhatsApp message pending in instance queue'
-      );
-    }
+    // Solo los ACKs que marcan entrega por primera vez llegan a la base de datos
+    const stateChanging = filterStateChangingAcks(acks);
+    const updated = await recordDeliveryAcks(stateChanging);
 
-    return NextResponse.json({ 
-      success: true, 
+    logApiRequest('POST', '/api/whatsapp/webhook', 200, Date.now() - startTime);
+    return NextResponse.json({
+      success: true,
       message: 'Webhook processed',
-      appointmentId: appointment.id,
-      ackStatus 
+      received: acks.length,
+      applied: stateChanging.length,
+      updated: Array.from(updated, ([messageId, appointmentId]) => ({ messageId, appointmentId })),
+      ignored,
     });
   } catch (error: any) {
-    apiLogger.error({ error, body: await request.json().catch(() => ({})) }, 'Error processing UltraMsg webhook');
+    apiLogger.error({ error, body }, 'Error processing UltraMsg webhook');
+    logApiRequest('POST', '/api/whatsapp/webhook', 500, Date.now() - startTime);
     return NextResponse.json(
       { success: false, error: 'Error processing webhook' },
       { status: 500 }
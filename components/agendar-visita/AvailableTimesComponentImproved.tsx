@@ -4,6 +4,7 @@ import { useQuery } from '@tanstack/react-query';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { formatDate } from '@/lib/utils';
 import { Loader2 } from 'lucide-react';
+import { startOfWeek, endOfWeek } from 'date-fns';
 
 interface AvailableTimesComponentImprovedProps {
   userAccountId: number;
@@ -19,26 +20,33 @@ export default function AvailableTimesComponentImproved({
   selectedTime,
 }: AvailableTimesComponentImprovedProps) {
   const dateString = selectedDate ? formatDate(selectedDate) : null;
+  // Se pide la semana completa de la fecha seleccionada en una sola request;
+  // al cambiar de día dentro de la misma semana no hay nuevas llamadas.
+  const weekStart = selectedDate ? formatDate(startOfWeek(selectedDate)) : null;
+  const weekEnd = selectedDate ? formatDate(endOfWeek(selectedDate)) : null;
 
-  const { data: availableTimes = [], isLoading, error } = useQuery<string[]>({
-    queryKey: ['available-times', userAccountId, dateString],
+  const { data: weekTimes, isLoading, error } = useQuery<Record<string, string[]>>({
+    queryKey: ['available-times', userAccountId, weekStart],
     queryFn: async () => {
-      if (!dateString) return [];
+      if (!weekStart || !weekEnd) return {};
 
       const response = await fetch(
-        `/api/available-times/${dateString}?user_account_id=${userAccountId}`
+        `/api/available-times?user_account_id=${userAccountId}&from=${weekStart}&to=${weekEnd}`
       );
 
       if (!response.ok) {
         throw new Error('Error al obtener horarios disponibles');
       }
 
-      return response.json();
+      const data = await response.json();
+      return data.available_times;
     },
-    enabled: !!dateString && !!userAccountId,
+    enabled: !!weekStart && !!userAccountId,
     staleTime: 5 * 60 * 1000, // 5 minutos
   });
 
+  const availableTimes = (dateString && weekTimes?.[dateString]) || [];
+
   if (!selectedDate) {
     return null;
   }
@@ -0,0 +1,22 @@
+/**
+ * Hook de inicio de Next.js
+ * 
+ * Se ejecuta una vez por instancia del servidor, antes de atender requests.
+ */
+export async function register() {
+  if (process.env.NEXT_RUNTIME !== 'nodejs') {
+    return;
+  }
+
+  // Cargar el registro de capacidades del esquema y los datos de referencia al iniciar
+  const { getSchemaCapabilities } = await import('./lib/db');
+  const { getReferenceData } = await import('./lib/reference-data');
+  const { dbLogger } = await import('./lib/logger');
+  try {
+    await getSchemaCapabilities();
+    await getReferenceData();
+  } catch (error) {
+    // Si la BD no está disponible al iniciar, se reintenta en el primer request
+    dbLogger.warn({ error: error instanceof Error ? error.message : String(error) }, 'Could not preload schema capabilities or reference data');
+  }
+}
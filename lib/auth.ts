@@ -8,6 +8,7 @@
  */
 
 import { SignJWT, jwtVerify } from 'jose';
+import { LRUCache } from 'lru-cache';
 import { JWTPayload } from './types';
 import { logger, authLogger } from './logger';
 
@@ -26,6 +27,32 @@ if (process.env.NODE_ENV === 'production') {
 
 const JWT_EXPIRATION = '24h'; // 24 horas
 
+// Clave HMAC preparada una sola vez (no en cada firma/verificación)
+const JWT_SECRET_KEY = JWT_SECRET && JWT_SECRET.length >= 32 ? new TextEncoder().encode(JWT_SECRET) : null;
+
+// Tokens ya verificados, por hash SHA-256; cada entrada vence con el exp del token
+const VERIFIED_TOKEN_MAX_TTL_MS = 1000 * 60 * 5; // 5 minutos
+const verifiedTokens = new LRUCache<string, JWTPayload>({
+  max: 1000,
+  ttl: VERIFIED_TOKEN_MAX_TTL_MS,
+});
+
+async function hashToken(token: string): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(token));
+  let hex = '';
+  for (const byte of new Uint8Array(digest)) {
+    hex += byte.toString(16).padStart(2, '0');
+  }
+  return hex;
+}
+
+// Headers que agrega middleware.ts después de verificar el token en /api/proveedor/*
+export const AUTH_USER_HEADERS = {
+  id: 'x-user-id',
+  email: 'x-user-email',
+  username: 'x-user-username',
+} as const;
+
 /**
  * Genera un token JWT para un usuario autenticado
  * 
@@ -38,7 +65,7 @@ export async function generateToken(payload: {
   username: string | null;
   email_verified: boolean;
 }): Promise<string> {
-  if (!JWT_SECRET || JWT_SECRET.length < 32) {
+  if (!JWT_SECRET_KEY) {
     throw new Error('JWT_SECRET no está configurado correctamente. Debe tener al menos 32 caracteres.');
   }
 
@@ -50,12 +77,11 @@ export async function generateToken(payload: {
       email_verified: payload.email_verified,
     };
 
-    const secret = new TextEncoder().encode(JWT_SECRET);
     const token = await new SignJWT(tokenPayload as any)
       .setProtectedHeader({ alg: 'HS256' })
       .setIssuedAt()
       .setExpirationTime(JWT_EXPIRATION)
-      .sign(secret);
+      .sign(JWT_SECRET_KEY);
 
     return token;
   } catch (error) {
@@ -67,18 +93,29 @@ export async function generateToken(payload: {
 /**
  * Verifica y decodifica un token JWT
  * 
+ * Los tokens válidos se recuerdan (por hash) hasta su exp o 5 minutos,
+ * así las requests siguientes con el mismo token no repiten la verificación.
+ * 
  * @param token Token JWT a verificar
  * @returns Payload decodificado o null si el token es inválido
  */
 export async function verifyToken(token: string): Promise<JWTPayload | null> {
-  if (!JWT_SECRET || JWT_SECRET.length < 32) {
+  if (!JWT_SECRET_KEY) {
     authLogger.warn('JWT_SECRET no está configurado correctamente. No se puede verificar token.');
     return null;
   }
 
+  const tokenHash = await hashToken(token);
+  const cached = verifiedTokens.get(tokenHash);
+  if (cached) {
+    if (!cached.exp || cached.exp * 1000 > Date.now()) {
+      return cached;
+    }
+    verifiedTokens.delete(tokenHash);
+  }
+
   try {
-    const secret = new TextEncoder().encode(JWT_SECRET);
-    const { payload } = await jwtVerify(token, secret);
+    const { payload } = await jwtVerify(token, JWT_SECRET_KEY);
     
     // Convertir el payload a JWTPayload
     const decoded: JWTPayload = {
@@ -89,6 +126,13 @@ export async function verifyToken(token: string): Promise<JWTPayload | null> {
       iat: payload.iat as number | undefined,
       exp: payload.exp as number | undefined,
     };
+
+    const ttl = decoded.exp
+      ? Math.min(decoded.exp * 1000 - Date.now(), VERIFIED_TOKEN_MAX_TTL_MS)
+      : VERIFIED_TOKEN_MAX_TTL_MS;
+    if (ttl > 0) {
+      verifiedTokens.set(tokenHash, Object.freeze(decoded), { ttl });
+    }
     
     return decoded;
   } catch (error: any) {
@@ -176,6 +220,53 @@ export async function requireAuth(authHeader: string | null): Promise<{
   return user;
 }
 
+/**
+ * Obtiene el usuario autenticado de una request
+ * 
+ * En /api/proveedor/* middleware.ts ya verificó el token (y exige email
+ * verificado) y pasó la identidad en los headers x-user-*, que siempre
+ * sobrescribe: se usan sin volver a verificar. En el resto de las rutas
+ * el middleware no corre, así que esos headers podrían venir del cliente
+ * y se verifica el token.
+ * 
+ * @param request Request de Next.js
+ * @returns Usuario autenticado o null si no está autenticado
+ * 
+ * @example
+ * ```typescript
+ * const user = await requireAuthFromRequest(request);
+ * if (!user) return NextResponse.json({ error: 'No autorizado' }, { status: 401 });
+ * ```
+ */
+export async function requireAuthFromRequest(request: {
+  headers: Headers;
+  nextUrl: { pathname: string };
+}): Promise<{
+  id: number;
+  email: string;
+  username: string | null;
+  email_verified: boolean;
+} | null> {
+  const trustedId = request.nextUrl.pathname.startsWith('/api/proveedor/')
+    ? request.headers.get(AUTH_USER_HEADERS.id)
+    : null;
+
+  if (trustedId) {
+    const id = parseInt(trustedId);
+    const email = request.headers.get(AUTH_USER_HEADERS.email);
+    if (Number.isInteger(id) && email) {
+      return {
+        id,
+        email,
+        username: request.headers.get(AUTH_USER_HEADERS.username) || null,
+        email_verified: true,
+      };
+    }
+  }
+
+  return requireAuth(request.headers.get('authorization'));
+}
+
 /**
  * Verifica que el usuario autenticado es el propietario del recurso
  * 
@@ -235,3 +326,46 @@ export async function isSuperAdmin(authHeader: string | null): Promise<boolean>
 
   return false;
 }
+
+/**
+ * Verifica el secreto de los endpoints de cron
+ * 
+ * Acepta 'Authorization: Bearer <CRON_SECRET>' o 'x-cron-secret: <CRON_SECRET>'.
+ * Sin CRON_SECRET configurado, los crons quedan deshabilitados.
+ * 
+ * @param headers Headers de la request
+ * @param cronName Nombre del cron (para el log)
+ * @returns true si el secreto es válido
+ */
+export function isCronRequestAuthorized(headers: Headers, cronName: string): boolean {
+  const secret = process.env.CRON_SECRET;
+  if (!secret) {
+    logger.warn(`CRON_SECRET not set, cron ${cronName} is disabled`);
+    return false;
+  }
+  const authHeader = headers.get('authorization');
+  if (authHeader?.startsWith('Bearer ')) {
+    return authHeader.slice(7) === secret;
+  }
+  const cronSecret = headers.get('x-cron-secret');
+  return cronSecret === secret;
+}
+
+/**
+ * Verifica el token del endpoint de métricas
+ * 
+ * Acepta 'Authorization: Bearer <METRICS_TOKEN>' (bearer_token en la
+ * configuración del scrape de Prometheus). Sin METRICS_TOKEN configurado,
+ * /api/metrics queda deshabilitado.
+ * 
+ * @param headers Headers de la request
+ * @returns true si el token es válido
+ */
+export function isMetricsRequestAuthorized(headers: Headers): boolean {
+  const token = process.env.METRICS_TOKEN;
+  if (!token) {
+    logger.warn('METRICS_TOKEN not set, /api/metrics is disabled');
+    return false;
+  }
+  return headers.get('authorization') === `Bearer ${token}`;
+}
@@ -0,0 +1,817 @@
+/**
+ * Cálculo e Índice de Horarios Disponibles
+ *
+ * Calcula los horarios libres de un proveedor para una fecha y mantiene
+ * un índice precomputado por proveedor y fecha (tabla availability_index).
+ *
+ * El índice guarda, en minutos desde medianoche:
+ * - open_minutes: slots de 20 minutos que el proveedor atiende ese día
+ *   (franjas de available_slots menos unavailable_time_frames)
+ * - booked_minutes: slots ocupados por citas programadas
+ *
+ * Una consulta de disponibilidad es una sola lectura por clave primaria.
+ * Reservas y cancelaciones actualizan booked_minutes en el lugar; cambios de
+ * horario o días no laborables actualizan o descartan las filas afectadas,
+ * que se reconstruyen en la siguiente lectura.
+ *
+ * Concurrencia: toda escritura del índice (reconstrucción, reserva,
+ * cancelación, invalidación) toma un advisory lock por proveedor, y la
+ * reconstrucción calcula booked_minutes dentro de la misma sentencia que
+ * escribe la fila. Así una reserva que se confirma durante una reconstrucción
+ * queda siempre reflejada: o la ve la sentencia de escritura, o su
+ * markSlotBooked espera el lock y se aplica sobre la fila ya escrita.
+ * open_minutes se sigue calculando antes del lock; un cambio de horario que
+ * coincide con una reconstrucción puede quedar desactualizado hasta
+ * INDEX_MAX_AGE_SECONDS.
+ *
+ * Motores de cálculo (variable AVAILABILITY_ENGINE):
+ * - 'node' (default): varias consultas por tabla, armado de slots en Node
+ * - 'sql': una sola sentencia con generate_series y anti-joins
+ *
+ * Tabla requerida: scripts/create-availability-index-table.js
+ */
+
+import type { PoolClient } from 'pg';
+import { query, readQuery, defineStatement, getSchemaCapabilities, type PreparedStatement } from './db';
+import { withTransaction } from './db-transactions';
+import { apiLogger } from './logger';
+import { getDayNameEnglish } from './utils';
+
+/**
+ * Duración de cada turno en minutos
+ */
+export const SLOT_DURATION_MINUTES = 20;
+
+/**
+ * Antigüedad máxima de una fila del índice antes de reconstruirla.
+ * Cubre cambios hechos fuera de la app (ej: unavailable_time_frames cargados por script).
+ */
+const INDEX_MAX_AGE_SECONDS = 6 * 60 * 60;
+
+// Prepared statements de las consultas de disponibilidad (ver defineStatement en lib/db.ts)
+const UNAVAILABLE_DAYS_IN_RANGE = defineStatement(
+  'availability_unavailable_days',
+  `SELECT to_char(unavailable_date, 'YYYY-MM-DD') AS date
+   FROM unavailable_days
+   WHERE user_account_id = $1 AND unavailable_date BETWEEN $2 AND $3`
+);
+
+const OPEN_SLOTS_BY_PROVIDER = defineStatement(
+  'availability_open_slots',
+  `SELECT ws.day_of_week, s.start_time, s.end_time
+   FROM work_schedule ws
+   JOIN available_slots s ON s.work_schedule_id = ws.id AND s.is_available = true
+   WHERE ws.user_account_id = $1 AND ws.is_working_day = true
+   ORDER BY s.start_time`
+);
+
+const BOOKED_APPOINTMENTS_IN_RANGE = defineStatement(
+  'availability_booked_appointments',
+  `SELECT to_char(appointment_date, 'YYYY-MM-DD') AS date, appointment_time
+   FROM appointments
+   WHERE user_account_id = $1
+     AND appointment_date BETWEEN $2 AND $3
+     AND status = 'scheduled'`
+);
+
+const BLOCKED_FRAMES_IN_RANGE = defineStatement(
+  'availability_blocked_frames',
+  `SELECT to_char(workday_date, 'YYYY-MM-DD') AS date, start_time, end_time
+   FROM unavailable_time_frames
+   WHERE user_account_id = $1 AND workday_date BETWEEN $2 AND $3`
+);
+
+const READ_AVAILABILITY_INDEX = defineStatement(
+  'availability_index_read',
+  `SELECT open_minutes, booked_minutes
+   FROM availability_index
+   WHERE user_account_id = $1
+     AND slot_date = $2
+     AND refreshed_at > CURRENT_TIMESTAMP - make_interval(secs => $3)`
+);
+
+// booked_minutes se lee de appointments en la misma sentencia (ver "Concurrencia")
+const WRITE_AVAILABILITY_INDEX = defineStatement(
+  'availability_index_write',
+  `INSERT INTO availability_index (user_account_id, slot_date, open_minutes, booked_minutes, refreshed_at)
+   SELECT $1, d.slot_date, d.open_minutes::smallint[],
+          COALESCE(
+            (SELECT array_agg((EXTRACT(HOUR FROM a.appointment_time) * 60 + EXTRACT(MINUTE FROM a.appointment_time))::smallint)
+             FROM appointments a
+             WHERE a.user_account_id = $1
+               AND a.appointment_date = d.slot_date
+               AND a.status = 'scheduled'),
+            '{}'
+          ),
+          CURRENT_TIMESTAMP
+   FROM unnest($2::date[], $3::text[]) AS d(slot_date, open_minutes)
+   ON CONFLICT (user_account_id, slot_date)
+   DO UPDATE SET
+     open_minutes = EXCLUDED.open_minutes,
+     booked_minutes = EXCLUDED.booked_minutes,
+     refreshed_at = CURRENT_TIMESTAMP
+   RETURNING to_char(slot_date, 'YYYY-MM-DD') AS date, booked_minutes`
+);
+
+const READ_AVAILABILITY_INDEX_RANGE = defineStatement(
+  'availability_index_read_range',
+  `SELECT to_char(slot_date, 'YYYY-MM-DD') AS date, open_minutes, booked_minutes
+   FROM availability_index
+   WHERE user_account_id = $1
+     AND slot_date BETWEEN $2 AND $3
+     AND refreshed_at > CURRENT_TIMESTAMP - make_interval(secs => $4)`
+);
+
+const MARK_SLOT_BOOKED = defineStatement(
+  'availability_index_book',
+  `UPDATE availability_index
+   SET booked_minutes = array_append(array_remove(booked_minutes, $3::smallint), $3::smallint)
+   WHERE user_account_id = $1 AND slot_date = $2`
+);
+
+const MARK_SLOT_RELEASED = defineStatement(
+  'availability_index_release',
+  `UPDATE availability_index
+   SET booked_minutes = array_remove(booked_minutes, $3::smallint)
+   WHERE user_account_id = $1 AND slot_date = $2`
+);
+
+const MARK_DAY_UNAVAILABLE = defineStatement(
+  'availability_index_day_unavailable',
+  `INSERT INTO availability_index (user_account_id, slot_date, open_minutes, booked_minutes, refreshed_at)
+   VALUES ($1, $2, '{}', '{}', CURRENT_TIMESTAMP)
+   ON CONFLICT (user_account_id, slot_date)
+   DO UPDATE SET open_minutes = '{}', refreshed_at = CURRENT_TIMESTAMP`
+);
+
+const INVALIDATE_INDEX_DATE = defineStatement(
+  'availability_index_invalidate_date',
+  'DELETE FROM availability_index WHERE user_account_id = $1 AND slot_date = $2'
+);
+
+const INVALIDATE_INDEX_PROVIDER = defineStatement(
+  'availability_index_invalidate_provider',
+  'DELETE FROM availability_index WHERE user_account_id = $1'
+);
+
+// Espacio de claves propio para pg_advisory_xact_lock(namespace, user_account_id)
+const INDEX_LOCK_NAMESPACE = 41001;
+
+const LOCK_PROVIDER_INDEX = defineStatement(
+  'availability_index_lock',
+  'SELECT pg_advisory_xact_lock($1::int, $2::int)'
+);
+
+/**
+ * Motor usado para calcular la disponibilidad desde las tablas de origen
+ */
+export type AvailabilityEngine = 'node' | 'sql';
+
+export const availabilityEngine: AvailabilityEngine =
+  process.env.AVAILABILITY_ENGINE === 'sql' ? 'sql' : 'node';
+
+/**
+ * De dónde leer las tablas de origen
+ *
+ * 'replica' usa readQuery() (réplica de lectura si está configurada, con
+ * read-your-writes por proveedor). Lo que se guarda en availability_index se
+ * calcula con 'primary': un valor leído de una réplica atrasada quedaría
+ * persistido en el índice hasta la próxima invalidación.
+ */
+export type AvailabilitySource = 'replica' | 'primary';
+
+function sourceQuery(
+  source: AvailabilitySource,
+  userAccountId: number,
+  statement: PreparedStatement,
+  params: any[]
+): Promise<{ rows: any[]; rowCount: number | null }> {
+  return source === 'primary'
+    ? query(statement, params)
+    : readQuery(statement, params, { userAccountId });
+}
+
+/**
+ * Disponibilidad de un día expresada en minutos desde medianoche
+ */
+export interface DayAvailability {
+  openMinutes: number[];
+  bookedMinutes: number[];
+}
+
+/**
+ * Convierte 'HH:MM' o 'HH:MM:SS' a minutos desde medianoche
+ */
+export function timeToMinutes(time: string): number {
+  const [hours, minutes] = time.split(':').map(Number);
+  return hours * 60 + minutes;
+}
+
+/**
+ * Convierte minutos desde medianoche a 'HH:MM'
+ */
+export function minutesToTime(totalMinutes: number): string {
+  const hours = Math.floor(totalMinutes / 60);
+  const mins = totalMinutes % 60;
+  return `${String(hours).padStart(2, '0')}:${String(mins).padStart(2, '0')}`;
+}
+
+/**
+ * Genera intervalos de tiempo de 20 minutos entre startTime y endTime
+ */
+export function generateTimeSlots(startTime: string, endTime: string): string[] {
+  return generateSlotMinutes(startTime, endTime).map(minutesToTime);
+}
+
+/**
+ * Igual que generateTimeSlots pero devuelve minutos desde medianoche
+ */
+function generateSlotMinutes(startTime: string, endTime: string): number[] {
+  const slots: number[] = [];
+  const endMinutes = timeToMinutes(endTime);
+
+  for (let minutes = timeToMinutes(startTime); minutes < endMinutes; minutes += SLOT_DURATION_MINUTES) {
+    slots.push(minutes);
+  }
+
+  return slots;
+}
+
+/**
+ * Valida el formato de fecha e indica si la fecha ya pasó
+ *
+ * @throws Error si el formato no es YYYY-MM-DD
+ */
+export function isPastDate(date: string): boolean {
+  if (!/^\d{4}-\d{2}-\d{2}$/.test(date)) {
+    throw new Error('Formato de fecha inválido. Debe ser YYYY-MM-DD');
+  }
+
+  const selectedDate = new Date(date);
+  const today = new Date();
+  today.setHours(0, 0, 0, 0);
+
+  return selectedDate < today;
+}
+
+/**
+ * Resta los slots ocupados de los slots abiertos y los formatea como 'HH:MM'
+ */
+export function freeSlotsFromAvailability(availability: DayAvailability): string[] {
+  const booked = new Set(availability.bookedMinutes);
+  return [...new Set(availability.openMinutes)]
+    .filter((minutes) => !booked.has(minutes))
+    .sort((a, b) => a - b)
+    .map(minutesToTime);
+}
+
+/**
+ * Indica si el error corresponde a que la tabla availability_index no existe
+ */
+function isMissingIndexTable(error: any): boolean {
+  return error?.code === '42P01';
+}
+
+/**
+ * Máximo de días que se pueden consultar en un rango
+ */
+export const MAX_RANGE_DAYS = 31;
+
+/**
+ * Lista las fechas (YYYY-MM-DD) entre from y to, ambas inclusive
+ *
+ * @throws Error si el formato es inválido, si from > to o si el rango supera MAX_RANGE_DAYS
+ */
+export function listDatesInRange(from: string, to: string): string[] {
+  if (!/^\d{4}-\d{2}-\d{2}$/.test(from) || !/^\d{4}-\d{2}-\d{2}$/.test(to)) {
+    throw new Error('Formato de fecha inválido. Debe ser YYYY-MM-DD');
+  }
+
+  const dates: string[] = [];
+  const cursor = new Date(`${from}T00:00:00Z`);
+  const end = new Date(`${to}T00:00:00Z`);
+
+  if (cursor > end) {
+    throw new Error('Rango de fechas inválido: from debe ser anterior o igual a to');
+  }
+
+  while (cursor <= end) {
+    if (dates.length >= MAX_RANGE_DAYS) {
+      throw new Error(`Rango de fechas inválido: máximo ${MAX_RANGE_DAYS} días`);
+    }
+    dates.push(cursor.toISOString().split('T')[0]);
+    cursor.setUTCDate(cursor.getUTCDate() + 1);
+  }
+
+  return dates;
+}
+
+/**
+ * Calcula la disponibilidad de varios días consultando las tablas de origen
+ *
+ * Es el camino lento; se usa para reconstruir el índice.
+ *
+ * @param dates Fechas YYYY-MM-DD a calcular
+ * @param engine Motor a usar (default: AVAILABILITY_ENGINE)
+ * @param source Réplica o primario (ver AvailabilitySource)
+ * @returns Disponibilidad por fecha
+ */
+export async function computeRangeAvailability(
+  userAccountId: number,
+  dates: string[],
+  engine: AvailabilityEngine = availabilityEngine,
+  source: AvailabilitySource = 'replica'
+): Promise<Map<string, DayAvailability>> {
+  return engine === 'sql'
+    ? await computeRangeAvailabilitySql(userAccountId, dates, source)
+    : await computeRangeAvailabilityNode(userAccountId, dates, source);
+}
+
+/**
+ * Motor 'node': consultas por rango (una por tabla) y armado de slots en Node
+ */
+export async function computeRangeAvailabilityNode(
+  userAccountId: number,
+  dates: string[],
+  source: AvailabilitySource = 'replica'
+): Promise<Map<string, DayAvailability>> {
+  const availabilityByDate = new Map<string, DayAvailability>();
+  if (dates.length === 0) {
+    return availabilityByDate;
+  }
+
+  const sortedDates = [...dates].sort();
+  const from = sortedDates[0];
+  const to = sortedDates[sortedDates.length - 1];
+
+  // Días marcados como no disponibles en el rango
+  const unavailableDaysResult = await sourceQuery(source, userAccountId, UNAVAILABLE_DAYS_IN_RANGE, [userAccountId, from, to]);
+  const unavailableDates = new Set<string>(unavailableDaysResult.rows.map((row: any) => row.date));
+
+  // Franjas horarias disponibles de todos los días laborables del proveedor
+  const slotsResult = await sourceQuery(source, userAccountId, OPEN_SLOTS_BY_PROVIDER, [userAccountId]);
+
+  const openMinutesByDay = new Map<string, number[]>();
+  for (const slot of slotsResult.rows) {
+    const dayMinutes = openMinutesByDay.get(slot.day_of_week) || [];
+    dayMinutes.push(...generateSlotMinutes(slot.start_time.substring(0, 5), slot.end_time.substring(0, 5)));
+    openMinutesByDay.set(slot.day_of_week, dayMinutes);
+  }
+
+  // Citas reservadas en el rango
+  const appointmentsResult = await sourceQuery(source, userAccountId, BOOKED_APPOINTMENTS_IN_RANGE, [userAccountId, from, to]);
+
+  const bookedByDate = new Map<string, number[]>();
+  for (const row of appointmentsResult.rows) {
+    const booked = bookedByDate.get(row.date) || [];
+    booked.push(timeToMinutes(row.appointment_time.substring(0, 5)));
+    bookedByDate.set(row.date, booked);
+  }
+
+  // Verificar si la tabla unavailable_time_frames existe
+  const schema = await getSchemaCapabilities();
+  const hasUnavailableTimeFramesTable = schema.hasTable('unavailable_time_frames');
+
+  // Marcos de tiempo bloqueados en el rango (solo si la tabla existe)
+  const blockedByDate = new Map<string, Set<number>>();
+  if (hasUnavailableTimeFramesTable) {
+    try {
+      const blockedFramesResult = await sourceQuery(source, userAccountId, BLOCKED_FRAMES_IN_RANGE, [userAccountId, from, to]);
+
+      for (const frame of blockedFramesResult.rows) {
+        const startTime = frame.start_time?.substring(0, 5) || '';
+        const endTime = frame.end_time?.substring(0, 5) || '';
+        if (startTime && endTime) {
+          const blocked = blockedByDate.get(frame.date) || new Set<number>();
+          generateSlotMinutes(startTime, endTime).forEach((minutes) => blocked.add(minutes));
+          blockedByDate.set(frame.date, blocked);
+        }
+      }
+    } catch (error: any) {
+      // Si hay un error al consultar la tabla, registrar pero continuar sin bloquear slots
+      apiLogger.warn({ error, userAccountId, from, to }, 'Error querying unavailable_time_frames, skipping blocked slots');
+    }
+  }
+
+  for (const date of dates) {
+    const dayName = getDayNameEnglish(new Date(date).getDay());
+    const dayMinutes = unavailableDates.has(date) ? [] : openMinutesByDay.get(dayName) || [];
+    const blocked = blockedByDate.get(date);
+    const openMinutes = [...new Set(dayMinutes)]
+      .filter((minutes) => !blocked || !blocked.has(minutes))
+      .sort((a, b) => a - b);
+
+    availabilityByDate.set(date, {
+      openMinutes,
+      bookedMinutes: bookedByDate.get(date) || [],
+    });
+  }
+
+  return availabilityByDate;
+}
+
+/**
+ * Sentencia del motor 'sql'
+ *
+ * Para cada fecha pedida expande las franjas de available_slots en slots de
+ * 20 minutos con generate_series, descarta días no laborables y marcos
+ * bloqueados con anti-joins (NOT EXISTS) y agrega las citas programadas.
+ * Los marcos bloquean los slots alineados a su propio inicio, igual que el
+ * motor 'node'.
+ */
+function buildAvailabilitySql(includeTimeFrames: boolean): string {
+  const timeFramesAntiJoin = includeTimeFrames
+    ? `
+        AND NOT EXISTS (
+          SELECT 1 FROM unavailable_time_frames tf
+          WHERE tf.user_account_id = $1
+            AND tf.workday_date = d.slot_date
+            AND m.minute >= (EXTRACT(HOUR FROM tf.start_time) * 60 + EXTRACT(MINUTE FROM tf.start_time))::int
+            AND m.minute < (EXTRACT(HOUR FROM tf.end_time) * 60 + EXTRACT(MINUTE FROM tf.end_time))::int
+            AND (m.minute - (EXTRACT(HOUR FROM tf.start_time) * 60 + EXTRACT(MINUTE FROM tf.start_time))::int) % $3 = 0
+        )`
+    : '';
+
+  return `
+    WITH days AS (
+      SELECT d::date AS slot_date,
+             (ARRAY['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'])[EXTRACT(DOW FROM d)::int + 1] AS day_name
+      FROM unnest($2::date[]) AS d
+    ),
+    open_slots AS (
+      SELECT DISTINCT d.slot_date, m.minute
+      FROM days d
+      JOIN work_schedule ws
+        ON ws.user_account_id = $1
+       AND ws.day_of_week = d.day_name
+       AND ws.is_working_day = true
+      JOIN available_slots s
+        ON s.work_schedule_id = ws.id
+       AND s.is_available = true
+      CROSS JOIN LATERAL generate_series(
+        (EXTRACT(HOUR FROM s.start_time) * 60 + EXTRACT(MINUTE FROM s.start_time))::int,
+        (EXTRACT(HOUR FROM s.end_time) * 60 + EXTRACT(MINUTE FROM s.end_time))::int - 1,
+        $3
+      ) AS m(minute)
+      WHERE NOT EXISTS (
+          SELECT 1 FROM unavailable_days ud
+          WHERE ud.user_account_id = $1 AND ud.unavailable_date = d.slot_date
+        )${timeFramesAntiJoin}
+    )
+    SELECT
+      to_char(d.slot_date, 'YYYY-MM-DD') AS date,
+      COALESCE(
+        (SELECT array_agg(o.minute ORDER BY o.minute) FROM open_slots o WHERE o.slot_date = d.slot_date),
+        '{}'
+      ) AS open_minutes,
+      COALESCE(
+        (SELECT array_agg((EXTRACT(HOUR FROM a.appointment_time) * 60 + EXTRACT(MINUTE FROM a.appointment_time))::int)
+         FROM appointments a
+         WHERE a.user_account_id = $1
+           AND a.appointment_date = d.slot_date
+           AND a.status = 'scheduled'),
+        '{}'
+      ) AS booked_minutes
+    FROM days d
+  `;
+}
+
+/**
+ * Motor 'sql': calcula la disponibilidad de todas las fechas en una sola sentencia
+ *
+ * Si la tabla unavailable_time_frames no existe, la sentencia omite ese anti-join.
+ */
+export async function computeRangeAvailabilitySql(
+  userAccountId: number,
+  dates: string[],
+  source: AvailabilitySource = 'replica'
+): Promise<Map<string, DayAvailability>> {
+  const availabilityByDate = new Map<string, DayAvailability>();
+  if (dates.length === 0) {
+    return availabilityByDate;
+  }
+
+  const schema = await getSchemaCapabilities();
+  const result = await sourceQuery(
+    source,
+    userAccountId,
+    defineStatement('availability_range_sql', buildAvailabilitySql(schema.hasTable('unavailable_time_frames'))),
+    [userAccountId, dates, SLOT_DURATION_MINUTES]
+  );
+
+  for (const row of result.rows) {
+    availabilityByDate.set(row.date, {
+      openMinutes: row.open_minutes || [],
+      bookedMinutes: row.booked_minutes || [],
+    });
+  }
+
+  return availabilityByDate;
+}
+
+/**
+ * Calcula la disponibilidad de un día consultando las tablas de origen
+ */
+export async function computeDayAvailability(
+  userAccountId: number,
+  date: string,
+  source: AvailabilitySource = 'replica'
+): Promise<DayAvailability> {
+  const availabilityByDate = await computeRangeAvailability(userAccountId, [date], availabilityEngine, source);
+  return availabilityByDate.get(date)!;
+}
+
+/**
+ * Lee la disponibilidad de un día desde el índice
+ *
+ * Siempre del primario: reservas y cancelaciones actualizan la fila ahí, y
+ * una fila leída de una réplica atrasada quedaría guardada en el caché
+ * compartido por varios minutos. Es una lectura por clave primaria.
+ *
+ * @returns Disponibilidad indexada, o null si no hay fila vigente
+ */
+export async function readAvailabilityIndex(
+  userAccountId: number,
+  date: string
+): Promise<DayAvailability | null> {
+  const result = await query(READ_AVAILABILITY_INDEX, [userAccountId, date, INDEX_MAX_AGE_SECONDS]);
+
+  if (result.rows.length === 0) {
+    return null;
+  }
+
+  return {
+    openMinutes: result.rows[0].open_minutes || [],
+    bookedMinutes: result.rows[0].booked_minutes || [],
+  };
+}
+
+/**
+ * Ejecuta escrituras del índice de un proveedor bajo su advisory lock
+ *
+ * El lock se toma en una sentencia propia: las siguientes de la transacción
+ * ya ven todo lo confirmado mientras se esperaba el lock.
+ */
+async function withIndexLock<T>(userAccountId: number, run: (client: PoolClient) => Promise<T>): Promise<T> {
+  return withTransaction(async (client) => {
+    await query(LOCK_PROVIDER_INDEX, [INDEX_LOCK_NAMESPACE, userAccountId], client);
+    return run(client);
+  });
+}
+
+/**
+ * Guarda (o reemplaza) la disponibilidad de uno o más días en el índice
+ *
+ * Solo se usa openMinutes: booked_minutes se vuelve a leer de appointments
+ * al escribir, para no persistir reservas calculadas antes de tomar el lock.
+ *
+ * @returns booked_minutes guardado por fecha
+ */
+export async function writeAvailabilityIndex(
+  userAccountId: number,
+  availabilityByDate: Map<string, DayAvailability>
+): Promise<Map<string, number[]>> {
+  const dates = [...availabilityByDate.keys()];
+  const openMinutes = dates.map((date) => `{${availabilityByDate.get(date)!.openMinutes.join(',')}}`);
+
+  const result = await withIndexLock(userAccountId, (client) =>
+    query(WRITE_AVAILABILITY_INDEX, [userAccountId, dates, openMinutes], client)
+  );
+
+  return new Map(result.rows.map((row: any) => [row.date, row.booked_minutes || []]));
+}
+
+/**
+ * Lee la disponibilidad de un rango de días desde el índice (del primario,
+ * igual que readAvailabilityIndex)
+ *
+ * @returns Disponibilidad por fecha, solo para las fechas con fila vigente
+ */
+export async function readAvailabilityIndexRange(
+  userAccountId: number,
+  from: string,
+  to: string
+): Promise<Map<string, DayAvailability>> {
+  const result = await query(READ_AVAILABILITY_INDEX_RANGE, [userAccountId, from, to, INDEX_MAX_AGE_SECONDS]);
+
+  const availabilityByDate = new Map<string, DayAvailability>();
+  for (const row of result.rows) {
+    availabilityByDate.set(row.date, {
+      openMinutes: row.open_minutes || [],
+      bookedMinutes: row.booked_minutes || [],
+    });
+  }
+
+  return availabilityByDate;
+}
+
+/**
+ * Obtiene la disponibilidad de un día usando el índice
+ *
+ * Si no hay fila vigente, la recalcula desde las tablas de origen y la guarda.
+ * Si la tabla del índice no existe (según el registro de esquema), calcula directamente.
+ */
+export async function getDayAvailability(
+  userAccountId: number,
+  date: string
+): Promise<DayAvailability> {
+  const schema = await getSchemaCapabilities();
+  if (!schema.hasTable('availability_index')) {
+    // El resultado se guarda en el caché compartido: no leer de la réplica
+    return await computeDayAvailability(userAccountId, date, 'primary');
+  }
+
+  const indexed = await readAvailabilityIndex(userAccountId, date);
+  if (indexed) {
+    return indexed;
+  }
+
+  const availability = await computeDayAvailability(userAccountId, date, 'primary');
+
+  try {
+    const bookedByDate = await writeAvailabilityIndex(userAccountId, new Map([[date, availability]]));
+    return { ...availability, bookedMinutes: bookedByDate.get(date) ?? availability.bookedMinutes };
+  } catch (error: any) {
+    // El índice es derivado: si no se puede guardar, igual devolvemos el cálculo
+    apiLogger.warn({ error, userAccountId, date }, 'Error writing availability_index');
+  }
+
+  return availability;
+}
+
+/**
+ * Calcula horarios disponibles para una fecha y proveedor
+ *
+ * @param userAccountId ID del proveedor
+ * @param date Fecha en formato YYYY-MM-DD
+ * @returns Horarios libres en formato HH:MM, ordenados
+ * @throws Error si el formato de fecha es inválido
+ */
+export async function calculateAvailableTimes(userAccountId: number, date: string): Promise<string[]> {
+  if (isPastDate(date)) {
+    return []; // Fecha pasada, no hay horarios disponibles
+  }
+
+  const availability = await getDayAvailability(userAccountId, date);
+  return freeSlotsFromAvailability(availability);
+}
+
+/**
+ * Calcula horarios disponibles para varias fechas de un proveedor
+ *
+ * Lee el índice para todo el rango en una consulta y recalcula solo las
+ * fechas faltantes, con consultas por rango.
+ *
+ * @param dates Fechas YYYY-MM-DD (ver listDatesInRange)
+ * @returns Horarios libres por fecha; las fechas pasadas devuelven []
+ */
+export async function calculateAvailableTimesForDates(
+  userAccountId: number,
+  dates: string[]
+): Promise<Record<string, string[]>> {
+  const timesByDate: Record<string, string[]> = {};
+  const pendingDates: string[] = [];
+
+  for (const date of dates) {
+    if (isPastDate(date)) {
+      timesByDate[date] = [];
+    } else {
+      pendingDates.push(date);
+    }
+  }
+
+  if (pendingDates.length === 0) {
+    return timesByDate;
+  }
+
+  const sortedDates = [...pendingDates].sort();
+  const schema = await getSchemaCapabilities();
+  const indexAvailable = schema.hasTable('availability_index');
+  const indexed = indexAvailable
+    ? await readAvailabilityIndexRange(userAccountId, sortedDates[0], sortedDates[sortedDates.length - 1])
+    : new Map<string, DayAvailability>();
+
+  const missingDates = pendingDates.filter((date) => !indexed.has(date));
+  // Del primario: lo calculado va al índice o, sin índice, al caché compartido
+  const computed = await computeRangeAvailability(userAccountId, missingDates, availabilityEngine, 'primary');
+
+  if (indexAvailable && computed.size > 0) {
+    try {
+      const bookedByDate = await writeAvailabilityIndex(userAccountId, computed);
+      for (const [date, bookedMinutes] of bookedByDate) {
+        computed.set(date, { ...computed.get(date)!, bookedMinutes });
+      }
+    } catch (error: any) {
+      apiLogger.warn({ error, userAccountId, dates: missingDates }, 'Error writing availability_index');
+    }
+  }
+
+  for (const date of pendingDates) {
+    const availability = indexed.get(date) || computed.get(date)!;
+    timesByDate[date] = freeSlotsFromAvailability(availability);
+  }
+
+  return timesByDate;
+}
+
+/**
+ * Ejecuta una actualización del índice sin propagar errores
+ *
+ * El índice es derivado: si falla, la fila queda desactualizada hasta que
+ * expire o se invalide, pero la operación principal no debe fallar.
+ */
+async function updateIndexSafely(
+  operation: string,
+  context: { userAccountId: number } & Record<string, unknown>,
+  statement: PreparedStatement,
+  params: any[]
+): Promise<void> {
+  try {
+    await withIndexLock(context.userAccountId, (client) => query(statement, params, client));
+  } catch (error: any) {
+    if (isMissingIndexTable(error)) {
+      return;
+    }
+    apiLogger.warn({ error, ...context }, `Error updating availability_index (${operation})`);
+  }
+}
+
+/**
+ * Marca un slot como reservado en el índice (al crear una cita)
+ *
+ * @param time Hora en formato HH:MM o HH:MM:SS
+ */
+export async function markSlotBooked(
+  userAccountId: number,
+  date: string,
+  time: string
+): Promise<void> {
+  const minutes = timeToMinutes(time);
+  await updateIndexSafely(
+    'book',
+    { userAccountId, date, time },
+    MARK_SLOT_BOOKED,
+    [userAccountId, date, minutes]
+  );
+}
+
+/**
+ * Libera un slot reservado en el índice (al cancelar una cita)
+ *
+ * @param time Hora en formato HH:MM o HH:MM:SS
+ */
+export async function markSlotReleased(
+  userAccountId: number,
+  date: string,
+  time: string
+): Promise<void> {
+  const minutes = timeToMinutes(time);
+  await updateIndexSafely(
+    'release',
+    { userAccountId, date, time },
+    MARK_SLOT_RELEASED,
+    [userAccountId, date, minutes]
+  );
+}
+
+/**
+ * Marca un día completo como no disponible en el índice
+ */
+export async function markDayUnavailable(userAccountId: number, date: string): Promise<void> {
+  await updateIndexSafely(
+    'unavailable_day',
+    { userAccountId, date },
+    MARK_DAY_UNAVAILABLE,
+    [userAccountId, date]
+  );
+}
+
+/**
+ * Descarta filas del índice para que se reconstruyan en la próxima lectura
+ *
+ * Se llama cuando cambian horarios de trabajo, franjas o días no laborables.
+ *
+ * @param userAccountId ID del proveedor
+ * @param date Fecha puntual (opcional). Sin fecha, descarta todos los días del proveedor.
+ */
+export async function invalidateAvailabilityIndex(
+  userAccountId: number,
+  date?: string
+): Promise<void> {
+  if (date) {
+    await updateIndexSafely(
+      'invalidate_date',
+      { userAccountId, date },
+      INVALIDATE_INDEX_DATE,
+      [userAccountId, date]
+    );
+    return;
+  }
+
+  await updateIndexSafely(
+    'invalidate_provider',
+    { userAccountId },
+    INVALIDATE_INDEX_PROVIDER,
+    [userAccountId]
+  );
+}
@@ -5,9 +5,20 @@
  * consultas frecuentes a la base de datos.
  * 
  * Estrategias:
- * - Redis (producción) - recomendado
+ * - Redis (producción) - recomendado, con un caché L1 en memoria delante
  * - In-memory cache (desarrollo) - fallback
  * 
+ * Invalidación por generaciones:
+ * Cada clave pertenece a un namespace formado por sus dos primeros segmentos
+ * (ej: 'available_times:123:2025-01-15' -> 'available_times:123'). Cada namespace
+ * tiene un contador de generación en Redis y las entradas guardan la generación
+ * con la que se escribieron. Invalidar un namespace es un INCR del contador:
+ * las entradas anteriores dejan de ser válidas sin recorrer el keyspace.
+ * 
+ * El L1 guarda las entradas leídas de Redis y los contadores por
+ * GENERATION_CHECK_MS; una invalidación hecha en otra instancia se ve
+ * como máximo después de ese intervalo.
+ * 
  * Dependencias requeridas:
  * npm install @upstash/redis
  * 
@@ -17,18 +28,233 @@
 
 import { Redis } from '@upstash/redis';
 import { LRUCache } from 'lru-cache';
+import { incrementCounter } from './metrics';
 
 // Configuración de Redis para caché
 const redis = process.env.UPSTASH_REDIS_REST_URL && process.env.UPSTASH_REDIS_REST_TOKEN
   ? Redis.fromEnv()
   : null;
 
+/**
+ * Entrada tal como se guarda: generación del namespace + valor
+ */
+interface StoredCacheEntry {
+  g: number;
+  v: unknown;
+}
+
 // Caché en memoria como fallback (solo desarrollo)
-const memoryCache = new LRUCache<string, any>({
+const memoryCache = new LRUCache<string, StoredCacheEntry>({
   max: 500, // Máximo 500 entradas
   ttl: 1000 * 60 * 5, // 5 minutos por defecto
 });
 
+// Caché L1 en memoria delante de Redis
+const L1_TTL_MS = 30 * 1000;
+const l1Cache = new LRUCache<string, StoredCacheEntry>({
+  max: 2000,
+  ttl: L1_TTL_MS,
+});
+
+// Cada cuánto se vuelve a leer de Redis el contador de un namespace
+const GENERATION_CHECK_MS = 1000;
+const localGenerations = new Map<string, { value: number; checkedAt: number }>();
+
+/**
+ * Namespace de una clave: sus dos primeros segmentos
+ */
+export function cacheNamespace(key: string): string {
+  return key.split(':').slice(0, 2).join(':');
+}
+
+const generationKey = (namespace: string) => `gen:${namespace}`;
+
+function isStoredCacheEntry(value: unknown): value is StoredCacheEntry {
+  return typeof value === 'object' && value !== null && typeof (value as any).g === 'number' && 'v' in value;
+}
+
+/**
+ * Generación conocida localmente, si todavía es reciente
+ */
+function knownGeneration(namespace: string): number | undefined {
+  if (!redis) {
+    return localGenerations.get(namespace)?.value ?? 0;
+  }
+  const local = localGenerations.get(namespace);
+  if (local && Date.now() - local.checkedAt < GENERATION_CHECK_MS) {
+    return local.value;
+  }
+  return undefined;
+}
+
+function rememberGeneration(namespace: string, value: number): void {
+  localGenerations.set(namespace, { value, checkedAt: Date.now() });
+}
+
+/**
+ * Obtiene la generación actual de un namespace
+ */
+async function getGeneration(namespace: string): Promise<number> {
+  const known = knownGeneration(namespace);
+  if (known !== undefined) return known;
+
+  const value = Number((await redis!.get<number | string>(generationKey(namespace))) ?? 0);
+  rememberGeneration(namespace, value);
+  return value;
+}
+
+/**
+ * Generación actual de un namespace, compartida entre instancias vía Redis
+ *
+ * Sirve como número de versión para estado que vive fuera del caché (ej:
+ * los datos de referencia en memoria): quien escribe llama a
+ * invalidateCacheNamespace() y las demás instancias ven el cambio en
+ * GENERATION_CHECK_MS como máximo.
+ *
+ * @returns Generación, o null si Redis no responde
+ */
+export async function getCacheGeneration(namespace: string): Promise<number | null> {
+  try {
+    return await getGeneration(namespace);
+  } catch (error) {
+    console.error('Cache generation read error:', error);
+    return null;
+  }
+}
+
+/**
+ * Invalida todas las claves de un namespace en O(1)
+ * 
+ * @param namespace Namespace (ej: 'available_times:123')
+ * 
+ * @example
+ * ```typescript
+ * await invalidateCacheNamespace(cacheNamespace(cacheKeys.healthInsurance()));
+ * ```
+ */
+export async function invalidateCacheNamespace(namespace: string): Promise<void> {
+  try {
+    if (redis) {
+      const value = await redis.incr(generationKey(namespace));
+      rememberGeneration(namespace, value);
+    } else {
+      rememberGeneration(namespace, (localGenerations.get(namespace)?.value ?? 0) + 1);
+    }
+  } catch (error) {
+    console.error('Cache namespace invalidation error:', error);
+  }
+}
+
+/**
+ * Cuenta una lectura para las métricas de hit ratio
+ * 
+ * @param layer Dónde se resolvió: 'l1', 'redis' o 'memory' (sin Redis)
+ */
+function recordCacheLookup(key: string, layer: 'l1' | 'redis' | 'memory', hit: boolean): void {
+  incrementCounter('cache_requests_total', 'Lecturas del caché por tipo de clave, capa y resultado', {
+    kind: key.split(':')[0],
+    layer,
+    result: hit ? 'hit' : 'miss',
+  });
+}
+
+/**
+ * Lee el valor guardado para una clave, validado contra la generación
+ * 
+ * @returns Valor crudo (null si no existe o es de una generación anterior)
+ * y la generación vigente, para que quien recalcule escriba con ella
+ */
+async function readStoredValue(key: string): Promise<{ raw: unknown; generation: number }> {
+  const namespace = cacheNamespace(key);
+
+  if (!redis) {
+    const generation = knownGeneration(namespace)!;
+    const stored = memoryCache.get(key);
+    const hit = Boolean(stored && stored.g === generation);
+    recordCacheLookup(key, 'memory', hit);
+    return { raw: hit ? stored!.v : null, generation };
+  }
+
+  let generation = knownGeneration(namespace);
+  let stored: unknown;
+
+  if (generation !== undefined) {
+    const l1 = l1Cache.get(key);
+    if (l1 && l1.g === generation) {
+      recordCacheLookup(key, 'l1', true);
+      return { raw: l1.v, generation };
+    }
+    stored = parseRedisValue<unknown>(await redis.get(key));
+  } else {
+    // Contador y valor en una sola operación
+    const [generationRaw, storedRaw] = await redis.mget<unknown[]>(generationKey(namespace), key);
+    generation = Number(generationRaw ?? 0);
+    rememberGeneration(namespace, generation);
+    stored = parseRedisValue<unknown>(storedRaw);
+  }
+
+  if (isStoredCacheEntry(stored) && stored.g === generation) {
+    l1Cache.set(key, stored);
+    recordCacheLookup(key, 'redis', true);
+    return { raw: stored.v, generation };
+  }
+
+  recordCacheLookup(key, 'redis', false);
+  return { raw: null, generation };
+}
+
+/**
+ * Entrada con expiración suave (stale-while-revalidate)
+ * 
+ * La clave vive en el caché hasta el TTL duro; a partir de staleAt
+ * el valor se considera viejo y getOrSetCache lo recalcula en segundo plano.
+ */
+interface SoftCacheEntry<T> {
+  __soft: true;
+  value: T;
+  staleAt: number;
+}
+
+function isSoftCacheEntry(value: unknown): value is SoftCacheEntry<unknown> {
+  return typeof value === 'object' && value !== null && (value as any).__soft === true;
+}
+
+/**
+ * Lee una entrada del caché sin desempaquetar
+ * 
+ * @returns Valor y momento en que pasa a ser viejo (null si no tiene TTL suave),
+ * junto con la generación vigente del namespace
+ */
+async function readCacheEntry<T>(key: string): Promise<{
+  entry: { value: T; staleAt: number | null } | null;
+  generation: number | null;
+}> {
+  try {
+    const { raw, generation } = await readStoredValue(key);
+    return { entry: unwrapCacheEntry<T>(raw), generation };
+  } catch (error) {
+    console.error('Cache get error:', error);
+    return { entry: null, generation: null };
+  }
+}
+
+function unwrapCacheEntry<T>(raw: unknown): { value: T; staleAt: number | null } | null {
+  if (raw === null || raw === undefined) return null;
+  if (isSoftCacheEntry(raw)) {
+    return { value: raw.value as T, staleAt: raw.staleAt };
+  }
+  return { value: raw as T, staleAt: null };
+}
+
+/**
+ * Valor de una entrada si todavía está fresca (null si no existe o pasó su TTL suave)
+ */
+function freshValue<T>(raw: unknown): T | null {
+  const entry = unwrapCacheEntry<T>(raw);
+  if (!entry || (entry.staleAt !== null && Date.now() >= entry.staleAt)) return null;
+  return entry.value;
+}
+
 /**
  * Obtiene un valor del caché
  * 
@@ -42,34 +268,140 @@ const memoryCache = new LRUCache<string, any>({
  * ```
  */
 export async function getCache<T>(key: string): Promise<T | null> {
+  const { entry } = await readCacheEntry<T>(key);
+  return entry ? entry.value : null;
+}
+
+/**
+ * Obtiene varios valores del caché en una sola operación
+ * 
+ * Las claves que están en L1 con generación vigente no van a Redis;
+ * el resto y los contadores desconocidos se leen con un solo MGET.
+ * Las entradas con TTL suave vencido cuentan como faltantes: quien llama
+ * las recalcula (y las guarda con setComputedCache).
+ * 
+ * @param keys Claves del caché
+ * @returns Valores en el mismo orden que keys (null si no existe o está vieja)
+ * 
+ * @example
+ * ```typescript
+ * const [monday, tuesday] = await getManyCache<string[]>([
+ *   cacheKeys.availableTimes(123, '2025-01-13'),
+ *   cacheKeys.availableTimes(123, '2025-01-14'),
+ * ]);
+ * ```
+ */
+export async function getManyCache<T>(keys: string[]): Promise<(T | null)[]> {
+  if (keys.length === 0) return [];
+
   try {
-    if (redis) {
-      const value = await redis.get(key);
-      if (value === null || value === undefined) return null;
-      
-      // Upstash Redis puede devolver string o ya parseado
-      // Si es string, parsearlo; si ya es objeto, devolverlo directamente
-      if (typeof value === 'string') {
-        try {
-          return JSON.parse(value) as T;
-        } catch (parseError) {
-          // Si no es JSON válido, podría ser un string directo
-          const valuePreview = value.substring(0, 100);
-          console.error('Cache parse error:', parseError, 'Value:', valuePreview);
-          return null;
-        }
+    if (!redis) {
+      return await Promise.all(
+        keys.map(async (key) => freshValue<T>((await readStoredValue(key)).raw))
+      );
+    }
+
+    const results: (T | null)[] = keys.map(() => null);
+    const unknownNamespaces = [...new Set(keys.map(cacheNamespace))].filter(
+      (namespace) => knownGeneration(namespace) === undefined
+    );
+
+    // Resolver desde L1 lo que se pueda validar sin ir a Redis
+    const pendingIndexes: number[] = [];
+    keys.forEach((key, i) => {
+      const generation = knownGeneration(cacheNamespace(key));
+      const l1 = generation !== undefined ? l1Cache.get(key) : undefined;
+      if (l1 && l1.g === generation) {
+        recordCacheLookup(key, 'l1', true);
+        results[i] = freshValue<T>(l1.v);
       } else {
-        // Ya es un objeto (Upstash puede devolver objetos directamente)
-        return value as T;
+        pendingIndexes.push(i);
       }
-    } else {
-      // Fallback a memoria - LRU cache devuelve el objeto directamente
-      const value = memoryCache.get(key);
-      return value as T | null;
+    });
+
+    if (pendingIndexes.length === 0) {
+      return results;
     }
+
+    const values = await redis.mget<unknown[]>(
+      ...unknownNamespaces.map(generationKey),
+      ...pendingIndexes.map((i) => keys[i])
+    );
+
+    unknownNamespaces.forEach((namespace, i) => {
+      rememberGeneration(namespace, Number(values[i] ?? 0));
+    });
+
+    pendingIndexes.forEach((keyIndex, i) => {
+      const stored = parseRedisValue<unknown>(values[unknownNamespaces.length + i]);
+      const generation = knownGeneration(cacheNamespace(keys[keyIndex]));
+      const hit = isStoredCacheEntry(stored) && stored.g === generation;
+      recordCacheLookup(keys[keyIndex], 'redis', hit);
+      if (hit) {
+        l1Cache.set(keys[keyIndex], stored);
+        results[keyIndex] = freshValue<T>(stored.v);
+      }
+    });
+
+    return results;
   } catch (error) {
-    console.error('Cache get error:', error);
-    return null;
+    console.error('Cache mget error:', error);
+    return keys.map(() => null);
+  }
+}
+
+/**
+ * Normaliza un valor leído de Redis
+ * 
+ * Upstash Redis puede devolver string o ya parseado:
+ * si es string, parsearlo; si ya es objeto, devolverlo directamente.
+ */
+function parseRedisValue<T>(value: unknown): T | null {
+  if (value === null || value === undefined) return null;
+
+  if (typeof value === 'string') {
+    try {
+      return JSON.parse(value) as T;
+    } catch (parseError) {
+      // Si no es JSON válido, podría ser un string directo
+      const valuePreview = value.substring(0, 100);
+      console.error('Cache parse error:', parseError, 'Value:', valuePreview);
+      return null;
+    }
+  }
+
+  // Ya es un objeto (Upstash puede devolver objetos directamente)
+  return value as T;
+}
+
+/**
+ * Guarda un valor con la generación indicada (o la vigente)
+ */
+async function writeCacheEntry(
+  key: string,
+  value: unknown,
+  ttlSeconds: number,
+  generation: number | null = null
+): Promise<void> {
+  const g = generation ?? (await getGeneration(cacheNamespace(key)));
+
+  if (redis) {
+    const stored: StoredCacheEntry = { g, v: value };
+    // Redis necesita string JSON - asegurarse de serializar correctamente
+    await redis.setex(key, ttlSeconds, JSON.stringify(stored));
+    l1Cache.set(key, stored, { ttl: Math.min(L1_TTL_MS, ttlSeconds * 1000) });
+  } else {
+    // Fallback a memoria - LRU cache puede guardar objetos directamente
+    // Pero para consistencia, guardamos una copia serializada/deserializada
+    let copy: unknown;
+    try {
+      // Serializar y deserializar para asegurar consistencia
+      copy = JSON.parse(JSON.stringify(value));
+    } catch (serializeError) {
+      // Si falla la serialización, guardar directamente (para objetos complejos)
+      copy = value;
+    }
+    memoryCache.set(key, { g, v: copy }, { ttl: ttlSeconds * 1000 });
   }
 }
 
@@ -91,22 +423,7 @@ export async function setCache<T>(
   ttlSeconds: number = 300
 ): Promise<void> {
   try {
-    if (redis) {
-      // Redis necesita string JSON - asegurarse de serializar correctamente
-      const serialized = JSON.stringify(value);
-      await redis.setex(key, ttlSeconds, serialized);
-    } else {
-      // Fallback a memoria - LRU cache puede guardar objetos directamente
-      // Pero para consistencia, guardamos una copia serializada/deserializada
-      try {
-        // Serializar y deserializar para asegurar consistencia
-        const serialized = JSON.parse(JSON.stringify(value));
-        memoryCache.set(key, serialized, { ttl: ttlSeconds * 1000 });
-      } catch (serializeError) {
-        // Si falla la serialización, guardar directamente (para objetos complejos)
-        memoryCache.set(key, value, { ttl: ttlSeconds * 1000 });
-      }
-    }
+    await writeCacheEntry(key, value, ttlSeconds);
   } catch (error) {
     console.error('Cache set error:', error);
     // No lanzar error, solo loguear
@@ -116,11 +433,17 @@ export async function setCache<T>(
 /**
  * Elimina una clave del caché
  * 
+ * Además invalida su namespace, para que las copias en L1 de otras
+ * instancias también dejen de servirse.
+ * 
  * @param key Clave a eliminar
  */
 export async function deleteCache(key: string): Promise<void> {
+  await invalidateCacheNamespace(cacheNamespace(key));
+
   try {
     if (redis) {
+      l1Cache.delete(key);
       await redis.del(key);
     } else {
       memoryCache.delete(key);
@@ -133,9 +456,18 @@ export async function deleteCache(key: string): Promise<void> {
 /**
  * Elimina múltiples claves del caché que coinciden con un patrón
  * 
- * @param pattern Patrón de claves a eliminar (ej: 'available_times:*')
+ * Los patrones de la forma '<tipo>:<id>:*' se resuelven invalidando el
+ * namespace (un INCR). Otros patrones recorren el keyspace con SCAN.
+ * 
+ * @param pattern Patrón de claves a eliminar (ej: 'available_times:123:*')
  */
 export async function deleteCachePattern(pattern: string): Promise<void> {
+  const namespaceMatch = /^([^:*]+:[^:*]+):\*$/.exec(pattern);
+  if (namespaceMatch) {
+    await invalidateCacheNamespace(namespaceMatch[1]);
+    return;
+  }
+
   try {
     if (redis) {
       // Redis SCAN para encontrar claves que coinciden
@@ -150,6 +482,7 @@ export async function deleteCachePattern(pattern: string): Promise<void> {
       } while (cursor !== 0 && String(cursor) !== '0');
       
       if (keys.length > 0) {
+        keys.forEach((key) => l1Cache.delete(key));
         await redis.del(...keys);
       }
     } else {
@@ -165,14 +498,209 @@ export async function deleteCachePattern(pattern: string): Promise<void> {
   }
 }
 
+/**
+ * Opciones de expiración para getOrSetCache
+ */
+export interface CacheOptions {
+  // TTL suave: mientras no venza, el valor se sirve como fresco
+  softTtlSeconds: number;
+  // TTL duro: hasta este vencimiento el valor viejo se sirve mientras se recalcula.
+  // Default: igual al suave (sin stale-while-revalidate)
+  hardTtlSeconds?: number;
+  // Usar un lock en Redis para que un solo proceso recalcule la clave
+  distributedLock?: boolean;
+}
+
+// Cálculos en curso por clave (coalescing dentro del proceso)
+const inFlight = new Map<string, Promise<unknown>>();
+
+// Lock distribuido: duración máxima y espera de los procesos que no lo obtienen
+const LOCK_TTL_MS = 10000;
+const LOCK_WAIT_MS = 3000;
+const LOCK_POLL_MS = 100;
+
+const lockKey = (key: string) => `lock:${key}`;
+
+/**
+ * Intenta tomar el lock distribuido de una clave
+ * 
+ * @returns Token del lock, o null si otro proceso lo tiene
+ */
+async function acquireCacheLock(key: string): Promise<string | null> {
+  if (!redis) return globalThis.crypto.randomUUID();
+
+  const token = globalThis.crypto.randomUUID();
+  const result = await redis.set(lockKey(key), token, { nx: true, px: LOCK_TTL_MS });
+  return result === 'OK' ? token : null;
+}
+
+/**
+ * Libera el lock solo si sigue siendo nuestro
+ */
+async function releaseCacheLock(key: string, token: string): Promise<void> {
+  if (!redis) return;
+
+  try {
+    await redis.eval(
+      "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end",
+      [lockKey(key)],
+      [token]
+    );
+  } catch (error) {
+    console.error('Cache lock release error:', error);
+  }
+}
+
+/**
+ * Ejecuta run una sola vez por clave dentro del proceso;
+ * los llamados concurrentes reciben la misma promesa.
+ */
+function singleFlight<T>(key: string, run: () => Promise<T>): Promise<T> {
+  const existing = inFlight.get(key);
+  if (existing) return existing as Promise<T>;
+
+  const promise = run().finally(() => inFlight.delete(key));
+  inFlight.set(key, promise);
+  return promise;
+}
+
+/**
+ * Guarda un valor con TTL suave y duro
+ */
+async function storeCacheEntry<T>(
+  key: string,
+  value: T,
+  softTtlSeconds: number,
+  hardTtlSeconds: number,
+  generation: number | null
+): Promise<void> {
+  if (hardTtlSeconds > softTtlSeconds) {
+    const entry: SoftCacheEntry<T> = {
+      __soft: true,
+      value,
+      staleAt: Date.now() + softTtlSeconds * 1000,
+    };
+    await writeCacheEntry(key, entry, hardTtlSeconds, generation);
+  } else {
+    await writeCacheEntry(key, value, softTtlSeconds, generation);
+  }
+}
+
+/**
+ * Guarda un valor calculado fuera de getOrSetCache, con su mismo formato
+ * 
+ * Para rutas que calculan varias claves en lote (ej: /api/available-times)
+ * y no pueden pasar por getOrSetCache clave por clave.
+ * 
+ * @param generation Generación del namespace leída con getCacheGeneration
+ * ANTES de calcular: si se invalidó mientras tanto (una reserva, por ejemplo),
+ * el valor queda con la generación vieja y no se sirve. Con null no se guarda.
+ * 
+ * @example
+ * ```typescript
+ * const generation = await getCacheGeneration(cacheNamespace(key));
+ * const value = await compute();
+ * await setComputedCache(key, value, AVAILABLE_TIMES_CACHE_OPTIONS, generation);
+ * ```
+ */
+export async function setComputedCache<T>(
+  key: string,
+  value: T,
+  options: CacheOptions,
+  generation: number | null
+): Promise<void> {
+  if (generation === null) return;
+
+  try {
+    await storeCacheEntry(
+      key,
+      value,
+      options.softTtlSeconds,
+      Math.max(options.hardTtlSeconds ?? options.softTtlSeconds, options.softTtlSeconds),
+      generation
+    );
+  } catch (error) {
+    console.error('Cache set error:', error);
+  }
+}
+
+/**
+ * Recalcula una clave, coordinando con otros procesos si se pidió lock
+ * 
+ * @param generation Generación leída antes de calcular: si el namespace se
+ * invalida mientras tanto, el resultado se guarda con la generación vieja y no se sirve
+ * @param staleValue Valor viejo disponible (si hay); si otro proceso tiene
+ * el lock se devuelve este valor en lugar de esperar
+ */
+async function recomputeCacheEntry<T>(
+  key: string,
+  fetchFn: () => Promise<T>,
+  softTtlSeconds: number,
+  hardTtlSeconds: number,
+  distributedLock: boolean,
+  generation: number | null,
+  staleValue?: { value: T }
+): Promise<T> {
+  if (!distributedLock || !redis) {
+    const value = await fetchFn();
+    
+    // Almacenar en caché de forma asíncrona (no bloquear respuesta)
+    setImmediate(async () => {
+      try {
+        await storeCacheEntry(key, value, softTtlSeconds, hardTtlSeconds, generation);
+      } catch (cacheError) {
+        // Si falla el caché, solo loguear (no crítico)
+        console.error('Cache set error (non-critical):', cacheError);
+      }
+    });
+    
+    return value;
+  }
+
+  const token = await acquireCacheLock(key);
+  if (token) {
+    try {
+      const value = await fetchFn();
+      // Guardar antes de liberar el lock para que los demás procesos lo lean
+      await storeCacheEntry(key, value, softTtlSeconds, hardTtlSeconds, generation);
+      return value;
+    } finally {
+      await releaseCacheLock(key, token);
+    }
+  }
+
+  // Otro proceso está recalculando
+  if (staleValue) {
+    return staleValue.value;
+  }
+
+  // Sin valor viejo: esperar a que el otro proceso guarde el resultado
+  const deadline = Date.now() + LOCK_WAIT_MS;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, LOCK_POLL_MS));
+    const { entry } = await readCacheEntry<T>(key);
+    if (entry) {
+      return entry.value;
+    }
+  }
+
+  // El otro proceso no terminó a tiempo: calcular sin guardar encima
+  return await fetchFn();
+}
+
 /**
  * Obtiene o establece un valor en caché (patrón cache-aside)
  * 
  * Si el valor no está en caché, ejecuta la función y almacena el resultado.
+ * Protección contra estampidas:
+ * - Requests concurrentes de la misma clave en el proceso comparten un solo fetchFn
+ * - Con hardTtlSeconds > softTtlSeconds, un valor viejo se sirve mientras
+ *   un solo llamado lo recalcula en segundo plano (stale-while-revalidate)
+ * - Con distributedLock (y Redis), un solo proceso recalcula la clave
  * 
  * @param key Clave del caché
  * @param fetchFn Función que obtiene el valor si no está en caché
- * @param ttlSeconds TTL en segundos (default: 300)
+ * @param ttl TTL en segundos (default: 300) u opciones de expiración
  * @returns Valor del caché o resultado de fetchFn
  * 
  * @example
@@ -183,36 +711,43 @@ export async function deleteCachePattern(pattern: string): Promise<void> {
  *     // Consulta a BD si no está en caché
  *     return await getAvailableTimesFromDB(userAccountId, date);
  *   },
- *   300 // 5 minutos
+ *   { softTtlSeconds: 300, hardTtlSeconds: 900, distributedLock: true }
  * );
  * ```
  */
 export async function getOrSetCache<T>(
   key: string,
   fetchFn: () => Promise<T>,
-  ttlSeconds: number = 300
+  ttl: number | CacheOptions = 300
 ): Promise<T> {
+  const options: CacheOptions = typeof ttl === 'number' ? { softTtlSeconds: ttl } : ttl;
+  const softTtlSeconds = options.softTtlSeconds;
+  const hardTtlSeconds = Math.max(options.hardTtlSeconds ?? softTtlSeconds, softTtlSeconds);
+  const distributedLock = options.distributedLock ?? false;
+
   try {
     // Intentar obtener del caché
-    const cached = await getCache<T>(key);
-    if (cached !== null && cached !== undefined) {
-      return cached;
-    }
+    const { entry: cached, generation } = await readCacheEntry<T>(key);
 
-    // Si no está en caché, ejecutar función y almacenar
-    const value = await fetchFn();
-    
-    // Almacenar en caché de forma asíncrona (no bloquear respuesta)
-    setImmediate(async () => {
-      try {
-        await setCache(key, value, ttlSeconds);
-      } catch (cacheError) {
-        // Si falla el caché, solo loguear (no crítico)
-        console.error('Cache set error (non-critical):', cacheError);
+    if (cached) {
+      if (cached.staleAt === null || Date.now() < cached.staleAt) {
+        return cached.value;
       }
-    });
-    
-    return value;
+
+      // Valor viejo: servirlo y recalcular en segundo plano (una sola vez)
+      singleFlight(key, () =>
+        recomputeCacheEntry(key, fetchFn, softTtlSeconds, hardTtlSeconds, distributedLock, generation, { value: cached.value })
+      ).catch((refreshError) => {
+        console.error('Cache background refresh error:', refreshError);
+      });
+
+      return cached.value;
+    }
+
+    // Si no está en caché, calcular una sola vez por clave
+    return await singleFlight(key, () =>
+      recomputeCacheEntry(key, fetchFn, softTtlSeconds, hardTtlSeconds, distributedLock, generation)
+    );
   } catch (error) {
     // Si hay error en getCache o fetchFn, intentar ejecutar fetchFn directamente
     console.error('Cache operation error, falling back to fetchFn:', error);
@@ -240,6 +775,10 @@ export const cacheKeys = {
   consultTypes: () => 'reference:consult_types',
   practiceTypes: () => 'reference:practice_types',
   healthInsurance: () => 'reference:health_insurance',
+  // Versión de los datos de referencia en memoria (lib/reference-data.ts)
+  referenceData: () => 'reference:data',
+  // Versión del directorio de proveedores en memoria (lib/user-routes.ts)
+  providerDirectory: () => 'provider_directory:all',
 
   // Calendario del proveedor
   calendar: (userAccountId: number, year: number, month: number) =>
@@ -258,6 +797,15 @@ export const cacheKeys = {
   ) => `appointments:${userAccountId}:${status}:${startDate}:${endDate}:${page}`,
 };
 
+// Horarios disponibles: frescos 5 minutos; hasta 15 minutos se sirven viejos
+// mientras un solo proceso recalcula. Compartido por las dos rutas de
+// /api/available-times, que usan las mismas claves.
+export const AVAILABLE_TIMES_CACHE_OPTIONS: CacheOptions = {
+  softTtlSeconds: 300,
+  hardTtlSeconds: 900,
+  distributedLock: true,
+};
+
 /**
  * Invalida caché relacionado con una cita
  * 
@@ -271,7 +819,9 @@ export async function invalidateAppointmentCache(
   userAccountId: number,
   date: string
 ): Promise<void> {
-  // Invalidar horarios disponibles para esa fecha
+  // Invalidar horarios disponibles: el contador cubre todas las fechas del
+  // proveedor, recalcular las demás es barato gracias al índice de disponibilidad
+  // y evita servir la fecha vieja desde el endpoint de rango
   await deleteCache(cacheKeys.availableTimes(userAccountId, date));
 
   // Invalidar calendario del mes
@@ -281,8 +831,7 @@ export async function invalidateAppointmentCache(
   );
 
   // Invalidar lista de citas del proveedor (todas las páginas)
-  // Nota: En producción, podrías usar un patrón más específico
-  await deleteCachePattern(`appointments:${userAccountId}:*`);
+  await invalidateCacheNamespace(`appointments:${userAccountId}`);
 }
 
 /**
@@ -297,9 +846,11 @@ export async function invalidateScheduleCache(
   userAccountId: number,
   username: string
 ): Promise<void> {
-  await deleteCache(cacheKeys.workSchedule(username));
-  await deleteCachePattern(`available_times:${userAccountId}:*`);
-  await deleteCachePattern(`calendar:${userAccountId}:*`);
+  await Promise.all([
+    deleteCache(cacheKeys.workSchedule(username)),
+    invalidateCacheNamespace(`available_times:${userAccountId}`),
+    invalidateCacheNamespace(`calendar:${userAccountId}`),
+  ]);
 }
 
 /**
@@ -314,3 +865,19 @@ export async function invalidateUnavailableDaysCache(
 ): Promise<void> {
   await invalidateScheduleCache(userAccountId, username);
 }
+
+/**
+ * Mide la latencia de Redis con el cliente compartido del caché
+ * 
+ * @returns Latencia del PING en ms, o null si Redis no está configurado
+ * @throws Error si Redis no responde PONG
+ */
+export async function pingRedis(): Promise<number | null> {
+  if (!redis) return null;
+  const startTime = performance.now();
+  const pong = await redis.ping();
+  if (pong !== 'PONG') {
+    throw new Error('Redis ping did not return PONG');
+  }
+  return Math.round((performance.now() - startTime) * 10) / 10;
+}
@@ -0,0 +1,113 @@
+/**
+ * Circuit Breaker
+ *
+ * Corta las llamadas a un servicio externo degradado para fallar rápido en
+ * lugar de acumular requests esperando timeouts:
+ * - closed: las llamadas pasan; tras failureThreshold fallas seguidas se abre
+ * - open: se rechaza todo hasta que pasa openDurationMs
+ * - half_open: se deja pasar una llamada de prueba; si sale bien se cierra,
+ *   si falla se vuelve a abrir
+ */
+
+export type CircuitState = 'closed' | 'open' | 'half_open';
+
+export interface CircuitBreakerOptions {
+  /** Fallas consecutivas para abrir el circuito */
+  failureThreshold: number;
+  /** Tiempo que el circuito queda abierto antes de probar de nuevo (ms) */
+  openDurationMs: number;
+  /** Se llama en cada cambio de estado (para logs) */
+  onStateChange?: (from: CircuitState, to: CircuitState) => void;
+}
+
+export class CircuitBreaker {
+  private state: CircuitState = 'closed';
+  private consecutiveFailures = 0;
+  private openedAt = 0;
+  private probeInFlight = false;
+  private opens = 0;
+
+  constructor(private readonly options: CircuitBreakerOptions) {}
+
+  /**
+   * Indica si se puede hacer la llamada ahora
+   *
+   * En half_open solo autoriza una llamada de prueba a la vez; quien recibe
+   * true debe informar el resultado con recordSuccess() o recordFailure().
+   */
+  tryAcquire(): boolean {
+    if (this.state === 'open') {
+      if (Date.now() - this.openedAt < this.options.openDurationMs) {
+        return false;
+      }
+      this.transition('half_open');
+    }
+
+    if (this.state === 'half_open') {
+      if (this.probeInFlight) return false;
+      this.probeInFlight = true;
+    }
+
+    return true;
+  }
+
+  recordSuccess(): void {
+    this.consecutiveFailures = 0;
+    this.probeInFlight = false;
+    if (this.state !== 'closed') {
+      this.transition('closed');
+    }
+  }
+
+  recordFailure(): void {
+    this.consecutiveFailures++;
+    this.probeInFlight = false;
+    if (this.state === 'half_open' || this.consecutiveFailures >= this.options.failureThreshold) {
+      this.openedAt = Date.now();
+      if (this.state !== 'open') {
+        this.opens++;
+        this.transition('open');
+      }
+    }
+  }
+
+  /**
+   * Libera la llamada autorizada sin contar éxito ni falla
+   * (ej: el servicio respondió pero rechazó el pedido por datos inválidos)
+   */
+  release(): void {
+    if (this.state === 'half_open') {
+      this.recordSuccess();
+    }
+  }
+
+  getState(): CircuitState {
+    if (this.state === 'open' && Date.now() - this.openedAt >= this.options.openDurationMs) {
+      return 'half_open';
+    }
+    return this.state;
+  }
+
+  /**
+   * Milisegundos hasta que el circuito deje pasar una llamada de prueba (0 si no está abierto)
+   */
+  getRetryAfterMs(): number {
+    if (this.state !== 'open') return 0;
+    return Math.max(0, this.openedAt + this.options.openDurationMs - Date.now());
+  }
+
+  getStats(): { state: CircuitState; consecutiveFailures: number; opens: number; retryAfterMs: number } {
+    return {
+      state: this.getState(),
+      consecutiveFailures: this.consecutiveFailures,
+      opens: this.opens,
+      retryAfterMs: this.getRetryAfterMs(),
+    };
+  }
+
+  private transition(to: CircuitState): void {
+    const from = this.state;
+    this.state = to;
+    this.options.onStateChange?.(from, to);
+  }
+}
@@ -10,10 +10,85 @@
  * - Siempre hacer rollback en caso de error
  * - Liberar conexiones del pool correctamente
  * - No hacer operaciones asíncronas externas dentro de transacciones (ej: WhatsApp)
+ * 
+ * La creación de citas (createBooking) no abre transacción: escribe cliente,
+ * cita y outbox en una sola sentencia, que ya es atómica.
  */
 
-import { Pool, PoolClient } from 'pg';
-import { pool } from './db';
+import { PoolClient } from 'pg';
+import { pool, query, defineStatement } from './db';
+
+// Reserva los IDs de la cita (y del cliente, si es nuevo) antes de escribir,
+// para firmar el token de cancelación sin un UPDATE posterior
+const RESERVE_BOOKING_IDS = defineStatement(
+  'reserve_booking_ids',
+  `SELECT nextval(pg_get_serial_sequence('appointments', 'id'))::int AS appointment_id,
+          COALESCE(
+            (SELECT id FROM clients WHERE phone_number = $1),
+            nextval(pg_get_serial_sequence('clients', 'id'))::int
+          ) AS client_id`
+);
+
+/**
+ * Cliente, cita y (opcionalmente) mensaje del outbox en una sola sentencia.
+ *
+ * Una sentencia es atómica por sí sola: no hace falta BEGIN/COMMIT. Si el
+ * cliente lo creó otra reserva entre la reserva de IDs y esta sentencia, el
+ * upsert devuelve otro id, la cita no se inserta y no vuelve ninguna fila.
+ */
+function buildCreateBookingSql(withOutbox: boolean): string {
+  return `WITH client_row AS (
+    INSERT INTO clients (id, first_name, last_name, phone_number, user_account_id, updated_at)
+    VALUES ($1, $2, $3, $4, $5, CURRENT_TIMESTAMP)
+    ON CONFLICT (phone_number)
+    DO UPDATE SET
+      first_name = EXCLUDED.first_name,
+      last_name = EXCLUDED.last_name,
+      user_account_id = COALESCE(EXCLUDED.user_account_id, clients.user_account_id),
+      updated_at = CURRENT_TIMESTAMP
+    RETURNING id, phone_number, (xmax = 0) AS inserted
+  ), appointment_row AS (
+    INSERT INTO appointments (
+      id, client_id, user_account_id, appointment_date, appointment_time,
+      visit_type_id, consult_type_id, practice_type_id, health_insurance,
+      cancellation_token, notes, status, created_at, updated_at
+    )
+    SELECT $6::int, client_row.id, $5, $7::date, $8::time,
+           $9::int, $10::int, $11::int, $12::text,
+           $13::text, $14::text, 'scheduled', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    FROM client_row
+    WHERE client_row.id = $1
+    RETURNING id, client_id
+  )${withOutbox ? `, outbox_row AS (
+    INSERT INTO whatsapp_outbox (idempotency_key, appointment_id, kind, phone_number, message)
+    SELECT $15::text, appointment_row.id, $16::text, client_row.phone_number, $17::text
+    FROM appointment_row CROSS JOIN client_row
+    ON CONFLICT (idempotency_key) DO NOTHING
+  )` : ''}
+  SELECT appointment_row.id, appointment_row.client_id, client_row.inserted
+  FROM appointment_row CROSS JOIN client_row`;
+}
+
+const CREATE_BOOKING = defineStatement('create_booking', buildCreateBookingSql(false));
+const CREATE_BOOKING_WITH_OUTBOX = defineStatement('create_booking_outbox', buildCreateBookingSql(true));
+
+// Índices únicos parciales (status = 'scheduled') que impiden reservar dos veces
+// el mismo horario; unique_appointment_scheduled es el anterior, por cliente
+const SCHEDULED_SLOT_CONSTRAINTS = new Set(['unique_appointment_slot_scheduled', 'unique_appointment_scheduled']);
+
+/**
+ * El horario ya tiene una cita activa (otra reserva lo tomó primero)
+ */
+export class AppointmentSlotTakenError extends Error {
+  constructor() {
+    super('Appointment slot is already booked');
+    this.name = 'AppointmentSlotTakenError';
+  }
+}
+
+function isSlotTakenError(error: any): boolean {
+  return error?.code === '23505' && SCHEDULED_SLOT_CONSTRAINTS.has(error.constraint);
+}
 
 /**
  * Ejecuta una función dentro de una transacción de base de datos
@@ -51,107 +126,37 @@ export async function withTransaction<T>(
   }
 }
 
-/**
- * Ejecuta una función dentro de una transacción con manejo de errores externos
- * 
- * Útil cuando hay operaciones externas (ej: WhatsApp) que no deben hacer rollback
- * de la transacción principal si fallan.
- * 
- * @param callback Función principal de transacción
- * @param onError Callback opcional para manejar errores después del commit
- * @returns Resultado de la función callback
- * 
- * @example
- * ```typescript
- * const appointment = await withTransactionAndExternalOps(
- *   async (client) => {
- *     // Operaciones críticas de BD
- *     const result = await client.query('INSERT INTO appointments ...');
- *     return result.rows[0];
- *   },
- *   async (appointment, error) => {
- *     // Si falla WhatsApp, loguear pero no hacer rollback
- *     logger.error({ error, appointmentId: appointment.id }, 'Failed to send WhatsApp');
- *   }
- * );
- * ```
- */
-export async function withTransactionAndExternalOps<T>(
-  callback: (client: PoolClient) => Promise<T>,
-  onError?: (result: T, error: Error) => Promise<void>
-): Promise<T> {
-  const client = await pool.connect();
-  let result: T | undefined;
-  
-  try {
-    await client.query('BEGIN');
-    
-    result = await callback(client);
-    
-    await client.query('COMMIT');
-    return result;
-  } catch (error) {
-    await client.query('ROLLBACK');
-    
-    // Si hay callback de error y tenemos resultado, ejecutarlo
-    if (onError && error instanceof Error && result !== undefined) {
-      try {
-        await onError(result, error);
-      } catch (onErrorErr) {
-        // Log error pero no lanzar
-        console.error('Error in onError callback:', onErrorErr);
-      }
-    }
-    
-    throw error;
-  } finally {
-    client.release();
-  }
+export interface BookingIds {
+  appointmentId: number;
+  clientId: number;
 }
 
-/**
- * Helper para crear o actualizar un cliente dentro de una transacción
- * 
- * @param client Cliente de transacción
- * @param phoneNumber Número de teléfono del cliente
- * @param firstName Nombre del cliente
- * @param lastName Apellido del cliente
- * @returns ID del cliente (existente o nuevo)
- */
-export async function upsertClientInTransaction(
-  client: PoolClient,
-  phoneNumber: string,
-  firstName: string,
-  lastName: string,
-  userAccountId?: number
-): Promise<number> {
-  const result = await client.query(
-    `INSERT INTO clients (first_name, last_name, phone_number, user_account_id, updated_at)
-     VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
-     ON CONFLICT (phone_number) 
-     DO UPDATE SET 
-       first_name = EXCLUDED.first_name,
-       last_name = EXCLUDED.last_name,
-       user_account_id = COALESCE(EXCLUDED.user_account_id, clients.user_account_id),
-       updated_at = CURRENT_TIMESTAMP
-     RETURNING id`,
-    [firstName, lastName, phoneNumber, userAccountId || null]
-  );
-  
-  return result.rows[0].id;
+export interface CreatedBooking extends BookingIds {
+  isNewClient: boolean;
+  cancellationToken: string;
 }
 
 /**
- * Helper para crear una cita dentro de una transacción
+ * Crea cliente (o lo actualiza) y cita en dos round trips, sin transacción explícita
+ * 
+ * 1. Reserva los IDs con nextval (el del cliente existente, si ya hay uno con ese teléfono)
+ * 2. Con los IDs, prepare() arma el token de cancelación y el mensaje del outbox,
+ *    y una única sentencia inserta todo (ver buildCreateBookingSql)
  * 
- * @param client Cliente de transacción
- * @param appointmentData Datos de la cita
- * @returns ID de la cita creada
+ * Si dos primeras reservas del mismo teléfono se cruzan, la sentencia no inserta
+ * la cita y se reintenta una vez con los IDs nuevos (el cliente ya existe).
+ * Los IDs reservados que no se usan quedan como huecos en las secuencias.
+ * 
+ * @param booking Datos del cliente y de la cita
+ * @param prepare Arma el token (y el mensaje del outbox, si corresponde) a partir de los IDs
+ * @returns IDs, si el cliente es nuevo y el token de cancelación guardado
+ * @throws AppointmentSlotTakenError si el horario ya tiene una cita activa
  */
-export async function createAppointmentInTransaction(
-  client: PoolClient,
-  appointmentData: {
-    clientId: number;
+export async function createBooking(
+  booking: {
+    phoneNumber: string;
+    firstName: string;
+    lastName: string;
     userAccountId: number;
     appointmentDate: string;
     appointmentTime: string;
@@ -159,53 +164,49 @@ export async function createAppointmentInTransaction(
     consultTypeId: number | null;
     practiceTypeId: number | null;
     healthInsurance: string;
-    cancellationToken: string;
     notes?: string;
+  },
+  prepare: (ids: BookingIds) => {
+    cancellationToken: string;
+    outbox?: { idempotencyKey: string; kind: string; message: string };
   }
-): Promise<number> {
-  const result = await client.query(
-    `INSERT INTO appointments (
-      client_id, user_account_id, appointment_date, appointment_time,
-      visit_type_id, consult_type_id, practice_type_id, health_insurance,
-      cancellation_token, notes, status, created_at, updated_at
-    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, 'scheduled', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-    RETURNING id`,
-    [
-      appointmentData.clientId,
-      appointmentData.userAccountId,
-      appointmentData.appointmentDate,
-      appointmentData.appointmentTime,
-      appointmentData.visitTypeId,
-      appointmentData.consultTypeId,
-      appointmentData.practiceTypeId,
-      appointmentData.healthInsurance,
-      appointmentData.cancellationToken,
-      appointmentData.notes || null,
-    ]
-  );
-  
-  return result.rows[0].id;
-}
+): Promise<CreatedBooking> {
+  for (let attempt = 0; attempt < 2; attempt++) {
+    const reserved = await query(RESERVE_BOOKING_IDS, [booking.phoneNumber]);
+    const ids: BookingIds = {
+      appointmentId: reserved.rows[0].appointment_id,
+      clientId: reserved.rows[0].client_id,
+    };
+    const { cancellationToken, outbox } = prepare(ids);
 
-/**
- * Helper para actualizar estado de WhatsApp en una transacción
- * 
- * @param client Cliente de transacción
- * @param appointmentId ID de la cita
- * @param whatsappMessageId ID del mensaje de WhatsApp
- */
-export async function updateWhatsAppStatusInTransaction(
-  client: PoolClient,
-  appointmentId: number,
-  whatsappMessageId: string
-): Promise<void> {
-  await client.query(
-    `UPDATE appointments 
-     SET whatsapp_sent = true, 
-         whatsapp_sent_at = CURRENT_TIMESTAMP,
-         whatsapp_message_id = $1,
-         updated_at = CURRENT_TIMESTAMP
-     WHERE id = $2`,
-    [whatsappMessageId, appointmentId]
-  );
+    const params: any[] = [
+      ids.clientId,
+      booking.firstName,
+      booking.lastName,
+      booking.phoneNumber,
+      booking.userAccountId,
+      ids.appointmentId,
+      booking.appointmentDate,
+      booking.appointmentTime,
+      booking.visitTypeId,
+      booking.consultTypeId,
+      booking.practiceTypeId,
+      booking.healthInsurance,
+      cancellationToken,
+      booking.notes || null,
+    ];
+    if (outbox) {
+      params.push(outbox.idempotencyKey, outbox.kind, outbox.message);
+    }
+
+    const result = await query(outbox ? CREATE_BOOKING_WITH_OUTBOX : CREATE_BOOKING, params).catch((error) => {
+      throw isSlotTakenError(error) ? new AppointmentSlotTakenError() : error;
+    });
+
+    if (result.rows.length > 0) {
+      return { ...ids, isNewClient: result.rows[0].inserted, cancellationToken };
+    }
+  }
+
+  throw new Error('Client was created concurrently while booking; retry the request');
 }
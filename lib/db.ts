@@ -10,62 +10,263 @@
  * - Manejo de errores de conexión
  * - Configuración SSL para producción
  * - Logging de operaciones de base de datos
+ * - Réplica de lectura opcional (readQuery) con read-your-writes
  */
 
-import { Pool } from 'pg';
+import { createHash } from 'crypto';
+import { Pool, type PoolClient } from 'pg';
+import { LRUCache } from 'lru-cache';
 import { dbLogger } from './logger';
+import { incrementCounter, observeHistogram, registerGauge } from './metrics';
 
-// Configuración del pool de conexiones
-export const pool = new Pool({
-  host: process.env.POSTGRESQL_HOST || 'localhost',
-  port: parseInt(process.env.POSTGRESQL_PORT || '5432'),
-  database: process.env.POSTGRESQL_DATABASE || 'MaxTurnos_db',
-  user: process.env.POSTGRESQL_USER || 'postgres',
-  password: process.env.POSTGRESQL_PASSWORD,
-  max: 20, // Máximo de conexiones en el pool
-  idleTimeoutMillis: 30000, // Cerrar conexiones inactivas después de 30s
-  connectionTimeoutMillis: 10000, // Timeout al obtener conexión (10 segundos)
-  ssl:
-    process.env.POSTGRESQL_SSL_MODE === 'require' ||
-    process.env.POSTGRESQL_SSL_MODE === 'verify-full'
-      ? {
-          rejectUnauthorized: process.env.POSTGRESQL_SSL_MODE === 'verify-full',
-          ca: process.env.POSTGRESQL_CA_CERT,
-        }
-      : false,
-});
+/**
+ * Configuración común de los pools (primario y réplica)
+ */
+function createPool(role: 'primary' | 'replica', host: string, port: string, max: number): Pool {
+  const created = new Pool({
+    host,
+    port: parseInt(port),
+    database: process.env.POSTGRESQL_DATABASE || 'MaxTurnos_db',
+    user: process.env.POSTGRESQL_USER || 'postgres',
+    password: process.env.POSTGRESQL_PASSWORD,
+    max, // Máximo de conexiones en el pool
+    idleTimeoutMillis: 30000, // Cerrar conexiones inactivas después de 30s
+    connectionTimeoutMillis: 10000, // Timeout al obtener conexión (10 segundos)
+    ssl:
+      process.env.POSTGRESQL_SSL_MODE === 'require' ||
+      process.env.POSTGRESQL_SSL_MODE === 'verify-full'
+        ? {
+            rejectUnauthorized: process.env.POSTGRESQL_SSL_MODE === 'verify-full',
+            ca: process.env.POSTGRESQL_CA_CERT,
+          }
+        : false,
+  });
 
-// Manejo de errores del pool
-pool.on('error', (err) => {
-  dbLogger.error({ error: err }, 'Unexpected error on idle client');
-});
+  // Manejo de errores del pool
+  created.on('error', (err) => {
+    dbLogger.error({ error: err, pool: role }, 'Unexpected error on idle client');
+  });
 
-pool.on('connect', (client) => {
-  dbLogger.debug('New client connected to database');
-});
+  created.on('connect', (client) => {
+    dbLogger.debug({ pool: role }, 'New client connected to database');
+    instrumentClientQueries(client, role);
+  });
 
-pool.on('remove', (client) => {
-  dbLogger.debug('Client removed from pool');
-});
+  created.on('remove', (client) => {
+    dbLogger.debug({ pool: role }, 'Client removed from pool');
+  });
+
+  return created;
+}
+
+// Configuración del pool de conexiones (primario: escrituras, transacciones y lecturas por defecto)
+export const pool = createPool(
+  'primary',
+  process.env.POSTGRESQL_HOST || 'localhost',
+  process.env.POSTGRESQL_PORT || '5432',
+  20
+);
+
+/**
+ * Pool de la réplica de lectura (opcional)
+ * 
+ * Con POSTGRESQL_READ_HOST definido, las lecturas declaradas con readQuery()
+ * van a la réplica. Usuario, base y SSL son los mismos que los del primario.
+ * Sin réplica, readQuery() usa el pool primario.
+ */
+export const readPool: Pool | null = process.env.POSTGRESQL_READ_HOST
+  ? createPool(
+      'replica',
+      process.env.POSTGRESQL_READ_HOST,
+      process.env.POSTGRESQL_READ_PORT || process.env.POSTGRESQL_PORT || '5432',
+      parseInt(process.env.POSTGRESQL_READ_POOL_MAX || '20')
+    )
+  : null;
+
+registerGauge('db_pool_connections', 'Conexiones del pool de PostgreSQL por estado', () =>
+  [
+    { role: 'primary', instance: pool },
+    ...(readPool ? [{ role: 'replica', instance: readPool }] : []),
+  ].flatMap(({ role, instance }) => [
+    { labels: { pool: role, state: 'total' }, value: instance.totalCount },
+    { labels: { pool: role, state: 'idle' }, value: instance.idleCount },
+    { labels: { pool: role, state: 'waiting' }, value: instance.waitingCount },
+  ])
+);
+
+/**
+ * Nombre de una query para métricas
+ * 
+ * Usa el nombre del prepared statement si lo tiene (sin el sufijo de
+ * variante); si no, la operación
+ * y la tabla principal (ej: "select appointments", "insert patients").
+ * Así la cantidad de series queda acotada aunque el SQL se arme dinámicamente.
+ */
+export function getQueryMetricName(textOrConfig: unknown): string {
+  if (textOrConfig && typeof textOrConfig === 'object') {
+    const config = textOrConfig as { name?: string; text?: string };
+    if (config.name) return config.name.split('__')[0];
+    textOrConfig = config.text;
+  }
+  if (typeof textOrConfig !== 'string') return 'unknown';
+
+  const sql = textOrConfig.trim().toLowerCase();
+  const operation = sql.match(/^[a-z]+/)?.[0] ?? 'unknown';
+  const tablePattern =
+    operation === 'insert' ? /\binto\s+([a-z_][\w.]*)/
+    : operation === 'update' ? /^update\s+([a-z_][\w.]*)/
+    : /\bfrom\s+([a-z_][\w.]*)/;
+  const table = sql.match(tablePattern)?.[1];
+  return table ? `${operation} ${table}` : operation;
+}
+
+function observeQuery(name: string, role: string, startTime: number, failed: boolean): void {
+  observeHistogram(
+    'db_query_duration_seconds',
+    'Latencia de queries a PostgreSQL',
+    { query: name, pool: role },
+    (Date.now() - startTime) / 1000
+  );
+  if (failed) {
+    incrementCounter('db_query_errors_total', 'Queries a PostgreSQL que fallaron', { query: name, pool: role });
+  }
+}
+
+/**
+ * Mide la latencia de todas las queries de un cliente del pool
+ * 
+ * Se aplica al conectarse cada cliente, así cubre pool.query, query() y
+ * las transacciones con pool.connect() sin tocar las rutas. pg-pool llama
+ * a client.query con callback; el resto del código usa promesas.
+ */
+function instrumentClientQueries(client: PoolClient, role: string): void {
+  const originalQuery = client.query.bind(client) as (...args: any[]) => any;
+
+  (client as any).query = (...args: any[]) => {
+    // Cursores y otros submittables: sin medición
+    if (args[0] && typeof args[0].submit === 'function') {
+      return originalQuery(...args);
+    }
+
+    const name = getQueryMetricName(args[0]);
+    const startTime = Date.now();
+    const callbackIndex = args.findIndex((arg) => typeof arg === 'function');
+
+    if (callbackIndex !== -1) {
+      const callback = args[callbackIndex];
+      args[callbackIndex] = (error: Error | null, result: unknown) => {
+        observeQuery(name, role, startTime, Boolean(error));
+        callback(error, result);
+      };
+      return originalQuery(...args);
+    }
+
+    const result = originalQuery(...args);
+    if (result && typeof result.then === 'function') {
+      result.then(
+        () => observeQuery(name, role, startTime, false),
+        () => observeQuery(name, role, startTime, true)
+      );
+    }
+    return result;
+  };
+}
+
+/**
+ * Registro de prepared statements
+ * 
+ * Las queries más frecuentes (disponibilidad, directorio de proveedores,
+ * detalle y listado de citas, upsert de clientes) se definen una vez con
+ * defineStatement() y se ejecutan con query(statement, params). pg las manda
+ * con nombre: la primera vez en cada conexión del pool se preparan (parse)
+ * y las siguientes solo se ejecutan (bind/execute), sin volver a parsear ni
+ * planificar. El nombre además identifica la query en las métricas.
+ * 
+ * Las queries que se arman según el esquema o los filtros se registran una
+ * vez por variante: cada texto distinto recibe el nombre base con un sufijo
+ * '__<hash>' (las métricas usan solo el nombre base).
+ * 
+ * PG_PREPARED_STATEMENTS=false las manda sin nombre (ej: detrás de PgBouncer
+ * en modo transaction, donde las conexiones no son fijas).
+ */
+export interface PreparedStatement {
+  /** Nombre del statement en cada conexión ('' = sin preparar) */
+  name: string;
+  text: string;
+}
+
+const PREPARED_STATEMENTS_ENABLED = process.env.PG_PREPARED_STATEMENTS !== 'false';
+// Límite de statements distintos: más que esto indica SQL armado con valores
+const MAX_PREPARED_STATEMENTS = 200;
+
+const preparedStatements = new Map<string, PreparedStatement>();
+
+/**
+ * Define (o recupera) un prepared statement
+ * 
+ * @param name Nombre del statement (snake_case, único por query)
+ * @param text Query SQL parametrizada ($1, $2, ...)
+ * 
+ * @example
+ * ```typescript
+ * const APPOINTMENT_BY_ID = defineStatement('appointment_by_id', 'SELECT ... WHERE a.id = $1');
+ * const { rows } = await query(APPOINTMENT_BY_ID, [appointmentId]);
+ * ```
+ */
+export function defineStatement(name: string, text: string): PreparedStatement {
+  const existing = preparedStatements.get(name);
+  if (existing && existing.text === text) {
+    return existing;
+  }
+
+  const variantName = existing
+    ? `${name}__${createHash('sha1').update(text).digest('hex').slice(0, 8)}`
+    : name;
+  const variant = preparedStatements.get(variantName);
+  if (variant) {
+    return variant;
+  }
+
+  if (preparedStatements.size >= MAX_PREPARED_STATEMENTS) {
+    dbLogger.warn({ statement: name }, 'Too many prepared statements, running unnamed');
+    return { name: '', text };
+  }
+
+  const statement = Object.freeze({ name: variantName, text });
+  preparedStatements.set(variantName, statement);
+  return statement;
+}
+
+/**
+ * Nombres de los statements registrados (para diagnóstico)
+ */
+export function getPreparedStatementNames(): string[] {
+  return Array.from(preparedStatements.keys());
+}
 
 /**
  * Ejecuta una query con logging automático
  * 
- * @param text Query SQL
+ * @param statement Query SQL o prepared statement (ver defineStatement)
  * @param params Parámetros de la query
+ * @param client Cliente de una transacción (por defecto, el pool)
  * @returns Resultado de la query
  */
 export async function query<T = any>(
-  text: string,
-  params?: any[]
+  statement: string | PreparedStatement,
+  params?: any[],
+  client: Pick<PoolClient, 'query'> = pool
 ): Promise<{ rows: T[]; rowCount: number | null }> {
   const startTime = Date.now();
+  const text = typeof statement === 'string' ? statement : statement.text;
+  const name = typeof statement === 'string' || !PREPARED_STATEMENTS_ENABLED ? undefined : statement.name || undefined;
   
   try {
-    const result = await pool.query(text, params);
+    const result = await client.query({ name, text, values: params });
     const duration = Date.now() - startTime;
     
     dbLogger.debug({
+      statement: name,
       query: text.substring(0, 100), // Primeros 100 caracteres para logging
       duration,
       rowCount: result.rowCount,
@@ -79,6 +280,7 @@ export async function query<T = any>(
     const duration = Date.now() - startTime;
     
     dbLogger.error({
+      statement: name,
       query: text.substring(0, 100),
       duration,
       error: error instanceof Error ? error.message : String(error),
@@ -88,6 +290,179 @@ export async function query<T = any>(
   }
 }
 
+/**
+ * Read-your-writes para la réplica
+ * 
+ * Después de que un proveedor modifica sus datos (o se crea o cancela una
+ * cita suya), sus lecturas van al primario durante READ_YOUR_WRITES_MS, para
+ * no mostrarle datos que la réplica todavía no recibió. El registro es por
+ * instancia: la ventana debe cubrir el lag normal de la réplica.
+ */
+const READ_YOUR_WRITES_MS = parseInt(process.env.READ_YOUR_WRITES_MS || '10000');
+
+const recentProviderWrites = new LRUCache<number, true>({
+  max: 10000,
+  ttl: READ_YOUR_WRITES_MS,
+});
+
+// Errores por los que una lectura en la réplica se reintenta en el primario:
+// sin código SQLSTATE (conexión, timeout), conflicto con la recuperación o réplica apagándose
+const REPLICA_RETRY_CODES = new Set(['40001', '57P01', '57P03']);
+
+/**
+ * Registra una escritura de un proveedor (ver read-your-writes)
+ * 
+ * @param userAccountId ID del proveedor cuyos datos cambiaron
+ */
+export function markProviderWrite(userAccountId: number): void {
+  if (readPool) {
+    recentProviderWrites.set(userAccountId, true);
+  }
+}
+
+/**
+ * Pool para una lectura: la réplica, salvo que no exista o que el
+ * proveedor haya escrito hace menos de READ_YOUR_WRITES_MS
+ */
+export function getReadPool(userAccountId?: number | null): Pool {
+  if (!readPool) return pool;
+  if (userAccountId && recentProviderWrites.has(userAccountId)) return pool;
+  return readPool;
+}
+
+/**
+ * Ejecuta una query de solo lectura, en la réplica si está configurada
+ * 
+ * Las escrituras y las transacciones siempre usan query() / pool.
+ * Si la réplica falla por conexión o por conflicto de recuperación, la
+ * lectura se reintenta en el primario.
+ * 
+ * @param statement Query SQL o prepared statement (ver defineStatement)
+ * @param params Parámetros de la query
+ * @param options.userAccountId Proveedor dueño de los datos, para read-your-writes
+ * 
+ * @example
+ * ```typescript
+ * const { rows } = await readQuery(CALENDAR_APPOINTMENTS, [user.id, from, to], { userAccountId: user.id });
+ * ```
+ */
+export async function readQuery<T = any>(
+  statement: string | PreparedStatement,
+  params?: any[],
+  options: { userAccountId?: number | null } = {}
+): Promise<{ rows: T[]; rowCount: number | null }> {
+  const target = getReadPool(options.userAccountId);
+  if (target === pool) {
+    return query<T>(statement, params);
+  }
+
+  try {
+    return await query<T>(statement, params, target);
+  } catch (error: any) {
+    const isSqlError = typeof error?.code === 'string' && /^[0-9A-Z]{5}$/.test(error.code);
+    if (isSqlError && !REPLICA_RETRY_CODES.has(error.code)) {
+      throw error;
+    }
+    incrementCounter('db_replica_fallbacks_total', 'Lecturas de la réplica reintentadas en el primario');
+    dbLogger.warn({ error: error instanceof Error ? error.message : String(error) }, 'Read replica query failed, retrying on primary');
+    return query<T>(statement, params);
+  }
+}
+
+/**
+ * Registro de capacidades del esquema
+ * 
+ * Algunas tablas y columnas son opcionales según qué scripts de migración
+ * se hayan ejecutado (ej: appointments.whatsapp_sent, unavailable_time_frames).
+ * En lugar de consultar information_schema en cada request, el esquema se
+ * carga una vez (al iniciar, ver instrumentation.ts) y las rutas lo consultan
+ * en memoria de forma sincrónica.
+ * 
+ * Se recarga en segundo plano cada SCHEMA_REFRESH_INTERVAL_MS para tomar
+ * migraciones ejecutadas con la app corriendo, o a demanda con
+ * refreshSchemaCapabilities().
+ */
+export interface SchemaCapabilities {
+  hasTable(table: string): boolean;
+  hasColumn(table: string, column: string): boolean;
+  loadedAt: number;
+}
+
+const SCHEMA_REFRESH_INTERVAL_MS = 10 * 60 * 1000; // 10 minutos
+
+let schemaCapabilities: SchemaCapabilities | null = null;
+let schemaLoadPromise: Promise<SchemaCapabilities> | null = null;
+
+async function loadSchemaCapabilities(): Promise<SchemaCapabilities> {
+  const result = await pool.query(
+    `SELECT table_name, column_name
+     FROM information_schema.columns
+     WHERE table_schema = 'public'`
+  );
+
+  const columnsByTable = new Map<string, Set<string>>();
+  for (const row of result.rows) {
+    const columns = columnsByTable.get(row.table_name) || new Set<string>();
+    columns.add(row.column_name);
+    columnsByTable.set(row.table_name, columns);
+  }
+
+  dbLogger.info({ tables: columnsByTable.size }, 'Schema capabilities loaded');
+
+  return {
+    hasTable: (table) => columnsByTable.has(table),
+    hasColumn: (table, column) => columnsByTable.get(table)?.has(column) ?? false,
+    loadedAt: Date.now(),
+  };
+}
+
+/**
+ * Recarga el registro de capacidades del esquema
+ * 
+ * Llamar después de ejecutar migraciones para no esperar al refresco periódico.
+ * 
+ * @returns Capacidades recién cargadas
+ */
+export function refreshSchemaCapabilities(): Promise<SchemaCapabilities> {
+  if (!schemaLoadPromise) {
+    schemaLoadPromise = loadSchemaCapabilities()
+      .then((capabilities) => {
+        schemaCapabilities = capabilities;
+        return capabilities;
+      })
+      .finally(() => {
+        schemaLoadPromise = null;
+      });
+  }
+  return schemaLoadPromise;
+}
+
+/**
+ * Obtiene el registro de capacidades del esquema
+ * 
+ * Solo consulta la base de datos la primera vez; después resuelve al instante
+ * con el registro en memoria (y lo recarga en segundo plano si está vencido).
+ * 
+ * @example
+ * ```typescript
+ * const schema = await getSchemaCapabilities();
+ * if (schema.hasColumn('appointments', 'whatsapp_sent')) { ... }
+ * ```
+ */
+export async function getSchemaCapabilities(): Promise<SchemaCapabilities> {
+  if (!schemaCapabilities) {
+    return await refreshSchemaCapabilities();
+  }
+
+  if (Date.now() - schemaCapabilities.loadedAt > SCHEMA_REFRESH_INTERVAL_MS) {
+    refreshSchemaCapabilities().catch((error) => {
+      dbLogger.error({ error: error instanceof Error ? error.message : String(error) }, 'Schema capabilities refresh failed');
+    });
+  }
+
+  return schemaCapabilities;
+}
+
 /**
  * Obtiene un cliente del pool (para transacciones)
  * 
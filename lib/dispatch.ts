@@ -0,0 +1,119 @@
+/**
+ * Despacho con Concurrencia Acotada
+ *
+ * Procesa una lista de trabajos con un máximo de N en paralelo, espaciando
+ * los que van al mismo destino (ej: el mismo número de WhatsApp) y cortando
+ * al llegar a un plazo para no exceder el timeout de la función.
+ * Los trabajos no iniciados se informan como omitidos para reintentar después.
+ */
+
+export interface DispatchOptions<T> {
+  /** Trabajos en paralelo (mínimo 1) */
+  concurrency: number;
+  /** Destino de cada trabajo, para espaciar los envíos al mismo destino */
+  destinationOf?: (item: T) => string;
+  /** Tiempo mínimo entre dos trabajos al mismo destino (ms) */
+  minIntervalPerDestinationMs?: number;
+  /** Momento (epoch ms) a partir del cual no se inician más trabajos */
+  deadline?: number;
+}
+
+export interface DispatchOutcome<T, R> {
+  item: T;
+  result?: R;
+  error?: unknown;
+  latencyMs: number;
+}
+
+export interface DispatchSummary<T, R> {
+  outcomes: DispatchOutcome<T, R>[];
+  skipped: T[];
+  durationMs: number;
+  /** Trabajos terminados por segundo */
+  throughputPerSecond: number;
+  latencyMs: { p50: number; p95: number; max: number };
+}
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)];
+}
+
+/**
+ * Ejecuta worker sobre cada item con concurrencia acotada
+ *
+ * Los errores del worker no cortan el despacho: quedan en el outcome del item.
+ *
+ * @example
+ * ```typescript
+ * const summary = await dispatchWithConcurrency(rows, (row) => send(row), {
+ *   concurrency: 5,
+ *   destinationOf: (row) => row.phone_number,
+ *   minIntervalPerDestinationMs: 1000,
+ * });
+ * ```
+ */
+export async function dispatchWithConcurrency<T, R>(
+  items: T[],
+  worker: (item: T) => Promise<R>,
+  options: DispatchOptions<T>
+): Promise<DispatchSummary<T, R>> {
+  const startedAt = Date.now();
+  const concurrency = Math.max(1, Math.floor(options.concurrency) || 1);
+  const minInterval = options.minIntervalPerDestinationMs ?? 0;
+
+  const outcomes: DispatchOutcome<T, R>[] = [];
+  const skipped: T[] = [];
+  // Próximo momento permitido por destino
+  const nextSlotByDestination = new Map<string, number>();
+  let nextIndex = 0;
+
+  async function runLane(): Promise<void> {
+    while (nextIndex < items.length) {
+      const item = items[nextIndex++];
+
+      if (options.deadline !== undefined && Date.now() >= options.deadline) {
+        skipped.push(item);
+        continue;
+      }
+
+      if (options.destinationOf && minInterval > 0) {
+        const destination = options.destinationOf(item);
+        const now = Date.now();
+        const slot = Math.max(now, nextSlotByDestination.get(destination) ?? 0);
+        nextSlotByDestination.set(destination, slot + minInterval);
+        if (slot > now) {
+          await new Promise((resolve) => setTimeout(resolve, slot - now));
+        }
+      }
+
+      const itemStart = Date.now();
+      try {
+        const result = await worker(item);
+        outcomes.push({ item, result, latencyMs: Date.now() - itemStart });
+      } catch (error) {
+        outcomes.push({ item, error, latencyMs: Date.now() - itemStart });
+      }
+    }
+  }
+
+  await Promise.all(
+    Array.from({ length: Math.min(concurrency, items.length) }, () => runLane())
+  );
+
+  const durationMs = Date.now() - startedAt;
+  const latencies = outcomes.map((outcome) => outcome.latencyMs).sort((a, b) => a - b);
+
+  return {
+    outcomes,
+    skipped,
+    durationMs,
+    throughputPerSecond: durationMs > 0 ? Math.round((outcomes.length / durationMs) * 1000 * 100) / 100 : outcomes.length,
+    latencyMs: {
+      p50: percentile(latencies, 50),
+      p95: percentile(latencies, 95),
+      max: latencies[latencies.length - 1] ?? 0,
+    },
+  };
+}
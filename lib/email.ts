@@ -1,8 +1,16 @@
 /**
  * Utilidades de Email con Nodemailer (Google SMTP)
- * 
+ *
  * Funciones para enviar emails de verificación y notificaciones
  * a proveedores.
+ *
+ * - El transporter usa un pool de conexiones SMTP: no hay un handshake
+ *   TLS + AUTH con Gmail por cada email.
+ * - Las plantillas se compilan una vez al cargar el módulo.
+ * - queueEmail()/queueVerificationEmail() encolan el envío y vuelven al
+ *   instante; la cola se procesa en segundo plano (las rutas esperan a que
+ *   se vacíe con after(whenEmailQueueIdle)). getEmailQueueStats() expone la
+ *   profundidad de la cola y la latencia de envío.
  */
 
 import nodemailer from 'nodemailer';
@@ -17,9 +25,22 @@ const SMTP_PASS = process.env.SMTP_PASS || process.env.EMAIL_PASS;
 const SMTP_FROM = process.env.SMTP_FROM || SMTP_USER;
 const SMTP_FROM_NAME = process.env.SMTP_FROM_NAME || 'MaxTurnos';
 const APP_URL = process.env.NEXT_PUBLIC_APP_URL || process.env.BACKEND_API_PROD || 'http://localhost:3000';
+// Conexiones SMTP abiertas a la vez y mensajes por conexión antes de reconectar
+const SMTP_MAX_CONNECTIONS = parseInt(process.env.SMTP_MAX_CONNECTIONS || '3');
+const SMTP_MAX_MESSAGES = parseInt(process.env.SMTP_MAX_MESSAGES || '100');
+// Emails pendientes máximos; pasado este límite queueEmail rechaza
+const EMAIL_QUEUE_LIMIT = parseInt(process.env.EMAIL_QUEUE_LIMIT || '500');
+const EMAIL_MAX_ATTEMPTS = 2;
+// Espera antes de reintentar un envío fallido (se duplica en cada intento):
+// un error transitorio de SMTP (ej: 421 de Gmail por throttling) no se
+// resuelve en milisegundos
+const EMAIL_RETRY_BASE_DELAY_MS = parseInt(process.env.EMAIL_RETRY_BASE_DELAY_MS || '5000');
 
 // Configurar transporter de Nodemailer
 const transporter = nodemailer.createTransport({
+  pool: true,
+  maxConnections: SMTP_MAX_CONNECTIONS,
+  maxMessages: SMTP_MAX_MESSAGES,
   host: SMTP_HOST,
   port: SMTP_PORT,
   secure: SMTP_SECURE, // true para puerto 465, false para puerto 587
@@ -31,26 +52,47 @@ const transporter = nodemailer.createTransport({
     : undefined,
 });
 
+// ---------------------------------------------------------------------------
+// Plantillas
+// ---------------------------------------------------------------------------
+
+type EmailTemplate<K extends string> = (values: Record<K, string>) => string;
+
+const HTML_ESCAPES: Record<string, string> = {
+  '&': '&amp;',
+  '<': '&lt;',
+  '>': '&gt;',
+  '"': '&quot;',
+  "'": '&#39;',
+};
+
+function escapeHtml(value: string): string {
+  return value.replace(/[&<>"']/g, (char) => HTML_ESCAPES[char]);
+}
+
 /**
- * Envía email de verificación a un proveedor
- * 
- * @param email Email del proveedor
- * @param username Username del proveedor
- * @param verificationToken Token de verificación
- * @returns Resultado del envío
+ * Compila una plantilla con marcadores {{nombre}}
+ *
+ * La plantilla se parte una sola vez en fragmentos fijos y marcadores;
+ * renderizar es solo concatenar.
+ *
+ * @param source Texto de la plantilla
+ * @param options.html Escapar los valores como HTML
  */
-export async function sendVerificationEmail(
-  email: string,
-  username: string,
-  verificationToken: string
-): Promise<nodemailer.SentMessageInfo> {
-  const verificationUrl = `${APP_URL}/${username}/verificar-email?token=${verificationToken}`;
+function compileTemplate<K extends string>(source: string, options: { html: boolean }): EmailTemplate<K> {
+  const parts = source.split(/\{\{(\w+)\}\}/);
+  // parts alterna texto fijo (índices pares) y nombres de marcador (impares)
+  return (values) => {
+    let output = parts[0];
+    for (let i = 1; i < parts.length; i += 2) {
+      const value = values[parts[i] as K] ?? '';
+      output += (options.html ? escapeHtml(value) : value) + parts[i + 1];
+    }
+    return output;
+  };
+}
 
-  const mailOptions = {
-    from: `"${SMTP_FROM_NAME}" <${SMTP_FROM}>`,
-    to: email,
-    subject: 'Verifica tu cuenta de MaxTurnos',
-    html: `
+const verificationEmailHtml = compileTemplate<'verificationUrl'>(`
       <!DOCTYPE html>
       <html>
         <head>
@@ -104,10 +146,10 @@ export async function sendVerificationEmail(
               <p>Hola,</p>
               <p>Gracias por registrarte en MaxTurnos. Para completar tu registro, por favor verifica tu cuenta haciendo clic en el siguiente enlace:</p>
               <p style="text-align: center;">
-                <a href="${verificationUrl}" class="button">Verificar Cuenta</a>
+                <a href="{{verificationUrl}}" class="button">Verificar Cuenta</a>
               </p>
               <p>O copia y pega este enlace en tu navegador:</p>
-              <p style="word-break: break-all; color: #666;">${verificationUrl}</p>
+              <p style="word-break: break-all; color: #666;">{{verificationUrl}}</p>
               <p><strong>Este enlace expira en 24 horas.</strong></p>
               <p>Si no solicitaste esta cuenta, puedes ignorar este email.</p>
             </div>
@@ -117,57 +159,252 @@ export async function sendVerificationEmail(
           </div>
         </body>
       </html>
-    `,
-    text: `
+    `, { html: true });
+
+const verificationEmailText = compileTemplate<'verificationUrl'>(`
 Bienvenido a MaxTurnos
 
 Por favor, verifica tu cuenta haciendo clic en el siguiente enlace:
-${verificationUrl}
+{{verificationUrl}}
 
 Este enlace expira en 24 horas.
 
 Si no solicitaste esta cuenta, puedes ignorar este email.
-    `,
+    `, { html: false });
+
+function buildVerificationEmail(email: string, username: string, verificationToken: string) {
+  const verificationUrl = `${APP_URL}/${username}/verificar-email?token=${verificationToken}`;
+  return {
+    to: email,
+    subject: 'Verifica tu cuenta de MaxTurnos',
+    html: verificationEmailHtml({ verificationUrl }),
+    text: verificationEmailText({ verificationUrl }),
   };
+}
+
+// ---------------------------------------------------------------------------
+// Cola de envío
+// ---------------------------------------------------------------------------
+
+interface QueuedEmail {
+  to: string;
+  subject: string;
+  html: string;
+  text?: string;
+  /** Contexto para los logs (ej: { username }) */
+  context?: Record<string, unknown>;
+  enqueuedAt: number;
+  attempts: number;
+}
+
+export interface EmailQueueStats {
+  /** Emails esperando turno */
+  depth: number;
+  /** Emails fallidos esperando su reintento */
+  retrying: number;
+  /** Emails enviándose en este momento */
+  inFlight: number;
+  sent: number;
+  failed: number;
+  /** Rechazados por cola llena */
+  dropped: number;
+  /** Tiempo en cola hasta empezar el envío */
+  waitMs: { avg: number; max: number };
+  /** Duración del envío SMTP */
+  sendMs: { avg: number; max: number; last: number };
+}
+
+const emailQueue: QueuedEmail[] = [];
+let emailsInFlight = 0;
+let emailsWaitingRetry = 0;
+let idleWaiters: Array<() => void> = [];
+const emailStats = {
+  sent: 0,
+  failed: 0,
+  dropped: 0,
+  waitCount: 0,
+  waitSum: 0,
+  waitMax: 0,
+  sendCount: 0,
+  sendSum: 0,
+  sendMax: 0,
+  sendLast: 0,
+};
 
-  // Verificar configuración antes de enviar
+function assertEmailConfigured(context: Record<string, unknown>): void {
   if (!SMTP_USER || !SMTP_PASS) {
     const errorMsg = 'Email no configurado: SMTP_USER o SMTP_PASS faltantes';
-    logger.error({ email, username, SMTP_USER: !!SMTP_USER, SMTP_PASS: !!SMTP_PASS }, errorMsg);
+    logger.error({ ...context, SMTP_USER: !!SMTP_USER, SMTP_PASS: !!SMTP_PASS }, errorMsg);
     throw new Error(errorMsg);
   }
+}
 
+async function deliverEmail(message: {
+  to: string;
+  subject: string;
+  html: string;
+  text?: string;
+}): Promise<nodemailer.SentMessageInfo> {
+  const startedAt = Date.now();
   try {
-    // Verificar conexión antes de enviar
-    await transporter.verify();
-    logger.info({ email, username }, 'SMTP connection verified');
-    
-    const info = await transporter.sendMail(mailOptions);
-    logger.info({ 
-      email, 
-      username, 
-      messageId: info.messageId,
-      response: info.response 
-    }, 'Verification email sent successfully');
-    return info;
+    return await transporter.sendMail({
+      from: `"${SMTP_FROM_NAME}" <${SMTP_FROM}>`,
+      ...message,
+    });
+  } finally {
+    const duration = Date.now() - startedAt;
+    emailStats.sendCount++;
+    emailStats.sendSum += duration;
+    emailStats.sendMax = Math.max(emailStats.sendMax, duration);
+    emailStats.sendLast = duration;
+  }
+}
+
+async function processQueuedEmail(item: QueuedEmail): Promise<void> {
+  item.attempts++;
+  try {
+    const info = await deliverEmail(item);
+    emailStats.sent++;
+    logger.info({ ...item.context, to: item.to, subject: item.subject, messageId: info.messageId, response: info.response }, 'Email sent successfully');
   } catch (error: any) {
-    const errorDetails = {
-      email,
-      username,
+    if (item.attempts < EMAIL_MAX_ATTEMPTS) {
+      const delayMs = EMAIL_RETRY_BASE_DELAY_MS * 2 ** (item.attempts - 1);
+      logger.warn({ ...item.context, to: item.to, delayMs, error: error instanceof Error ? error.message : String(error) }, 'Email send failed, retrying');
+      emailsWaitingRetry++;
+      setTimeout(() => {
+        emailsWaitingRetry--;
+        // waitMs mide la espera en cola de este intento, no desde el primero
+        emailQueue.push({ ...item, enqueuedAt: Date.now() });
+        pumpEmailQueue();
+      }, delayMs);
+      return;
+    }
+    emailStats.failed++;
+    logger.error({
+      ...item.context,
+      to: item.to,
+      subject: item.subject,
       error: error instanceof Error ? error.message : String(error),
       code: error.code,
       command: error.command,
       response: error.response,
       responseCode: error.responseCode,
-    };
-    logger.error(errorDetails, 'Error sending verification email');
-    throw error;
+    }, 'Error sending queued email');
+  }
+}
+
+function pumpEmailQueue(): void {
+  while (emailsInFlight < SMTP_MAX_CONNECTIONS && emailQueue.length > 0) {
+    const item = emailQueue.shift()!;
+    const wait = Date.now() - item.enqueuedAt;
+    emailStats.waitCount++;
+    emailStats.waitSum += wait;
+    emailStats.waitMax = Math.max(emailStats.waitMax, wait);
+
+    emailsInFlight++;
+    processQueuedEmail(item).finally(() => {
+      emailsInFlight--;
+      pumpEmailQueue();
+    });
+  }
+
+  if (isEmailQueueIdle() && idleWaiters.length > 0) {
+    const waiters = idleWaiters;
+    idleWaiters = [];
+    waiters.forEach((resolve) => resolve());
+  }
+}
+
+/**
+ * Encola un email para envío en segundo plano
+ *
+ * Vuelve sin esperar a SMTP. Lanza si el email no está configurado o si la
+ * cola está llena, para que quien llama pueda informarlo.
+ *
+ * @example
+ * ```typescript
+ * queueEmail({ to, subject, html });
+ * after(whenEmailQueueIdle); // en una ruta: terminar los envíos tras responder
+ * ```
+ */
+export function queueEmail(options: {
+  to: string;
+  subject: string;
+  html: string;
+  text?: string;
+  context?: Record<string, unknown>;
+}): void {
+  assertEmailConfigured({ to: options.to, ...options.context });
+
+  if (emailQueue.length >= EMAIL_QUEUE_LIMIT) {
+    emailStats.dropped++;
+    logger.error({ to: options.to, depth: emailQueue.length }, 'Email queue full, dropping email');
+    throw new Error('Cola de emails llena');
   }
+
+  emailQueue.push({ ...options, enqueuedAt: Date.now(), attempts: 0 });
+  pumpEmailQueue();
+}
+
+function isEmailQueueIdle(): boolean {
+  return emailsInFlight === 0 && emailQueue.length === 0 && emailsWaitingRetry === 0;
+}
+
+/**
+ * Resuelve cuando la cola de emails queda vacía, sin envíos en curso ni reintentos pendientes
+ */
+export function whenEmailQueueIdle(): Promise<void> {
+  if (isEmailQueueIdle()) {
+    return Promise.resolve();
+  }
+  return new Promise((resolve) => idleWaiters.push(resolve));
+}
+
+/**
+ * Estado de la cola de emails (para monitoreo)
+ */
+export function getEmailQueueStats(): EmailQueueStats {
+  return {
+    depth: emailQueue.length,
+    retrying: emailsWaitingRetry,
+    inFlight: emailsInFlight,
+    sent: emailStats.sent,
+    failed: emailStats.failed,
+    dropped: emailStats.dropped,
+    waitMs: {
+      avg: emailStats.waitCount > 0 ? Math.round(emailStats.waitSum / emailStats.waitCount) : 0,
+      max: emailStats.waitMax,
+    },
+    sendMs: {
+      avg: emailStats.sendCount > 0 ? Math.round(emailStats.sendSum / emailStats.sendCount) : 0,
+      max: emailStats.sendMax,
+      last: emailStats.sendLast,
+    },
+  };
+}
+
+/**
+ * Encola el email de verificación de un proveedor
+ *
+ * @param email Email del proveedor
+ * @param username Username del proveedor
+ * @param verificationToken Token de verificación
+ * @throws Error si el email no está configurado o la cola está llena
+ */
+export function queueVerificationEmail(
+  email: string,
+  username: string,
+  verificationToken: string
+): void {
+  queueEmail({
+    ...buildVerificationEmail(email, username, verificationToken),
+    context: { username },
+  });
 }
 
 /**
  * Envía un email genérico
- * 
+ *
  * @param options Opciones del email
  * @returns Resultado del envío
  */
@@ -177,16 +414,8 @@ export async function sendEmail(options: {
   html: string;
   text?: string;
 }): Promise<nodemailer.SentMessageInfo> {
-  const mailOptions = {
-    from: `"${SMTP_FROM_NAME}" <${SMTP_FROM}>`,
-    to: options.to,
-    subject: options.subject,
-    html: options.html,
-    text: options.text,
-  };
-
   try {
-    const info = await transporter.sendMail(mailOptions);
+    const info = await deliverEmail(options);
     logger.info({ to: options.to, subject: options.subject }, 'Email sent successfully');
     return info;
   } catch (error) {
@@ -197,7 +426,7 @@ export async function sendEmail(options: {
 
 /**
  * Verifica la configuración de email
- * 
+ *
  * @returns true si está configurado correctamente, false si no
  */
 export function isEmailConfigured(): boolean {
@@ -0,0 +1,169 @@
+/**
+ * Sondas de Salud de la Instancia
+ *
+ * Mide lo que anticipa que la instancia va a empezar a fallar requests:
+ * - latencia de un SELECT 1 al primario (y a la réplica, si hay)
+ * - saturación del pool (conexiones totales, libres y requests esperando)
+ * - latencia de Redis con el cliente compartido del caché
+ * - lag del event loop (p50/p99/máximo desde la sonda anterior)
+ *
+ * El resultado se guarda HEALTH_CACHE_MS: el polling del load balancer
+ * (varias veces por segundo entre todos sus nodos) no suma carga a la base
+ * ni a Redis. Requests concurrentes comparten la misma sonda en curso.
+ *
+ * Estados:
+ * - unhealthy: el primario o Redis (si está configurado) no responden
+ * - degraded: responden, pero algún umbral HEALTH_* se superó (o la réplica
+ *   falla y las lecturas vuelven al primario)
+ *
+ * localDegraded indica si alguna señal propia de esta instancia superó su
+ * umbral (lag del event loop, requests esperando en su pool). La latencia de
+ * PostgreSQL o Redis es compartida: si sacara instancias del load balancer,
+ * una base lenta las sacaría a todas a la vez.
+ */
+
+import { monitorEventLoopDelay } from 'perf_hooks';
+import type { Pool } from 'pg';
+import { pool, readPool } from './db';
+import { pingRedis } from './cache';
+
+const HEALTH_CACHE_MS = parseInt(process.env.HEALTH_CACHE_MS || '5000');
+// Una sonda que no responde en este tiempo cuenta como falla
+const HEALTH_PROBE_TIMEOUT_MS = parseInt(process.env.HEALTH_PROBE_TIMEOUT_MS || '2000');
+
+const THRESHOLDS = {
+  dbLatencyMs: parseInt(process.env.HEALTH_DB_LATENCY_DEGRADED_MS || '250'),
+  poolWaiting: parseInt(process.env.HEALTH_POOL_WAITING_DEGRADED || '5'),
+  redisLatencyMs: parseInt(process.env.HEALTH_REDIS_LATENCY_DEGRADED_MS || '250'),
+  eventLoopLagMs: parseInt(process.env.HEALTH_EVENT_LOOP_LAG_DEGRADED_MS || '200'),
+};
+
+export type HealthStatus = 'healthy' | 'degraded' | 'unhealthy';
+
+export interface DatabaseProbe {
+  ok: boolean;
+  latencyMs: number | null;
+  error?: string;
+  pool: { total: number; idle: number; waiting: number; max: number };
+}
+
+export interface HealthProbes {
+  status: HealthStatus;
+  checkedAt: string;
+  database: DatabaseProbe;
+  replica?: DatabaseProbe;
+  redis?: { ok: boolean; latencyMs: number | null; error?: string };
+  eventLoop: { p50Ms: number; p99Ms: number; maxMs: number };
+  thresholds: typeof THRESHOLDS;
+  /** Motivos de degraded/unhealthy */
+  reasons: string[];
+  /** Hay señales de degradación propias de esta instancia (ver arriba) */
+  localDegraded: boolean;
+}
+
+// Lag del event loop: el histograma corre siempre y se reinicia en cada sonda
+const eventLoopDelay = monitorEventLoopDelay({ resolution: 10 });
+eventLoopDelay.enable();
+
+let cachedProbes: { at: number; probes: Promise<HealthProbes> } | null = null;
+
+function withTimeout<T>(promise: Promise<T>, label: string): Promise<T> {
+  let timer: NodeJS.Timeout;
+  const timeout = new Promise<never>((_, reject) => {
+    timer = setTimeout(() => reject(new Error(`${label} timed out after ${HEALTH_PROBE_TIMEOUT_MS}ms`)), HEALTH_PROBE_TIMEOUT_MS);
+  });
+  return Promise.race([promise, timeout]).finally(() => clearTimeout(timer));
+}
+
+function errorMessage(error: unknown): string {
+  return error instanceof Error ? error.message : String(error);
+}
+
+async function probeDatabase(target: Pool, label: string): Promise<DatabaseProbe> {
+  const poolStats = {
+    total: target.totalCount,
+    idle: target.idleCount,
+    waiting: target.waitingCount,
+    max: target.options.max ?? 10,
+  };
+  const startTime = performance.now();
+  try {
+    await withTimeout(target.query('SELECT 1'), label);
+    return { ok: true, latencyMs: Math.round((performance.now() - startTime) * 10) / 10, pool: poolStats };
+  } catch (error) {
+    return { ok: false, latencyMs: null, error: errorMessage(error), pool: poolStats };
+  }
+}
+
+function readEventLoopLag(): HealthProbes['eventLoop'] {
+  const toMs = (ns: number) => Math.round(ns / 1e5) / 10;
+  const lag = {
+    p50Ms: toMs(eventLoopDelay.percentile(50)),
+    p99Ms: toMs(eventLoopDelay.percentile(99)),
+    maxMs: toMs(eventLoopDelay.max),
+  };
+  eventLoopDelay.reset();
+  return lag;
+}
+
+async function runProbes(): Promise<HealthProbes> {
+  const [database, replica, redis] = await Promise.all([
+    probeDatabase(pool, 'Database'),
+    readPool ? probeDatabase(readPool, 'Read replica') : Promise.resolve(undefined),
+    withTimeout(pingRedis(), 'Redis').then(
+      (latencyMs) => (latencyMs === null ? undefined : { ok: true, latencyMs }),
+      (error) => ({ ok: false, latencyMs: null, error: errorMessage(error) })
+    ),
+  ]);
+  const eventLoop = readEventLoopLag();
+
+  const failures: string[] = [];
+  const warnings: string[] = [];
+  // Subconjunto de warnings propios de la instancia
+  const localWarnings: string[] = [];
+
+  if (!database.ok) failures.push(`Database connection failed: ${database.error}`);
+  if (redis && !redis.ok) failures.push(`Redis connection failed: ${redis.error}`);
+
+  if (database.latencyMs !== null && database.latencyMs > THRESHOLDS.dbLatencyMs) {
+    warnings.push(`Database latency ${database.latencyMs}ms > ${THRESHOLDS.dbLatencyMs}ms`);
+  }
+  for (const [label, probe] of [['Primary', database], ['Replica', replica]] as const) {
+    if (probe && probe.pool.waiting > THRESHOLDS.poolWaiting) {
+      localWarnings.push(`${label} pool has ${probe.pool.waiting} waiting requests > ${THRESHOLDS.poolWaiting}`);
+    }
+  }
+  if (replica && !replica.ok) warnings.push(`Read replica failed, reads fall back to primary: ${replica.error}`);
+  if (redis?.latencyMs != null && redis.latencyMs > THRESHOLDS.redisLatencyMs) {
+    warnings.push(`Redis latency ${redis.latencyMs}ms > ${THRESHOLDS.redisLatencyMs}ms`);
+  }
+  if (eventLoop.p99Ms > THRESHOLDS.eventLoopLagMs) {
+    localWarnings.push(`Event loop lag p99 ${eventLoop.p99Ms}ms > ${THRESHOLDS.eventLoopLagMs}ms`);
+  }
+  warnings.push(...localWarnings);
+
+  return {
+    status: failures.length > 0 ? 'unhealthy' : warnings.length > 0 ? 'degraded' : 'healthy',
+    checkedAt: new Date().toISOString(),
+    database,
+    ...(replica && { replica }),
+    ...(redis && { redis }),
+    eventLoop,
+    thresholds: THRESHOLDS,
+    reasons: [...failures, ...warnings],
+    localDegraded: localWarnings.length > 0,
+  };
+}
+
+/**
+ * Devuelve las sondas de salud, reutilizando las de los últimos HEALTH_CACHE_MS
+ */
+export function getHealthProbes(): Promise<HealthProbes> {
+  const now = Date.now();
+  if (cachedProbes && now - cachedProbes.at < HEALTH_CACHE_MS) {
+    return cachedProbes.probes;
+  }
+  const probes = runProbes();
+  cachedProbes = { at: now, probes };
+  return probes;
+}
@@ -22,6 +22,7 @@
  */
 
 import pino from 'pino';
+import { normalizeRouteLabel, observeHistogram } from './metrics';
 
 // Configuración del logger basada en entorno
 const isDevelopment = process.env.NODE_ENV === 'development';
@@ -197,6 +198,13 @@ export function logApiRequest(
     ...context,
   };
 
+  observeHistogram(
+    'http_request_duration_seconds',
+    'Latencia de las rutas de la API',
+    { method, route: normalizeRouteLabel(path), status: statusCode },
+    duration / 1000
+  );
+
   if (statusCode >= 500) {
     apiLogger.error(logData, 'API error');
   } else if (statusCode >= 400) {
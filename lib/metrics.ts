@@ -0,0 +1,225 @@
+/**
+ * Registro de Métricas en Proceso
+ *
+ * Contadores, histogramas y gauges en memoria, expuestos en formato de texto
+ * de Prometheus por /api/metrics. Lo alimentan:
+ * - logApiRequest: latencia por ruta, método y status
+ * - lib/db.ts: latencia de cada query del pool, por nombre de query
+ * - lib/cache.ts: hits y misses por capa
+ * - lib/rate-limit.ts: decisiones por limitador
+ * - gauges leídos al momento del scrape (pool de PostgreSQL, colas, etc.)
+ * - contadores que otros módulos ya llevan, también leídos en el scrape
+ *
+ * Las métricas son por instancia; Prometheus agrega entre instancias.
+ * Cada métrica acepta hasta MAX_SERIES_PER_METRIC combinaciones de labels
+ * para que una ruta con IDs no haga crecer la memoria sin límite.
+ */
+
+type Labels = Record<string, string | number>;
+
+interface MetricBase {
+  name: string;
+  help: string;
+}
+
+interface CounterMetric extends MetricBase {
+  type: 'counter';
+  series: Map<string, { labels: Labels; value: number }>;
+}
+
+interface HistogramMetric extends MetricBase {
+  type: 'histogram';
+  buckets: number[];
+  series: Map<string, { labels: Labels; counts: number[]; sum: number; count: number }>;
+}
+
+// Gauge, o contador que lleva otro módulo, leído al momento del scrape
+interface CollectedMetric extends MetricBase {
+  type: 'gauge' | 'counter';
+  collect: () => Array<{ labels?: Labels; value: number }>;
+}
+
+type Metric = CounterMetric | HistogramMetric | CollectedMetric;
+
+const MAX_SERIES_PER_METRIC = 500;
+
+// Buckets de latencia en segundos (5ms a 10s)
+export const LATENCY_BUCKETS_SECONDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10];
+
+const metrics = new Map<string, Metric>();
+let droppedSeries = 0;
+
+function seriesKey(labels: Labels): string {
+  return Object.keys(labels)
+    .sort()
+    .map((key) => `${key}=${labels[key]}`)
+    .join(',');
+}
+
+function escapeLabelValue(value: string | number): string {
+  return String(value).replace(/\\/g, '\\\\').replace(/\n/g, '\\n').replace(/"/g, '\\"');
+}
+
+function formatLabels(labels: Labels | undefined, extra?: Labels): string {
+  const all = { ...labels, ...extra };
+  const keys = Object.keys(all);
+  if (keys.length === 0) return '';
+  return `{${keys.map((key) => `${key}="${escapeLabelValue(all[key])}"`).join(',')}}`;
+}
+
+function getOrCreate<M extends Metric>(name: string, create: () => M): M {
+  const existing = metrics.get(name);
+  if (existing) return existing as M;
+  const metric = create();
+  metrics.set(name, metric);
+  return metric;
+}
+
+/**
+ * Suma a un contador
+ *
+ * @example
+ * incrementCounter('cache_requests_total', 'Lecturas del caché', { layer: 'l1', result: 'hit' });
+ */
+export function incrementCounter(name: string, help: string, labels: Labels = {}, by = 1): void {
+  const metric = getOrCreate<CounterMetric>(name, () => ({ type: 'counter', name, help, series: new Map() }));
+  const key = seriesKey(labels);
+  let series = metric.series.get(key);
+  if (!series) {
+    if (metric.series.size >= MAX_SERIES_PER_METRIC) {
+      droppedSeries++;
+      return;
+    }
+    series = { labels, value: 0 };
+    metric.series.set(key, series);
+  }
+  series.value += by;
+}
+
+/**
+ * Registra una observación en un histograma
+ *
+ * @param value Valor observado (para latencias, en segundos)
+ */
+export function observeHistogram(
+  name: string,
+  help: string,
+  labels: Labels,
+  value: number,
+  buckets: number[] = LATENCY_BUCKETS_SECONDS
+): void {
+  const metric = getOrCreate<HistogramMetric>(name, () => ({ type: 'histogram', name, help, buckets, series: new Map() }));
+  const key = seriesKey(labels);
+  let series = metric.series.get(key);
+  if (!series) {
+    if (metric.series.size >= MAX_SERIES_PER_METRIC) {
+      droppedSeries++;
+      return;
+    }
+    series = { labels, counts: metric.buckets.map(() => 0), sum: 0, count: 0 };
+    metric.series.set(key, series);
+  }
+  for (let i = 0; i < metric.buckets.length; i++) {
+    if (value <= metric.buckets[i]) series.counts[i]++;
+  }
+  series.sum += value;
+  series.count++;
+}
+
+/**
+ * Registra un gauge que se lee al momento del scrape
+ *
+ * @example
+ * registerGauge('db_pool_connections', 'Conexiones del pool', () => [
+ *   { labels: { state: 'idle' }, value: pool.idleCount },
+ * ]);
+ */
+export function registerGauge(
+  name: string,
+  help: string,
+  collect: () => Array<{ labels?: Labels; value: number }>
+): void {
+  metrics.set(name, { type: 'gauge', name, help, collect });
+}
+
+/**
+ * Registra un contador que otro módulo ya lleva y se lee al momento del scrape
+ *
+ * Para valores que solo crecen (desde que arrancó el proceso); Prometheus los
+ * trata como contadores, así que rate() tolera los reinicios. El nombre debe
+ * terminar en _total.
+ *
+ * @example
+ * registerCollectedCounter('password_hasher_rejected_total', 'Hashes rechazados', () => [
+ *   { value: getPasswordHasherStats().rejected },
+ * ]);
+ */
+export function registerCollectedCounter(
+  name: string,
+  help: string,
+  collect: () => Array<{ labels?: Labels; value: number }>
+): void {
+  metrics.set(name, { type: 'counter', name, help, collect });
+}
+
+/**
+ * Normaliza una ruta para usarla como label (sin IDs, fechas ni usernames)
+ *
+ * Las rutas pasan a logApiRequest el path con los parámetros ya resueltos
+ * (incluso los inválidos, en los 400), así que los segmentos dinámicos
+ * se reemplazan por su nombre.
+ *
+ * @example
+ * normalizeRouteLabel('/api/appointments/123/cancel') // '/api/appointments/:id/cancel'
+ * normalizeRouteLabel('/api/available-times/2025-03-10') // '/api/available-times/:date'
+ * normalizeRouteLabel('/api/provider/maraflamini/info') // '/api/provider/:username/info'
+ */
+export function normalizeRouteLabel(path: string): string {
+  return path
+    .split('?')[0]
+    .replace(/^\/api\/provider\/[^/]+/, '/api/provider/:username')
+    .replace(/^\/api\/(appointments\/date|available-times)\/[^/]+/, '/api/$1/:date')
+    .replace(/^\/api\/appointments\/(?!(?:date|create)(?:\/|$))[^/]+/, '/api/appointments/:id')
+    .replace(/\/(?:\d+|\[\w+\])(?=\/|$)/g, '/:id');
+}
+
+/**
+ * Exporta todas las métricas en formato de texto de Prometheus
+ */
+export function renderPrometheusMetrics(): string {
+  const lines: string[] = [];
+
+  for (const metric of metrics.values()) {
+    lines.push(`# HELP ${metric.name} ${metric.help}`);
+    lines.push(`# TYPE ${metric.name} ${metric.type}`);
+
+    if ('collect' in metric) {
+      try {
+        for (const sample of metric.collect()) {
+          lines.push(`${metric.name}${formatLabels(sample.labels)} ${sample.value}`);
+        }
+      } catch {
+        // Una métrica leída en el scrape que falla no debe romper el resto
+      }
+    } else if (metric.type === 'counter') {
+      for (const series of metric.series.values()) {
+        lines.push(`${metric.name}${formatLabels(series.labels)} ${series.value}`);
+      }
+    } else {
+      for (const series of metric.series.values()) {
+        metric.buckets.forEach((bucket, i) => {
+          lines.push(`${metric.name}_bucket${formatLabels(series.labels, { le: bucket })} ${series.counts[i]}`);
+        });
+        lines.push(`${metric.name}_bucket${formatLabels(series.labels, { le: '+Inf' })} ${series.count}`);
+        lines.push(`${metric.name}_sum${formatLabels(series.labels)} ${series.sum}`);
+        lines.push(`${metric.name}_count${formatLabels(series.labels)} ${series.count}`);
+      }
+    }
+  }
+
+  lines.push('# HELP metrics_dropped_series_total Series descartadas por exceder el límite de labels');
+  lines.push('# TYPE metrics_dropped_series_total counter');
+  lines.push(`metrics_dropped_series_total ${droppedSeries}`);
+
+  return lines.join('\n') + '\n';
+}
@@ -0,0 +1,245 @@
+/**
+ * Hash y Comparación de Contraseñas en Worker Threads
+ *
+ * bcryptjs es JavaScript puro: con cost 10 bloquea el event loop decenas
+ * de ms por llamada, y una ráfaga de logins frena todas las demás requests
+ * de la instancia. Acá el trabajo se hace en un pool de worker_threads:
+ * - BCRYPT_POOL_SIZE workers (por defecto núcleos - 1, máximo 4; 0 = sin pool)
+ * - cada worker procesa un trabajo a la vez; el resto espera en una cola
+ * - con más de BCRYPT_QUEUE_LIMIT trabajos en cola se rechaza con
+ *   PasswordHasherBusyError (las rutas responden 503 + Retry-After)
+ *
+ * Si los workers no pueden iniciarse, se usa bcryptjs en el hilo principal.
+ *
+ * Benchmark: npx tsx scripts/benchmark-password-hasher.ts
+ */
+
+import os from 'os';
+import path from 'path';
+import { Worker } from 'worker_threads';
+import bcrypt from 'bcryptjs';
+import { logger } from './logger';
+
+const BCRYPT_ROUNDS = 10;
+const DEFAULT_POOL_SIZE = Math.max(1, Math.min(4, (os.availableParallelism?.() ?? os.cpus().length) - 1));
+const POOL_SIZE = parseInt(process.env.BCRYPT_POOL_SIZE ?? String(DEFAULT_POOL_SIZE));
+const QUEUE_LIMIT = parseInt(process.env.BCRYPT_QUEUE_LIMIT || '100');
+
+// Código del worker. Se evalúa como CommonJS y carga bcryptjs desde el
+// directorio de la app (funciona igual con `next dev` y con output standalone)
+const WORKER_SOURCE = `
+const { parentPort, workerData } = require('worker_threads');
+const { createRequire } = require('module');
+const bcrypt = createRequire(workerData.resolveFrom)('bcryptjs');
+parentPort.on('message', ({ id, op, a, b }) => {
+  try {
+    const result = op === 'hash' ? bcrypt.hashSync(a, b) : bcrypt.compareSync(a, b);
+    parentPort.postMessage({ id, result });
+  } catch (error) {
+    parentPort.postMessage({ id, error: (error && error.message) || String(error) });
+  }
+});
+`;
+
+/**
+ * La cola del pool está llena: el servidor está saturado de hashes
+ */
+export class PasswordHasherBusyError extends Error {
+  constructor() {
+    super('Password hasher queue is full');
+    this.name = 'PasswordHasherBusyError';
+  }
+}
+
+type HasherJob =
+  | { op: 'hash'; a: string; b: number }
+  | { op: 'compare'; a: string; b: string };
+
+interface PendingJob {
+  id: number;
+  job: HasherJob;
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+}
+
+interface PoolWorker {
+  worker: Worker;
+  current: PendingJob | null;
+}
+
+const workers: PoolWorker[] = [];
+const queue: PendingJob[] = [];
+let nextJobId = 1;
+let poolDisabled = POOL_SIZE <= 0;
+const hasherStats = { completed: 0, rejected: 0, workerRestarts: 0 };
+
+function spawnWorker(): PoolWorker {
+  const entry: PoolWorker = {
+    worker: new Worker(WORKER_SOURCE, {
+      eval: true,
+      workerData: { resolveFrom: path.join(process.cwd(), 'package.json') },
+    }),
+    current: null,
+  };
+
+  entry.worker.on('message', (message: { id: number; result?: unknown; error?: string }) => {
+    const job = entry.current;
+    entry.current = null;
+    if (job && job.id === message.id) {
+      hasherStats.completed++;
+      if (message.error) job.reject(new Error(message.error));
+      else job.resolve(message.result);
+    }
+    dispatch();
+  });
+
+  // Un worker caído se reemplaza y su trabajo en curso vuelve a la cola
+  const onFailure = (error: Error) => {
+    const index = workers.indexOf(entry);
+    if (index === -1) return;
+    workers.splice(index, 1);
+    if (entry.current) queue.unshift(entry.current);
+    entry.current = null;
+    logger.error({ error: error.message }, 'Password hasher worker failed');
+
+    // Si fallan sin haber completado nada (ej: no encuentran bcryptjs), no insistir
+    if (hasherStats.completed === 0 && hasherStats.workerRestarts >= POOL_SIZE) {
+      for (const other of workers.splice(0)) {
+        if (other.current) queue.unshift(other.current);
+        other.worker.terminate();
+      }
+      disablePool(error);
+      return;
+    }
+
+    try {
+      hasherStats.workerRestarts++;
+      workers.push(spawnWorker());
+    } catch (spawnError) {
+      disablePool(spawnError);
+    }
+    dispatch();
+  };
+  entry.worker.on('error', onFailure);
+  entry.worker.on('exit', (code) => onFailure(new Error(`Password hasher worker exited with code ${code}`)));
+
+  // No mantener vivo el proceso por los workers ociosos
+  entry.worker.unref();
+  return entry;
+}
+
+function disablePool(error: unknown): void {
+  poolDisabled = true;
+  logger.warn({ error: error instanceof Error ? error.message : String(error) }, 'Password hasher pool unavailable, using main thread');
+  // Lo que quedó en cola se resuelve en el hilo principal
+  for (const pending of queue.splice(0)) {
+    runInline(pending.job).then(pending.resolve, pending.reject);
+  }
+}
+
+function ensurePool(): void {
+  if (poolDisabled || workers.length > 0) return;
+  try {
+    for (let i = 0; i < POOL_SIZE; i++) {
+      workers.push(spawnWorker());
+    }
+    logger.info({ size: POOL_SIZE, queueLimit: QUEUE_LIMIT }, 'Password hasher pool started');
+  } catch (error) {
+    workers.splice(0).forEach((entry) => entry.worker.terminate());
+    disablePool(error);
+  }
+}
+
+function dispatch(): void {
+  for (const entry of workers) {
+    if (queue.length === 0) return;
+    if (entry.current) continue;
+    const pending = queue.shift()!;
+    entry.current = pending;
+    entry.worker.ref();
+    entry.worker.postMessage({ id: pending.id, ...pending.job });
+  }
+  // Sin trabajos en curso, los workers no retienen el proceso
+  for (const entry of workers) {
+    if (!entry.current) entry.worker.unref();
+  }
+}
+
+function runInline(job: HasherJob): Promise<any> {
+  return job.op === 'hash' ? bcrypt.hash(job.a, job.b) : bcrypt.compare(job.a, job.b);
+}
+
+function runJob<T>(job: HasherJob): Promise<T> {
+  ensurePool();
+  if (poolDisabled) {
+    return runInline(job);
+  }
+
+  if (queue.length >= QUEUE_LIMIT) {
+    hasherStats.rejected++;
+    return Promise.reject(new PasswordHasherBusyError());
+  }
+
+  return new Promise<T>((resolve, reject) => {
+    queue.push({ id: nextJobId++, job, resolve, reject });
+    dispatch();
+  });
+}
+
+/**
+ * Genera el hash bcrypt de una contraseña
+ *
+ * @throws PasswordHasherBusyError si la cola del pool está llena
+ */
+export function hashPassword(password: string, rounds: number = BCRYPT_ROUNDS): Promise<string> {
+  return runJob<string>({ op: 'hash', a: password, b: rounds });
+}
+
+/**
+ * Compara una contraseña con su hash bcrypt
+ *
+ * @throws PasswordHasherBusyError si la cola del pool está llena
+ */
+export function comparePassword(password: string, hash: string): Promise<boolean> {
+  return runJob<boolean>({ op: 'compare', a: password, b: hash });
+}
+
+/**
+ * Respuesta 503 para cuando el pool está saturado
+ */
+export function passwordHasherBusyResponse(): Response {
+  return new Response(
+    JSON.stringify({
+      success: false,
+      error: 'Servidor ocupado. Intenta de nuevo en unos segundos.',
+    }),
+    {
+      status: 503,
+      headers: {
+        'Content-Type': 'application/json',
+        'Retry-After': '2',
+      },
+    }
+  );
+}
+
+/**
+ * Estado del pool (para monitoreo)
+ */
+export function getPasswordHasherStats(): {
+  enabled: boolean;
+  size: number;
+  busy: number;
+  queued: number;
+  completed: number;
+  rejected: number;
+  workerRestarts: number;
+} {
+  return {
+    enabled: !poolDisabled,
+    size: workers.length,
+    busy: workers.filter((entry) => entry.current).length,
+    queued: queue.length,
+    ...hasherStats,
+  };
+}
@@ -7,15 +7,24 @@
  * - Fixed window
  * - Token bucket
  * 
- * Dependencias requeridas:
- * npm install @upstash/ratelimit @upstash/redis
+ * Dos niveles:
+ * - L1 en memoria (TieredRateLimiter): ventana deslizante aproximada por
+ *   identificador en un LRU acotado. Niega localmente a quien ya superó el
+ *   límite y, en los limitadores con localShare > 0, permite sin consultar
+ *   Redis mientras el identificador está lejos del umbral.
+ * - L2 en Upstash: fuente de verdad compartida entre instancias. Las
+ *   requests permitidas localmente se informan en lote (limit con rate = N),
+ *   al acercarse al umbral o en el flush periódico.
  * 
- * Alternativa sin Redis (para desarrollo):
- * npm install lru-cache
+ * Dependencias requeridas:
+ * npm install @upstash/ratelimit @upstash/redis lru-cache
  */
 
 import { Ratelimit } from '@upstash/ratelimit';
 import { Redis } from '@upstash/redis';
+import { LRUCache } from 'lru-cache';
+import { logger } from './logger';
+import { incrementCounter } from './metrics';
 
 // Configuración de Redis para rate limiting
 // En producción, usar Upstash Redis o Redis propio
@@ -26,6 +35,244 @@ const redis = process.env.UPSTASH_REDIS_REST_URL && process.env.UPSTASH_REDIS_RE
 // Detectar modo de prueba
 const isTestMode = process.env.NODE_ENV === 'test' || process.env.TEST_MODE === 'true';
 
+// analytics de Upstash suma llamadas a Redis por cada request; solo si se pide
+const RATE_LIMIT_ANALYTICS = process.env.RATE_LIMIT_ANALYTICS === 'true';
+
+// Identificadores recordados por limitador (memoria acotada)
+const LOCAL_MAX_IDENTIFIERS = 10000;
+// Demora máxima para informar a Redis las requests permitidas localmente
+const LOCAL_FLUSH_MAX_DELAY_MS = 1000;
+
+type WindowDuration = `${number} ${'s' | 'm' | 'h'}`;
+
+const WINDOW_UNIT_MS = { s: 1000, m: 60 * 1000, h: 60 * 60 * 1000 };
+
+function windowToMs(window: WindowDuration): number {
+  const [amount, unit] = window.split(' ') as [string, keyof typeof WINDOW_UNIT_MS];
+  return parseFloat(amount) * WINDOW_UNIT_MS[unit];
+}
+
+export interface RateLimitResult {
+  success: boolean;
+  limit: number;
+  remaining: number;
+  reset: number;
+}
+
+interface LocalWindow {
+  /** Inicio de la ventana actual (epoch ms) */
+  windowStart: number;
+  /** Requests de la ventana anterior y de la actual (estimación local + global conocida) */
+  previous: number;
+  current: number;
+  /** Requests permitidas localmente que Redis todavía no conoce */
+  unsynced: number;
+  /** Hasta cuándo el identificador está bloqueado (según Redis) */
+  blockedUntil: number;
+  /** Sincronización con Redis en curso */
+  syncing: Promise<RateLimitResult> | null;
+}
+
+const rateLimitStats = {
+  localAllowed: 0,
+  localDenied: 0,
+  redisCalls: 0,
+  batchedHits: 0,
+};
+
+// Identificadores con requests sin informar, por limitador
+const pendingFlush = new Map<TieredRateLimiter, Set<string>>();
+let flushTimer: NodeJS.Timeout | null = null;
+
+/**
+ * Rate limiter de dos niveles (memoria + Upstash)
+ * 
+ * Con localShare = 0 (endpoints sensibles como login) cada request permitida
+ * pasa por Redis y el L1 solo evita llamadas para identificadores ya bloqueados.
+ * Con localShare = 0.5, la primera mitad del cupo se decide en memoria.
+ */
+export class TieredRateLimiter {
+  /** Nombre para métricas, derivado del prefijo (ej: 'auth/login') */
+  readonly name: string;
+  readonly tokens: number;
+  readonly windowMs: number;
+  private readonly localAllowance: number;
+  private readonly windows: LRUCache<string, LocalWindow>;
+
+  constructor(
+    private readonly remote: Ratelimit,
+    options: { tokens: number; window: WindowDuration; prefix: string; localShare: number }
+  ) {
+    this.name = options.prefix.replace(/^@maxturnos\/ratelimit\/?/, '') || 'default';
+    this.tokens = options.tokens;
+    this.windowMs = windowToMs(options.window);
+    this.localAllowance = Math.floor(options.tokens * options.localShare);
+    this.windows = new LRUCache<string, LocalWindow>({
+      max: LOCAL_MAX_IDENTIFIERS,
+      ttl: this.windowMs * 2,
+    });
+  }
+
+  async limit(identifier: string): Promise<RateLimitResult> {
+    const now = Date.now();
+    const entry = this.getWindow(identifier, now);
+    const reset = entry.windowStart + this.windowMs;
+
+    if (entry.blockedUntil > now) {
+      rateLimitStats.localDenied++;
+      return { success: false, limit: this.tokens, remaining: 0, reset: entry.blockedUntil };
+    }
+
+    const estimate = this.estimate(entry, now);
+    if (estimate + 1 <= this.localAllowance) {
+      entry.current++;
+      entry.unsynced++;
+      rateLimitStats.localAllowed++;
+      scheduleFlush(this, identifier);
+      return {
+        success: true,
+        limit: this.tokens,
+        remaining: Math.max(0, this.tokens - Math.ceil(estimate) - 1),
+        reset,
+      };
+    }
+
+    // Cerca del umbral: decide Redis. Si ya hay una consulta en curso, esperarla
+    if (entry.syncing) {
+      await entry.syncing.catch(() => undefined);
+      return this.limit(identifier);
+    }
+    return this.sync(identifier, entry, 1);
+  }
+
+  /**
+   * Informa a Redis las requests permitidas localmente (sin decidir una nueva)
+   */
+  async flush(identifier: string): Promise<void> {
+    const entry = this.windows.get(identifier);
+    if (!entry || entry.unsynced === 0 || entry.syncing) return;
+    await this.sync(identifier, entry, 0);
+  }
+
+  private async sync(identifier: string, entry: LocalWindow, requested: number): Promise<RateLimitResult> {
+    const rate = entry.unsynced + requested;
+    rateLimitStats.batchedHits += entry.unsynced;
+    entry.unsynced = 0;
+    rateLimitStats.redisCalls++;
+
+    const syncing = this.remote.limit(identifier, { rate }).then((result) => ({
+      success: result.success,
+      limit: result.limit,
+      remaining: result.remaining,
+      reset: result.reset,
+    }));
+    entry.syncing = syncing;
+
+    try {
+      const result = await syncing;
+      if (result.success) {
+        // Tomar el conteo global como piso de la estimación local
+        entry.current = Math.max(entry.current + requested, result.limit - result.remaining);
+      } else {
+        entry.blockedUntil = result.reset;
+      }
+      return result;
+    } finally {
+      entry.syncing = null;
+    }
+  }
+
+  private getWindow(identifier: string, now: number): LocalWindow {
+    let entry = this.windows.get(identifier);
+    if (!entry) {
+      entry = { windowStart: now, previous: 0, current: 0, unsynced: 0, blockedUntil: 0, syncing: null };
+      this.windows.set(identifier, entry);
+      return entry;
+    }
+
+    const elapsedWindows = Math.floor((now - entry.windowStart) / this.windowMs);
+    if (elapsedWindows >= 1) {
+      entry.previous = elapsedWindows === 1 ? entry.current : 0;
+      entry.current = 0;
+      entry.windowStart += elapsedWindows * this.windowMs;
+    }
+    return entry;
+  }
+
+  /**
+   * Ventana deslizante aproximada: la ventana anterior pesa según cuánto
+   * se solapa todavía con los últimos windowMs
+   */
+  private estimate(entry: LocalWindow, now: number): number {
+    const overlap = 1 - (now - entry.windowStart) / this.windowMs;
+    return entry.previous * Math.max(0, overlap) + entry.current;
+  }
+}
+
+function scheduleFlush(limiter: TieredRateLimiter, identifier: string): void {
+  let identifiers = pendingFlush.get(limiter);
+  if (!identifiers) {
+    identifiers = new Set();
+    pendingFlush.set(limiter, identifiers);
+  }
+  identifiers.add(identifier);
+
+  if (!flushTimer) {
+    flushTimer = setTimeout(flushLocalHits, LOCAL_FLUSH_MAX_DELAY_MS);
+    flushTimer.unref?.();
+  }
+}
+
+/**
+ * Informa a Redis, en un solo lote, las requests permitidas localmente
+ */
+async function flushLocalHits(): Promise<void> {
+  flushTimer = null;
+  const batch = Array.from(pendingFlush, ([limiter, identifiers]) => ({ limiter, identifiers: Array.from(identifiers) }));
+  pendingFlush.clear();
+
+  await Promise.all(
+    batch.flatMap(({ limiter, identifiers }) =>
+      identifiers.map((identifier) =>
+        limiter.flush(identifier).catch((error) => {
+          logger.warn({ error: error instanceof Error ? error.message : String(error), identifier }, 'Rate limit flush failed');
+        })
+      )
+    )
+  );
+}
+
+/**
+ * Contadores del rate limiting (para monitoreo)
+ */
+export function getRateLimitStats(): typeof rateLimitStats {
+  return { ...rateLimitStats };
+}
+
+/**
+ * Crea un rate limiter de dos niveles (null si no hay Redis)
+ */
+function createRateLimiter(options: {
+  tokens: number;
+  window: WindowDuration;
+  prefix: string;
+  /** Fracción del cupo que se decide en memoria (0 = siempre consultar Redis) */
+  localShare: number;
+}): TieredRateLimiter | null {
+  if (!redis) return null;
+  return new TieredRateLimiter(
+    new Ratelimit({
+      redis: redis,
+      limiter: Ratelimit.slidingWindow(options.tokens, options.window),
+      analytics: RATE_LIMIT_ANALYTICS,
+      prefix: options.prefix,
+      // El L1 ya recuerda los identificadores bloqueados (en un LRU acotado)
+      ephemeralCache: false,
+    }),
+    options
+  );
+}
+
 /**
  * Rate limiter principal usando sliding window
  * 
@@ -33,119 +280,85 @@ const isTestMode = process.env.NODE_ENV === 'test' || process.env.TEST_MODE ===
  * - 10 requests por 10 segundos por defecto
  * - Ajustable por endpoint mediante configuración personalizada
  */
-const defaultRateLimiter = redis
-  ? new Ratelimit({
-      redis: redis,
-      limiter: Ratelimit.slidingWindow(10, '10 s'),
-      analytics: true,
-      prefix: '@maxturnos/ratelimit',
-    })
-  : null;
+const defaultRateLimiter = createRateLimiter({
+  tokens: 10,
+  window: '10 s',
+  prefix: '@maxturnos/ratelimit',
+  localShare: 0.5,
+});
 
 /**
  * Rate limiters específicos por endpoint
  * 
  * En modo test, los límites son mucho más permisivos para permitir pruebas automatizadas.
  * En producción, los límites son más restrictivos para prevenir abuso.
+ * 
+ * Los endpoints de autenticación y escritura usan localShare 0: cada request
+ * permitida se cuenta en Redis, así el límite es exacto entre instancias.
  */
 export const rateLimiters = {
   // Endpoint de creación de citas
   // Producción: 5 requests/minuto | Test: 100 requests/minuto
-  createAppointment: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 100 : 5, 
-          isTestMode ? '1 m' : '1 m'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/appointments/create',
-      })
-    : null,
+  createAppointment: createRateLimiter({
+    tokens: isTestMode ? 100 : 5,
+    window: '1 m',
+    prefix: '@maxturnos/ratelimit/appointments/create',
+    localShare: 0,
+  }),
 
   // Endpoint de registro
   // Producción: 3 requests/10 minutos | Test: 1000 requests/minuto (para pruebas paralelas)
-  register: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 1000 : 3,
-          isTestMode ? '1 m' : '10 m'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/auth/register',
-      })
-    : null,
+  register: createRateLimiter({
+    tokens: isTestMode ? 1000 : 3,
+    window: isTestMode ? '1 m' : '10 m',
+    prefix: '@maxturnos/ratelimit/auth/register',
+    localShare: 0,
+  }),
 
   // Endpoint de login
   // Producción: 5 requests/5 minutos | Test: 100 requests/minuto
-  login: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 100 : 5,
-          isTestMode ? '1 m' : '5 m'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/auth/login',
-      })
-    : null,
+  login: createRateLimiter({
+    tokens: isTestMode ? 100 : 5,
+    window: isTestMode ? '1 m' : '5 m',
+    prefix: '@maxturnos/ratelimit/auth/login',
+    localShare: 0,
+  }),
 
   // Endpoint de verificación de email
   // Producción: 10 requests/hora | Test: 100 requests/minuto
-  verifyEmail: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 100 : 10,
-          isTestMode ? '1 m' : '1 h'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/auth/verify',
-      })
-    : null,
+  verifyEmail: createRateLimiter({
+    tokens: isTestMode ? 100 : 10,
+    window: isTestMode ? '1 m' : '1 h',
+    prefix: '@maxturnos/ratelimit/auth/verify',
+    localShare: 0,
+  }),
 
   // Endpoints del perfil del proveedor
   // Producción: 30 requests/minuto | Test: 200 requests/minuto
-  providerProfile: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 200 : 30,
-          '1 m'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/provider',
-      })
-    : null,
+  providerProfile: createRateLimiter({
+    tokens: isTestMode ? 200 : 30,
+    window: '1 m',
+    prefix: '@maxturnos/ratelimit/provider',
+    localShare: 0.5,
+  }),
 
   // Endpoints públicos de lectura (ej: horarios disponibles, obras sociales)
   // Producción: 10 requests/10 segundos | Test: 1000 requests/minuto (para pruebas paralelas)
-  publicRead: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 1000 : 10,
-          isTestMode ? '1 m' : '10 s'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/public-read',
-      })
-    : null,
+  publicRead: createRateLimiter({
+    tokens: isTestMode ? 1000 : 10,
+    window: isTestMode ? '1 m' : '10 s',
+    prefix: '@maxturnos/ratelimit/public-read',
+    localShare: 0.5,
+  }),
 
   // Admin master reset password (solo super_admin)
   // Producción: 5 requests/5 minutos | Test: 50 requests/minuto
-  adminMasterReset: redis
-    ? new Ratelimit({
-        redis: redis,
-        limiter: Ratelimit.slidingWindow(
-          isTestMode ? 50 : 5,
-          isTestMode ? '1 m' : '5 m'
-        ),
-        analytics: true,
-        prefix: '@maxturnos/ratelimit/admin/master-reset',
-      })
-    : null,
+  adminMasterReset: createRateLimiter({
+    tokens: isTestMode ? 50 : 5,
+    window: isTestMode ? '1 m' : '5 m',
+    prefix: '@maxturnos/ratelimit/admin/master-reset',
+    localShare: 0,
+  }),
 };
 
 /**
@@ -165,13 +378,8 @@ export const rateLimiters = {
  */
 export async function checkRateLimit(
   identifier: string,
-  limiter: Ratelimit | null = defaultRateLimiter
-): Promise<{
-  success: boolean;
-  limit: number;
-  remaining: number;
-  reset: number;
-}> {
+  limiter: TieredRateLimiter | null = defaultRateLimiter
+): Promise<RateLimitResult> {
   // En modo test, permitir todas las requests si no hay Redis configurado
   // O si está explícitamente deshabilitado el rate limiting en test
   // O si TEST_MODE está activo (más permisivo)
@@ -199,13 +407,11 @@ export async function checkRateLimit(
   }
 
   const result = await limiter.limit(identifier);
-
-  return {
-    success: result.success,
-    limit: result.limit,
-    remaining: result.remaining,
-    reset: result.reset,
-  };
+  incrementCounter('rate_limit_requests_total', 'Decisiones de rate limiting por limitador', {
+    limiter: limiter.name,
+    result: result.success ? 'allowed' : 'rejected',
+  });
+  return result;
 }
 
 /**
@@ -224,7 +430,7 @@ export async function checkRateLimit(
  */
 export async function rateLimitMiddleware(
   identifier: string,
-  limiter: Ratelimit | null = defaultRateLimiter
+  limiter: TieredRateLimiter | null = defaultRateLimiter
 ): Promise<Response | null> {
   const result = await checkRateLimit(identifier, limiter);
 
@@ -286,78 +492,3 @@ export function getRateLimitIdentifier(
 
   return `ip:${ip || 'unknown'}`;
 }
-
-/**
- * Rate limiter en memoria para desarrollo (sin Redis)
- * 
- * Solo usar en desarrollo. En producción siempre usar Redis.
- */
-class InMemoryRateLimiter {
-  private cache: Map<string, { count: number; resetAt: number }> = new Map();
-  private windowMs: number;
-  private maxRequests: number;
-
-  constructor(maxRequests: number, windowMs: number) {
-    this.maxRequests = maxRequests;
-    this.windowMs = windowMs;
-  }
-
-  async limit(identifier: string): Promise<{
-    success: boolean;
-    limit: number;
-    remaining: number;
-    reset: number;
-  }> {
-    const now = Date.now();
-    const key = identifier;
-    const entry = this.cache.get(key);
-
-    // Limpiar entradas expiradas
-    if (entry && entry.resetAt < now) {
-      this.cache.delete(key);
-    }
-
-    const current = this.cache.get(key);
-
-    if (!current) {
-      // Primera request
-      this.cache.set(key, {
-        count: 1,
-        resetAt: now + this.windowMs,
-      });
-
-      return {
-        success: true,
-        limit: this.maxRequests,
-        remaining: this.maxRequests - 1,
-        reset: now + this.windowMs,
-      };
-    }
-
-    if (current.count >= this.maxRequests) {
-      return {
-        success: false,
-        limit: this.maxRequests,
-        remaining: 0,
-        reset: current.resetAt,
-      };
-    }
-
-    // Incrementar contador
-    current.count++;
-    this.cache.set(key, current);
-
-    return {
-      success: true,
-      limit: this.maxRequests,
-      remaining: this.maxRequests - current.count,
-      reset: current.resetAt,
-    };
-  }
-}
-
-/**
- * Rate limiter en memoria para desarrollo
- * Usar solo cuando Redis no está disponible
- */
-export const inMemoryRateLimiter = new InMemoryRateLimiter(10, 10000);
@@ -0,0 +1,328 @@
+/**
+ * Datos de Referencia en Memoria
+ *
+ * visit_types, consult_types, practice_types y health_insurance son tablas
+ * chicas que cambian muy poco. Se cargan en memoria como mapas inmutables
+ * (por id y por nombre normalizado) para que validar una cita no cueste
+ * consultas a la base de datos.
+ *
+ * Se recargan en segundo plano cada REFERENCE_REFRESH_INTERVAL_MS y a demanda
+ * con refreshReferenceData() después de modificarlas desde la app. Como cada
+ * instancia tiene su propia copia, refreshReferenceData() además incrementa
+ * la generación compartida en Redis (cacheKeys.referenceData()); las demás
+ * instancias la comparan al leer y recargan en cuanto cambia.
+ */
+
+import { pool, getSchemaCapabilities } from './db';
+import { cacheKeys, getCacheGeneration, invalidateCacheNamespace } from './cache';
+import { dbLogger } from './logger';
+import { HealthInsurance } from './types';
+
+export interface ReferenceItem {
+  id: number;
+  name: string;
+  description: string | null;
+}
+
+export interface ReferenceTable<T extends { id?: number; name: string }> {
+  list: readonly T[];
+  byId: ReadonlyMap<number, T>;
+  byName: ReadonlyMap<string, T>;
+}
+
+export interface ReferenceData {
+  visitTypes: ReferenceTable<ReferenceItem>;
+  consultTypes: ReferenceTable<ReferenceItem>;
+  practiceTypes: ReferenceTable<ReferenceItem>;
+  healthInsurance: ReferenceTable<HealthInsurance>;
+  loadedAt: number;
+  // Generación compartida leída antes de cargar (null si Redis no respondió)
+  generation: number | null;
+}
+
+type ReferenceTypeTable = 'visit_types' | 'consult_types' | 'practice_types';
+
+const REFERENCE_REFRESH_INTERVAL_MS = 60 * 1000; // 1 minuto
+const REFERENCE_GENERATION_NAMESPACE = cacheKeys.referenceData();
+
+let referenceData: ReferenceData | null = null;
+let referenceLoadPromise: Promise<ReferenceData> | null = null;
+let referenceQueuedPromise: Promise<ReferenceData> | null = null;
+
+/**
+ * Normaliza un nombre para búsquedas: minúsculas, sin espacios extremos ni tildes
+ *
+ * @example
+ * normalizeReferenceName(' Práctica ') // 'practica'
+ */
+export function normalizeReferenceName(name: string): string {
+  return name
+    .normalize('NFD')
+    .replace(/[\u0300-\u036f]/g, '')
+    .toLowerCase()
+    .trim();
+}
+
+function buildReferenceTable<T extends { id?: number; name: string }>(rows: T[]): ReferenceTable<T> {
+  const list = Object.freeze(rows.map((row) => Object.freeze(row)));
+  const byId = new Map<number, T>();
+  const byName = new Map<string, T>();
+  for (const row of list) {
+    if (row.id !== undefined) byId.set(row.id, row);
+    const normalized = normalizeReferenceName(row.name);
+    if (!byName.has(normalized)) byName.set(normalized, row);
+  }
+  return { list, byId, byName };
+}
+
+async function loadReferenceTypes(table: ReferenceTypeTable, present: boolean): Promise<ReferenceItem[]> {
+  if (!present) return [];
+  const result = await pool.query(`SELECT id, name, description FROM ${table} ORDER BY id`);
+  return result.rows.map((row) => ({
+    id: row.id,
+    name: row.name,
+    description: row.description ?? null,
+  }));
+}
+
+async function loadReferenceData(): Promise<ReferenceData> {
+  // Leer la generación antes que las tablas: si cambia durante la carga,
+  // la próxima lectura ve una generación más nueva y vuelve a cargar
+  const generation = await getCacheGeneration(REFERENCE_GENERATION_NAMESPACE);
+  const schema = await getSchemaCapabilities();
+
+  const [visitTypes, consultTypes, practiceTypes, healthInsurance] = await Promise.all([
+    loadReferenceTypes('visit_types', schema.hasTable('visit_types')),
+    loadReferenceTypes('consult_types', schema.hasTable('consult_types')),
+    loadReferenceTypes('practice_types', schema.hasTable('practice_types')),
+    schema.hasTable('health_insurance')
+      ? pool.query('SELECT id, name, price, notes FROM health_insurance ORDER BY id').then((result) =>
+          result.rows.map((row): HealthInsurance => ({
+            id: row.id,
+            name: row.name,
+            price: row.price ?? null,
+            price_numeric: null,
+            notes: row.notes ?? null,
+          }))
+        )
+      : Promise.resolve([] as HealthInsurance[]),
+  ]);
+
+  dbLogger.debug(
+    {
+      visitTypes: visitTypes.length,
+      consultTypes: consultTypes.length,
+      practiceTypes: practiceTypes.length,
+      healthInsurance: healthInsurance.length,
+    },
+    'Reference data loaded'
+  );
+
+  return {
+    visitTypes: buildReferenceTable(visitTypes),
+    consultTypes: buildReferenceTable(consultTypes),
+    practiceTypes: buildReferenceTable(practiceTypes),
+    healthInsurance: buildReferenceTable(healthInsurance),
+    loadedAt: Date.now(),
+    generation,
+  };
+}
+
+function loadReferenceDataOnce(): Promise<ReferenceData> {
+  if (!referenceLoadPromise) {
+    referenceLoadPromise = loadReferenceData()
+      .then((data) => {
+        referenceData = data;
+        return data;
+      })
+      .finally(() => {
+        referenceLoadPromise = null;
+      });
+  }
+  return referenceLoadPromise;
+}
+
+/**
+ * Recarga los datos de esta instancia
+ *
+ * Si hay una carga en curso (que pudo leer antes del cambio), se encadena otra.
+ */
+function reloadReferenceData(): Promise<ReferenceData> {
+  if (!referenceLoadPromise) {
+    return loadReferenceDataOnce();
+  }
+  if (!referenceQueuedPromise) {
+    referenceQueuedPromise = referenceLoadPromise
+      .catch(() => undefined)
+      .then(() => {
+        referenceQueuedPromise = null;
+        return loadReferenceDataOnce();
+      });
+  }
+  return referenceQueuedPromise;
+}
+
+/**
+ * Recarga los datos de referencia en todas las instancias
+ *
+ * Llamar después de modificar alguna de las tablas (ya confirmada la
+ * transacción) para no esperar al refresco periódico. Incrementa la
+ * generación compartida para que las demás instancias recarguen en su
+ * próxima lectura y recarga esta en el momento.
+ *
+ * @returns Datos recién cargados
+ */
+export async function refreshReferenceData(): Promise<ReferenceData> {
+  await invalidateCacheNamespace(REFERENCE_GENERATION_NAMESPACE);
+  return await reloadReferenceData();
+}
+
+/**
+ * Obtiene los datos de referencia
+ *
+ * Solo consulta la base de datos la primera vez; después resuelve con los
+ * mapas en memoria (y los recarga en segundo plano si están vencidos). Si
+ * otra instancia modificó las tablas (cambió la generación compartida),
+ * recarga antes de responder.
+ *
+ * @example
+ * ```typescript
+ * const { healthInsurance } = await getReferenceData();
+ * const osde = healthInsurance.byName.get(normalizeReferenceName('OSDE'));
+ * ```
+ */
+export async function getReferenceData(): Promise<ReferenceData> {
+  if (!referenceData) {
+    return await loadReferenceDataOnce();
+  }
+
+  const generation = await getCacheGeneration(REFERENCE_GENERATION_NAMESPACE);
+  if (generation !== null && generation !== referenceData.generation) {
+    try {
+      return await reloadReferenceData();
+    } catch (error) {
+      dbLogger.error({ error: error instanceof Error ? error.message : String(error) }, 'Reference data reload failed');
+      return referenceData;
+    }
+  }
+
+  if (Date.now() - referenceData.loadedAt > REFERENCE_REFRESH_INTERVAL_MS) {
+    loadReferenceDataOnce().catch((error) => {
+      dbLogger.error({ error: error instanceof Error ? error.message : String(error) }, 'Reference data refresh failed');
+    });
+  }
+
+  return referenceData;
+}
+
+/**
+ * Crea un tipo de referencia (o devuelve el existente con ese nombre) y recarga los mapas
+ *
+ * Solo se usa cuando falta un tipo esperado, no en el camino normal.
+ */
+async function ensureReferenceType(
+  table: ReferenceTypeTable,
+  name: string,
+  description: string
+): Promise<number | null> {
+  try {
+    const result = await pool.query(
+      `INSERT INTO ${table} (name, description)
+       VALUES ($1, $2)
+       ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+       RETURNING id`,
+      [name, description]
+    );
+    await refreshReferenceData();
+    dbLogger.info({ table, id: result.rows[0].id, name }, 'Reference type created');
+    return result.rows[0].id;
+  } catch (error) {
+    dbLogger.error({ error: error instanceof Error ? error.message : String(error), table, name }, 'Error creating reference type');
+    return null;
+  }
+}
+
+function findByNames(table: ReferenceTable<ReferenceItem>, names: string[]): ReferenceItem | undefined {
+  for (const name of names) {
+    const item = table.byName.get(normalizeReferenceName(name));
+    if (item) return item;
+  }
+  return undefined;
+}
+
+// Nombres esperados para los IDs que usa el formulario de turnos
+const VISIT_TYPE_NAMES: Record<number, { names: string[]; description: string }> = {
+  1: { names: ['Consulta', 'Consulta General'], description: 'Consulta médica general' },
+  2: { names: ['Practica', 'Práctica', 'practice'], description: 'Procedimiento o práctica médica' },
+};
+
+const PRACTICE_TYPE_NAMES: Record<number, string> = {
+  1: 'Criocirugía',
+  2: 'Electrocoagulación',
+  3: 'Biopsia',
+};
+
+/**
+ * Resuelve un visit_type_id solicitado a un ID existente
+ *
+ * Si el ID no existe, busca por el nombre esperado para ese ID y, como
+ * último recurso, crea el tipo.
+ *
+ * @returns ID válido o null si no se pudo resolver
+ */
+export async function resolveVisitTypeId(requestedId: number): Promise<number | null> {
+  const { visitTypes } = await getReferenceData();
+  if (visitTypes.byId.has(requestedId)) return requestedId;
+
+  const expected = VISIT_TYPE_NAMES[requestedId] ?? VISIT_TYPE_NAMES[1];
+  const byName = findByNames(visitTypes, expected.names);
+  if (byName) {
+    dbLogger.warn({ requestedId, usingId: byName.id, matchedByName: byName.name }, 'visit_type_id no encontrado, usando por nombre');
+    return byName.id;
+  }
+
+  return await ensureReferenceType('visit_types', expected.names[0], expected.description);
+}
+
+/**
+ * Resuelve un consult_type_id solicitado a un ID existente
+ *
+ * Si el ID no existe, usa el primer tipo de consulta disponible o crea
+ * 'Primera vez' si la tabla está vacía.
+ *
+ * @returns ID válido o null si no se pudo resolver
+ */
+export async function resolveConsultTypeId(requestedId: number): Promise<number | null> {
+  const { consultTypes } = await getReferenceData();
+  if (consultTypes.byId.has(requestedId)) return requestedId;
+
+  const first = consultTypes.list[0];
+  if (first) {
+    dbLogger.warn({ requestedId, usingId: first.id }, 'consult_type_id no encontrado, usando primer disponible');
+    return first.id;
+  }
+
+  return await ensureReferenceType('consult_types', 'Primera vez', 'Consulta inicial del paciente');
+}
+
+/**
+ * Resuelve un practice_type_id solicitado a un ID existente
+ *
+ * Si el ID no existe, busca por el nombre esperado para ese ID y, como
+ * último recurso, crea el tipo.
+ *
+ * @returns ID válido o null si no se pudo resolver
+ */
+export async function resolvePracticeTypeId(requestedId: number): Promise<number | null> {
+  const { practiceTypes } = await getReferenceData();
+  if (practiceTypes.byId.has(requestedId)) return requestedId;
+
+  const targetName = PRACTICE_TYPE_NAMES[requestedId] || 'Criocirugía';
+  const byName = practiceTypes.byName.get(normalizeReferenceName(targetName));
+  if (byName) {
+    dbLogger.warn({ requestedId, usingId: byName.id, matchedByName: targetName }, 'practice_type_id no encontrado, usando por nombre');
+    return byName.id;
+  }
+
+  return await ensureReferenceType('practice_types', targetName, `Procedimiento de ${targetName.toLowerCase()}`);
+}
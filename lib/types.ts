@@ -228,6 +228,8 @@ export interface WhatsAppResponse {
   success: boolean;
   messageId?: string;
   error?: string;
+  // Solo si el envío no se intentó (circuit breaker abierto): ms hasta volver a probar
+  retryAfterMs?: number;
 }
 
 // Tipos para Email
@@ -252,10 +254,12 @@ export interface ProviderProfile {
 
 export interface ProviderAppointmentsResponse {
   appointments: Appointment[];
-  total: number;
-  page: number;
+  total: number | null; // null con include_total=false
+  page: number | null; // null al paginar por cursor
   limit: number;
-  total_pages: number;
+  total_pages: number | null;
+  has_more: boolean;
+  next_cursor: string | null;
 }
 
 export interface CalendarDay {
@@ -0,0 +1,258 @@
+/**
+ * Cliente HTTP de UltraMsg
+ *
+ * Un único cliente por proceso con:
+ * - agente keep-alive con pool de sockets (no se abre una conexión TLS por mensaje)
+ * - timeout de conexión y timeout de respuesta estrictos, más un tope total
+ * - circuit breaker: con UltraMsg caído o lento se falla al instante en lugar
+ *   de dejar requests colgadas esperando el timeout
+ * - contadores de envíos, errores, timeouts y latencia (getStats())
+ *
+ * createUltraMsgClient() recibe la URL base, así que se puede probar contra un
+ * servidor HTTP local (ver scripts/test-ultramsg-client.ts).
+ */
+
+import http from 'http';
+import https from 'https';
+import type { Socket } from 'net';
+import { TLSSocket } from 'tls';
+import axios, { AxiosInstance } from 'axios';
+import { CircuitBreaker, CircuitState } from './circuit-breaker';
+import { whatsappLogger } from './logger';
+import { WhatsAppResponse } from './types';
+
+export interface UltraMsgClientConfig {
+  /** URL base sin instance_id (ej: https://api.ultramsg.com) */
+  baseUrl: string;
+  instanceId: string;
+  token: string;
+  /** Tiempo máximo para establecer la conexión (ms) */
+  connectTimeoutMs?: number;
+  /** Tiempo máximo sin respuesta una vez conectado (ms) */
+  responseTimeoutMs?: number;
+  /** Conexiones simultáneas máximas a UltraMsg */
+  maxSockets?: number;
+  /** Fallas consecutivas que abren el circuito */
+  breakerFailureThreshold?: number;
+  /** Tiempo que el circuito queda abierto (ms) */
+  breakerOpenMs?: number;
+}
+
+export interface UltraMsgClientStats {
+  requests: number;
+  sent: number;
+  /** UltraMsg respondió pero no envió el mensaje (ej: número inválido) */
+  rejected: number;
+  /** Errores de red, 5xx y 429 */
+  errors: number;
+  timeouts: number;
+  /** Llamadas rechazadas sin salir por tener el circuito abierto */
+  shortCircuited: number;
+  /** Conexiones nuevas abiertas (con keep-alive debería crecer poco) */
+  socketsCreated: number;
+  latencyMs: { count: number; avg: number; p50: number; p95: number; max: number };
+  circuit: { state: CircuitState; consecutiveFailures: number; opens: number; retryAfterMs: number };
+}
+
+export interface UltraMsgClient {
+  /** Envía un mensaje de texto; nunca lanza, devuelve success: false ante cualquier error */
+  sendChat(to: string, body: string): Promise<WhatsAppResponse>;
+  getStats(): UltraMsgClientStats;
+  /** Cierra los sockets del pool */
+  close(): void;
+}
+
+const DEFAULT_CONNECT_TIMEOUT_MS = 3000;
+const DEFAULT_RESPONSE_TIMEOUT_MS = 10000;
+const DEFAULT_MAX_SOCKETS = 10;
+const DEFAULT_BREAKER_FAILURE_THRESHOLD = 5;
+const DEFAULT_BREAKER_OPEN_MS = 30000;
+// Muestras de latencia guardadas para calcular percentiles
+const LATENCY_SAMPLE_SIZE = 256;
+
+/**
+ * Agrega un timeout de conexión a los sockets nuevos del agente
+ *
+ * Si el handshake (TCP, y TLS en https) no termina a tiempo, el socket se
+ * destruye con ETIMEDOUT y la request falla.
+ */
+function withConnectTimeout<A extends http.Agent>(agent: A, connectTimeoutMs: number, onSocket: () => void): A {
+  const target = agent as A & { createConnection: (...args: unknown[]) => Socket };
+  const createConnection = target.createConnection.bind(agent);
+  target.createConnection = (...args: unknown[]) => {
+    const socket = createConnection(...args);
+    onSocket();
+    const readyEvent = socket instanceof TLSSocket ? 'secureConnect' : 'connect';
+    const timer = setTimeout(() => {
+      const error = new Error(`UltraMsg connect timeout after ${connectTimeoutMs}ms`) as NodeJS.ErrnoException;
+      error.code = 'ETIMEDOUT';
+      socket.destroy(error);
+    }, connectTimeoutMs);
+    socket.once(readyEvent, () => clearTimeout(timer));
+    socket.once('close', () => clearTimeout(timer));
+    return socket;
+  };
+  return agent;
+}
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)];
+}
+
+function isTimeoutError(error: any): boolean {
+  return (
+    error?.code === 'ETIMEDOUT' ||
+    error?.code === 'ECONNABORTED' ||
+    error?.code === 'ERR_CANCELED' ||
+    error?.name === 'TimeoutError'
+  );
+}
+
+/**
+ * Crea un cliente de UltraMsg
+ *
+ * @example
+ * ```typescript
+ * const client = createUltraMsgClient({
+ *   baseUrl: 'http://127.0.0.1:4010',
+ *   instanceId: 'instance1',
+ *   token: 'test',
+ *   responseTimeoutMs: 500,
+ * });
+ * const result = await client.sendChat('+5491112345678', 'Hola');
+ * ```
+ */
+export function createUltraMsgClient(config: UltraMsgClientConfig): UltraMsgClient {
+  const connectTimeoutMs = config.connectTimeoutMs ?? DEFAULT_CONNECT_TIMEOUT_MS;
+  const responseTimeoutMs = config.responseTimeoutMs ?? DEFAULT_RESPONSE_TIMEOUT_MS;
+  const baseUrl = config.baseUrl.replace(/\/+$/, '');
+
+  const counters = {
+    requests: 0,
+    sent: 0,
+    rejected: 0,
+    errors: 0,
+    timeouts: 0,
+    shortCircuited: 0,
+    socketsCreated: 0,
+  };
+  const latency = { count: 0, sum: 0, max: 0, samples: [] as number[] };
+
+  const agentOptions = {
+    keepAlive: true,
+    maxSockets: config.maxSockets ?? DEFAULT_MAX_SOCKETS,
+    maxFreeSockets: Math.min(config.maxSockets ?? DEFAULT_MAX_SOCKETS, 5),
+    scheduling: 'lifo' as const,
+  };
+  const onSocket = () => {
+    counters.socketsCreated++;
+  };
+  const agent = baseUrl.startsWith('https:')
+    ? withConnectTimeout(new https.Agent(agentOptions), connectTimeoutMs, onSocket)
+    : withConnectTimeout(new http.Agent(agentOptions), connectTimeoutMs, onSocket);
+
+  const httpClient: AxiosInstance = axios.create({
+    baseURL: `${baseUrl}/${config.instanceId}`,
+    httpAgent: agent instanceof https.Agent ? undefined : agent,
+    httpsAgent: agent instanceof https.Agent ? agent : undefined,
+    timeout: responseTimeoutMs,
+    headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+    // Los códigos de estado se evalúan abajo para decidir qué cuenta como falla
+    validateStatus: () => true,
+  });
+
+  const breaker = new CircuitBreaker({
+    failureThreshold: config.breakerFailureThreshold ?? DEFAULT_BREAKER_FAILURE_THRESHOLD,
+    openDurationMs: config.breakerOpenMs ?? DEFAULT_BREAKER_OPEN_MS,
+    onStateChange: (from, to) => {
+      const log = to === 'open' ? whatsappLogger.warn.bind(whatsappLogger) : whatsappLogger.info.bind(whatsappLogger);
+      log({ from, to }, 'UltraMsg circuit breaker state changed');
+    },
+  });
+
+  function recordLatency(ms: number): void {
+    latency.count++;
+    latency.sum += ms;
+    latency.max = Math.max(latency.max, ms);
+    latency.samples.push(ms);
+    if (latency.samples.length > LATENCY_SAMPLE_SIZE) {
+      latency.samples.shift();
+    }
+  }
+
+  async function sendChat(to: string, body: string): Promise<WhatsAppResponse> {
+    counters.requests++;
+
+    if (!breaker.tryAcquire()) {
+      counters.shortCircuited++;
+      return {
+        success: false,
+        error: 'UltraMsg no disponible (circuit breaker abierto)',
+        retryAfterMs: breaker.getRetryAfterMs(),
+      };
+    }
+
+    const params = new URLSearchParams({ token: config.token, to, body });
+    const startedAt = Date.now();
+
+    try {
+      const response = await httpClient.post('/messages/chat', params.toString(), {
+        // Tope total: conexión + respuesta (timeout solo mide inactividad del socket)
+        signal: AbortSignal.timeout(connectTimeoutMs + responseTimeoutMs),
+      });
+      recordLatency(Date.now() - startedAt);
+
+      if (response.status >= 500 || response.status === 429) {
+        counters.errors++;
+        breaker.recordFailure();
+        return { success: false, error: `UltraMsg respondió ${response.status}` };
+      }
+
+      // UltraMsg responde con: {"sent":"true","message":"ok","id":44897}
+      const data = response.data || {};
+      if (response.status < 400 && (data.sent === 'true' || data.sent === true)) {
+        counters.sent++;
+        breaker.recordSuccess();
+        return { success: true, messageId: String(data.id) };
+      }
+
+      // El servicio funciona pero no aceptó el mensaje: no cuenta para el circuito
+      counters.rejected++;
+      breaker.release();
+      return { success: false, error: data.message || data.error || `Message not sent (HTTP ${response.status})` };
+    } catch (error: any) {
+      recordLatency(Date.now() - startedAt);
+      counters.errors++;
+      const timedOut = isTimeoutError(error);
+      if (timedOut) counters.timeouts++;
+      breaker.recordFailure();
+      return {
+        success: false,
+        error: timedOut ? 'Timeout al contactar UltraMsg' : error?.message || 'Failed to send message',
+      };
+    }
+  }
+
+  function getStats(): UltraMsgClientStats {
+    const sorted = [...latency.samples].sort((a, b) => a - b);
+    return {
+      ...counters,
+      latencyMs: {
+        count: latency.count,
+        avg: latency.count > 0 ? Math.round(latency.sum / latency.count) : 0,
+        p50: percentile(sorted, 50),
+        p95: percentile(sorted, 95),
+        max: latency.max,
+      },
+      circuit: breaker.getStats(),
+    };
+  }
+
+  return {
+    sendChat,
+    getStats,
+    close: () => agent.destroy(),
+  };
+}
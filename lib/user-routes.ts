@@ -3,11 +3,234 @@
  * 
  * Este módulo proporciona funciones para obtener el user_account_id
  * a partir del username del proveedor, necesario para las rutas dinámicas.
+ * 
+ * Directorio de proveedores:
+ * Los datos públicos del proveedor se guardan en un LRU en memoria, indexados
+ * por username y por id. Los "no encontrado" también se guardan, con un TTL
+ * corto, para que probar usernames al azar no llegue a la base de datos.
+ * Las rutas que modifican un proveedor llaman a invalidateProviderDirectory(),
+ * que además incrementa la generación compartida en Redis
+ * (cacheKeys.providerDirectory()): cada instancia la compara al buscar y
+ * vacía su directorio en cuanto cambia.
  */
 
-import { pool } from './db';
+import { LRUCache } from 'lru-cache';
+import { query, defineStatement, getSchemaCapabilities } from './db';
+import { cacheKeys, getCacheGeneration, invalidateCacheNamespace } from './cache';
 import { logger } from './logger';
 
+export interface ProviderDirectoryEntry {
+  id: number;
+  email: string;
+  username: string;
+  first_name: string | null;
+  last_name: string | null;
+  whatsapp_phone_number: string | null;
+  email_verified: boolean;
+  created_at: Date;
+}
+
+const PROVIDER_TTL_MS = 5 * 60 * 1000; // 5 minutos
+const PROVIDER_NOT_FOUND_TTL_MS = 30 * 1000; // 30 segundos
+
+// null = "no existe" (caché negativo)
+const providersByUsername = new LRUCache<string, ProviderDirectoryEntry | null>({
+  max: 5000,
+  ttl: PROVIDER_TTL_MS,
+  allowStale: false,
+});
+const providersById = new LRUCache<number, ProviderDirectoryEntry | null>({
+  max: 5000,
+  ttl: PROVIDER_TTL_MS,
+  allowStale: false,
+});
+
+const USERNAME_COUNT = defineStatement(
+  'username_count',
+  'SELECT COUNT(*) as count FROM user_accounts WHERE username = $1'
+);
+
+// Búsquedas en curso, para no repetir la consulta con requests concurrentes
+const pendingLookups = new Map<string, Promise<ProviderDirectoryEntry | null>>();
+
+const DIRECTORY_GENERATION_NAMESPACE = cacheKeys.providerDirectory();
+// Generación compartida con la que se llenó el directorio local
+let directoryGeneration: number | null = null;
+// Cambia con cada vaciado local: una búsqueda que empezó antes no guarda su resultado
+let directoryEpoch = 0;
+
+function clearProviderDirectory(): void {
+  providersByUsername.clear();
+  providersById.clear();
+  pendingLookups.clear();
+  directoryEpoch++;
+}
+
+/**
+ * Vacía el directorio local si otra instancia modificó un proveedor
+ */
+async function syncDirectoryGeneration(): Promise<void> {
+  const generation = await getCacheGeneration(DIRECTORY_GENERATION_NAMESPACE);
+  if (generation === null || generation === directoryGeneration) return;
+  if (directoryGeneration !== null) {
+    clearProviderDirectory();
+  }
+  directoryGeneration = generation;
+}
+
+async function loadProvider(column: 'username' | 'id', value: string | number): Promise<ProviderDirectoryEntry | null> {
+  // Verificar qué columnas existen en la tabla
+  const schema = await getSchemaCapabilities();
+  const hasFirstName = schema.hasColumn('user_accounts', 'first_name');
+  const hasLastName = schema.hasColumn('user_accounts', 'last_name');
+  const hasWhatsAppPhone = schema.hasColumn('user_accounts', 'whatsapp_phone_number');
+  
+  // Construir SELECT dinámicamente
+  const selectFields = [
+    'id',
+    'email',
+    'username',
+    ...(hasFirstName ? ['first_name'] : []),
+    ...(hasLastName ? ['last_name'] : []),
+    ...(hasWhatsAppPhone ? ['whatsapp_phone_number'] : []),
+    'email_verified',
+    'created_at'
+  ];
+  
+  // Una variante por columna y combinación de columnas opcionales
+  const result = await query(
+    defineStatement(
+      `provider_by_${column}`,
+      `SELECT ${selectFields.join(', ')}
+       FROM user_accounts 
+       WHERE ${column} = $1`
+    ),
+    [value]
+  );
+
+  if (result.rows.length === 0) {
+    return null;
+  }
+
+  const provider = result.rows[0];
+  
+  // Asegurar que los campos opcionales estén presentes
+  return Object.freeze({
+    id: provider.id,
+    email: provider.email,
+    username: provider.username,
+    first_name: hasFirstName ? provider.first_name : null,
+    last_name: hasLastName ? provider.last_name : null,
+    whatsapp_phone_number: hasWhatsAppPhone ? provider.whatsapp_phone_number : null,
+    email_verified: provider.email_verified,
+    created_at: provider.created_at,
+  });
+}
+
+function rememberProvider(entry: ProviderDirectoryEntry): void {
+  providersByUsername.set(entry.username, entry);
+  providersById.set(entry.id, entry);
+}
+
+async function lookupProvider(column: 'username' | 'id', value: string | number): Promise<ProviderDirectoryEntry | null> {
+  await syncDirectoryGeneration();
+
+  const cached = column === 'username'
+    ? providersByUsername.get(value as string)
+    : providersById.get(value as number);
+  if (cached !== undefined) {
+    return cached;
+  }
+
+  const lookupKey = `${column}:${value}`;
+  const pending = pendingLookups.get(lookupKey);
+  if (pending) {
+    return pending;
+  }
+
+  const epoch = directoryEpoch;
+  const lookup: Promise<ProviderDirectoryEntry | null> = loadProvider(column, value)
+    .then((entry) => {
+      // El directorio se invalidó mientras tanto: la fila puede ser la vieja
+      if (epoch !== directoryEpoch) {
+        return entry;
+      }
+      if (entry) {
+        rememberProvider(entry);
+      } else if (column === 'username') {
+        providersByUsername.set(value as string, null, { ttl: PROVIDER_NOT_FOUND_TTL_MS });
+      } else {
+        providersById.set(value as number, null, { ttl: PROVIDER_NOT_FOUND_TTL_MS });
+      }
+      return entry;
+    })
+    .finally(() => {
+      if (pendingLookups.get(lookupKey) === lookup) pendingLookups.delete(lookupKey);
+    });
+
+  pendingLookups.set(lookupKey, lookup);
+  return lookup;
+}
+
+/**
+ * Obtiene un proveedor del directorio por username
+ * 
+ * @param username Username del proveedor
+ * @returns Datos públicos del proveedor o null si no existe
+ */
+export async function getProviderByUsername(username: string): Promise<ProviderDirectoryEntry | null> {
+  try {
+    return await lookupProvider('username', username);
+  } catch (error) {
+    logger.error({ error, username }, 'Error getting provider by username');
+    throw error;
+  }
+}
+
+/**
+ * Obtiene un proveedor del directorio por user_account_id
+ * 
+ * Reemplaza el chequeo 'SELECT id FROM user_accounts WHERE id = $1' de las rutas.
+ * 
+ * @param userAccountId ID del user_account
+ * @returns Datos públicos del proveedor o null si no existe
+ */
+export async function getProviderById(userAccountId: number): Promise<ProviderDirectoryEntry | null> {
+  try {
+    return await lookupProvider('id', userAccountId);
+  } catch (error) {
+    logger.error({ error, userAccountId }, 'Error getting provider by id');
+    throw error;
+  }
+}
+
+/**
+ * Invalida el directorio de proveedores en todas las instancias
+ * 
+ * Llamar después de crear un proveedor o modificar su perfil/username (ya
+ * confirmada la transacción). Quita las entradas locales al momento e
+ * incrementa la generación compartida: las demás instancias vacían su
+ * directorio en su próxima búsqueda.
+ * 
+ * @param userAccountId ID del proveedor (si se conoce)
+ * @param username Username del proveedor (si se conoce; ej: recién registrado)
+ */
+export async function invalidateProviderDirectory(userAccountId?: number | null, username?: string | null): Promise<void> {
+  if (userAccountId) {
+    const entry = providersById.get(userAccountId);
+    if (entry) providersByUsername.delete(entry.username);
+    providersById.delete(userAccountId);
+  }
+  if (username) {
+    providersByUsername.delete(username);
+  }
+  // Una búsqueda en curso pudo leer la fila anterior al cambio
+  pendingLookups.clear();
+  directoryEpoch++;
+
+  await invalidateCacheNamespace(DIRECTORY_GENERATION_NAMESPACE);
+}
+
 /**
  * Obtiene el user_account_id a partir del username
  * 
@@ -16,16 +239,8 @@ import { logger } from './logger';
  */
 export async function getUserAccountIdByUsername(username: string): Promise<number | null> {
   try {
-    const result = await pool.query(
-      'SELECT id FROM user_accounts WHERE username = $1',
-      [username]
-    );
-
-    if (result.rows.length === 0) {
-      return null;
-    }
-
-    return result.rows[0].id;
+    const provider = await lookupProvider('username', username);
+    return provider ? provider.id : null;
   } catch (error) {
     logger.error({ error, username }, 'Error getting user_account_id by username');
     throw error;
@@ -40,16 +255,8 @@ export async function getUserAccountIdByUsername(username: string): Promise<numb
  */
 export async function getUsernameByUserAccountId(userAccountId: number): Promise<string | null> {
   try {
-    const result = await pool.query(
-      'SELECT username FROM user_accounts WHERE id = $1',
-      [userAccountId]
-    );
-
-    if (result.rows.length === 0) {
-      return null;
-    }
-
-    return result.rows[0].username;
+    const provider = await lookupProvider('id', userAccountId);
+    return provider ? provider.username : null;
   } catch (error) {
     logger.error({ error, userAccountId }, 'Error getting username by user_account_id');
     throw error;
@@ -64,10 +271,7 @@ export async function getUsernameByUserAccountId(userAccountId: number): Promise
  */
 export async function usernameExists(username: string): Promise<boolean> {
   try {
-    const result = await pool.query(
-      'SELECT COUNT(*) as count FROM user_accounts WHERE username = $1',
-      [username]
-    );
+    const result = await query(USERNAME_COUNT, [username]);
 
     return parseInt(result.rows[0].count) > 0;
   } catch (error) {
@@ -75,61 +279,3 @@ export async function usernameExists(username: string): Promise<boolean> {
     throw error;
   }
 }
-
-/**
- * Obtiene información completa del proveedor por username
- * 
- * @param username Username del proveedor
- * @returns Información del proveedor o null si no existe
- */
-export async function getProviderByUsername(username: string) {
-  try {
-    // Verificar qué columnas existen en la tabla
-    const columnsResult = await pool.query(`
-      SELECT column_name 
-      FROM information_schema.columns 
-      WHERE table_name = 'user_accounts' AND table_schema = 'public'
-    `);
-    
-    const existingColumns = columnsResult.rows.map((row: any) => row.column_name);
-    const hasFirstName = existingColumns.includes('first_name');
-    const hasLastName = existingColumns.includes('last_name');
-    const hasWhatsAppPhone = existingColumns.includes('whatsapp_phone_number');
-    
-    // Construir SELECT dinámicamente
-    const selectFields = [
-      'id',
-      'email',
-      'username',
-      ...(hasFirstName ? ['first_name'] : []),
-      ...(hasLastName ? ['last_name'] : []),
-      ...(hasWhatsAppPhone ? ['whatsapp_phone_number'] : []),
-      'email_verified',
-      'created_at'
-    ];
-    
-    const result = await pool.query(
-      `SELECT ${selectFields.join(', ')}
-       FROM user_accounts 
-       WHERE username = $1`,
-      [username]
-    );
-
-    if (result.rows.length === 0) {
-      return null;
-    }
-
-    const provider = result.rows[0];
-    
-    // Asegurar que los campos opcionales estén presentes
-    return {
-      ...provider,
-      first_name: hasFirstName ? provider.first_name : null,
-      last_name: hasLastName ? provider.last_name : null,
-      whatsapp_phone_number: hasWhatsAppPhone ? provider.whatsapp_phone_number : null,
-    };
-  } catch (error) {
-    logger.error({ error, username }, 'Error getting provider by username');
-    throw error;
-  }
-}
@@ -0,0 +1,209 @@
+/**
+ * Ingesta de ACKs de WhatsApp (webhook de UltraMsg)
+ *
+ * UltraMsg manda varios ACKs por mensaje (server, device, read, played) y solo
+ * el primero que indica entrega cambia algo en la base de datos. Para que las
+ * ráfagas de webhooks no compitan con las reservas por el pool:
+ * - se descartan antes de tocar la BD los ACKs que no cambian el estado
+ *   (pending/server, repetidos dentro del lote, o de mensajes ya marcados
+ *   como entregados por este proceso)
+ * - los ACKs que quedan, de todas las requests que llegan en unos pocos ms,
+ *   se aplican juntos con un único UPDATE ... FROM (VALUES ...) RETURNING
+ *   apoyado en idx_appointments_whatsapp_message_id
+ */
+
+import { LRUCache } from 'lru-cache';
+import { pool } from './db';
+import { whatsappLogger } from './logger';
+
+export type WhatsAppAckStatus = 'pending' | 'server' | 'device' | 'read' | 'played';
+
+export interface WhatsAppAck {
+  messageId: string;
+  ack: WhatsAppAckStatus;
+}
+
+// Orden de los estados: a partir de 'device' el mensaje llegó al paciente
+const ACK_RANK: Record<WhatsAppAckStatus, number> = {
+  pending: 0,
+  server: 1,
+  device: 2,
+  read: 3,
+  played: 4,
+};
+const DELIVERED_RANK = ACK_RANK.device;
+
+// Espera para juntar ACKs de requests concurrentes en un solo UPDATE
+const ACK_FLUSH_DELAY_MS = 20;
+const ACK_MAX_BATCH = 500;
+
+// Mensajes cuya entrega ya se registró: sus ACKs siguientes (read/played) no cambian nada
+const deliveredMessages = new LRUCache<string, true>({
+  max: 10000,
+  ttl: 1000 * 60 * 60, // 1 hora
+});
+
+let pendingAcks = new Map<string, WhatsAppAckStatus>();
+let pendingFlush: Promise<Map<string, number>> | null = null;
+let flushTimer: NodeJS.Timeout | null = null;
+let resolvePendingFlush: (() => void) | null = null;
+
+function isAckStatus(value: unknown): value is WhatsAppAckStatus {
+  return typeof value === 'string' && value in ACK_RANK;
+}
+
+/**
+ * Extrae los ACKs de un body de webhook
+ *
+ * Acepta un evento suelto, un array de eventos o { data: [...] }.
+ * UltraMsg usa dos formatos por evento:
+ * - { event_type: "message_ack", data: { id, ack, ... } }
+ * - { id, ack, status, ... } (formato directo)
+ *
+ * @returns ACKs válidos, eventos ignorados (no-ACK) y ACKs sin ID de mensaje
+ */
+export function parseWhatsAppAcks(body: unknown): { acks: WhatsAppAck[]; ignored: number; missingId: number } {
+  const events: any[] = Array.isArray(body)
+    ? body
+    : Array.isArray((body as any)?.data)
+      ? (body as any).data
+      : [body];
+
+  const acks: WhatsAppAck[] = [];
+  let ignored = 0;
+  let missingId = 0;
+
+  for (const event of events) {
+    if (!event || typeof event !== 'object') {
+      ignored++;
+      continue;
+    }
+    const eventType: string | undefined = event.event_type || event.event || event.type;
+    const payload = event.data && typeof event.data === 'object' ? event.data : event;
+    const messageId = payload.id ?? payload.messageId;
+    const ack = payload.ack ?? payload.status;
+
+    if (eventType && !String(eventType).includes('ack') && !ack) {
+      ignored++;
+      continue;
+    }
+    if (!messageId) {
+      missingId++;
+      continue;
+    }
+    if (!isAckStatus(ack)) {
+      ignored++;
+      continue;
+    }
+    acks.push({ messageId: String(messageId), ack });
+  }
+
+  return { acks, ignored, missingId };
+}
+
+/**
+ * Deja solo los ACKs que pueden cambiar el estado de una cita
+ *
+ * Un ACK por mensaje (el de mayor estado), solo si indica entrega y el
+ * mensaje no se marcó ya como entregado.
+ */
+export function filterStateChangingAcks(acks: WhatsAppAck[]): WhatsAppAck[] {
+  const best = new Map<string, WhatsAppAckStatus>();
+  for (const { messageId, ack } of acks) {
+    if (ACK_RANK[ack] < DELIVERED_RANK || deliveredMessages.has(messageId)) continue;
+    const current = best.get(messageId);
+    if (!current || ACK_RANK[ack] > ACK_RANK[current]) {
+      best.set(messageId, ack);
+    }
+  }
+  return Array.from(best, ([messageId, ack]) => ({ messageId, ack }));
+}
+
+/**
+ * Aplica un lote de ACKs de entrega con un único UPDATE
+ *
+ * @returns Mapa messageId → id de la cita actualizada
+ */
+async function applyDeliveryAcks(batch: Map<string, WhatsAppAckStatus>): Promise<Map<string, number>> {
+  const values: string[] = [];
+  const params: string[] = [];
+  for (const [messageId, ack] of batch) {
+    values.push(`($${params.length + 1}::varchar, $${params.length + 2}::varchar)`);
+    params.push(messageId, ack);
+  }
+
+  const result = await pool.query(
+    `UPDATE appointments a
+     SET whatsapp_sent = true,
+         whatsapp_sent_at = COALESCE(a.whatsapp_sent_at, CURRENT_TIMESTAMP),
+         updated_at = CURRENT_TIMESTAMP
+     FROM (VALUES ${values.join(', ')}) AS v(message_id, ack)
+     WHERE a.whatsapp_message_id = v.message_id
+       AND (a.whatsapp_sent = false OR a.whatsapp_sent_at IS NULL)
+     RETURNING a.id, v.message_id, v.ack`,
+    params
+  );
+
+  // Entregados (o ajenos a las citas): los próximos ACKs de estos mensajes no cambian nada
+  for (const messageId of batch.keys()) {
+    deliveredMessages.set(messageId, true);
+  }
+
+  const updated = new Map<string, number>();
+  for (const row of result.rows) {
+    updated.set(row.message_id, row.id);
+    whatsappLogger.info({ appointmentId: row.id, messageId: row.message_id, ackStatus: row.ack }, 'WhatsApp message delivered to patient');
+  }
+  return updated;
+}
+
+function flushPendingAcks(): void {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  resolvePendingFlush?.();
+  resolvePendingFlush = null;
+}
+
+/**
+ * Registra ACKs de entrega, juntándolos con los de otras requests concurrentes
+ *
+ * @returns Mapa messageId → id de la cita actualizada, solo para los ACKs pasados
+ */
+export async function recordDeliveryAcks(acks: WhatsAppAck[]): Promise<Map<string, number>> {
+  if (acks.length === 0) return new Map();
+
+  for (const { messageId, ack } of acks) {
+    const current = pendingAcks.get(messageId);
+    if (!current || ACK_RANK[ack] > ACK_RANK[current]) {
+      pendingAcks.set(messageId, ack);
+    }
+  }
+
+  if (!pendingFlush) {
+    const batch = pendingAcks;
+    pendingFlush = new Promise<void>((resolve) => {
+      resolvePendingFlush = resolve;
+      flushTimer = setTimeout(flushPendingAcks, ACK_FLUSH_DELAY_MS);
+    }).then(() => {
+      // A partir de acá los ACKs nuevos van al próximo lote
+      pendingAcks = new Map();
+      pendingFlush = null;
+      return applyDeliveryAcks(batch);
+    });
+  }
+  const flush = pendingFlush;
+
+  if (pendingAcks.size >= ACK_MAX_BATCH) {
+    flushPendingAcks();
+  }
+
+  const updated = await flush;
+  const mine = new Map<string, number>();
+  for (const { messageId } of acks) {
+    const appointmentId = updated.get(messageId);
+    if (appointmentId !== undefined) mine.set(messageId, appointmentId);
+  }
+  return mine;
+}
@@ -0,0 +1,297 @@
+/**
+ * Outbox Transaccional de WhatsApp
+ *
+ * Los mensajes se escriben en whatsapp_outbox dentro de la misma transacción
+ * que la cita (enqueueWhatsAppMessage), así la respuesta HTTP no espera a
+ * UltraMsg y un mensaje nunca se pierde ni se envía por una cita que no se guardó.
+ *
+ * drainWhatsAppOutbox() toma los mensajes pendientes con FOR UPDATE SKIP LOCKED
+ * (varios workers pueden correr a la vez), los envía y:
+ * - si se envió: marca el mensaje como 'sent' y actualiza whatsapp_sent /
+ *   whatsapp_message_id de la cita
+ * - si falló: reprograma con backoff exponencial hasta OUTBOX_MAX_ATTEMPTS,
+ *   después queda como 'failed'
+ * - si no se intentó (circuit breaker de UltraMsg abierto): lo devuelve a
+ *   'pending' sin gastar un intento, para cuando el circuito vuelva a probar,
+ *   y deja de tomar lotes. Así una caída larga de UltraMsg demora los
+ *   mensajes pero no los descarta
+ *
+ * Idempotencia: cada mensaje tiene una idempotency_key única
+ * (ej: 'confirmation:123'); encolar dos veces el mismo evento no duplica el envío.
+ * La entrega es "al menos una vez": si el worker muere entre el envío y la
+ * marca, el mensaje se reintenta cuando vence su lock.
+ *
+ * Se dispara después de cada commit (ver las rutas de citas) y periódicamente
+ * desde /api/cron/whatsapp-outbox para los reintentos.
+ */
+
+import { PoolClient } from 'pg';
+import { pool, getSchemaCapabilities } from './db';
+import { whatsappLogger } from './logger';
+import { sendWhatsAppMessage, isWhatsAppConfigured, getWhatsAppClientStats } from './whatsapp';
+import { dispatchWithConcurrency, DispatchSummary } from './dispatch';
+
+export type WhatsAppOutboxKind = 'appointment_confirmation' | 'provider_cancellation';
+
+interface WhatsAppOutboxRow {
+  id: number;
+  appointment_id: number | null;
+  kind: WhatsAppOutboxKind;
+  phone_number: string;
+  message: string;
+  attempts: number;
+}
+
+const OUTBOX_MAX_ATTEMPTS = 6;
+const OUTBOX_BASE_BACKOFF_SECONDS = 30;
+const OUTBOX_MAX_BACKOFF_SECONDS = 60 * 60;
+// Si un worker muere con mensajes tomados, se liberan pasado este tiempo
+const OUTBOX_LOCK_SECONDS = 120;
+const OUTBOX_BATCH_SIZE = parseInt(process.env.WHATSAPP_OUTBOX_BATCH_SIZE || '20');
+const OUTBOX_CONCURRENCY = parseInt(process.env.WHATSAPP_OUTBOX_CONCURRENCY || '4');
+
+/**
+ * Indica si se puede encolar: la tabla whatsapp_outbox existe (migración
+ * aplicada) y UltraMsg está configurado
+ *
+ * Sin UltraMsg, drainWhatsAppOutbox no envía nada: los mensajes quedarían
+ * pendientes y saldrían todos juntos, ya viejos, el día que se configure.
+ */
+export async function isWhatsAppOutboxEnabled(): Promise<boolean> {
+  if (!isWhatsAppConfigured()) {
+    return false;
+  }
+  const schema = await getSchemaCapabilities();
+  return schema.hasTable('whatsapp_outbox');
+}
+
+/**
+ * Descarta las confirmaciones pendientes de citas canceladas o ya pasadas
+ *
+ * Cubre mensajes encolados antes de configurar UltraMsg o reintentados
+ * durante mucho tiempo: avisarle al paciente de un turno que ya no existe
+ * es peor que no avisarle.
+ */
+async function expireStaleConfirmations(): Promise<void> {
+  const result = await pool.query(
+    `UPDATE whatsapp_outbox o
+     SET status = 'failed', locked_until = NULL,
+         last_error = 'Appointment no longer scheduled or already past'
+     FROM appointments a
+     WHERE o.appointment_id = a.id
+       AND o.kind = 'appointment_confirmation'
+       AND o.status = 'pending'
+       AND (a.status <> 'scheduled' OR a.appointment_date < CURRENT_DATE)`
+  );
+  if (result.rowCount) {
+    whatsappLogger.warn({ expired: result.rowCount }, 'Discarded stale WhatsApp confirmations');
+  }
+}
+
+/**
+ * Encola un mensaje dentro de la transacción de la cita
+ *
+ * La confirmación de una cita nueva no pasa por acá: createBooking la
+ * inserta en la misma sentencia que la cita.
+ *
+ * @param client Cliente de la transacción
+ * @param message Mensaje ya armado y clave de idempotencia
+ *
+ * @example
+ * ```typescript
+ * await withTransaction(async (client) => {
+ *   await client.query("UPDATE appointments SET status = 'cancelled' WHERE id = $1", [appointmentId]);
+ *   await enqueueWhatsAppMessage(client, {
+ *     idempotencyKey: `provider_cancellation:${appointmentId}`,
+ *     appointmentId,
+ *     kind: 'provider_cancellation',
+ *     phoneNumber,
+ *     message: buildProviderCancellationMessage({ ... }),
+ *   });
+ * });
+ * ```
+ */
+export async function enqueueWhatsAppMessage(
+  client: PoolClient,
+  message: {
+    idempotencyKey: string;
+    appointmentId: number | null;
+    kind: WhatsAppOutboxKind;
+    phoneNumber: string;
+    message: string;
+  }
+): Promise<void> {
+  await client.query(
+    `INSERT INTO whatsapp_outbox (idempotency_key, appointment_id, kind, phone_number, message)
+     VALUES ($1, $2, $3, $4, $5)
+     ON CONFLICT (idempotency_key) DO NOTHING`,
+    [message.idempotencyKey, message.appointmentId, message.kind, message.phoneNumber, message.message]
+  );
+}
+
+/**
+ * Toma hasta limit mensajes listos para enviar
+ */
+async function claimOutboxBatch(limit: number): Promise<WhatsAppOutboxRow[]> {
+  const result = await pool.query(
+    `UPDATE whatsapp_outbox
+     SET status = 'processing',
+         attempts = attempts + 1,
+         locked_until = CURRENT_TIMESTAMP + ($2 || ' seconds')::interval
+     WHERE id IN (
+       SELECT id FROM whatsapp_outbox
+       WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+          OR (status = 'processing' AND locked_until < CURRENT_TIMESTAMP)
+       ORDER BY next_attempt_at
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED
+     )
+     RETURNING id, appointment_id, kind, phone_number, message, attempts`,
+    [limit, String(OUTBOX_LOCK_SECONDS)]
+  );
+  return result.rows;
+}
+
+function backoffSeconds(attempts: number): number {
+  return Math.min(OUTBOX_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS);
+}
+
+async function markOutboxSent(row: WhatsAppOutboxRow, messageId: string | undefined): Promise<void> {
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+    await client.query(
+      `UPDATE whatsapp_outbox
+       SET status = 'sent', sent_at = CURRENT_TIMESTAMP, whatsapp_message_id = $2,
+           locked_until = NULL, last_error = NULL
+       WHERE id = $1`,
+      [row.id, messageId || null]
+    );
+    const schema = await getSchemaCapabilities();
+    if (row.appointment_id && messageId && schema.hasColumn('appointments', 'whatsapp_message_id')) {
+      await client.query(
+        `UPDATE appointments
+         SET whatsapp_sent = true,
+             whatsapp_sent_at = CURRENT_TIMESTAMP,
+             whatsapp_message_id = $1
+         WHERE id = $2`,
+        [messageId, row.appointment_id]
+      );
+    }
+    await client.query('COMMIT');
+  } catch (error) {
+    await client.query('ROLLBACK');
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
+/**
+ * Devuelve a 'pending' un mensaje que no se llegó a enviar, sin contar el intento
+ *
+ * claimOutboxBatch ya sumó el intento al tomarlo; acá se descuenta.
+ */
+async function markOutboxDeferred(row: WhatsAppOutboxRow, retryAfterMs: number, error: string): Promise<void> {
+  await pool.query(
+    `UPDATE whatsapp_outbox
+     SET status = 'pending',
+         attempts = GREATEST(attempts - 1, 0),
+         next_attempt_at = CURRENT_TIMESTAMP + ($2 || ' seconds')::interval,
+         locked_until = NULL,
+         last_error = $3
+     WHERE id = $1`,
+    [row.id, String(Math.max(1, Math.ceil(retryAfterMs / 1000))), error]
+  );
+}
+
+async function markOutboxFailed(row: WhatsAppOutboxRow, error: string): Promise<void> {
+  const giveUp = row.attempts >= OUTBOX_MAX_ATTEMPTS;
+  await pool.query(
+    `UPDATE whatsapp_outbox
+     SET status = $2,
+         next_attempt_at = CURRENT_TIMESTAMP + ($3 || ' seconds')::interval,
+         locked_until = NULL,
+         last_error = $4
+     WHERE id = $1`,
+    [row.id, giveUp ? 'failed' : 'pending', String(backoffSeconds(row.attempts)), error]
+  );
+  if (giveUp) {
+    whatsappLogger.error({ outboxId: row.id, appointmentId: row.appointment_id, attempts: row.attempts, error }, 'WhatsApp outbox message failed permanently');
+  }
+}
+
+/**
+ * Envía los mensajes pendientes del outbox
+ *
+ * @param options.maxBatches Lotes a procesar como máximo en esta llamada
+ * @returns Cantidad de mensajes enviados, fallidos y postergados (circuit breaker abierto)
+ */
+export async function drainWhatsAppOutbox(options: { maxBatches?: number } = {}): Promise<{
+  sent: number;
+  failed: number;
+  deferred: number;
+  batches: DispatchSummary<WhatsAppOutboxRow, unknown>[];
+}> {
+  const totals = { sent: 0, failed: 0, deferred: 0, batches: [] as DispatchSummary<WhatsAppOutboxRow, unknown>[] };
+  if (!isWhatsAppConfigured() || !(await isWhatsAppOutboxEnabled())) {
+    return totals;
+  }
+
+  await expireStaleConfirmations();
+
+  const maxBatches = options.maxBatches ?? 5;
+  for (let batch = 0; batch < maxBatches; batch++) {
+    // Con el circuito abierto no tomar mensajes: fallarían sin salir
+    if ((getWhatsAppClientStats()?.circuit.retryAfterMs ?? 0) > 0) break;
+
+    const rows = await claimOutboxBatch(OUTBOX_BATCH_SIZE);
+    if (rows.length === 0) break;
+
+    const summary = await dispatchWithConcurrency(
+      rows,
+      async (row) => {
+        const result = await sendWhatsAppMessage(row.phone_number, row.message);
+        if (result.success) {
+          await markOutboxSent(row, result.messageId);
+          totals.sent++;
+        } else if (result.retryAfterMs !== undefined) {
+          await markOutboxDeferred(row, result.retryAfterMs, result.error || 'Circuit breaker open');
+          totals.deferred++;
+        } else {
+          await markOutboxFailed(row, result.error || 'Unknown error');
+          totals.failed++;
+        }
+      },
+      { concurrency: OUTBOX_CONCURRENCY }
+    );
+
+    // Errores al marcar (ej: BD caída): el lock vence y el mensaje se reintenta
+    for (const outcome of summary.outcomes) {
+      if (outcome.error) {
+        whatsappLogger.error({ error: outcome.error, outboxId: outcome.item.id }, 'Error updating WhatsApp outbox message');
+      }
+    }
+
+    totals.batches.push(summary);
+    if (rows.length < OUTBOX_BATCH_SIZE) break;
+  }
+
+  if (totals.sent > 0 || totals.failed > 0 || totals.deferred > 0) {
+    whatsappLogger.info({ sent: totals.sent, failed: totals.failed, deferred: totals.deferred }, 'WhatsApp outbox drained');
+  }
+  return totals;
+}
+
+/**
+ * Vacía el outbox en segundo plano, sin propagar errores
+ *
+ * Para llamar después del commit desde las rutas (ej: dentro de after()).
+ */
+export async function drainWhatsAppOutboxSafely(): Promise<void> {
+  try {
+    await drainWhatsAppOutbox({ maxBatches: 1 });
+  } catch (error) {
+    whatsappLogger.error({ error }, 'Error draining WhatsApp outbox');
+  }
+}
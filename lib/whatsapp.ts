@@ -5,8 +5,8 @@
  * de citas vía WhatsApp.
  */
 
-import axios from 'axios';
 import { WhatsAppMessage, WhatsAppResponse } from './types';
+import { createUltraMsgClient, UltraMsgClient, UltraMsgClientStats } from './ultramsg-client';
 import { logger, whatsappLogger } from './logger';
 import { cleanPhoneNumber } from './utils';
 
@@ -25,6 +25,32 @@ if (ULTRAMSG_API_URL.includes('/instance')) {
   ULTRAMSG_API_URL = ULTRAMSG_API_URL.split('/instance')[0];
 }
 
+// Cliente compartido (keep-alive, timeouts y circuit breaker); se crea al primer envío
+let ultraMsgClient: UltraMsgClient | null = null;
+
+function getUltraMsgClient(): UltraMsgClient {
+  if (!ultraMsgClient) {
+    ultraMsgClient = createUltraMsgClient({
+      baseUrl: ULTRAMSG_API_URL,
+      instanceId: ULTRAMSG_INSTANCE_ID!,
+      token: ULTRAMSG_API_TOKEN!,
+      connectTimeoutMs: parseInt(process.env.ULTRAMSG_CONNECT_TIMEOUT_MS || '3000'),
+      responseTimeoutMs: parseInt(process.env.ULTRAMSG_RESPONSE_TIMEOUT_MS || '10000'),
+      maxSockets: parseInt(process.env.ULTRAMSG_MAX_SOCKETS || '10'),
+      breakerFailureThreshold: parseInt(process.env.ULTRAMSG_BREAKER_FAILURE_THRESHOLD || '5'),
+      breakerOpenMs: parseInt(process.env.ULTRAMSG_BREAKER_OPEN_MS || '30000'),
+    });
+  }
+  return ultraMsgClient;
+}
+
+/**
+ * Contadores del cliente de UltraMsg (null si todavía no se envió nada)
+ */
+export function getWhatsAppClientStats(): UltraMsgClientStats | null {
+  return ultraMsgClient ? ultraMsgClient.getStats() : null;
+}
+
 /**
  * Envía un mensaje de WhatsApp genérico usando UltraMsg API
  * 
@@ -45,51 +71,21 @@ export async function sendWhatsAppMessage(
     };
   }
 
-  try {
-    // Limpiar y formatear número de teléfono
-    const cleanedPhone = cleanPhoneNumber(phoneNumber);
-    
-    // Asegurar que tenga código de país (agregar + si no lo tiene)
-    const formattedPhone = cleanedPhone.startsWith('+') ? cleanedPhone : `+${cleanedPhone}`;
-
-    // Construir URL de la API de UltraMsg
-    const apiUrl = `${ULTRAMSG_API_URL}/${ULTRAMSG_INSTANCE_ID}/messages/chat`;
-
-    // UltraMsg requiere parámetros como form-urlencoded o query params
-    const params = new URLSearchParams({
-      token: ULTRAMSG_API_TOKEN,
-      to: formattedPhone,
-      body: message,
-    });
+  // Limpiar y formatear número de teléfono
+  const cleanedPhone = cleanPhoneNumber(phoneNumber);
 
-    const response = await axios.post(
-      apiUrl,
-      params.toString(),
-      {
-        headers: {
-          'Content-Type': 'application/x-www-form-urlencoded',
-        },
-      }
-    );
-
-    whatsappLogger.info({ phoneNumber: formattedPhone, messageId: response.data.id }, 'WhatsApp message sent successfully via UltraMsg');
-
-    // UltraMsg responde con: {"sent":"true","message":"ok","id":44897}
-    if (response.data.sent === 'true' || response.data.sent === true) {
-      return {
-        success: true,
-        messageId: String(response.data.id),
-      };
-    } else {
-      throw new Error(response.data.message || 'Message not sent');
-    }
-  } catch (error: any) {
-    whatsappLogger.error({ error, phoneNumber, errorResponse: error.response?.data }, 'Error sending WhatsApp message via UltraMsg');
-    return {
-      success: false,
-      error: error.response?.data?.message || error.message || 'Failed to send message',
-    };
+  // Asegurar que tenga código de país (agregar + si no lo tiene)
+  const formattedPhone = cleanedPhone.startsWith('+') ? cleanedPhone : `+${cleanedPhone}`;
+
+  const result = await getUltraMsgClient().sendChat(formattedPhone, message);
+
+  if (result.success) {
+    whatsappLogger.info({ phoneNumber: formattedPhone, messageId: result.messageId }, 'WhatsApp message sent successfully via UltraMsg');
+  } else {
+    whatsappLogger.error({ phoneNumber: formattedPhone, error: result.error }, 'Error sending WhatsApp message via UltraMsg');
   }
+
+  return result;
 }
 
 /**
@@ -104,20 +100,22 @@ const DEPOSIT_ALIAS = 'maraflamini';
 /** Texto de política de cancelación incluido en todos los mensajes al paciente */
 const CANCELLATION_POLICY = '\n📋 *Política de cancelación:* Si necesitás cancelar, hacelo con al menos 24 horas de anticipación.';
 
-export async function sendAppointmentConfirmation(
-  phoneNumber: string,
-  appointmentDetails: {
-    patientName: string;
-    providerName: string;
-    date: string; // YYYY-MM-DD
-    time: string; // HH:MM
-    visitType: string;
-    consultType?: string | null;
-    practiceType?: string | null;
-    healthInsurance: string;
-    detailsUrl: string;
-  }
-): Promise<WhatsAppResponse> {
+export interface AppointmentConfirmationDetails {
+  patientName: string;
+  providerName: string;
+  date: string; // YYYY-MM-DD
+  time: string; // HH:MM
+  visitType: string;
+  consultType?: string | null;
+  practiceType?: string | null;
+  healthInsurance: string;
+  detailsUrl: string;
+}
+
+/**
+ * Arma el texto del mensaje de confirmación de cita
+ */
+export function buildAppointmentConfirmationMessage(appointmentDetails: AppointmentConfirmationDetails): string {
   const visitTypeText = appointmentDetails.visitType;
   const subTypeText = appointmentDetails.consultType || appointmentDetails.practiceType || '';
   const requiresDeposit35000 = appointmentDetails.visitType === 'Practica' && appointmentDetails.healthInsurance === 'Practica Particular';
@@ -137,7 +135,7 @@ Una vez abonado, enviá el comprobante de pago a este mismo chat para confirmar
   const introLine = requiresDeposit
     ? `Tu visita con ${appointmentDetails.providerName} ha sido registrada.`
     : `Tu visita con ${appointmentDetails.providerName} ha sido confirmada exitosamente.`;
-  const message = `¡Hola ${appointmentDetails.patientName}!
+  return `¡Hola ${appointmentDetails.patientName}!
 
 ${introLine}
 
@@ -152,8 +150,16 @@ ${appointmentDetails.detailsUrl}
 ${CANCELLATION_POLICY}
 
 ¡Te esperamos!`;
+}
 
-  return await sendWhatsAppMessage(phoneNumber, message);
+/**
+ * Envía mensaje de confirmación de cita
+ */
+export async function sendAppointmentConfirmation(
+  phoneNumber: string,
+  appointmentDetails: AppointmentConfirmationDetails
+): Promise<WhatsAppResponse> {
+  return await sendWhatsAppMessage(phoneNumber, buildAppointmentConfirmationMessage(appointmentDetails));
 }
 
 /**
@@ -189,23 +195,18 @@ ${CANCELLATION_POLICY}
   return await sendWhatsAppMessage(phoneNumber, message);
 }
 
+export interface ProviderCancellationDetails {
+  patientName: string;
+  date: string; // YYYY-MM-DD
+  time: string; // HH:MM
+  rescheduleUrl: string;
+}
+
 /**
- * Envía mensaje de cancelación por proveedor
- * 
- * @param phoneNumber Número de teléfono del paciente
- * @param appointmentDetails Detalles de la cita cancelada
- * @returns Resultado del envío
+ * Arma el texto del mensaje de cancelación por proveedor
  */
-export async function sendProviderCancellationNotification(
-  phoneNumber: string,
-  appointmentDetails: {
-    patientName: string;
-    date: string; // YYYY-MM-DD
-    time: string; // HH:MM
-    rescheduleUrl: string;
-  }
-): Promise<WhatsAppResponse> {
-  const message = `¡Hola ${appointmentDetails.patientName}!
+export function buildProviderCancellationMessage(appointmentDetails: ProviderCancellationDetails): string {
+  return `¡Hola ${appointmentDetails.patientName}!
 
 Lamentamos informarte que tu cita del ${appointmentDetails.date} a las ${appointmentDetails.time} ha sido cancelada.
 
@@ -214,8 +215,20 @@ ${appointmentDetails.rescheduleUrl}
 ${CANCELLATION_POLICY}
 
 Disculpa las molestias.`;
+}
 
-  return await sendWhatsAppMessage(phoneNumber, message);
+/**
+ * Envía mensaje de cancelación por proveedor
+ * 
+ * @param phoneNumber Número de teléfono del paciente
+ * @param appointmentDetails Detalles de la cita cancelada
+ * @returns Resultado del envío
+ */
+export async function sendProviderCancellationNotification(
+  phoneNumber: string,
+  appointmentDetails: ProviderCancellationDetails
+): Promise<WhatsAppResponse> {
+  return await sendWhatsAppMessage(phoneNumber, buildProviderCancellationMessage(appointmentDetails));
 }
 
 /**
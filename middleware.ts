@@ -1,6 +1,6 @@
 import { NextResponse } from 'next/server';
 import type { NextRequest } from 'next/server';
-import { verifyToken } from '@/lib/auth';
+import { verifyToken, AUTH_USER_HEADERS } from '@/lib/auth';
 
 export async function middleware(request: NextRequest) {
   const { pathname } = request.nextUrl;
@@ -41,9 +41,16 @@ export async function middleware(request: NextRequest) {
     }
 
     // Agregar información del usuario a los headers para uso en las rutas
+    // (requireAuthFromRequest confía en ellos sin volver a verificar el token).
+    // Siempre se sobrescriben, así un cliente no puede inyectarlos.
     const requestHeaders = new Headers(request.headers);
-    requestHeaders.set('x-user-id', user.id.toString());
-    requestHeaders.set('x-user-email', user.email);
+    requestHeaders.set(AUTH_USER_HEADERS.id, user.id.toString());
+    requestHeaders.set(AUTH_USER_HEADERS.email, user.email);
+    if (user.username) {
+      requestHeaders.set(AUTH_USER_HEADERS.username, user.username);
+    } else {
+      requestHeaders.delete(AUTH_USER_HEADERS.username);
+    }
 
     return NextResponse.next({
       request: {
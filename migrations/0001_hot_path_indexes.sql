@@ -0,0 +1,23 @@
+-- migrate:no-transaction
+--
+-- Índices compuestos sobre los predicados de las rutas calientes.
+-- CONCURRENTLY no bloquea escrituras, pero no puede correr dentro de una
+-- transacción: el runner ejecuta cada sentencia por separado y, si una
+-- creación anterior quedó INVALID, borra el índice y lo vuelve a crear.
+--
+-- Ya cubiertos por restricciones UNIQUE (no se duplican):
+-- - work_schedule (user_account_id, day_of_week)
+-- - unavailable_days (user_account_id, unavailable_date); igual se asegura
+--   idx_unavailable_days_user_date para bases creadas antes de que existiera
+--
+-- Sin índice por (client_id, fecha, hora): crear una cita no busca duplicados
+-- del cliente antes de insertar (los rechaza el índice único parcial de 0002)
+-- y el borrado en cascada de clients usa idx_appointments_client_id.
+
+-- Disponibilidad, calendario y lista del proveedor: filtran por proveedor y
+-- rango de fechas, y la disponibilidad además por status = 'scheduled'
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_user_date_status
+  ON appointments (user_account_id, appointment_date, status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_unavailable_days_user_date
+  ON unavailable_days (user_account_id, unavailable_date);
@@ -0,0 +1,19 @@
+-- migrate:no-transaction
+--
+-- Un horario del proveedor admite una sola cita activa. El índice único
+-- parcial reemplaza a los SELECT previos de /api/appointments/create: dos
+-- reservas simultáneas del mismo horario ya no pueden pasar las dos, la
+-- segunda recibe 23505 y la ruta responde 409.
+--
+-- Si la creación falla por duplicados existentes, listarlos con:
+--   SELECT user_account_id, appointment_date, appointment_time, array_agg(id)
+--   FROM appointments WHERE status = 'scheduled'
+--   GROUP BY 1, 2, 3 HAVING COUNT(*) > 1;
+-- cancelar los sobrantes y volver a correr npm run migrate.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS unique_appointment_slot_scheduled
+  ON appointments (user_account_id, appointment_date, appointment_time)
+  WHERE status = 'scheduled';
+
+-- El índice anterior incluía client_id y queda cubierto por el nuevo
+DROP INDEX CONCURRENTLY IF EXISTS unique_appointment_scheduled;
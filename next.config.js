@@ -2,6 +2,8 @@
 const nextConfig = {
   reactStrictMode: true,
   output: 'standalone',
+  // bcryptjs queda fuera del bundle: los workers de lib/password-hasher.ts lo cargan con require
+  serverExternalPackages: ['bcryptjs'],
   // swcMinify está habilitado por defecto en Next.js 15
   experimental: {
     // Next.js 15 features
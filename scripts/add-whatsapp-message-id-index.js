@@ -0,0 +1,48 @@
+/**
+ * Migración: agrega índice sobre appointments.whatsapp_message_id
+ * para que el webhook de UltraMsg encuentre la cita de cada ACK sin
+ * recorrer toda la tabla.
+ *
+ * Se crea con CONCURRENTLY para no bloquear las escrituras en producción.
+ *
+ * Uso: node scripts/add-whatsapp-message-id-index.js
+ */
+
+const { Pool } = require('pg');
+require('dotenv').config({ path: '.env.local' });
+
+const pool = new Pool({
+  host: process.env.POSTGRESQL_HOST || 'localhost',
+  port: parseInt(process.env.POSTGRESQL_PORT || '5432'),
+  database: process.env.POSTGRESQL_DATABASE || 'MaxTurnos_db',
+  user: process.env.POSTGRESQL_USER || 'postgres',
+  password: process.env.POSTGRESQL_PASSWORD,
+  ssl:
+    process.env.POSTGRESQL_SSL_MODE === 'require' ||
+    process.env.POSTGRESQL_SSL_MODE === 'verify-full'
+      ? {
+          rejectUnauthorized: process.env.POSTGRESQL_SSL_MODE === 'verify-full',
+          ca: process.env.POSTGRESQL_CA_CERT,
+        }
+      : false,
+});
+
+async function run() {
+  const client = await pool.connect();
+  try {
+    await client.query(`
+      CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_whatsapp_message_id
+        ON appointments (whatsapp_message_id)
+        WHERE whatsapp_message_id IS NOT NULL
+    `);
+    console.log('✅ Índice idx_appointments_whatsapp_message_id creado.');
+  } catch (err) {
+    console.error('❌ Error:', err.message);
+    process.exit(1);
+  } finally {
+    client.release();
+    await pool.end();
+  }
+}
+
+run();
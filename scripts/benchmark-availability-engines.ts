@@ -0,0 +1,90 @@
+/**
+ * Benchmark de Motores de Disponibilidad
+ *
+ * Compara los motores 'node' y 'sql' de lib/availability.ts calculando la
+ * disponibilidad de un proveedor desde las tablas de origen (sin índice ni caché)
+ * y verifica que ambos devuelvan el mismo resultado.
+ *
+ * Ejecutar con:
+ * npx tsx scripts/benchmark-availability-engines.ts <username> [días=14] [iteraciones=20]
+ */
+
+import { config } from 'dotenv';
+
+config({ path: '.env.local' });
+
+async function main() {
+  // Importar después de cargar .env.local: lib/db crea el pool al importarse
+  const { pool } = await import('../lib/db');
+  const { computeRangeAvailability, freeSlotsFromAvailability } = await import('../lib/availability');
+  const { getUserAccountIdByUsername } = await import('../lib/user-routes');
+
+  const [username, daysArg = '14', iterationsArg = '20'] = process.argv.slice(2);
+  if (!username) {
+    console.error('Uso: npx tsx scripts/benchmark-availability-engines.ts <username> [días] [iteraciones]');
+    process.exit(1);
+  }
+
+  const userAccountId = await getUserAccountIdByUsername(username);
+  if (!userAccountId) {
+    console.error(`❌ Proveedor no encontrado: ${username}`);
+    process.exit(1);
+  }
+
+  const days = parseInt(daysArg);
+  const iterations = parseInt(iterationsArg);
+  const dates: string[] = [];
+  const cursor = new Date();
+  for (let i = 0; i < days; i++) {
+    dates.push(cursor.toISOString().split('T')[0]);
+    cursor.setUTCDate(cursor.getUTCDate() + 1);
+  }
+
+  console.log(`🏁 Proveedor ${username} (id ${userAccountId}), ${days} días, ${iterations} iteraciones\n`);
+
+  const results: Record<string, Record<string, string[]>> = {};
+
+  for (const engine of ['node', 'sql'] as const) {
+    for (const mode of ['día por día', 'rango'] as const) {
+      // Calentamiento
+      await computeRangeAvailability(userAccountId, dates, engine);
+
+      const start = process.hrtime.bigint();
+      for (let i = 0; i < iterations; i++) {
+        if (mode === 'rango') {
+          await computeRangeAvailability(userAccountId, dates, engine);
+        } else {
+          for (const date of dates) {
+            await computeRangeAvailability(userAccountId, [date], engine);
+          }
+        }
+      }
+      const totalMs = Number(process.hrtime.bigint() - start) / 1e6;
+
+      console.log(`  ${engine.padEnd(4)} ${mode.padEnd(12)} ${(totalMs / iterations).toFixed(1)} ms/iteración`);
+    }
+
+    const availability = await computeRangeAvailability(userAccountId, dates, engine);
+    results[engine] = Object.fromEntries(
+      dates.map((date) => [date, freeSlotsFromAvailability(availability.get(date)!)])
+    );
+  }
+
+  const mismatches = dates.filter(
+    (date) => JSON.stringify(results.node[date]) !== JSON.stringify(results.sql[date])
+  );
+
+  if (mismatches.length > 0) {
+    console.error(`\n❌ Los motores difieren en: ${mismatches.join(', ')}`);
+    process.exitCode = 1;
+  } else {
+    console.log('\n✅ Ambos motores devuelven los mismos horarios');
+  }
+
+  await pool.end();
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,63 @@
+/**
+ * Benchmark del Pool de bcrypt
+ *
+ * Simula una ráfaga de logins concurrentes (comparaciones bcrypt cost 10)
+ * y mide el lag del event loop con bcryptjs en el hilo principal y con el
+ * pool de worker_threads de lib/password-hasher.ts. Mientras tanto corre un
+ * "tick" cada 5ms que representa al resto de las requests de la instancia.
+ *
+ * Ejecutar con:
+ * npx tsx scripts/benchmark-password-hasher.ts [logins=50]
+ */
+
+import { monitorEventLoopDelay } from 'perf_hooks';
+import bcrypt from 'bcryptjs';
+
+async function measure(label: string, compare: () => Promise<boolean>, logins: number) {
+  const histogram = monitorEventLoopDelay({ resolution: 1 });
+  let ticks = 0;
+  const ticker = setInterval(() => ticks++, 5);
+
+  histogram.enable();
+  const start = process.hrtime.bigint();
+  const results = await Promise.all(Array.from({ length: logins }, () => compare()));
+  const totalMs = Number(process.hrtime.bigint() - start) / 1e6;
+  histogram.disable();
+  clearInterval(ticker);
+
+  if (results.some((ok) => !ok)) {
+    throw new Error(`${label}: alguna comparación falló`);
+  }
+
+  const toMs = (ns: number) => (ns / 1e6).toFixed(1);
+  console.log(
+    `  ${label.padEnd(14)} total ${totalMs.toFixed(0).padStart(6)} ms | ` +
+      `lag p50 ${toMs(histogram.percentile(50)).padStart(6)} ms, ` +
+      `p99 ${toMs(histogram.percentile(99)).padStart(6)} ms, ` +
+      `max ${toMs(histogram.max).padStart(6)} ms | ` +
+      `ticks ${ticks} de ~${Math.round(totalMs / 5)}`
+  );
+}
+
+async function main() {
+  const logins = parseInt(process.argv[2] || '50');
+  const { comparePassword, getPasswordHasherStats } = await import('../lib/password-hasher');
+
+  const password = 'benchmark-password';
+  const hash = bcrypt.hashSync(password, 10);
+
+  console.log(`🏁 ${logins} logins concurrentes (bcrypt cost 10)\n`);
+
+  // Calentamiento (arranca el pool)
+  await comparePassword(password, hash);
+
+  await measure('hilo principal', () => bcrypt.compare(password, hash), logins);
+  await measure('pool', () => comparePassword(password, hash), logins);
+
+  console.log('\n📊 Pool:', JSON.stringify(getPasswordHasherStats()));
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
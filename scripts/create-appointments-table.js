@@ -59,12 +59,15 @@ async function createAppointmentsTable() {
       CREATE INDEX IF NOT EXISTS idx_appointments_whatsapp_pending 
         ON appointments (user_account_id, appointment_date) 
         WHERE whatsapp_sent = false AND status = 'scheduled';
+      CREATE INDEX IF NOT EXISTS idx_appointments_whatsapp_message_id 
+        ON appointments (whatsapp_message_id) 
+        WHERE whatsapp_message_id IS NOT NULL;
     `);
 
-    // Crear índice único parcial para prevenir citas duplicadas activas
+    // Crear índice único parcial: una sola cita activa por horario del proveedor
     await client.query(`
-      CREATE UNIQUE INDEX IF NOT EXISTS unique_appointment_scheduled 
-        ON appointments (client_id, user_account_id, appointment_date, appointment_time) 
+      CREATE UNIQUE INDEX IF NOT EXISTS unique_appointment_slot_scheduled 
+        ON appointments (user_account_id, appointment_date, appointment_time) 
         WHERE status = 'scheduled';
     `);
 
@@ -0,0 +1,54 @@
+const { Pool } = require('pg');
+require('dotenv').config({ path: '.env.local' });
+
+const pool = new Pool({
+  host: process.env.POSTGRESQL_HOST || 'localhost',
+  port: parseInt(process.env.POSTGRESQL_PORT || '5432'),
+  database: process.env.POSTGRESQL_DATABASE || 'MaxTurnos_db',
+  user: process.env.POSTGRESQL_USER || 'postgres',
+  password: process.env.POSTGRESQL_PASSWORD,
+});
+
+async function createAvailabilityIndexTable() {
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+
+    // Índice precomputado de disponibilidad por proveedor y fecha (ver lib/availability.ts).
+    // open_minutes / booked_minutes: minutos desde medianoche de cada slot de 20 minutos.
+    await client.query(`
+      CREATE TABLE IF NOT EXISTS availability_index (
+        user_account_id INTEGER NOT NULL REFERENCES user_accounts(id) ON DELETE CASCADE,
+        slot_date DATE NOT NULL,
+        open_minutes SMALLINT[] DEFAULT '{}' NOT NULL,
+        booked_minutes SMALLINT[] DEFAULT '{}' NOT NULL,
+        refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+
+        PRIMARY KEY (user_account_id, slot_date)
+      );
+    `);
+
+    // Limpiar días pasados que ya no se consultan
+    await client.query(`DELETE FROM availability_index WHERE slot_date < CURRENT_DATE`);
+
+    await client.query('COMMIT');
+    console.log('✅ Tabla availability_index creada exitosamente');
+  } catch (error) {
+    await client.query('ROLLBACK');
+    console.error('❌ Error al crear tabla availability_index:', error);
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
+createAvailabilityIndexTable()
+  .then(() => {
+    pool.end();
+    process.exit(0);
+  })
+  .catch((error) => {
+    console.error(error);
+    pool.end();
+    process.exit(1);
+  });
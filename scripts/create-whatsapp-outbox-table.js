@@ -0,0 +1,67 @@
+const { Pool } = require('pg');
+require('dotenv').config({ path: '.env.local' });
+
+const pool = new Pool({
+  host: process.env.POSTGRESQL_HOST || 'localhost',
+  port: parseInt(process.env.POSTGRESQL_PORT || '5432'),
+  database: process.env.POSTGRESQL_DATABASE || 'MaxTurnos_db',
+  user: process.env.POSTGRESQL_USER || 'postgres',
+  password: process.env.POSTGRESQL_PASSWORD,
+});
+
+async function createWhatsAppOutboxTable() {
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+
+    // Outbox transaccional de mensajes de WhatsApp (ver lib/whatsapp-outbox.ts).
+    // Se escribe en la misma transacción que la cita; un worker lo vacía con reintentos.
+    await client.query(`
+      CREATE TABLE IF NOT EXISTS whatsapp_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        idempotency_key VARCHAR(255) UNIQUE NOT NULL,
+        appointment_id INTEGER REFERENCES appointments(id) ON DELETE CASCADE,
+        kind VARCHAR(50) NOT NULL,
+        phone_number VARCHAR(50) NOT NULL,
+        message TEXT NOT NULL,
+        status VARCHAR(20) DEFAULT 'pending' NOT NULL,
+        attempts INTEGER DEFAULT 0 NOT NULL,
+        next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        locked_until TIMESTAMP WITH TIME ZONE,
+        last_error TEXT,
+        whatsapp_message_id VARCHAR(255),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        sent_at TIMESTAMP WITH TIME ZONE,
+
+        CONSTRAINT chk_whatsapp_outbox_status CHECK (status IN ('pending', 'processing', 'sent', 'failed'))
+      );
+    `);
+
+    // Mensajes listos para enviar (pendientes o con lock vencido)
+    await client.query(`
+      CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_due
+      ON whatsapp_outbox (next_attempt_at)
+      WHERE status IN ('pending', 'processing');
+    `);
+
+    await client.query('COMMIT');
+    console.log('✅ Tabla whatsapp_outbox creada exitosamente');
+  } catch (error) {
+    await client.query('ROLLBACK');
+    console.error('❌ Error al crear tabla whatsapp_outbox:', error);
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
+createWhatsAppOutboxTable()
+  .then(() => {
+    pool.end();
+    process.exit(0);
+  })
+  .catch((error) => {
+    console.error(error);
+    pool.end();
+    process.exit(1);
+  });
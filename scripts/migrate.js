@@ -0,0 +1,625 @@
+/**
+ * Runner de migraciones versionadas
+ *
+ * Aplica en orden los archivos migrations/NNNN_nombre.sql que todavía no
+ * figuran en schema_migrations, y registra versión, checksum y duración de
+ * cada uno. Un pg_advisory_lock evita que dos deploys migren a la vez.
+ *
+ * Cada migración corre en su propia transacción, salvo las que empiezan con
+ * "-- migrate:no-transaction" (necesario para CREATE INDEX CONCURRENTLY):
+ * esas se ejecutan sentencia por sentencia, así que deben ser idempotentes
+ * (IF NOT EXISTS) y no pueden tener ';' dentro de una sentencia. Si un
+ * CREATE INDEX CONCURRENTLY anterior falló a mitad de camino, el índice
+ * quedó INVALID: el runner lo borra antes de volver a crearlo.
+ *
+ * verify corre EXPLAIN (sin ANALYZE: las escrituras no se ejecutan) sobre las
+ * queries de las rutas calientes con datos reales de la base (el proveedor
+ * con más citas) y falla si alguna hace Seq Scan sobre una tabla con más de
+ * MIGRATE_VERIFY_MIN_ROWS filas estimadas. En tablas chicas el planner elige Seq Scan a propósito, así
+ * que ahí solo se informa.
+ *
+ * Uso:
+ *   node scripts/migrate.js          (o: up) aplica las migraciones pendientes
+ *   node scripts/migrate.js status   lista aplicadas y pendientes
+ *   node scripts/migrate.js verify   EXPLAIN de las queries calientes
+ */
+
+const { Pool } = require('pg');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+require('dotenv').config({ path: '.env.local' });
+
+const pool = new Pool({
+  host: process.env.POSTGRESQL_HOST || 'localhost',
+  port: parseInt(process.env.POSTGRESQL_PORT || '5432'),
+  database: process.env.POSTGRESQL_DATABASE || 'MaxTurnos_db',
+  user: process.env.POSTGRESQL_USER || 'postgres',
+  password: process.env.POSTGRESQL_PASSWORD,
+  ssl:
+    process.env.POSTGRESQL_SSL_MODE === 'require' ||
+    process.env.POSTGRESQL_SSL_MODE === 'verify-full'
+      ? {
+          rejectUnauthorized: process.env.POSTGRESQL_SSL_MODE === 'verify-full',
+          ca: process.env.POSTGRESQL_CA_CERT,
+        }
+      : false,
+});
+
+const MIGRATIONS_DIR = path.join(process.cwd(), 'migrations');
+// Clave arbitraria y fija para pg_advisory_lock
+const MIGRATION_LOCK_KEY = 727_001;
+const VERIFY_MIN_ROWS = parseInt(process.env.MIGRATE_VERIFY_MIN_ROWS || '10000');
+
+// Slot de la agenda en minutos (SLOT_DURATION_MINUTES en lib/availability.ts)
+const SLOT_DURATION_MINUTES = 20;
+
+/**
+ * Sentencia 'availability_range_sql' (buildAvailabilitySql en lib/availability.ts)
+ */
+function availabilityRangeSql(includeTimeFrames) {
+  const timeFramesAntiJoin = includeTimeFrames
+    ? `
+        AND NOT EXISTS (
+          SELECT 1 FROM unavailable_time_frames tf
+          WHERE tf.user_account_id = $1
+            AND tf.workday_date = d.slot_date
+            AND m.minute >= (EXTRACT(HOUR FROM tf.start_time) * 60 + EXTRACT(MINUTE FROM tf.start_time))::int
+            AND m.minute < (EXTRACT(HOUR FROM tf.end_time) * 60 + EXTRACT(MINUTE FROM tf.end_time))::int
+            AND (m.minute - (EXTRACT(HOUR FROM tf.start_time) * 60 + EXTRACT(MINUTE FROM tf.start_time))::int) % $3 = 0
+        )`
+    : '';
+
+  return `
+    WITH days AS (
+      SELECT d::date AS slot_date,
+             (ARRAY['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'])[EXTRACT(DOW FROM d)::int + 1] AS day_name
+      FROM unnest($2::date[]) AS d
+    ),
+    open_slots AS (
+      SELECT DISTINCT d.slot_date, m.minute
+      FROM days d
+      JOIN work_schedule ws
+        ON ws.user_account_id = $1
+       AND ws.day_of_week = d.day_name
+       AND ws.is_working_day = true
+      JOIN available_slots s
+        ON s.work_schedule_id = ws.id
+       AND s.is_available = true
+      CROSS JOIN LATERAL generate_series(
+        (EXTRACT(HOUR FROM s.start_time) * 60 + EXTRACT(MINUTE FROM s.start_time))::int,
+        (EXTRACT(HOUR FROM s.end_time) * 60 + EXTRACT(MINUTE FROM s.end_time))::int - 1,
+        $3
+      ) AS m(minute)
+      WHERE NOT EXISTS (
+          SELECT 1 FROM unavailable_days ud
+          WHERE ud.user_account_id = $1 AND ud.unavailable_date = d.slot_date
+        )${timeFramesAntiJoin}
+    )
+    SELECT
+      to_char(d.slot_date, 'YYYY-MM-DD') AS date,
+      COALESCE(
+        (SELECT array_agg(o.minute ORDER BY o.minute) FROM open_slots o WHERE o.slot_date = d.slot_date),
+        '{}'
+      ) AS open_minutes,
+      COALESCE(
+        (SELECT array_agg((EXTRACT(HOUR FROM a.appointment_time) * 60 + EXTRACT(MINUTE FROM a.appointment_time))::int)
+         FROM appointments a
+         WHERE a.user_account_id = $1
+           AND a.appointment_date = d.slot_date
+           AND a.status = 'scheduled'),
+        '{}'
+      ) AS booked_minutes
+    FROM days d
+  `;
+}
+
+/**
+ * Sentencias 'create_booking' y 'create_booking_outbox' (buildCreateBookingSql
+ * en lib/db-transactions.ts). EXPLAIN sin ANALYZE no ejecuta el INSERT.
+ */
+function createBookingSql(withOutbox) {
+  return `WITH client_row AS (
+    INSERT INTO clients (id, first_name, last_name, phone_number, user_account_id, updated_at)
+    VALUES ($1, $2, $3, $4, $5, CURRENT_TIMESTAMP)
+    ON CONFLICT (phone_number)
+    DO UPDATE SET
+      first_name = EXCLUDED.first_name,
+      last_name = EXCLUDED.last_name,
+      user_account_id = COALESCE(EXCLUDED.user_account_id, clients.user_account_id),
+      updated_at = CURRENT_TIMESTAMP
+    RETURNING id, phone_number, (xmax = 0) AS inserted
+  ), appointment_row AS (
+    INSERT INTO appointments (
+      id, client_id, user_account_id, appointment_date, appointment_time,
+      visit_type_id, consult_type_id, practice_type_id, health_insurance,
+      cancellation_token, notes, status, created_at, updated_at
+    )
+    SELECT $6::int, client_row.id, $5, $7::date, $8::time,
+           $9::int, $10::int, $11::int, $12::text,
+           $13::text, $14::text, 'scheduled', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    FROM client_row
+    WHERE client_row.id = $1
+    RETURNING id, client_id
+  )${withOutbox ? `, outbox_row AS (
+    INSERT INTO whatsapp_outbox (idempotency_key, appointment_id, kind, phone_number, message)
+    SELECT $15::text, appointment_row.id, $16::text, client_row.phone_number, $17::text
+    FROM appointment_row CROSS JOIN client_row
+    ON CONFLICT (idempotency_key) DO NOTHING
+  )` : ''}
+  SELECT appointment_row.id, appointment_row.client_id, client_row.inserted
+  FROM appointment_row CROSS JOIN client_row`;
+}
+
+// Columnas de la lista del proveedor (sin las opcionales de WhatsApp)
+const PROVIDER_APPOINTMENTS_SELECT = `
+  SELECT a.id, a.appointment_date, a.appointment_time, a.health_insurance, a.status, a.created_at,
+         to_char(a.appointment_date, 'YYYY-MM-DD') as cursor_date,
+         c.first_name, c.last_name, c.phone_number,
+         vt.name as visit_type_name, ct.name as consult_type_name, pt.name as practice_type_name
+  FROM appointments a
+  JOIN clients c ON a.client_id = c.id
+  JOIN visit_types vt ON a.visit_type_id = vt.id
+  LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
+  LEFT JOIN practice_types pt ON a.practice_type_id = pt.id`;
+
+/**
+ * Queries de las rutas calientes, copiadas de sus statements en lib/ y app/api/
+ * (mantener en sync: este script es CommonJS y no puede importar los .ts).
+ * Los parámetros salen de sampleParams(); sql y params pueden ser funciones
+ * que reciben (sample, tablas existentes), para las sentencias que cambian
+ * según el schema.
+ *
+ * Fuera de la lista a propósito:
+ * - escrituras por clave primaria o única (cancelar por id, availability_index
+ *   mark/invalidate, whatsapp_outbox por id): siempre usan el índice de la PK
+ * - app/api/cron/send-reminders: corre una vez por día, no en una request
+ * - registro, login y verificación de email: buscan por columnas UNIQUE
+ */
+const HOT_QUERIES = [
+  {
+    name: 'availability_unavailable_days',
+    tables: ['unavailable_days'],
+    sql: `SELECT to_char(unavailable_date, 'YYYY-MM-DD') AS date
+          FROM unavailable_days
+          WHERE user_account_id = $1 AND unavailable_date BETWEEN $2 AND $3`,
+    params: (s) => [s.userAccountId, s.from, s.to],
+  },
+  {
+    name: 'availability_open_slots',
+    tables: ['work_schedule', 'available_slots'],
+    sql: `SELECT ws.day_of_week, s.start_time, s.end_time
+          FROM work_schedule ws
+          JOIN available_slots s ON s.work_schedule_id = ws.id AND s.is_available = true
+          WHERE ws.user_account_id = $1 AND ws.is_working_day = true
+          ORDER BY s.start_time`,
+    params: (s) => [s.userAccountId],
+  },
+  {
+    name: 'availability_booked_appointments',
+    tables: ['appointments'],
+    sql: `SELECT to_char(appointment_date, 'YYYY-MM-DD') AS date, appointment_time
+          FROM appointments
+          WHERE user_account_id = $1
+            AND appointment_date BETWEEN $2 AND $3
+            AND status = 'scheduled'`,
+    params: (s) => [s.userAccountId, s.from, s.to],
+  },
+  {
+    name: 'availability_blocked_frames',
+    tables: ['unavailable_time_frames'],
+    sql: `SELECT to_char(workday_date, 'YYYY-MM-DD') AS date, start_time, end_time
+          FROM unavailable_time_frames
+          WHERE user_account_id = $1 AND workday_date BETWEEN $2 AND $3`,
+    params: (s) => [s.userAccountId, s.from, s.to],
+  },
+  {
+    name: 'availability_index_read_range',
+    tables: ['availability_index'],
+    sql: `SELECT to_char(slot_date, 'YYYY-MM-DD') AS date, open_minutes, booked_minutes
+          FROM availability_index
+          WHERE user_account_id = $1
+            AND slot_date BETWEEN $2 AND $3
+            AND refreshed_at > CURRENT_TIMESTAMP - make_interval(secs => $4)`,
+    params: (s) => [s.userAccountId, s.from, s.to, 300],
+  },
+  {
+    name: 'availability_range_sql',
+    tables: ['work_schedule', 'available_slots', 'unavailable_days', 'appointments'],
+    sql: (s, tables) => availabilityRangeSql(tables.has('unavailable_time_frames')),
+    params: (s) => [s.userAccountId, s.dates, SLOT_DURATION_MINUTES],
+  },
+  {
+    name: 'availability_index_write',
+    tables: ['availability_index', 'appointments'],
+    sql: `INSERT INTO availability_index (user_account_id, slot_date, open_minutes, booked_minutes, refreshed_at)
+          SELECT $1, d.slot_date, d.open_minutes::smallint[],
+                 COALESCE(
+                   (SELECT array_agg((EXTRACT(HOUR FROM a.appointment_time) * 60 + EXTRACT(MINUTE FROM a.appointment_time))::smallint)
+                    FROM appointments a
+                    WHERE a.user_account_id = $1
+                      AND a.appointment_date = d.slot_date
+                      AND a.status = 'scheduled'),
+                   '{}'
+                 ),
+                 CURRENT_TIMESTAMP
+          FROM unnest($2::date[], $3::text[]) AS d(slot_date, open_minutes)
+          ON CONFLICT (user_account_id, slot_date)
+          DO UPDATE SET
+            open_minutes = EXCLUDED.open_minutes,
+            booked_minutes = EXCLUDED.booked_minutes,
+            refreshed_at = CURRENT_TIMESTAMP
+          RETURNING to_char(slot_date, 'YYYY-MM-DD') AS date, booked_minutes`,
+    params: (s) => [s.userAccountId, s.dates, s.dates.map(() => '{}')],
+  },
+  {
+    name: 'reserve_booking_ids',
+    tables: ['clients'],
+    sql: `SELECT nextval(pg_get_serial_sequence('appointments', 'id'))::int AS appointment_id,
+                 COALESCE(
+                   (SELECT id FROM clients WHERE phone_number = $1),
+                   nextval(pg_get_serial_sequence('clients', 'id'))::int
+                 ) AS client_id`,
+    params: (s) => [s.phoneNumber],
+  },
+  {
+    name: 'create_booking',
+    tables: ['clients', 'appointments'],
+    sql: (s, tables) => createBookingSql(tables.has('whatsapp_outbox')),
+    params: (s, tables) => [
+      s.clientId, 'Verify', 'Migrate', s.phoneNumber, s.userAccountId, s.appointmentId, s.to, '09:00:00',
+      1, null, null, 'Particular', 'verify', null,
+      ...(tables.has('whatsapp_outbox') ? ['verify:create_booking', 'appointment_confirmation', ''] : []),
+    ],
+  },
+  {
+    name: 'calendar_month_appointments',
+    tables: ['appointments', 'clients', 'visit_types'],
+    sql: `SELECT a.id, a.appointment_time, a.status, c.first_name, c.last_name,
+                 vt.name as visit_type_name, ct.name as consult_type_name, pt.name as practice_type_name
+          FROM appointments a
+          JOIN clients c ON a.client_id = c.id
+          JOIN visit_types vt ON a.visit_type_id = vt.id
+          LEFT JOIN consult_types ct ON a.consult_type_id = ct.id
+          LEFT JOIN practice_types pt ON a.practice_type_id = pt.id
+          WHERE a.user_account_id = $1
+            AND a.appointment_date >= $2
+            AND a.appointment_date <= $3
+          ORDER BY a.appointment_date, a.appointment_time`,
+    params: (s) => [s.userAccountId, s.from, s.to],
+  },
+  {
+    name: 'provider_appointments_page',
+    tables: ['appointments', 'clients', 'visit_types'],
+    sql: `${PROVIDER_APPOINTMENTS_SELECT}
+          WHERE a.user_account_id = $1 AND a.status = $2
+          ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC LIMIT $3`,
+    params: (s) => [s.userAccountId, 'scheduled', 21],
+  },
+  {
+    name: 'provider_appointments_page_cursor',
+    tables: ['appointments', 'clients', 'visit_types'],
+    sql: `${PROVIDER_APPOINTMENTS_SELECT}
+          WHERE a.user_account_id = $1 AND a.status = $2
+            AND (a.appointment_date, a.appointment_time, a.id) < ($3::date, $4::time, $5)
+          ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC LIMIT $6`,
+    params: (s) => [s.userAccountId, 'scheduled', s.from, '12:00:00', s.appointmentId, 21],
+  },
+  {
+    name: 'provider_appointments_count',
+    tables: ['appointments'],
+    sql: `SELECT COUNT(*) as total FROM appointments a
+          WHERE a.user_account_id = $1 AND a.appointment_date >= $2 AND a.appointment_date <= $3`,
+    params: (s) => [s.userAccountId, s.from, s.to],
+  },
+  {
+    name: 'appointment_detail',
+    tables: ['appointments', 'clients', 'visit_types'],
+    sql: `SELECT a.id, a.status, c.first_name, vt.name as visit_type_name
+          FROM appointments a
+          JOIN clients c ON a.client_id = c.id
+          JOIN visit_types vt ON a.visit_type_id = vt.id
+          WHERE a.id = $1`,
+    params: (s) => [s.appointmentId],
+  },
+  {
+    name: 'provider_by_username',
+    tables: ['user_accounts'],
+    sql: 'SELECT id, email, username, email_verified, created_at FROM user_accounts WHERE username = $1',
+    params: (s) => [s.username],
+  },
+];
+
+function checksum(sql) {
+  return crypto.createHash('sha256').update(sql).digest('hex');
+}
+
+/**
+ * Lee migrations/NNNN_nombre.sql ordenadas por versión
+ */
+function loadMigrations() {
+  if (!fs.existsSync(MIGRATIONS_DIR)) return [];
+  return fs
+    .readdirSync(MIGRATIONS_DIR)
+    .filter((file) => /^\d+_[\w-]+\.sql$/.test(file))
+    .map((file) => {
+      const [, version, name] = file.match(/^(\d+)_([\w-]+)\.sql$/);
+      const sql = fs.readFileSync(path.join(MIGRATIONS_DIR, file), 'utf-8');
+      return {
+        version: parseInt(version, 10),
+        name,
+        file,
+        sql,
+        checksum: checksum(sql),
+        transactional: !/^--\s*migrate:no-transaction\b/m.test(sql),
+      };
+    })
+    .sort((a, b) => a.version - b.version);
+}
+
+/**
+ * Separa un archivo en sentencias (sin comentarios de línea)
+ */
+function splitStatements(sql) {
+  return sql
+    .split('\n')
+    .filter((line) => !line.trim().startsWith('--'))
+    .join('\n')
+    .split(/;\s*(?:\n|$)/)
+    .map((statement) => statement.trim())
+    .filter(Boolean);
+}
+
+async function ensureMigrationsTable(client) {
+  await client.query(`
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+      version INTEGER PRIMARY KEY,
+      name VARCHAR(255) NOT NULL,
+      checksum CHAR(64) NOT NULL,
+      applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      duration_ms INTEGER
+    )
+  `);
+}
+
+async function getApplied(client) {
+  const result = await client.query('SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version');
+  return new Map(result.rows.map((row) => [row.version, row]));
+}
+
+/**
+ * Falla si una migración ya aplicada cambió en disco
+ */
+function assertUnchanged(migrations, applied) {
+  const changed = migrations.filter((m) => applied.has(m.version) && applied.get(m.version).checksum !== m.checksum);
+  if (changed.length > 0) {
+    throw new Error(
+      `Migraciones modificadas después de aplicarse: ${changed.map((m) => m.file).join(', ')}. ` +
+        'Crear una migración nueva en lugar de editar una existente.'
+    );
+  }
+}
+
+/**
+ * Borra el índice si quedó INVALID por un CREATE INDEX CONCURRENTLY fallido
+ * (IF NOT EXISTS lo daría por creado)
+ */
+async function dropInvalidIndex(client, statement) {
+  const match = statement.match(/CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)/i);
+  if (!match) return;
+  const result = await client.query(
+    `SELECT 1 FROM pg_index i
+     JOIN pg_class c ON c.oid = i.indexrelid
+     WHERE c.relname = $1 AND NOT i.indisvalid`,
+    [match[1]]
+  );
+  if (result.rows.length > 0) {
+    console.log(`  ⚠️  ${match[1]} quedó INVALID en un intento anterior, recreando...`);
+    await client.query(`DROP INDEX CONCURRENTLY IF EXISTS ${match[1]}`);
+  }
+}
+
+async function applyMigration(client, migration) {
+  const startTime = Date.now();
+  const record = () =>
+    client.query(
+      'INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES ($1, $2, $3, $4)',
+      [migration.version, migration.name, migration.checksum, Date.now() - startTime]
+    );
+
+  if (migration.transactional) {
+    await client.query('BEGIN');
+    try {
+      await client.query(migration.sql);
+      await record();
+      await client.query('COMMIT');
+    } catch (error) {
+      await client.query('ROLLBACK');
+      throw error;
+    }
+  } else {
+    for (const statement of splitStatements(migration.sql)) {
+      await dropInvalidIndex(client, statement);
+      await client.query(statement);
+    }
+    await record();
+  }
+
+  return Date.now() - startTime;
+}
+
+async function up(client) {
+  await client.query('SELECT pg_advisory_lock($1)', [MIGRATION_LOCK_KEY]);
+  try {
+    await ensureMigrationsTable(client);
+    const migrations = loadMigrations();
+    const applied = await getApplied(client);
+    assertUnchanged(migrations, applied);
+
+    const pending = migrations.filter((m) => !applied.has(m.version));
+    if (pending.length === 0) {
+      console.log('✅ No hay migraciones pendientes.');
+      return;
+    }
+
+    for (const migration of pending) {
+      console.log(`🚀 Aplicando ${migration.file}${migration.transactional ? '' : ' (sin transacción)'}...`);
+      const duration = await applyMigration(client, migration);
+      console.log(`  ✅ ${migration.file} (${duration}ms)`);
+    }
+    console.log(`\n✅ ${pending.length} migración(es) aplicada(s).`);
+  } finally {
+    await client.query('SELECT pg_advisory_unlock($1)', [MIGRATION_LOCK_KEY]);
+  }
+}
+
+async function status(client) {
+  await ensureMigrationsTable(client);
+  const migrations = loadMigrations();
+  const applied = await getApplied(client);
+
+  for (const migration of migrations) {
+    const row = applied.get(migration.version);
+    if (!row) {
+      console.log(`  ⏳ ${migration.file} (pendiente)`);
+    } else if (row.checksum !== migration.checksum) {
+      console.log(`  ❌ ${migration.file} (modificada después de aplicarse)`);
+    } else {
+      console.log(`  ✅ ${migration.file} (${row.applied_at.toISOString()})`);
+    }
+  }
+  assertUnchanged(migrations, applied);
+}
+
+/**
+ * Toma parámetros reales para los EXPLAIN: con datos representativos el
+ * planner elige el mismo plan que en producción
+ */
+async function sampleParams(client) {
+  const today = new Date().toISOString().split('T')[0];
+  const monthLater = new Date(Date.now() + 30 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
+
+  const sample = await client.query(`
+    SELECT a.id, a.user_account_id, to_char(a.appointment_date, 'YYYY-MM-DD') AS date, ua.username,
+           c.id AS client_id, c.phone_number
+    FROM appointments a
+    JOIN user_accounts ua ON ua.id = a.user_account_id
+    JOIN clients c ON c.id = a.client_id
+    WHERE a.user_account_id = (
+      SELECT user_account_id FROM appointments GROUP BY user_account_id ORDER BY COUNT(*) DESC LIMIT 1
+    )
+    ORDER BY a.appointment_date DESC
+    LIMIT 1
+  `);
+  const row = sample.rows[0];
+  if (!row) {
+    const provider = await client.query('SELECT id, username FROM user_accounts ORDER BY id LIMIT 1');
+    return {
+      userAccountId: provider.rows[0]?.id ?? 1,
+      username: provider.rows[0]?.username ?? 'sample',
+      appointmentId: 1,
+      clientId: 1,
+      phoneNumber: '5490000000000',
+      from: today,
+      to: monthLater,
+      dates: datesBetween(today, monthLater),
+    };
+  }
+
+  const to = new Date(new Date(row.date).getTime() + 30 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
+  return {
+    userAccountId: row.user_account_id,
+    username: row.username,
+    appointmentId: row.id,
+    clientId: row.client_id,
+    phoneNumber: row.phone_number,
+    from: row.date,
+    to,
+    dates: datesBetween(row.date, to),
+  };
+}
+
+/**
+ * Fechas YYYY-MM-DD de from a to inclusive (como el mes del calendario)
+ */
+function datesBetween(from, to) {
+  const dates = [];
+  for (let time = new Date(from).getTime(); time <= new Date(to).getTime(); time += 24 * 60 * 60 * 1000) {
+    dates.push(new Date(time).toISOString().split('T')[0]);
+  }
+  return dates;
+}
+
+function collectSeqScans(plan, found = []) {
+  if (plan['Node Type'] === 'Seq Scan') {
+    found.push(plan['Relation Name']);
+  }
+  for (const child of plan.Plans || []) {
+    collectSeqScans(child, found);
+  }
+  return found;
+}
+
+async function verify(client) {
+  const sample = await sampleParams(client);
+  const sizes = await client.query(
+    `SELECT relname, reltuples::bigint AS rows FROM pg_class
+     WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace`
+  );
+  const rowsByTable = new Map(sizes.rows.map((row) => [row.relname, Number(row.rows)]));
+
+  console.log(`🔎 EXPLAIN de ${HOT_QUERIES.length} queries (Seq Scan permitido hasta ${VERIFY_MIN_ROWS} filas)\n`);
+  const failures = [];
+
+  for (const hotQuery of HOT_QUERIES) {
+    const missing = hotQuery.tables.filter((table) => !rowsByTable.has(table));
+    if (missing.length > 0) {
+      console.log(`  ⏭️  ${hotQuery.name}: falta la tabla ${missing.join(', ')}`);
+      continue;
+    }
+
+    const tables = new Set(rowsByTable.keys());
+    const sql = typeof hotQuery.sql === 'function' ? hotQuery.sql(sample, tables) : hotQuery.sql;
+    const result = await client.query(`EXPLAIN (FORMAT JSON) ${sql}`, hotQuery.params(sample, tables));
+    const seqScans = collectSeqScans(result.rows[0]['QUERY PLAN'][0].Plan);
+    const large = seqScans.filter((table) => (rowsByTable.get(table) ?? 0) > VERIFY_MIN_ROWS);
+
+    if (large.length > 0) {
+      failures.push(hotQuery.name);
+      console.log(
+        `  ❌ ${hotQuery.name}: Seq Scan sobre ${large.map((t) => `${t} (~${rowsByTable.get(t)} filas)`).join(', ')}`
+      );
+    } else if (seqScans.length > 0) {
+      console.log(`  ✅ ${hotQuery.name} (Seq Scan en tablas chicas: ${[...new Set(seqScans)].join(', ')})`);
+    } else {
+      console.log(`  ✅ ${hotQuery.name}`);
+    }
+  }
+
+  if (failures.length > 0) {
+    throw new Error(`${failures.length} query(s) con Seq Scan sobre tablas grandes: ${failures.join(', ')}`);
+  }
+  console.log('\n✅ Todas las queries calientes usan índices.');
+}
+
+async function run() {
+  const command = process.argv[2] || 'up';
+  const commands = { up, status, verify };
+  if (!commands[command]) {
+    console.error(`❌ Comando desconocido: ${command} (usar up, status o verify)`);
+    process.exit(1);
+  }
+
+  const client = await pool.connect();
+  try {
+    await commands[command](client);
+  } catch (err) {
+    console.error('❌ Error:', err.message);
+    process.exitCode = 1;
+  } finally {
+    client.release();
+    await pool.end();
+  }
+}
+
+run();
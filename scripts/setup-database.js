@@ -237,12 +237,55 @@ async function setupDatabase() {
       CREATE INDEX IF NOT EXISTS idx_appointments_whatsapp_pending 
         ON appointments (user_account_id, appointment_date) 
         WHERE whatsapp_sent = false AND status = 'scheduled';
-      CREATE UNIQUE INDEX IF NOT EXISTS unique_appointment_scheduled 
-        ON appointments (client_id, user_account_id, appointment_date, appointment_time) 
+      CREATE INDEX IF NOT EXISTS idx_appointments_whatsapp_message_id 
+        ON appointments (whatsapp_message_id) 
+        WHERE whatsapp_message_id IS NOT NULL;
+      CREATE UNIQUE INDEX IF NOT EXISTS unique_appointment_slot_scheduled 
+        ON appointments (user_account_id, appointment_date, appointment_time) 
         WHERE status = 'scheduled';
     `);
     console.log('  ✅ appointments');
 
+    // 8b. Índice precomputado de disponibilidad (lib/availability.ts)
+    console.log('\n🗓️  Creando tabla availability_index...');
+    await client.query(`
+      CREATE TABLE IF NOT EXISTS availability_index (
+        user_account_id INTEGER NOT NULL REFERENCES user_accounts(id) ON DELETE CASCADE,
+        slot_date DATE NOT NULL,
+        open_minutes SMALLINT[] DEFAULT '{}' NOT NULL,
+        booked_minutes SMALLINT[] DEFAULT '{}' NOT NULL,
+        refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (user_account_id, slot_date)
+      );
+    `);
+    console.log('  ✅ availability_index');
+
+    // 8c. Outbox de mensajes de WhatsApp (lib/whatsapp-outbox.ts)
+    console.log('\n📤 Creando tabla whatsapp_outbox...');
+    await client.query(`
+      CREATE TABLE IF NOT EXISTS whatsapp_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        idempotency_key VARCHAR(255) UNIQUE NOT NULL,
+        appointment_id INTEGER REFERENCES appointments(id) ON DELETE CASCADE,
+        kind VARCHAR(50) NOT NULL,
+        phone_number VARCHAR(50) NOT NULL,
+        message TEXT NOT NULL,
+        status VARCHAR(20) DEFAULT 'pending' NOT NULL,
+        attempts INTEGER DEFAULT 0 NOT NULL,
+        next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        locked_until TIMESTAMP WITH TIME ZONE,
+        last_error TEXT,
+        whatsapp_message_id VARCHAR(255),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        sent_at TIMESTAMP WITH TIME ZONE,
+        CONSTRAINT chk_whatsapp_outbox_status CHECK (status IN ('pending', 'processing', 'sent', 'failed'))
+      );
+      CREATE INDEX IF NOT EXISTS idx_whatsapp_outbox_due
+        ON whatsapp_outbox (next_attempt_at)
+        WHERE status IN ('pending', 'processing');
+    `);
+    console.log('  ✅ whatsapp_outbox');
+
     // 9. Crear tablas opcionales
     console.log('\n📦 Creando tablas opcionales...');
     await client.query(`
@@ -0,0 +1,155 @@
+/**
+ * Test de Concurrencia del Índice de Disponibilidad
+ *
+ * Reconstruye la fila de availability_index de un día mientras otras
+ * requests reservan y cancelan turnos de ese mismo día, y verifica que
+ * booked_minutes termine igual a las citas programadas en appointments
+ * (sin reservas ni cancelaciones perdidas).
+ *
+ * Crea citas de prueba con un cliente de prueba y las borra al terminar.
+ * Usar contra una base de desarrollo.
+ *
+ * Ejecutar con:
+ * npx tsx scripts/test-availability-index-race.ts <username> <fecha YYYY-MM-DD> [iteraciones=50]
+ */
+
+import { config } from 'dotenv';
+
+config({ path: '.env.local' });
+
+const TEST_PHONE = '5490000000099';
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+const jitter = () => sleep(Math.random() * 5);
+
+async function main() {
+  // Importar después de cargar .env.local: lib/db crea el pool al importarse
+  const { pool } = await import('../lib/db');
+  const { createBooking } = await import('../lib/db-transactions');
+  const {
+    computeDayAvailability,
+    getDayAvailability,
+    invalidateAvailabilityIndex,
+    markSlotBooked,
+    markSlotReleased,
+    freeSlotsFromAvailability,
+    timeToMinutes,
+  } = await import('../lib/availability');
+  const { getUserAccountIdByUsername } = await import('../lib/user-routes');
+
+  const [username, date, iterationsArg = '50'] = process.argv.slice(2);
+  if (!username || !date) {
+    console.error('Uso: npx tsx scripts/test-availability-index-race.ts <username> <fecha> [iteraciones]');
+    process.exit(1);
+  }
+
+  const userAccountId = await getUserAccountIdByUsername(username);
+  if (!userAccountId) {
+    console.error(`❌ Proveedor no encontrado: ${username}`);
+    process.exit(1);
+  }
+
+  const freeTimes = freeSlotsFromAvailability(await computeDayAvailability(userAccountId, date, 'primary'));
+  if (freeTimes.length === 0) {
+    console.error(`❌ El proveedor no tiene horarios libres el ${date}`);
+    process.exit(1);
+  }
+
+  const iterations = parseInt(iterationsArg);
+  const createdIds: number[] = [];
+  const failures: string[] = [];
+
+  // Compara la fila del índice con las citas programadas del día
+  const check = async (label: string) => {
+    const [indexResult, appointmentsResult] = await Promise.all([
+      pool.query(
+        'SELECT booked_minutes FROM availability_index WHERE user_account_id = $1 AND slot_date = $2',
+        [userAccountId, date]
+      ),
+      pool.query(
+        `SELECT appointment_time FROM appointments
+         WHERE user_account_id = $1 AND appointment_date = $2 AND status = 'scheduled'`,
+        [userAccountId, date]
+      ),
+    ]);
+    if (indexResult.rows.length === 0) return; // Sin fila: la próxima lectura la reconstruye
+
+    const indexed = [...(indexResult.rows[0].booked_minutes as number[])].sort((a, b) => a - b);
+    const actual = appointmentsResult.rows
+      .map((row) => timeToMinutes(row.appointment_time))
+      .sort((a, b) => a - b);
+    if (JSON.stringify(indexed) !== JSON.stringify(actual)) {
+      failures.push(`${label}: índice ${JSON.stringify(indexed)} ≠ citas ${JSON.stringify(actual)}`);
+    }
+  };
+
+  console.log(`🏁 Proveedor ${username} (id ${userAccountId}), ${date}, ${iterations} iteraciones\n`);
+
+  try {
+    for (let i = 0; i < iterations; i++) {
+      const time = freeTimes[i % freeTimes.length];
+
+      // Reserva concurrente con una reconstrucción
+      await invalidateAvailabilityIndex(userAccountId, date);
+      let appointmentId = 0;
+      await Promise.all([
+        jitter().then(() => getDayAvailability(userAccountId, date)),
+        jitter().then(async () => {
+          const booking = await createBooking(
+            {
+              phoneNumber: TEST_PHONE,
+              firstName: 'Test',
+              lastName: 'Concurrencia',
+              userAccountId,
+              appointmentDate: date,
+              appointmentTime: `${time}:00`,
+              visitTypeId: 1,
+              consultTypeId: 1,
+              practiceTypeId: null,
+              healthInsurance: 'Particular',
+            },
+            () => ({ cancellationToken: 'race-test' })
+          );
+          appointmentId = booking.appointmentId;
+          createdIds.push(appointmentId);
+          await markSlotBooked(userAccountId, date, time);
+        }),
+      ]);
+      await check(`iteración ${i + 1} (reserva ${time})`);
+
+      // Cancelación concurrente con una reconstrucción
+      await invalidateAvailabilityIndex(userAccountId, date);
+      await Promise.all([
+        jitter().then(() => getDayAvailability(userAccountId, date)),
+        jitter().then(async () => {
+          await pool.query("UPDATE appointments SET status = 'cancelled' WHERE id = $1", [appointmentId]);
+          await markSlotReleased(userAccountId, date, time);
+        }),
+      ]);
+      await check(`iteración ${i + 1} (cancelación ${time})`);
+    }
+  } finally {
+    if (createdIds.length > 0) {
+      await pool.query('DELETE FROM appointments WHERE id = ANY($1::int[])', [createdIds]);
+    }
+    await pool.query(
+      'DELETE FROM clients c WHERE c.phone_number = $1 AND NOT EXISTS (SELECT 1 FROM appointments a WHERE a.client_id = c.id)',
+      [TEST_PHONE]
+    );
+    await invalidateAvailabilityIndex(userAccountId, date);
+    await pool.end();
+  }
+
+  if (failures.length > 0) {
+    console.error(`❌ ${failures.length} actualizaciones perdidas:`);
+    failures.forEach((failure) => console.error(`  ${failure}`));
+    process.exitCode = 1;
+  } else {
+    console.log(`✅ booked_minutes coincide con appointments en las ${iterations * 2} carreras`);
+  }
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
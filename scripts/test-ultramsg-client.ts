@@ -0,0 +1,123 @@
+/**
+ * Prueba del Cliente de UltraMsg contra un servidor local
+ *
+ * Levanta un servidor HTTP que imita a UltraMsg y verifica:
+ * - keep-alive: varios envíos reutilizan la misma conexión
+ * - timeout de respuesta con un servidor que no contesta
+ * - circuit breaker: se abre tras fallas seguidas, falla al instante y se
+ *   recupera cuando el servidor vuelve
+ *
+ * Ejecutar con: npx tsx scripts/test-ultramsg-client.ts
+ */
+
+import http from 'http';
+import type { AddressInfo } from 'net';
+import { createUltraMsgClient } from '../lib/ultramsg-client';
+
+// Comportamiento actual del servidor
+type ServerMode = 'ok' | 'slow' | 'error' | 'reject';
+let mode: ServerMode = 'ok';
+let nextMessageId = 1;
+let requestsReceived = 0;
+
+const server = http.createServer((req, res) => {
+  requestsReceived++;
+  let body = '';
+  req.on('data', (chunk) => (body += chunk));
+  req.on('end', () => {
+    if (mode === 'slow') return; // no responde nunca
+    if (mode === 'error') {
+      res.writeHead(503, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({ error: 'unavailable' }));
+      return;
+    }
+    const params = new URLSearchParams(body);
+    res.writeHead(200, { 'Content-Type': 'application/json' });
+    res.end(
+      mode === 'reject'
+        ? JSON.stringify({ error: `invalid number ${params.get('to')}` })
+        : JSON.stringify({ sent: 'true', message: 'ok', id: nextMessageId++ })
+    );
+  });
+});
+
+let failures = 0;
+function check(name: string, condition: boolean, detail?: unknown) {
+  console.log(`${condition ? '✅' : '❌'} ${name}${condition ? '' : ` → ${JSON.stringify(detail)}`}`);
+  if (!condition) failures++;
+}
+
+async function main() {
+  await new Promise<void>((resolve) => server.listen(0, '127.0.0.1', resolve));
+  const { port } = server.address() as AddressInfo;
+
+  const client = createUltraMsgClient({
+    baseUrl: `http://127.0.0.1:${port}`,
+    instanceId: 'instance1',
+    token: 'test-token',
+    connectTimeoutMs: 500,
+    responseTimeoutMs: 300,
+    breakerFailureThreshold: 3,
+    breakerOpenMs: 500,
+  });
+
+  // Keep-alive
+  mode = 'ok';
+  for (let i = 0; i < 10; i++) {
+    const result = await client.sendChat('+5491112345678', `Mensaje ${i}`);
+    if (!result.success) check('envío correcto', false, result);
+  }
+  let stats = client.getStats();
+  check('10 envíos correctos', stats.sent === 10, stats);
+  check('keep-alive reutiliza la conexión', stats.socketsCreated === 1, stats.socketsCreated);
+
+  // Rechazo del servicio: no cuenta para el circuito
+  mode = 'reject';
+  const rejected = await client.sendChat('123', 'Hola');
+  stats = client.getStats();
+  check('rechazo devuelve success: false', !rejected.success && stats.rejected === 1, rejected);
+  check('rechazo no suma fallas al circuito', stats.circuit.consecutiveFailures === 0, stats.circuit);
+
+  // Timeout de respuesta
+  mode = 'slow';
+  const startedAt = Date.now();
+  const slow = await client.sendChat('+5491112345678', 'Hola');
+  const elapsed = Date.now() - startedAt;
+  check('servidor lento corta por timeout', !slow.success && client.getStats().timeouts === 1, slow);
+  check('el timeout se respeta (< 1s)', elapsed < 1000, elapsed);
+
+  // Circuit breaker
+  mode = 'error';
+  await client.sendChat('+5491112345678', 'Hola');
+  await client.sendChat('+5491112345678', 'Hola');
+  stats = client.getStats();
+  check('el circuito se abre tras 3 fallas seguidas', stats.circuit.state === 'open', stats.circuit);
+
+  const requestsBefore = requestsReceived;
+  const shortCircuited = await client.sendChat('+5491112345678', 'Hola');
+  stats = client.getStats();
+  check('con el circuito abierto falla sin llamar al servidor', !shortCircuited.success && stats.shortCircuited === 1, stats);
+  check('no se llamó al servidor', requestsReceived === requestsBefore, requestsReceived - requestsBefore);
+
+  mode = 'ok';
+  await new Promise((resolve) => setTimeout(resolve, 550));
+  const recovered = await client.sendChat('+5491112345678', 'Hola');
+  stats = client.getStats();
+  check('la prueba en half_open cierra el circuito', recovered.success && stats.circuit.state === 'closed', stats.circuit);
+
+  console.log('\n📊 Estadísticas:', JSON.stringify(stats, null, 2));
+
+  client.close();
+  server.close();
+
+  if (failures > 0) {
+    console.error(`\n❌ ${failures} verificación(es) fallaron`);
+    process.exit(1);
+  }
+  console.log('\n✅ Cliente de UltraMsg OK');
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});